@@ -0,0 +1,109 @@
+"""
+Kết nối giả lập giữa hai client trong cùng process cho các benchmark truyền
+file (thay cho relay server): packet gửi qua SenderService được đóng khung
+bằng Protocol để đếm byte trên dây, giữ lại theo băng thông + trễ một chiều
+rồi giao cho ReceiveHandler với session_id của phía bên kia.
+
+Import module này cần PYNPUT_BACKEND=dummy khi không có màn hình.
+"""
+
+import heapq
+import threading
+import time
+from collections import defaultdict
+
+from client.handlers.receive_handler import ReceiveHandler
+from client.managers.session_manager import SessionManager, SessionResources
+from client.services.ping_service import PingService
+from client.services.sender_service import SenderService
+from common.packets import FileChunkPacket, FileCompletePacket
+from common.protocol import FileRegion, Protocol
+
+SENDER, RECEIVER = "bench-tx", "bench-rx"
+
+
+class _Counter:
+    """Socket giả bỏ qua dữ liệu - Protocol.send_packet trả về số byte của frame"""
+
+    def sendall(self, data, flags=0):
+        pass
+
+
+class Link:
+    """
+    Link hai chiều SENDER (controller) <-> RECEIVER (host). on_packet(packet)
+    được gọi sau khi packet đã giao cho ReceiveHandler - vd. chọn nơi lưu khi
+    nhận FileMetadataPacket. rate=None là không giới hạn băng thông.
+    """
+
+    def __init__(self, delay: float = 0.0, rate: float | None = None, on_packet=None):
+        self.delay = delay
+        self.rate = rate
+        self.on_packet = on_packet
+        self.wire_bytes: dict[str, int] = defaultdict(int)  # Tên packet -> byte trên dây
+        self.packets: dict[str, int] = defaultdict(int)
+        self.results: dict[str, FileCompletePacket] = {}  # FileComplete của bên nhận
+        self.__free_at = [0.0, 0.0]  # Mỗi chiều một hàng đợi trên dây
+        self.__heap = []
+        self.__seq = 0
+        self.__condition = threading.Condition()
+        self.__thread = threading.Thread(target=self.__run, daemon=True, name="link-deliver")
+
+    def start(self):
+        for session_id, role in ((SENDER, "controller"), (RECEIVER, "host")):
+            SessionManager._sessions[session_id] = SessionResources(role=role)
+        SenderService.send_packet = self.send
+        # RTT như PingService đo được trên link này
+        PingService.get_session_rtt = classmethod(lambda cls, session_id: 2 * self.delay)
+        PingService.get_server_rtt = classmethod(lambda cls: 2 * self.delay)
+        self.__thread.start()
+
+    def send(self, packet):
+        if isinstance(packet, FileChunkPacket) and isinstance(packet.chunk_data, FileRegion):
+            region = packet.chunk_data
+            with open(region.path, "rb") as f:
+                f.seek(region.offset)
+                packet.chunk_data = f.read(region.length)
+        size = Protocol.send_packet(_Counter(), packet)
+        name = type(packet).__name__
+
+        with self.__condition:
+            self.wire_bytes[name] += size
+            self.packets[name] += 1
+            if isinstance(packet, FileCompletePacket) and packet.session_id == RECEIVER:
+                self.results[packet.file_id] = packet
+                self.__condition.notify_all()
+
+            direction = int(packet.session_id == SENDER)
+            due = max(self.__free_at[direction], time.monotonic())
+            if self.rate:
+                due += size / self.rate
+            self.__free_at[direction] = due
+            self.__seq += 1
+            heapq.heappush(self.__heap, (due + self.delay, self.__seq, packet))
+            self.__condition.notify_all()
+
+    def wait_results(self, count: int, timeout: float) -> bool:
+        """Chờ bên nhận báo xong count file (thành công hay không)"""
+        with self.__condition:
+            return self.__condition.wait_for(lambda: len(self.results) >= count, timeout)
+
+    def total_bytes(self) -> int:
+        return sum(self.wire_bytes.values())
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while not self.__heap:
+                    self.__condition.wait()
+                due, _, packet = self.__heap[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self.__condition.wait(wait)
+                    continue
+                heapq.heappop(self.__heap)
+
+            packet.session_id = RECEIVER if packet.session_id == SENDER else SENDER
+            ReceiveHandler.handle_packet(packet)
+            if self.on_packet:
+                self.on_packet(packet)
@@ -0,0 +1,73 @@
+"""
+Chạy relay server trong process riêng cho các benchmark (client và server
+không tranh GIL với nhau).
+
+    python -m benchmarks._server --port 5000 [--ssl --cert c.pem --key k.pem]
+"""
+
+import argparse
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def spawn(port: int, *args: str) -> subprocess.Popen:
+    """Khởi động server và chờ tới khi nó nhận kết nối"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks._server", "--port", str(port), *args],
+        cwd=ROOT,
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Server did not start")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--ssl", action="store_true")
+    parser.add_argument("--cert")
+    parser.add_argument("--key")
+    parser.add_argument("--max-clients", type=int, default=5000)
+    parser.add_argument("--backlog", type=int, default=None)
+    parser.add_argument("--handshake-workers", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+
+    from common.config import Config
+
+    if args.backlog is not None:
+        Config.backlog = args.backlog
+    if args.handshake_workers is not None:
+        Config.handshake_workers = args.handshake_workers
+    Config.max_clients = args.max_clients
+
+    from server.server import Server
+
+    Server(
+        "127.0.0.1", args.port, args.ssl, args.cert, args.key, args.max_clients
+    ).start()
+
+
+if __name__ == "__main__":
+    main()
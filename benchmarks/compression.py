@@ -0,0 +1,211 @@
+"""
+Benchmark nén FileChunkPacket trên bộ dữ liệu nhiều loại (text, csv, zip,
+jpg, video, thư viện .so), mỗi loại --size MiB, chunk 256 KiB:
+
+    - old:    cách cũ - LZ4 cả packet đã pickle, mọi loại dữ liệu
+    - policy: CompressionPolicy chọn codec theo mẫu (bỏ nén dữ liệu đã nén,
+              LZ4-HC cho dữ liệu nén tốt), chunk không nén đi dạng bulk
+    - zstd:   như policy nhưng cho phép zstd (cần package zstandard)
+
+Đo số byte trên dây và thời gian CPU của bên gửi (chọn codec + đóng khung)
+và bên nhận (Protocol.receive_packet).
+
+Chạy từ thư mục gốc:
+    python -m benchmarks.compression [--size 24] [--corpus DIR]
+"""
+
+import argparse
+import glob
+import io
+import os
+import pickle
+import random
+import shutil
+import socket
+import sys
+import sysconfig
+import tempfile
+import time
+import zipfile
+
+import lz4.frame as lz4
+from PIL import Image
+
+from client.services.file_writer import chunk_digest
+from common import compression
+from common.compression import CompressionPolicy
+from common.enums import PacketType
+from common.packets import FileChunkPacket
+from common.protocol import Protocol
+
+CHUNK_SIZE = 256 * 1024
+
+
+class _Buffer:
+    """Socket giả trong bộ nhớ: sendall ghi vào buffer, recv đọc lại từ đầu"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.pos = 0
+
+    def sendall(self, data, flags=0):
+        self.data += data
+
+    def recv(self, size, flags=0):
+        chunk = bytes(self.data[self.pos : self.pos + size])
+        if not flags & socket.MSG_PEEK:
+            self.pos += len(chunk)
+        return chunk
+
+    def recv_into(self, view):
+        chunk = self.recv(len(view))
+        view[: len(chunk)] = chunk
+        return len(chunk)
+
+
+def make_corpus(directory: str, size: int):
+    """Mỗi loại dữ liệu một file size byte"""
+    rng = random.Random(3)
+    stdlib = sorted(glob.glob(sysconfig.get_paths()["stdlib"] + "/**/*.py", recursive=True))
+
+    def write(name: str, data: bytes):
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(data[:size])
+
+    sources = bytearray()
+    for path in stdlib:
+        with open(path, "rb") as f:
+            sources += f.read()
+        if len(sources) >= size:
+            break
+    write("source.txt", sources)
+
+    rows = bytearray()
+    i = 0
+    while len(rows) < size:
+        rows += (
+            f"{i},{rng.randint(1, 10**6)},2026-10-{rng.randint(1, 28):02d}T"
+            f"{rng.randint(0, 23):02d}:00:00,user{rng.randint(1, 5000)},"
+            f"{rng.choice(['GET', 'POST', 'PUT'])},/api/v1/items/{rng.randint(1, 99999)},"
+            f"{rng.random():.6f}\n"
+        ).encode()
+        i += 1
+    write("access.csv", rows)
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+        for path in stdlib:
+            z.write(path, os.path.relpath(path, "/"))
+            if archive.tell() >= size:
+                break
+    write("sources.zip", archive.getvalue())
+
+    photos = bytearray()
+    while len(photos) < size:
+        image = Image.effect_noise((1920, 1080), rng.randint(20, 80)).convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=90)
+        photos += buffer.getvalue()
+    write("photos.jpg", photos)
+
+    # H.264/AAC không nén thêm được - dữ liệu ngẫu nhiên thay thế
+    write("video.mp4", rng.randbytes(size))
+
+    binaries = bytearray()
+    for path in sorted(glob.glob(os.path.join(sys.prefix, "lib", "**", "*.so*"), recursive=True)):
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                binaries += f.read()
+        if len(binaries) >= size:
+            break
+    write("binaries.so", binaries)
+
+
+def send_old(sock: _Buffer, packet: FileChunkPacket):
+    """Khung packet như trước CompressionPolicy: luôn LZ4 cả packet"""
+    payload = lz4.compress(pickle.dumps(packet, protocol=pickle.HIGHEST_PROTOCOL))
+    header = (
+        f"Packet-Length: {len(payload)}\r\n"
+        f"Packet-Type: {PacketType.FILE_CHUNK.value}\r\n"
+        f"Compression: {compression.LZ4}\r\n\r\n"
+    )
+    sock.sendall(header.encode() + payload)
+
+
+def run(path: str, mode: str) -> tuple[int, float, float, dict[str, int]]:
+    """Trả về (byte trên dây, CPU bên gửi, CPU bên nhận, số chunk theo codec)"""
+    policy = CompressionPolicy(allow_zstd=mode == "zstd")
+    wire = 0
+    send_time = receive_time = 0.0
+    codecs: dict[str, int] = {}
+
+    with open(path, "rb") as f:
+        chunk_index = 0
+        while data := f.read(CHUNK_SIZE):
+            sock = _Buffer()
+            start = time.perf_counter()
+            if mode == "old":
+                codec = compression.LZ4
+                send_old(sock, FileChunkPacket("s", "f", chunk_index, data, 0, chunk_digest(data)))
+            else:
+                codec = policy.choose(data)
+                packet = FileChunkPacket("s", "f", chunk_index, data, 0, chunk_digest(data), codec)
+                Protocol.send_packet(sock, packet)
+            send_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            packet = Protocol.receive_packet(sock)
+            receive_time += time.perf_counter() - start
+            assert packet.chunk_data == data
+
+            wire += len(sock.data)
+            codecs[codec] = codecs.get(codec, 0) + 1
+            chunk_index += 1
+    return wire, send_time, receive_time, codecs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=24, help="MiB mỗi loại dữ liệu")
+    parser.add_argument("--corpus", default=None, help="Dùng sẵn các file trong thư mục này")
+    args = parser.parse_args()
+
+    modes = ["old", "policy"]
+    if compression.zstd_available():
+        modes.append("zstd")
+
+    directory = args.corpus or tempfile.mkdtemp()
+    try:
+        if not args.corpus:
+            make_corpus(directory, args.size * 1024 * 1024)
+
+        totals = {mode: [0, 0, 0.0, 0.0] for mode in modes}
+        print(f"{'file':12} {'MiB':>5} | " + " | ".join(f"{mode:>6} wire   send   recv" for mode in modes))
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            size = os.path.getsize(path)
+            row = []
+            for mode in modes:
+                wire, send_time, receive_time, codecs = run(path, mode)
+                total = totals[mode]
+                total[0] += size
+                total[1] += wire
+                total[2] += send_time
+                total[3] += receive_time
+                row.append(
+                    f"{wire / 2**20:7.2f} {send_time * 1000:5.0f}ms {receive_time * 1000:5.0f}ms"
+                )
+            print(f"{name:12} {size / 2**20:5.1f} | " + " | ".join(row) + f"  {codecs}")
+
+        for mode, (size, wire, send_time, receive_time) in totals.items():
+            print(
+                f"TOTAL {mode:6s}: {size / 2**20:.0f} MiB -> {wire / 2**20:.1f} MiB on wire, "
+                f"sender {send_time * 1000:.0f} ms, receiver {receive_time * 1000:.0f} ms"
+            )
+    finally:
+        if not args.corpus:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark DeviceRegistry với hàng triệu thiết bị đã đăng ký:
+
+    - register: thiết bị mới (bind không có key) - µs mỗi thiết bị, đo theo
+      từng đợt để thấy chi phí không tăng theo số thiết bị
+    - lookup:   thiết bị cũ kết nối lại (bind với device key) ở các mốc
+    - allocate: ID không gắn thiết bị (acquire / release)
+    - kiểm tra mọi ID đã cấp là duy nhất, so với cách cũ generate_numeric_id(9)
+      (không kiểm tra trùng)
+    - flush xuống SQLite, nạp lại khi khởi động, ID giữ nguyên sau khởi động lại
+
+Chạy từ thư mục gốc:
+    python -m benchmarks.device_registry [--devices 2000000] [--dir /tmp]
+"""
+
+import argparse
+import os
+import random
+import resource
+import secrets
+import shutil
+import tempfile
+import time
+
+from server.device_registry import ID_BASE, ID_SPACE, DeviceRegistry
+
+BATCH = 100_000
+LOOKUPS = 200_000
+
+
+def old_client_id() -> str:
+    """Như common.utils.generate_numeric_id(9) (module đó import pynput)"""
+    return str(secrets.randbelow(ID_SPACE) + ID_BASE)
+
+
+def max_rss() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_lookup(keys: list[bytes], ids: list[str], registered: int):
+    rng = random.Random(registered)
+    devices = [rng.randrange(registered) for _ in range(LOOKUPS)]
+    start = time.perf_counter()
+    for device in devices:
+        client_id, _ = DeviceRegistry.bind(f"device-{device}", keys[device])
+    elapsed = time.perf_counter() - start
+    assert all(DeviceRegistry.bind(f"device-{d}", keys[d])[0] == ids[d] for d in devices[:1000])
+    print(f"  lookup at {registered:>9,} devices: {elapsed / LOOKUPS * 1e6:.2f} µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--devices", type=int, default=2_000_000)
+    parser.add_argument("--dir", default=None, help="Thư mục cho file SQLite")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(dir=args.dir)
+    path = os.path.join(directory, "devices.db")
+    try:
+        DeviceRegistry.start(path)
+        ids: list[str] = []
+        keys: list[bytes] = []
+        checkpoints = {10_000, 100_000, 1_000_000, args.devices}
+        batches = []
+        start = time.perf_counter()
+        for device in range(args.devices):
+            client_id, device_key = DeviceRegistry.bind(f"device-{device}", None)
+            ids.append(client_id)
+            keys.append(device_key)
+            registered = device + 1
+            if registered % BATCH == 0 or registered == args.devices:
+                batches.append(time.perf_counter() - start)
+            if registered in checkpoints:
+                lookup_start = time.perf_counter()
+                bench_lookup(keys, ids, registered)
+                start += time.perf_counter() - lookup_start
+        elapsed = batches[-1]
+        per_batch = [b - a for a, b in zip([0.0] + batches, batches)]
+        print(
+            f"register {args.devices:,}: {elapsed:.1f}s, {elapsed / args.devices * 1e6:.2f} µs/device "
+            f"(first {BATCH:,}: {per_batch[0] / BATCH * 1e6:.2f} µs, "
+            f"last {BATCH:,}: {per_batch[-1] / BATCH * 1e6:.2f} µs)"
+        )
+
+        start = time.perf_counter()
+        for _ in range(LOOKUPS):
+            DeviceRegistry.release(DeviceRegistry.allocate())
+        print(f"allocate + release: {(time.perf_counter() - start) / LOOKUPS * 1e6:.2f} µs")
+
+        start = time.perf_counter()
+        for client_id in ids[:LOOKUPS]:
+            DeviceRegistry.acquire(client_id)
+        print(f"acquire: {(time.perf_counter() - start) / LOOKUPS * 1e6:.2f} µs")
+
+        duplicates = len(ids) - len(set(ids))
+        old = [old_client_id() for _ in range(args.devices)]
+        print(
+            f"duplicate IDs among {args.devices:,}: registry {duplicates}, "
+            f"generate_numeric_id(9) {len(old) - len(set(old))}"
+        )
+        del old
+        print(f"max RSS {max_rss():.0f} MiB")
+
+        start = time.perf_counter()
+        DeviceRegistry.shutdown()
+        print(
+            f"flush + close: {time.perf_counter() - start:.1f}s, "
+            f"SQLite {os.path.getsize(path) / 2**20:.0f} MiB"
+        )
+
+        start = time.perf_counter()
+        DeviceRegistry.start(path)
+        print(f"load {DeviceRegistry.get_device_count():,} devices: {time.perf_counter() - start:.1f}s")
+        sample = random.Random(0).sample(range(args.devices), 10_000)
+        stable = sum(
+            DeviceRegistry.bind(f"device-{device}", keys[device])[0] == ids[device]
+            for device in sample
+        )
+        spoofed = sum(
+            DeviceRegistry.bind(f"device-{device}", bytes(len(keys[device])))[0] == ids[device]
+            for device in sample[:1000]
+        )
+        print(
+            f"after restart: {stable}/{len(sample)} devices kept their ID, "
+            f"{spoofed}/1000 wrong-key binds got the old ID"
+        )
+        DeviceRegistry.shutdown()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
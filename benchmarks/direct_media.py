@@ -0,0 +1,246 @@
+"""
+Kiểm tra đường media trực tiếp (--direct-media) trên loopback: relay server
+chạy trong process với --direct-media, hai client thật (RemoteDesktopClient
+không GUI, process riêng). Server gửi SESSION_STARTED cho cả hai như khi
+controller nhập đúng mật khẩu, client trao đổi địa chỉ UDP qua server rồi mở
+đường trực tiếp. Host gửi frame --fps khung/giây.
+
+    1. direct:   khi host đã có đường trực tiếp, bộ đếm byte relay của session
+                 trên server phải gần như đứng yên trong --duration giây
+    2. fallback: controller bỏ mọi datagram tới (như firewall chặn UDP), host
+                 không còn HELLO_ACK -> sau PATH_TIMEOUT video quay về relay,
+                 controller vẫn nhận frame, bộ đếm relay tăng theo lưu lượng
+
+Chạy từ thư mục gốc:
+    PYNPUT_BACKEND=dummy python -m benchmarks.direct_media [--duration 5] [--fps 50]
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks._server import ROOT, free_port
+from common import media_transport
+from common.config import Config
+from options import get_parser
+
+FRAME_SIZE = 20000
+
+
+def emit(**event):
+    print(json.dumps(event), flush=True)
+
+
+def run_client(role: str, port: int, fps: int):
+    """
+    Process client: RemoteDesktopClient thật nhưng không có Qt. Host ghi từng
+    frame đã gửi (kèm trạng thái đường trực tiếp), controller ghi từng frame
+    nhận được; controller đọc lệnh "block" từ stdin.
+    """
+    logging.basicConfig(level=logging.CRITICAL)
+    Config.save(get_parser().parse_args(["--client", "--direct-media", "--port", str(port)]))
+    Config.fps = fps
+
+    import client.client as client_module
+    import client.controllers.main_window_controller as controller_module
+    import client.handlers.receive_handler as receive_module
+    from client.managers.client_manager import ClientManager
+    from client.managers.session_manager import SessionManager, SessionResources
+    from client.services.peer_media_service import PeerMediaService
+    from client.services.sender_service import SenderService
+    from common.packets import VideoStreamPacket
+    from common.password_manager import PasswordManager
+
+    class HeadlessController:
+        """MainWindowController không GUI - bỏ qua mọi thông báo"""
+
+        def __getattr__(self, name):
+            return lambda *args, **kwargs: None
+
+    controller_module.main_window_controller = HeadlessController()
+    receive_module.main_window_controller = HeadlessController()
+    client_module.get_hardware_id = lambda: f"bench-direct-{role}"
+    PasswordManager.get_stored_password = staticmethod(lambda device_id: None)
+    # Session không cửa sổ / không chia sẻ màn hình - ReceiveHandler vẫn xử lý
+    # SESSION_STARTED như thật (gồm PeerMediaService.offer)
+    SessionManager.create_session = classmethod(
+        lambda cls, session_id, role, partner_hostname="Unknown": cls._sessions.__setitem__(
+            session_id, SessionResources(role=role, partner_hostname=partner_hostname)
+        )
+    )
+    receive_module.ReceiveHandler._ReceiveHandler__handle_video_stream_packet = staticmethod(
+        lambda packet: emit(ev="frame", t=time.time(), seq=packet.frame_seq)
+    )
+
+    client = client_module.RemoteDesktopClient("127.0.0.1", port, False, None)
+    if not client._RemoteDesktopClient__connect_to_server():
+        raise SystemExit("Cannot connect to server")
+    while not ClientManager.get_client_id():
+        time.sleep(0.01)
+    emit(ev="id", id=ClientManager.get_client_id())
+
+    while not SessionManager._sessions:
+        time.sleep(0.01)
+    session_id = next(iter(SessionManager._sessions))
+
+    if role == "controller":
+        if sys.stdin.readline().strip() == "block":
+            PeerMediaService._PeerMediaService__handle_datagram = classmethod(
+                lambda cls, sock, datagram, address: None
+            )
+            emit(ev="blocked", t=time.time())
+        threading.Event().wait()
+
+    frame_seq = 0
+    while True:
+        frame_seq += 1
+        SenderService.send_packet(
+            VideoStreamPacket(session_id, bytes(FRAME_SIZE), frame_seq=frame_seq, keyframe=False)
+        )
+        emit(ev="sent", t=time.time(), seq=frame_seq, direct=PeerMediaService.is_direct(session_id))
+        time.sleep(1 / fps)
+
+
+def spawn_client(role: str, port: int, fps: int) -> tuple[subprocess.Popen, list]:
+    args = [sys.executable, "-m", "benchmarks.direct_media", "--child", role]
+    args += ["--port", str(port), "--fps", str(fps)]
+    process = subprocess.Popen(
+        args,
+        cwd=ROOT,
+        env={**os.environ, "PYNPUT_BACKEND": "dummy", "QT_QPA_PLATFORM": "offscreen"},
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    events = []
+
+    def read():
+        for line in process.stdout:
+            events.append(json.loads(line))
+
+    threading.Thread(target=read, daemon=True).start()
+    return process, events
+
+
+def wait_for(condition, timeout: float, what: str):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Timed out waiting for {what}")
+        time.sleep(0.02)
+
+
+def measure(phase: str, duration: float, session_id: str, events: dict) -> tuple[int, int]:
+    """Đo trong duration giây: byte relay của session và byte video host đã gửi"""
+    from server.session_manager import SessionManager
+
+    start = {role: len(log) for role, log in events.items()}
+    relayed = SessionManager.get_session(session_id)["relayed_bytes"]
+    time.sleep(duration)
+    relayed = SessionManager.get_session(session_id)["relayed_bytes"] - relayed
+    sent = [e for e in events["host"][start["host"]:] if e["ev"] == "sent"]
+    received = [e for e in events["controller"][start["controller"]:] if e["ev"] == "frame"]
+    media = len(sent) * FRAME_SIZE
+    direct = sum(e["direct"] for e in sent)
+    print(
+        f"{phase:8s}: {len(sent)} frames sent ({direct} direct), {len(received)} received, "
+        f"video {media / duration / 1024:.0f} KiB/s, relayed {relayed / duration / 1024:.1f} KiB/s "
+        f"({relayed / max(media, 1) * 100:.1f}% of video)"
+    )
+    return relayed, media
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--fps", type=int, default=50)
+    parser.add_argument("--child", choices=("host", "controller"))
+    parser.add_argument("--port", type=int)
+    args = parser.parse_args()
+
+    if args.child:
+        run_client(args.child, args.port, args.fps)
+        return
+
+    logging.basicConfig(level=logging.CRITICAL)
+    port = free_port()
+    Config.save(get_parser().parse_args(["--server", "--direct-media", "--port", str(port)]))
+
+    from common.enums import Status
+    from common.packets import SessionPacket
+    from server.client_manager import ClientManager
+    from server.server import Server
+    from server.session_manager import SessionManager
+
+    server = Server("127.0.0.1", port, False, None, None, 10)
+    threading.Thread(target=server.start, daemon=True).start()
+    time.sleep(0.5)
+
+    processes = {}
+    events = {}
+    try:
+        for role in ("host", "controller"):
+            processes[role], events[role] = spawn_client(role, port, args.fps)
+        wait_for(
+            lambda: all(any(e["ev"] == "id" for e in log) for log in events.values()),
+            15,
+            "client IDs",
+        )
+        ids = {role: next(e["id"] for e in log if e["ev"] == "id") for role, log in events.items()}
+        session_id = SessionManager.create_session(ids["controller"], ids["host"])
+        started = time.time()
+        # Như RelayHandler khi mật khẩu đúng: SESSION_STARTED tới cả hai bên
+        # trước mọi PeerCandidatesPacket
+        for role in ("host", "controller"):
+            ClientManager.get_client_queue(ids[role]).put(
+                SessionPacket(status=Status.SESSION_STARTED, session_id=session_id, role=role)
+            )
+
+        wait_for(
+            lambda: any(e["ev"] == "sent" and e["direct"] for e in events["host"]),
+            10,
+            "the direct path",
+        )
+        direct_at = next(e["t"] for e in events["host"] if e["ev"] == "sent" and e["direct"])
+        print(f"direct path up {direct_at - started:.2f}s after SESSION_STARTED")
+        time.sleep(0.5)
+        relayed, media = measure("direct", args.duration, session_id, events)
+        assert relayed <= 0.01 * media, "video still goes through the relay on the direct path"
+
+        blocked = len(events["controller"])
+        processes["controller"].stdin.write("block\n")
+        processes["controller"].stdin.flush()
+        wait_for(lambda: any(e["ev"] == "blocked" for e in events["controller"][blocked:]), 5, "block")
+        blocked_at = next(e["t"] for e in events["controller"][blocked:] if e["ev"] == "blocked")
+        wait_for(
+            lambda: any(
+                e["ev"] == "sent" and not e["direct"] and e["t"] > blocked_at
+                for e in events["host"]
+            ),
+            media_transport.PATH_TIMEOUT + 5,
+            "the fallback",
+        )
+        fallback_at = next(
+            e["t"] for e in events["host"] if e["ev"] == "sent" and not e["direct"] and e["t"] > blocked_at
+        )
+        print(
+            f"fallback: host back on relay {fallback_at - blocked_at:.2f}s after UDP was blocked "
+            f"(PATH_TIMEOUT {media_transport.PATH_TIMEOUT:g}s)"
+        )
+        time.sleep(0.5)
+        relayed, media = measure("relay", args.duration, session_id, events)
+        assert relayed >= 0.9 * media, "video did not fall back to the relay"
+        print("ok")
+    finally:
+        for process in processes.values():
+            process.kill()
+    os._exit(0)  # Thread của server không dừng được sau RelayHandler.shutdown
+
+
+if __name__ == "__main__":
+    main()
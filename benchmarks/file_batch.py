@@ -0,0 +1,116 @@
+"""
+Benchmark gửi nhiều file nhỏ qua link giả lập có trễ (benchmarks._link):
+
+    - batch: send_files - một metadata/accept cho cả thư mục, các file nhỏ
+             đi chung chunk của một archive
+    - files: cách cũ - send_file từng file, mỗi file một lần metadata/accept
+             và một FileComplete
+
+Chạy từ thư mục gốc:
+    PYNPUT_BACKEND=dummy python -m benchmarks.file_batch [--files 10000] [--delay 20]
+"""
+
+import argparse
+import filecmp
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks._link import RECEIVER, SENDER, Link
+from client.managers.session_manager import SessionManager
+from client.services.file_transfer_service import FileTransferService
+from common.config import Config
+from common.packets import FileMetadataPacket
+
+
+def make_files(directory: str, count: int) -> list[str]:
+    """count file 200 B - 8 KiB trong 50 thư mục con"""
+    rng = random.Random(0)
+    paths = []
+    for i in range(count):
+        subdirectory = os.path.join(directory, f"d{i % 50:02d}")
+        os.makedirs(subdirectory, exist_ok=True)
+        path = os.path.join(subdirectory, f"f{i:05d}.txt")
+        with open(path, "wb") as f:
+            f.write(rng.randbytes(rng.randint(200, 8192)))
+        paths.append(path)
+    return paths
+
+
+def run(mode: str, source: str, paths: list[str], destination: str, delay: float):
+    accepts = 0
+
+    def on_packet(packet):
+        nonlocal accepts
+        if isinstance(packet, FileMetadataPacket):
+            accepts += 1
+            if packet.file_count is None:
+                save_path = os.path.join(destination, packet.filename)
+            else:
+                save_path = destination  # Batch: giải nén vào thư mục đích
+            SessionManager.accept_file_transfer(RECEIVER, packet.file_id, save_path)
+
+    link = Link(delay, on_packet=on_packet)
+    link.start()
+
+    start = time.monotonic()
+    if mode == "batch":
+        FileTransferService.send_files(SENDER, [source], "controller")
+        expected = 1
+    else:
+        for path in paths:
+            FileTransferService.send_file(SENDER, path, "controller")
+        expected = len(paths)
+    finished = link.wait_results(expected, 3600)
+    elapsed = time.monotonic() - start
+
+    received = {}
+    for root, _, names in os.walk(destination):
+        for name in names:
+            received[name] = os.path.join(root, name)
+    success = finished and all(result.success for result in link.results.values())
+    intact = success and all(
+        os.path.basename(path) in received
+        and filecmp.cmp(path, received[os.path.basename(path)], shallow=False)
+        for path in paths
+    )
+    print(
+        f"{mode:5s}: {len(paths)} files, one-way delay {delay * 1000:.0f} ms: "
+        f"{elapsed:.2f}s = {len(paths) / elapsed:.0f} files/s, "
+        f"accept dialogs={accepts}, packets={sum(link.packets.values())}, "
+        f"wire={link.total_bytes() / 2**20:.1f} MiB, intact={intact}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mode", choices=("batch", "files", "both"), default="both")
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--delay", type=float, default=20.0, help="Trễ một chiều (ms)")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    Config.sendfile = False
+
+    directory = tempfile.mkdtemp()
+    try:
+        source = os.path.join(directory, "source")
+        paths = make_files(source, args.files)
+        total = sum(os.path.getsize(path) for path in paths)
+        print(f"{args.files} files, {total / 2**20:.1f} MiB")
+
+        modes = ("batch", "files") if args.mode == "both" else (args.mode,)
+        for mode in modes:
+            destination = os.path.join(directory, f"received-{mode}")
+            os.makedirs(destination)
+            run(mode, source, paths, destination, args.delay / 1000)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark gửi lại một file lớn đã sửa 1% (80 đoạn ghi đè, 10 đoạn chèn, 10
+đoạn xóa) khi bên nhận đã có bản cũ, qua link giả lập (benchmarks._link):
+
+    - delta: bên nhận gửi checksum bản cũ, bên gửi chỉ gửi phần thay đổi
+    - full:  Config.file_delta = False - gửi lại cả file
+
+Đo số byte trên dây theo loại packet và thời gian tới khi bên nhận lưu xong.
+
+Chạy từ thư mục gốc (--dir nên là tmpfs, vd. /dev/shm, để đo CPU chứ không
+đo đĩa):
+    PYNPUT_BACKEND=dummy python -m benchmarks.file_delta [--size 1024] [--dir /dev/shm]
+"""
+
+import argparse
+import filecmp
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks._link import RECEIVER, SENDER, Link
+from client.managers.session_manager import SessionManager
+from client.services.file_transfer_service import FileTransferService
+from common.config import Config
+from common.packets import FileMetadataPacket
+
+REGIONS = 100
+
+
+def make_files(old_path: str, new_path: str, size: int) -> int:
+    """Bản cũ ngẫu nhiên + bản mới sửa 1% rải đều. Trả về số byte đã sửa"""
+    rng = random.Random(1)
+    with open(old_path, "wb") as f:
+        remaining = size
+        while remaining:
+            block = min(remaining, 16 * 1024 * 1024)
+            f.write(rng.randbytes(block))
+            remaining -= block
+
+    with open(old_path, "rb") as f:
+        data = bytearray(f.read())
+    length = size // 100 // REGIONS
+    offsets = sorted(rng.sample(range(0, size - 2 * length), REGIONS), reverse=True)
+    for i, offset in enumerate(offsets):
+        kind = i % 10
+        if kind < 8:
+            data[offset : offset + length] = rng.randbytes(length)
+        elif kind == 8:
+            data[offset:offset] = rng.randbytes(length)
+        else:
+            del data[offset : offset + length]
+    with open(new_path, "wb") as f:
+        f.write(data)
+    return REGIONS * length
+
+
+def run(mode: str, directory: str, old_path: str, new_path: str):
+    target = os.path.join(directory, "target.bin")
+    shutil.copyfile(old_path, target)  # Bản cũ đang có ở bên nhận
+    Config.file_delta = mode == "delta"
+
+    def on_packet(packet):
+        if isinstance(packet, FileMetadataPacket):
+            SessionManager.accept_file_transfer(RECEIVER, packet.file_id, target)
+
+    link = Link(on_packet=on_packet)
+    link.start()
+
+    start = time.monotonic()
+    FileTransferService.send_file(SENDER, new_path, "controller")
+    finished = link.wait_results(1, 3600)
+    elapsed = time.monotonic() - start
+
+    success = finished and all(result.success for result in link.results.values())
+    intact = success and filecmp.cmp(new_path, target, shallow=False)
+    size = os.path.getsize(new_path)
+    total = link.total_bytes()
+    parts = ", ".join(
+        f"{name.removesuffix('Packet')} {nbytes / 2**20:.2f} MiB"
+        for name, nbytes in sorted(link.wire_bytes.items(), key=lambda item: -item[1])
+        if nbytes >= 1024
+    )
+    print(
+        f"{mode:5s}: {total / 2**20:.2f} MiB on wire ({100 * total / size:.2f}% of file) "
+        f"in {elapsed:.1f}s, intact={intact}; {parts}"
+    )
+    os.remove(target)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mode", choices=("delta", "full", "both"), default="both")
+    parser.add_argument("--size", type=int, default=1024, help="Kích thước file (MiB)")
+    parser.add_argument("--dir", default=None, help="Thư mục tạm")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    Config.sendfile = False
+
+    directory = tempfile.mkdtemp(dir=args.dir)
+    try:
+        old_path = os.path.join(directory, "old.bin")
+        new_path = os.path.join(directory, "new.bin")
+        changed = make_files(old_path, new_path, args.size * 1024 * 1024)
+        print(
+            f"file {os.path.getsize(new_path) / 2**20:.0f} MiB, "
+            f"changed {changed / 2**20:.1f} MiB in {REGIONS} regions"
+        )
+        modes = ("delta", "full") if args.mode == "both" else (args.mode,)
+        for mode in modes:
+            run(mode, directory, old_path, new_path)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Benchmark loopback cho flow control của file transfer: link giả lập có băng
+thông --rate MiB/s và trễ một chiều --delay ms nằm giữa SenderService và
+receiver thật (SessionManager + ChunkFileWriter). Trong lúc truyền, một tin
+chat được gửi mỗi 20 ms để đo độ trễ của traffic tương tác đi chung kết nối.
+
+    - window: TransferWindow (credit theo throughput x RTT, receiver ack)
+    - sleep:  cách cũ - ngủ 10 ms sau mỗi chunk, không chờ ack
+
+Chạy từ thư mục gốc:
+    PYNPUT_BACKEND=dummy python -m benchmarks.file_flow_control [--rate 10] [--size 64]
+"""
+
+import argparse
+import heapq
+import logging
+import os
+import pickle
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+from client.handlers.send_handler import SendHandler
+from client.managers.session_manager import SessionManager, SessionResources
+from client.services import file_transfer_service
+from client.services.file_transfer_service import FileTransferService, TransferWindow
+from client.services.ping_service import PingService
+from client.services.sender_service import SenderService
+from common.packets import ChatMessagePacket, FileChunkPacket, FileCompletePacket
+from common.protocol import Protocol
+from common.streams import WindowTracker
+
+SESSION_ID = "bench"
+DELIVER_THREAD = "link-deliver"
+
+
+class Link:
+    """Nhận packet từ socket, giữ lại theo băng thông + trễ rồi mới giao cho receiver"""
+
+    def __init__(self, sock: socket.socket, rate: float, delay: float, deliver):
+        self.sock = sock
+        self.rate = rate
+        self.delay = delay
+        self.deliver = deliver
+        self.__heap = []
+        self.__seq = 0
+        self.__condition = threading.Condition()
+        threading.Thread(target=self.__wire, daemon=True).start()
+        threading.Thread(target=self.__output, daemon=True, name=DELIVER_THREAD).start()
+
+    def __wire(self):
+        free_at = time.monotonic()
+        while True:
+            packet = Protocol.receive_packet(self.sock)
+            now = time.monotonic()
+            free_at = max(free_at, now) + len(pickle.dumps(packet)) / self.rate
+            with self.__condition:
+                self.__seq += 1
+                heapq.heappush(self.__heap, (free_at + self.delay, self.__seq, packet))
+                self.__condition.notify()
+
+    def __output(self):
+        while True:
+            with self.__condition:
+                while not self.__heap:
+                    self.__condition.wait()
+                due, _, packet = self.__heap[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self.__condition.wait(wait)
+                    continue
+                heapq.heappop(self.__heap)
+            self.deliver(packet)
+
+
+def later(delay: float, function, *args):
+    """Chiều ngược lại của link: ack / window update tới bên gửi sau delay"""
+    timer = threading.Timer(delay, function, args)
+    timer.daemon = True
+    timer.start()
+
+
+def patch_fixed_sleep():
+    """Hành vi trước credit window: ngủ 10 ms sau mỗi chunk"""
+
+    def acquire(self, chunk_index, nbytes, timeout):
+        time.sleep(0.01)
+        return True
+
+    TransferWindow.acquire = acquire
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mode", choices=("window", "sleep"), default="window")
+    parser.add_argument("--rate", type=float, default=10.0, help="Băng thông link (MiB/s)")
+    parser.add_argument("--delay", type=float, default=10.0, help="Trễ một chiều (ms)")
+    parser.add_argument("--size", type=int, default=64, help="Kích thước file (MiB)")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    delay = args.delay / 1000
+    if args.mode == "sleep":
+        patch_fixed_sleep()
+    # RTT như PingService đo được trên link này
+    PingService.get_session_rtt = classmethod(lambda cls, session_id: 2 * delay)
+    PingService.get_server_rtt = classmethod(lambda cls: 2 * delay)
+
+    directory = tempfile.mkdtemp()
+    source = os.path.join(directory, "source.bin")
+    destination = os.path.join(directory, "received.bin")
+    size = args.size * 1024 * 1024
+    with open(source, "wb") as f:
+        f.write(os.urandom(size))
+
+    done = threading.Event()
+    latencies = []
+    tracker = WindowTracker()
+    send_complete = SendHandler.send_file_complete_packet.__func__
+
+    def complete(cls, **kwargs):
+        if threading.current_thread().name == DELIVER_THREAD:
+            done.set()  # Receiver đã lưu xong file
+        else:
+            send_complete(cls, **kwargs)
+
+    SendHandler.send_file_complete_packet = classmethod(complete)
+    SendHandler.send_file_accept_packet = classmethod(lambda cls, *args: None)
+    SendHandler.send_file_ack_packet = classmethod(
+        lambda cls, session_id, file_id, ranges: later(
+            delay, FileTransferService.handle_file_ack, file_id, ranges
+        )
+    )
+
+    def deliver(packet):
+        if isinstance(packet, ChatMessagePacket):
+            latencies.append(time.monotonic() - packet.timestamp)
+        elif isinstance(packet, FileChunkPacket):
+            SessionManager.handle_file_chunk(
+                SESSION_ID,
+                packet.file_id,
+                packet.chunk_index,
+                packet.chunk_data,
+                packet.total_chunks,
+                packet.chunk_hash,
+            )
+        elif isinstance(packet, FileCompletePacket):
+            SessionManager.handle_file_complete(
+                SESSION_ID, packet.file_id, packet.success, packet.message, packet.file_hash
+            )
+        update = tracker.consumed(packet)
+        if update:
+            later(delay, SenderService.window_update, *update)
+
+    sender_sock, link_sock = socket.socketpair()
+    SenderService.initialize(sender_sock)
+    Link(link_sock, args.rate * 1024 * 1024, delay, deliver)
+
+    SessionManager._sessions[SESSION_ID] = SessionResources(role="host")
+    SessionManager.handle_file_metadata(SESSION_ID, "bench-file", "source.bin", size, "controller")
+    SessionManager.accept_file_transfer(SESSION_ID, "bench-file", destination)
+
+    start = time.monotonic()
+    FileTransferService._pending_transfers["bench-file"] = {
+        "session_id": SESSION_ID,
+        "file_path": source,
+        "filesize": size,
+        "event": None,
+        "entries": None,
+    }
+    FileTransferService.start_sending_chunks("bench-file")
+
+    while not done.wait(0.02):
+        SenderService.send_packet(ChatMessagePacket(SESSION_ID, "controller", "x", time.monotonic()))
+    elapsed = time.monotonic() - start
+
+    with open(source, "rb") as a, open(destination, "rb") as b:
+        intact = a.read() == b.read()
+    for path in (source, destination):
+        os.remove(path)
+    os.rmdir(directory)
+
+    latencies.sort()
+    print(
+        f"{args.mode:6s} link {args.rate:.0f} MiB/s, {args.delay:.0f} ms: "
+        f"{args.size} MiB in {elapsed:.1f}s = {size / elapsed / 2**20:.1f} MiB/s, intact={intact}; "
+        f"chat p50={statistics.median(latencies) * 1000:.0f} ms "
+        f"p99={latencies[int(len(latencies) * 0.99)] * 1000:.0f} ms "
+        f"max={latencies[-1] * 1000:.0f} ms"
+    )
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
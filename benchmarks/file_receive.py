@@ -0,0 +1,98 @@
+"""
+Throughput và bộ nhớ khi nhận file, so sánh:
+    - memory: cách cũ - giữ (chunk_index, data) trong list, sort và ghi khi xong
+    - writer: ChunkFileWriter - ghi từng chunk tại offset vào file tạm cấp phát
+      trước (8 thread như ListenerService), kiểm tra hash từng chunk
+
+Chạy từ thư mục gốc:
+    python -m benchmarks.file_receive [--size-gb 1] [--dir /tmp]
+(máy không có màn hình: thêm PYNPUT_BACKEND=dummy)
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+
+from client.services.file_transfer_service import CHUNK_SIZE
+from client.services.file_writer import ChunkFileWriter, chunk_digest
+
+
+class PeakRss:
+    """Lấy mẫu RSS của process trên thread riêng"""
+
+    def __init__(self):
+        self.process = psutil.Process()
+        self.baseline = self.process.memory_info().rss
+        self.peak = self.baseline
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.__sample, daemon=True)
+        self.__thread.start()
+
+    def __sample(self):
+        while not self.__stop.wait(0.01):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def stop(self) -> int:
+        self.__stop.set()
+        self.__thread.join()
+        return self.peak - self.baseline
+
+
+def chunks(size: int):
+    base = os.urandom(CHUNK_SIZE)
+    for chunk_index in range((size + CHUNK_SIZE - 1) // CHUNK_SIZE):
+        length = min(CHUNK_SIZE, size - chunk_index * CHUNK_SIZE)
+        yield chunk_index, chunk_index.to_bytes(8, "little") + base[8:length]
+
+
+def receive_in_memory(path: str, size: int):
+    received = []
+    for chunk_index, data in chunks(size):
+        received.append((chunk_index, data))
+    received.sort(key=lambda item: item[0])
+    with open(path, "wb") as f:
+        for _, data in received:
+            f.write(data)
+
+
+def receive_with_writer(path: str, size: int):
+    writer = ChunkFileWriter(path, size, CHUNK_SIZE)
+    with ThreadPoolExecutor(8) as pool:
+        for chunk_index, data in chunks(size):
+            pool.submit(writer.write_chunk, chunk_index, data, chunk_digest(data))
+            while pool._work_queue.qsize() > 64:
+                time.sleep(0.001)
+    writer.mark_sender_done()
+    writer.finalize(writer.file_hash())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-gb", type=float, default=1.0)
+    parser.add_argument("--dir", default=None, help="Thư mục ghi file (mặc định thư mục tạm)")
+    args = parser.parse_args()
+
+    size = int(args.size_gb * 1024**3)
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        for name, receive in (("memory", receive_in_memory), ("writer", receive_with_writer)):
+            path = os.path.join(directory, f"{name}.bin")
+            rss = PeakRss()
+            start = time.perf_counter()
+            receive(path, size)
+            elapsed = time.perf_counter() - start
+            grown = rss.stop()
+            assert os.path.getsize(path) == size
+            os.remove(path)
+            print(
+                f"{name:6s} {size / 2**30:.1f} GiB in {elapsed:.1f}s = "
+                f"{size / elapsed / 2**20:.0f} MiB/s, RSS tăng tối đa {grown / 2**20:.0f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
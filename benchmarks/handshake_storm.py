@@ -0,0 +1,98 @@
+"""
+Reconnect storm: N client cùng kết nối tới relay một lúc, đo thời gian tới khi
+mọi client được cấp ID (AssignIdPacket). Một client chậm mở kết nối mà không
+gửi ClientInformationPacket trong suốt storm - accept loop không được bị chặn.
+
+Chạy từ thư mục gốc:
+    python -m benchmarks.handshake_storm [--clients 2000] [--backlog 128]
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import threading
+import time
+
+from benchmarks import _server
+from common.packets import AssignIdPacket, ClientInformationPacket
+from common.protocol import Protocol
+
+
+def connect(port: int, retries: int) -> float | None:
+    """Kết nối và chờ ID như client thật (thử lại có backoff), trả về lúc xong"""
+    for attempt in range(retries):
+        try:
+            sock = socket.create_connection(("127.0.0.1", port), timeout=30)
+            Protocol.send_packet(
+                sock,
+                ClientInformationPacket(
+                    os="Linux", host_name="bench", device_id=os.urandom(8).hex()
+                ),
+            )
+            packet = Protocol.receive_packet(sock)
+            if isinstance(packet, AssignIdPacket):
+                done = time.perf_counter()
+                connections.append(sock)
+                return done
+            sock.close()
+        except OSError:
+            pass
+        time.sleep(min(0.05 * 2**attempt, 1.0))
+    return None
+
+
+connections: list[socket.socket] = []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--backlog", type=int, default=None)
+    parser.add_argument("--handshake-workers", type=int, default=None)
+    parser.add_argument("--retries", type=int, default=10)
+    args = parser.parse_args()
+
+    port = _server.free_port()
+    server_args = []
+    if args.backlog is not None:
+        server_args += ["--backlog", str(args.backlog)]
+    if args.handshake_workers is not None:
+        server_args += ["--handshake-workers", str(args.handshake_workers)]
+    server = _server.spawn(port, *server_args)
+
+    try:
+        slow = socket.create_connection(("127.0.0.1", port))  # Không bao giờ gửi gì
+
+        barrier = threading.Barrier(args.clients + 1)
+        finished: list[float | None] = []
+
+        def client():
+            barrier.wait()
+            finished.append(connect(port, args.retries))
+
+        threads = [threading.Thread(target=client, daemon=True) for _ in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+
+        times = sorted(t - start for t in finished if t is not None)
+        failed = len(finished) - len(times)
+        print(
+            f"{args.clients} clients: assigned={len(times)} failed={failed} "
+            f"all assigned in {times[-1]:.2f}s, "
+            f"p50 {statistics.median(times):.2f}s p99 {times[int(len(times) * 0.99)]:.2f}s"
+        )
+        slow.close()
+    finally:
+        for sock in connections:
+            sock.close()
+        server.kill()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark thực thi input trên host với pynput giả (mỗi lệnh tốn --work ms
+như một lệnh X11 / SendInput thật), so sánh:
+    - pool:    mỗi packet vào thread pool 50 thread (cách cũ của ListenerService)
+    - ordered: InputExecutorService (mỗi session một thread, gộp MOVE)
+
+Workload: chuỗi kéo thả ở 1 kHz (PRESS, 40 MOVE, RELEASE, 40 MOVE).
+
+Chạy từ thư mục gốc:
+    PYNPUT_BACKEND=dummy python -m benchmarks.input_executor [--work 1.0]
+"""
+
+import argparse
+import logging
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from client.handlers.receive_handler import ReceiveHandler
+from client.managers.session_manager import SessionManager, SessionResources
+from client.services.input_executor_service import InputExecutorService
+from client.services.mouse_executor_service import MouseExecutorService
+from common.enums import MouseButton, MouseEventType
+from common.packets import MousePacket
+
+SESSION_ID = "bench"
+
+
+class MockController:
+    """pynput.mouse.Controller giả: ghi lại mọi lệnh và thời điểm thực thi"""
+
+    def __init__(self, work: float):
+        self.work = work
+        self.log: list[tuple[str, tuple[int, int], float]] = []
+        self.calls = 0
+        self.__position = (0, 0)
+        self.__lock = threading.Lock()
+
+    def __execute(self, kind: str):
+        time.sleep(self.work)
+        with self.__lock:
+            self.calls += 1
+            self.log.append((kind, self.__position, time.perf_counter()))
+
+    @property
+    def position(self):
+        return self.__position
+
+    @position.setter
+    def position(self, value):
+        self.__position = value
+        self.__execute("move")
+
+    def press(self, button):
+        self.__execute("press")
+
+    def release(self, button):
+        self.__execute("release")
+
+    def scroll(self, dx, dy):
+        self.__execute("scroll")
+
+
+def workload(drags: int) -> list[MousePacket]:
+    packets = []
+    for k in range(drags):
+        packets.append(
+            MousePacket(MouseEventType.PRESS, (k, 0), MouseButton.LEFT, session_id=SESSION_ID)
+        )
+        packets += [
+            MousePacket(MouseEventType.MOVE, (k, i), session_id=SESSION_ID)
+            for i in range(1, 40)
+        ]
+        packets.append(
+            MousePacket(MouseEventType.RELEASE, (k, 40), MouseButton.LEFT, session_id=SESSION_ID)
+        )
+        packets += [
+            MousePacket(MouseEventType.MOVE, (k, 100 + i), session_id=SESSION_ID)
+            for i in range(40)
+        ]
+    return packets
+
+
+def run(mode: str, work: float, drags: int):
+    controller = MockController(work)
+    MouseExecutorService._MouseExecutorService__mouse_controller = controller
+    packets = workload(drags)
+    submitted: list[float] = []  # Lúc đưa vào của từng PRESS / RELEASE
+
+    pool = ThreadPoolExecutor(50) if mode == "pool" else None
+    for packet in packets:
+        if packet.event_type != MouseEventType.MOVE:
+            submitted.append(time.perf_counter())
+        if pool:
+            pool.submit(ReceiveHandler.handle_packet, packet)
+        else:
+            InputExecutorService.submit(packet)
+        time.sleep(0.001)  # 1 kHz
+
+    if pool:
+        pool.shutdown(wait=True)
+    else:
+        time.sleep(0.5)
+        InputExecutorService.remove_session(SESSION_ID)
+
+    # PRESS / RELEASE phải xen kẽ và đúng vị trí của packet
+    buttons = [entry for entry in controller.log if entry[0] in ("press", "release")]
+    expected = [
+        (packet.event_type.name.lower(), packet.position)
+        for packet in packets
+        if packet.event_type != MouseEventType.MOVE
+    ]
+    wrong = sum(
+        1 for (kind, position, _), want in zip(buttons, expected) if (kind, position) != want
+    )
+    # Lệnh thứ i được tính cho packet PRESS / RELEASE thứ i
+    latency = sorted(
+        (executed - queued) * 1000
+        for (_, _, executed), queued in zip(buttons, submitted)
+    )
+
+    print(
+        f"{mode:8s} packets={len(packets)} pynput calls={controller.calls} "
+        f"press/release sai thứ tự hoặc vị trí={wrong}/{len(expected)} "
+        f"trễ press/release p50={statistics.median(latency):.2f} ms "
+        f"p99={latency[int(len(latency) * 0.99)]:.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--work", type=float, default=1.0, help="ms mỗi lệnh pynput")
+    parser.add_argument("--drags", type=int, default=50)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    SessionManager._sessions[SESSION_ID] = SessionResources(role="host")
+    for mode in ("pool", "ordered"):
+        run(mode, args.work / 1000, args.drags)
+
+
+if __name__ == "__main__":
+    main()
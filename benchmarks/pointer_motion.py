@@ -0,0 +1,156 @@
+"""
+Benchmark lưu lượng mouse move phía controller: chuột di chuyển vòng tròn
+liên tục --seconds giây ở --rates Hz, đo byte trên dây (Protocol, gồm header)
+và CPU tạo + đóng khung packet mỗi giây:
+
+    - before:   MousePacket mỗi lần gửi, chu kỳ cố định 16 ms (trước PointerMotionPacket)
+    - after:    PointerMotionEncoder, chu kỳ từ RemoteWidgetController.__motion_interval
+                theo RTT (LAN 2 ms, WAN 100 ms)
+    - 8ms floor: như after nhưng sàn 8 ms (giá trị cũ của MIN_MOTION_INTERVAL)
+
+Thời gian là đồng hồ giả lập (hẹn giờ gửi như QTimer trong widget), nên kết
+quả không phụ thuộc tải của máy.
+
+Chạy từ thư mục gốc:
+    PYNPUT_BACKEND=dummy python -m benchmarks.pointer_motion [--seconds 10] [--rates 125,1000]
+"""
+
+import argparse
+import math
+import time
+
+from client.controllers.remote_widget_controller import RemoteWidgetController
+from client.services.ping_service import PingService
+from client.services.sender_service import SenderService
+from common.enums import MouseButton, MouseEventType
+from common.packets import MousePacket
+from common.pointer_motion import PointerMotionEncoder
+from common.protocol import Protocol
+
+SESSION_ID = "5f0b6a52-3c1e-4d8a-9b7e-2a4c6d8e0f13"
+OLD_INTERVAL = 0.016
+RADIUS = 300
+
+
+class _Counter:
+    """Socket giả bỏ qua dữ liệu - Protocol.send_packet trả về số byte của frame"""
+
+    def sendall(self, data, flags=0):
+        pass
+
+
+class _Widget:
+    """Đủ thuộc tính cho RemoteWidgetController.__motion_interval"""
+
+    session_id = SESSION_ID
+
+    def __init__(self, min_interval: float):
+        for name, value in vars(RemoteWidgetController).items():
+            if "MOTION" in name:
+                setattr(self, name, value)
+        self.MIN_MOTION_INTERVAL = min_interval
+
+    def interval(self) -> float:
+        return RemoteWidgetController._RemoteWidgetController__motion_interval(self)
+
+
+def path(rate: int, seconds: float):
+    """(t, x, y) của chuột chạy vòng tròn một vòng mỗi giây"""
+    for index in range(int(rate * seconds)):
+        t = index / rate
+        angle = 2 * math.pi * t
+        yield t, 960 + int(RADIUS * math.cos(angle)), 540 + int(RADIUS * math.sin(angle))
+
+
+def run_before(rate: int, seconds: float) -> tuple[int, int, float]:
+    """Như on_mouse_event trước: gửi ngay nếu đã qua 16 ms, không thì hẹn giờ gửi vị trí cuối"""
+    sock = _Counter()
+    sent = packets = 0
+    last_send = -OLD_INTERVAL
+    last_position = pending = deadline = None
+    cpu = time.process_time()
+    for t, x, y in path(rate, seconds):
+        if deadline is not None and t >= deadline:
+            sent += Protocol.send_packet(sock, pending)
+            packets += 1
+            last_send, pending, deadline = deadline, None, None
+        if (x, y) == last_position:
+            continue
+        last_position = (x, y)
+        packet = MousePacket(MouseEventType.MOVE, (x, y), MouseButton.UNKNOWN, (0, 0), SESSION_ID)
+        if t - last_send >= OLD_INTERVAL:
+            sent += Protocol.send_packet(sock, packet)
+            packets += 1
+            last_send, pending, deadline = t, None, None
+        else:
+            pending = packet
+            if deadline is None:
+                deadline = last_send + OLD_INTERVAL
+    return sent, packets, time.process_time() - cpu
+
+
+def run_after(rate: int, seconds: float, widget: _Widget, drag: bool) -> tuple[int, int, float]:
+    """Như on_mouse_event hiện tại: gom mẫu, gửi theo chu kỳ thích ứng"""
+    sock = _Counter()
+    encoder = PointerMotionEncoder()
+    sent = packets = 0
+    last_send = -1.0
+    deadline = None
+
+    def flush(now: float):
+        nonlocal sent, packets, last_send, deadline
+        packet = encoder.flush(SESSION_ID)
+        deadline = None
+        if packet is not None:
+            sent += Protocol.send_packet(sock, packet)
+            packets += 1
+            last_send = now
+
+    cpu = time.process_time()
+    for t, x, y in path(rate, seconds):
+        if deadline is not None and t >= deadline:
+            flush(deadline)
+        if not encoder.add(x, y, t, keep_path=drag):
+            continue
+        if deadline is not None:
+            continue
+        wait = last_send + widget.interval() - t
+        if wait <= 0:
+            flush(t)
+        else:
+            deadline = t + max(0.001, wait)
+    return sent, packets, time.process_time() - cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--rates", default="125,1000")
+    args = parser.parse_args()
+
+    SenderService.get_queue_size = classmethod(lambda cls: 0)
+    seconds = args.seconds
+
+    def report(label: str, result: tuple[int, int, float]):
+        sent, packets, cpu = result
+        print(
+            f"  {label:28s} {sent / seconds / 1000:6.1f} KB/s, {packets / seconds:5.1f} packets/s, "
+            f"{cpu / seconds * 1000:5.2f} ms CPU/s"
+        )
+
+    for rate in map(int, args.rates.split(",")):
+        print(f"{rate} Hz mouse, {seconds:g}s:")
+        report("before (MousePacket, 16 ms)", run_before(rate, seconds))
+        for rtt in (None, 0.002, 0.1):
+            PingService.get_session_rtt = classmethod(lambda cls, session_id, rtt=rtt: rtt)
+            PingService.get_server_rtt = classmethod(lambda cls, rtt=rtt: rtt)
+            link = "no RTT" if rtt is None else f"RTT {rtt * 1000:g} ms"
+            after = _Widget(RemoteWidgetController.MIN_MOTION_INTERVAL)
+            report(f"after, {link}", run_after(rate, seconds, after, drag=False))
+            if rtt == 0.002:
+                report(f"8ms floor, {link}", run_after(rate, seconds, _Widget(0.008), drag=False))
+                report(f"after, {link}, drag", run_after(rate, seconds, after, drag=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+Benchmark downtime khi mạng chập chờn: relay server chạy trong process, hai
+client thật (RemoteDesktopClient không GUI, process riêng) kết nối qua một
+proxy TCP. Host gửi frame --fps khung/giây trong một session với controller.
+Proxy cắt mọi kết nối và từ chối kết nối mới trong --outages giây, client tự
+kết nối lại (ReconnectService) bằng resume token.
+
+Với mỗi lần cắt đo: thời điểm mỗi client resume, client có giữ ID không,
+session trên server còn không, và thời điểm keyframe đầu tiên tới controller
+(downtime thực tế người dùng thấy). Cuối cùng kill cả hai client để kiểm tra
+server giữ chỗ rồi dọn dẹp sau --grace giây.
+
+Chạy từ thư mục gốc:
+    PYNPUT_BACKEND=dummy python -m benchmarks.reconnect_downtime [--outages 0,1,3] [--ssl]
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks._server import ROOT, free_port
+from common.config import Config
+
+FRAME_SIZE = 20000
+
+
+class BlipProxy:
+    """Proxy TCP tới server, cut() ngắt mọi kết nối và từ chối kết nối mới trong outage giây"""
+
+    def __init__(self, target: int):
+        self.target = target
+        self.__up = True
+        self.__pairs = []
+        self.__lock = threading.Lock()
+        self.listener = socket.create_server(("127.0.0.1", 0), backlog=64)
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self.__accept, daemon=True).start()
+
+    def __accept(self):
+        while True:
+            client, _ = self.listener.accept()
+            if not self.__up:
+                client.close()
+                continue
+            server = socket.create_connection(("127.0.0.1", self.target))
+            with self.__lock:
+                self.__pairs.append((client, server))
+            for a, b in ((client, server), (server, client)):
+                threading.Thread(target=self.__pipe, args=(a, b), daemon=True).start()
+
+    @staticmethod
+    def __pipe(a: socket.socket, b: socket.socket):
+        try:
+            while data := a.recv(65536):
+                b.sendall(data)
+        except OSError:
+            pass
+        for sock in (a, b):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def cut(self, outage: float):
+        self.__up = False
+        with self.__lock:
+            pairs, self.__pairs = self.__pairs, []
+        for pair in pairs:
+            for sock in pair:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                    sock.close()
+                except OSError:
+                    pass
+        threading.Timer(outage, lambda: setattr(self, "_BlipProxy__up", True)).start()
+
+
+def emit(**event):
+    print(json.dumps(event), flush=True)
+
+
+def run_client(role: str, port: int, cert: str | None):
+    """
+    Process client: RemoteDesktopClient thật nhưng không có Qt. Ghi sự kiện
+    (id, resumed, frame) ra stdout dạng JSON, đọc session ID từ stdin.
+    """
+    logging.basicConfig(level=logging.CRITICAL)
+    Config.ip, Config.port = "127.0.0.1", port
+
+    import client.client as client_module
+    import client.controllers.main_window_controller as controller_module
+    import client.handlers.receive_handler as receive_module
+    from client.managers.client_manager import ClientManager
+    from client.managers.session_manager import (
+        PRIMARY_MONITOR,
+        MonitorView,
+        SessionManager,
+        SessionResources,
+    )
+    from client.services.screen_share_service import screen_share_service
+    from client.services.sender_service import SenderService
+    from common.packets import VideoStreamPacket
+    from common.password_manager import PasswordManager
+
+    class HeadlessController:
+        """MainWindowController không GUI - bỏ qua mọi thông báo"""
+
+        def __getattr__(self, name):
+            return lambda *args, **kwargs: None
+
+    controller_module.main_window_controller = HeadlessController()
+    receive_module.main_window_controller = HeadlessController()
+    # Hai client cùng máy - mỗi client một device ID để registry cấp hai ID
+    client_module.get_hardware_id = lambda: f"bench-{role}"
+    # Máy benchmark có thể không có keyring - client dùng mật khẩu ngẫu nhiên
+    PasswordManager.get_stored_password = staticmethod(lambda device_id: None)
+
+    keyframe = threading.Event()
+    screen_share_service.request_keyframe = lambda session_id, monitor=None: keyframe.set()
+    view = MonitorView()
+    accept_frame = SessionManager._SessionManager__accept_video_frame
+
+    def on_video(packet):
+        # Như SessionManager.handle_video_data nhưng không decode: bỏ frame tới
+        # keyframe, xin lại keyframe sau KEYFRAME_RETRY nếu chưa tới
+        shown = accept_frame(
+            packet.session_id, PRIMARY_MONITOR, view, packet.frame_seq, packet.keyframe
+        )
+        emit(ev="frame", t=time.time(), key=packet.keyframe, shown=shown)
+
+    receive_module.ReceiveHandler._ReceiveHandler__handle_video_stream_packet = staticmethod(
+        on_video
+    )
+    resume_sessions = SessionManager.resume_sessions.__func__
+
+    def resumed(cls):
+        emit(ev="resumed", t=time.time(), id=ClientManager.get_client_id())
+        resume_sessions(cls)
+
+    SessionManager.resume_sessions = classmethod(resumed)
+
+    client = client_module.RemoteDesktopClient("127.0.0.1", port, cert is not None, cert)
+    if not client._RemoteDesktopClient__connect_to_server():
+        raise SystemExit("Cannot connect to server")
+    while not ClientManager.get_client_id():
+        time.sleep(0.01)
+    emit(ev="id", id=ClientManager.get_client_id())
+
+    session_id = sys.stdin.readline().strip()
+    session = SessionResources(role=role)
+    if role == "controller":
+        session.views[PRIMARY_MONITOR] = view
+    SessionManager._sessions[session_id] = session
+    if role == "controller":
+        threading.Event().wait()
+    frame_seq = 0
+    while True:
+        frame_seq += 1
+        # Xóa cờ trước khi gửi - request tới trong lúc send_packet chờ không bị mất
+        is_keyframe = keyframe.is_set()
+        keyframe.clear()
+        SenderService.send_packet(
+            VideoStreamPacket(
+                session_id, bytes(FRAME_SIZE), frame_seq=frame_seq, keyframe=is_keyframe
+            )
+        )
+        time.sleep(1 / Config.fps)
+
+
+def spawn_client(role: str, port: int, cert: str | None) -> tuple[subprocess.Popen, list]:
+    args = [sys.executable, "-m", "benchmarks.reconnect_downtime", "--child", role]
+    args += ["--port", str(port)] + (["--cert", cert] if cert else [])
+    process = subprocess.Popen(
+        args,
+        cwd=ROOT,
+        env={**os.environ, "PYNPUT_BACKEND": "dummy", "QT_QPA_PLATFORM": "offscreen"},
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    events = []
+
+    def read():
+        for line in process.stdout:
+            events.append(json.loads(line))
+
+    threading.Thread(target=read, daemon=True).start()
+    return process, events
+
+
+def blip(proxy: BlipProxy, outage: float, events: dict, ids: dict, session_id: str):
+    from server.session_manager import SessionManager
+
+    start = {role: len(log) for role, log in events.items()}
+    cut_at = time.time()
+    proxy.cut(outage)
+    time.sleep(outage + 4)
+    after = {role: log[start[role]:] for role, log in events.items()}
+
+    resumed = {
+        role: next((event for event in log if event["ev"] == "resumed"), None)
+        for role, log in after.items()
+    }
+    same_ids = all(event and event["id"] == ids[role] for role, event in resumed.items())
+    frames = [event for event in after["controller"] if event["ev"] == "frame"]
+    keyframe = next((event for event in frames if event["key"]), None)
+    dropped = sum(not event["shown"] for event in frames)
+
+    def since_cut(event):
+        return f"{event['t'] - cut_at:.2f}s" if event else "never"
+
+    print(
+        f"outage {outage:.1f}s: resumed host {since_cut(resumed['host'])} "
+        f"controller {since_cut(resumed['controller'])}, same IDs {same_ids}, "
+        f"session alive {SessionManager.get_session(session_id) is not None}, "
+        f"first keyframe at controller {since_cut(keyframe)}, "
+        f"{len(frames)} frames after ({dropped} dropped waiting for it)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--outages", default="0,1,3")
+    parser.add_argument("--grace", type=float, default=10.0)
+    parser.add_argument("--fps", type=int, default=50)
+    parser.add_argument("--ssl", action="store_true")
+    parser.add_argument("--child", choices=("host", "controller"))
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--cert")
+    args = parser.parse_args()
+
+    Config.fps = args.fps
+    if args.child:
+        run_client(args.child, args.port, args.cert)
+        return
+
+    logging.basicConfig(level=logging.CRITICAL)
+    from benchmarks.tls_reconnect import make_certificate
+    from server.client_manager import ClientManager
+    from server.server import Server
+    from server.session_manager import SessionManager
+
+    directory = tempfile.mkdtemp()
+    cert = key = None
+    if args.ssl:
+        cert, key = make_certificate(directory)
+    Config.resume_grace = args.grace
+    port = free_port()
+    server = Server("127.0.0.1", port, args.ssl, cert, key, 10)
+    threading.Thread(target=server.start, daemon=True).start()
+    time.sleep(0.5)
+    proxy = BlipProxy(port)
+
+    processes = {}
+    events = {}
+    try:
+        for role in ("host", "controller"):
+            processes[role], events[role] = spawn_client(role, proxy.port, cert)
+        while not all(any(e["ev"] == "id" for e in events[role]) for role in events):
+            time.sleep(0.05)
+        ids = {role: next(e["id"] for e in log if e["ev"] == "id") for role, log in events.items()}
+        session_id = SessionManager.create_session(ids["controller"], ids["host"])
+        for process in processes.values():
+            process.stdin.write(session_id + "\n")
+            process.stdin.flush()
+        time.sleep(2)
+
+        for outage in args.outages.split(","):
+            blip(proxy, float(outage), events, ids, session_id)
+
+        for process in processes.values():
+            process.kill()
+        time.sleep(1)
+        print(
+            f"clients killed: {ClientManager.get_client_count()} parked, "
+            f"session alive {SessionManager.get_session(session_id) is not None}"
+        )
+        time.sleep(args.grace + 1)
+        print(
+            f"after {args.grace:.0f}s grace: {ClientManager.get_client_count()} clients, "
+            f"session alive {SessionManager.get_session(session_id) is not None}"
+        )
+    finally:
+        for process in processes.values():
+            process.kill()
+        shutil.rmtree(directory, ignore_errors=True)
+    os._exit(0)  # Thread của server không dừng được sau RelayHandler.shutdown
+
+
+if __name__ == "__main__":
+    main()
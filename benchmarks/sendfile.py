@@ -0,0 +1,145 @@
+"""
+Benchmark gửi chunk file không nén được qua TCP loopback, bên nhận chạy
+process riêng (Protocol.receive_packet, kiểm tra hash, ghi bằng write_at):
+
+    - lz4:      cách cũ mặc định - pickle cả packet rồi nén LZ4
+    - pickle:   cách cũ với Compression: none - vẫn pickle cả chunk
+    - bulk:     chunk bytes đi dạng bulk (không pickle dữ liệu)
+    - sendfile: FileRegion - Protocol gửi thẳng từ file bằng socket.sendfile
+
+Đo throughput và CPU (user + sys) của từng bên. --no-hash bỏ hash từng
+chunk ở cả hai bên để chỉ còn chi phí đóng khung và copy dữ liệu.
+
+Chạy từ thư mục gốc (--dir nên là tmpfs để không đo đĩa):
+    python -m benchmarks.sendfile [--size 1024] [--dir /dev/shm]
+"""
+
+import argparse
+import multiprocessing
+import os
+import pickle
+import resource
+import shutil
+import socket
+import tempfile
+import time
+
+import lz4.frame as lz4
+
+from client.services.file_writer import chunk_digest, write_at
+from common import compression
+from common.enums import PacketType
+from common.packets import FileChunkPacket
+from common.protocol import FileRegion, Protocol
+
+CHUNK_SIZE = 256 * 1024
+MODES = ("lz4", "pickle", "bulk", "sendfile")
+
+
+def cpu_time() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def send_pickled(sock: socket.socket, packet: FileChunkPacket, codec: str):
+    """Khung packet như trước khi có bulk: pickle cả chunk, nén nếu codec là LZ4"""
+    payload = pickle.dumps(packet, protocol=pickle.HIGHEST_PROTOCOL)
+    if codec == compression.LZ4:
+        payload = lz4.compress(payload)
+    header = (
+        f"Packet-Length: {len(payload)}\r\n"
+        f"Packet-Type: {PacketType.FILE_CHUNK.value}\r\n"
+        f"Compression: {codec}\r\n\r\n"
+    )
+    sock.sendall(header.encode() + payload)
+
+
+def receive(server: socket.socket, destination: str, results):
+    conn, _ = server.accept()
+    fd = os.open(destination, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    start = cpu_time()
+    try:
+        while True:
+            packet = Protocol.receive_packet(conn)
+            if packet.chunk_index < 0:
+                break
+            if packet.chunk_hash and chunk_digest(packet.chunk_data) != packet.chunk_hash:
+                raise ValueError(f"Chunk {packet.chunk_index} hash mismatch")
+            write_at(fd, packet.chunk_data, packet.chunk_index * CHUNK_SIZE)
+    finally:
+        os.close(fd)
+        conn.close()
+    results.put(cpu_time() - start)
+
+
+def run(mode: str, source: str, destination: str, hashed: bool):
+    size = os.path.getsize(source)
+    total_chunks = (size + CHUNK_SIZE - 1) // CHUNK_SIZE
+    server = socket.create_server(("127.0.0.1", 0))
+    results = multiprocessing.Queue()
+    receiver = multiprocessing.Process(target=receive, args=(server, destination, results))
+    receiver.start()
+    sock = socket.create_connection(server.getsockname())
+
+    buffer = bytearray(CHUNK_SIZE)
+    view = memoryview(buffer)
+    start_cpu = cpu_time()
+    start = time.perf_counter()
+    with open(source, "rb") as f:
+        for chunk_index in range(total_chunks):
+            if mode == "sendfile":
+                # Bên gửi vẫn đọc chunk để tính hash, dữ liệu gửi đi bằng sendfile
+                n = f.readinto(buffer)
+                digest = chunk_digest(view[:n]) if hashed else None
+                data = FileRegion(source, chunk_index * CHUNK_SIZE, n)
+            else:
+                data = f.read(CHUNK_SIZE)
+                digest = chunk_digest(data) if hashed else None
+            packet = FileChunkPacket(
+                "s", "f", chunk_index, data, total_chunks, digest, compression.NONE
+            )
+            if mode == "lz4":
+                send_pickled(sock, packet, compression.LZ4)
+            elif mode == "pickle":
+                send_pickled(sock, packet, compression.NONE)
+            else:
+                Protocol.send_packet(sock, packet)
+    Protocol.send_packet(sock, FileChunkPacket("s", "f", -1, b"", total_chunks))
+    receiver.join()
+    elapsed = time.perf_counter() - start
+    sender_cpu = cpu_time() - start_cpu
+    receiver_cpu = results.get()
+    sock.close()
+    server.close()
+
+    with open(source, "rb") as a, open(destination, "rb") as b:
+        intact = a.read(1 << 20) == b.read(1 << 20) and os.path.getsize(destination) == size
+    os.remove(destination)
+    print(
+        f"{mode:8s} {size / 2**20 / elapsed:7.0f} MiB/s  "
+        f"sender CPU {sender_cpu:5.2f}s  receiver CPU {receiver_cpu:5.2f}s  intact={intact}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=1024, help="Kích thước file (MiB)")
+    parser.add_argument("--dir", default=None, help="Thư mục tạm")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--no-hash", dest="hashed", action="store_false")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(dir=args.dir)
+    try:
+        source = os.path.join(directory, "source.bin")
+        with open(source, "wb") as f:
+            for _ in range(args.size // 16):
+                f.write(os.urandom(16 * 1024 * 1024))
+        for mode in args.modes.split(","):
+            run(mode, source, os.path.join(directory, "received.bin"), args.hashed)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
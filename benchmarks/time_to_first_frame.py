@@ -0,0 +1,189 @@
+"""
+Benchmark time-to-first-frame của host cho các session nối tiếp nhau (người
+xem đóng rồi mở lại session sau --gap giây), so sánh:
+
+    - cold: keep_warm=0 - như trước, người xem cuối rời đi là đóng encoder,
+            session sau mở lại mss và x264 rồi mới capture frame đầu
+    - warm: keep_warm=--keep-warm - encoder và handle capture được giữ ấm,
+            session sau nhận VideoConfigPacket từ extradata đã lưu và IDR ngay
+
+Đo từ add_session tới VideoConfigPacket và tới frame video đầu tiên (có phải
+keyframe không), cùng số lần mở mss / x264.
+
+Không có DISPLAY (hoặc --synthetic) thì màn hình là nguồn giả cùng độ phân
+giải, nên chi phí mở kết nối X của mss không được tính.
+
+Chạy từ thư mục gốc:
+    PYNPUT_BACKEND=dummy python -m benchmarks.time_to_first_frame [--sessions 8] [--resolution 1920x1080]
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import threading
+import time
+
+import client.services.screen_share_service as screen_share_module
+from client.handlers.send_handler import SendHandler
+from common.config import Config
+
+PRIMARY_MONITOR = screen_share_module.PRIMARY_MONITOR
+
+opens = {"capture": 0, "encoder": 0}
+
+
+class SyntheticScreen:
+    """mss.mss giả: một monitor, ảnh BGRA cố định"""
+
+    class Shot:
+        def __init__(self, size: tuple[int, int], bgra: bytes):
+            self.size = size
+            self.bgra = bgra
+
+    frame: bytes = b""
+    size = (0, 0)
+
+    def __init__(self, **kwargs):
+        opens["capture"] += 1
+        width, height = self.size
+        self.monitors = [{"left": 0, "top": 0, "width": width, "height": height}] * 2
+
+    def grab(self, monitor: dict):
+        return self.Shot(self.size, self.frame)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class CountingEncoder(screen_share_module.H264Encoder):
+    def __init__(self, *args, **kwargs):
+        opens["encoder"] += 1
+        super().__init__(*args, **kwargs)
+
+
+class Recorder:
+    """Thay các SendHandler mà ScreenShareService dùng, ghi thời điểm config / frame"""
+
+    def __init__(self):
+        self.config_at: float | None = None
+        self.first_frame: tuple[float, bool] | None = None
+        self.frame_sent = threading.Event()
+
+    def reset(self):
+        self.config_at = None
+        self.first_frame = None
+        self.frame_sent.clear()
+
+    def install(self):
+        recorder = self
+
+        def config(cls, **kwargs):
+            if recorder.config_at is None:
+                recorder.config_at = time.perf_counter()
+
+        def frame(cls, **kwargs):
+            if recorder.first_frame is None:
+                recorder.first_frame = (time.perf_counter(), kwargs["keyframe"])
+                recorder.frame_sent.set()
+
+        SendHandler.send_video_config_packet = classmethod(config)
+        SendHandler.send_video_stream_packet = classmethod(frame)
+        SendHandler.send_monitor_list_packet = classmethod(lambda cls, **kwargs: None)
+        SendHandler.send_cursor_packet = classmethod(lambda cls, **kwargs: None)
+
+
+def run(mode: str, keep_warm: float, sessions: int, duration: float, gap: float, recorder: Recorder):
+    opens.update(capture=0, encoder=0)
+    service = screen_share_module.ScreenShareService(
+        fps=Config.fps, gop_size=Config.fps, bitrate=2_400_000, keep_warm=keep_warm
+    )
+    results = []
+    for index in range(sessions):
+        session_id = f"{mode}-{index}"
+        recorder.reset()
+        start = time.perf_counter()
+        service.add_session(session_id)
+        if not recorder.frame_sent.wait(10):
+            raise RuntimeError("No frame within 10s")
+        frame_at, keyframe = recorder.first_frame
+        config = recorder.config_at - start if recorder.config_at else float("nan")
+        results.append((config, frame_at - start, keyframe))
+        time.sleep(duration)
+        service.remove_session(session_id)
+        time.sleep(gap)
+
+    first_config, first_frame, _ = results[0]
+    rest = results[1:] or results
+    print(
+        f"{mode:4s} (keep_warm={keep_warm:g}s): session 1 config {first_config * 1000:.1f} ms, "
+        f"first frame {first_frame * 1000:.1f} ms | later sessions median config "
+        f"{statistics.median(r[0] for r in rest) * 1000:.1f} ms, first frame "
+        f"{statistics.median(r[1] for r in rest) * 1000:.1f} ms "
+        f"(max {max(r[1] for r in rest) * 1000:.1f} ms), "
+        f"first frames keyframe {sum(r[2] for r in results)}/{len(results)} | "
+        f"mss opened {opens['capture']}x, x264 opened {opens['encoder']}x"
+    )
+
+
+def idr_floor(resolution: tuple[int, int]) -> float:
+    """Capture + encode một IDR trên encoder đã mở - sàn của time-to-first-frame"""
+    with screen_share_module.mss.mss(with_cursor=False) as sct:
+        monitor = sct.monitors[PRIMARY_MONITOR]
+        encoder = screen_share_module.H264Encoder(*resolution, fps=Config.fps)
+        for _ in range(3):
+            encoder.encode(screen_share_module.capture_frame(sct, monitor))
+        timings = []
+        for _ in range(5):
+            encoder.request_keyframe()
+            start = time.perf_counter()
+            encoder.encode(screen_share_module.capture_frame(sct, monitor))
+            timings.append(time.perf_counter() - start)
+        encoder.close()
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=0.4, help="Giây mỗi session")
+    parser.add_argument("--gap", type=float, default=0.3, help="Giây giữa hai session")
+    parser.add_argument("--keep-warm", type=float, default=Config.encoder_keep_warm)
+    parser.add_argument("--resolution", default="1920x1080")
+    parser.add_argument("--synthetic", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    screen_share_module.H264Encoder = CountingEncoder
+    if args.synthetic or not os.environ.get("DISPLAY"):
+        width, height = map(int, args.resolution.split("x"))
+        SyntheticScreen.size = (width, height)
+        SyntheticScreen.frame = os.urandom(4096) * (width * height * 4 // 4096)
+        screen_share_module.mss.mss = SyntheticScreen
+        screen_share_module.get_cursor_info_for_monitor = lambda *args: None
+        print(f"synthetic {width}x{height} screen")
+    else:
+        real_mss = screen_share_module.mss.mss
+
+        def counting_mss(**kwargs):
+            opens["capture"] += 1
+            return real_mss(**kwargs)
+
+        screen_share_module.mss.mss = counting_mss
+
+    with screen_share_module.mss.mss(with_cursor=False) as sct:
+        monitor = sct.monitors[PRIMARY_MONITOR]
+        resolution = (monitor["width"], monitor["height"])
+    print(f"capture + encode of one IDR on an open encoder: {idr_floor(resolution) * 1000:.1f} ms")
+
+    recorder = Recorder()
+    recorder.install()
+    run("cold", 0, args.sessions, args.duration, args.gap, recorder)
+    run("warm", args.keep_warm, args.sessions, args.duration, args.gap, recorder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark TimingWheel với 100k timer đang sống, so với heapq.
+
+Chạy từ thư mục gốc:
+    python -m benchmarks.timing_wheel [--timers 100000]
+
+Đo:
+    - schedule / reset / cancel (µs mỗi thao tác) và bộ nhớ cấp phát khi reset
+    - độ trễ callback so với deadline khi wheel thật chạy với N timer
+"""
+
+import argparse
+import heapq
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+
+from server.timing_wheel import TimingWheel
+
+
+def per_op(elapsed: float, count: int) -> str:
+    return f"{elapsed / count * 1e6:.2f} µs/op"
+
+
+def bench_operations(count: int):
+    wheel = TimingWheel(tick=0.1)
+
+    start = time.perf_counter()
+    timers = [wheel.schedule(random.uniform(1, 3600), lambda: None) for _ in range(count)]
+    print(f"schedule    {per_op(time.perf_counter() - start, count)}  live={len(wheel)}")
+
+    start = time.perf_counter()
+    for timer in timers:
+        wheel.reset(timer, random.uniform(1, 3600))
+    print(f"reset       {per_op(time.perf_counter() - start, count)}")
+
+    # Reset idle timer mỗi packet không tạo node mới - chỉ còn int deadline
+    # thay cho int cũ (được cấp phát trước khi tracemalloc bắt đầu)
+    tracemalloc.start()
+    for timer in timers[:10_000]:
+        wheel.reset(timer, 30.0)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"reset alloc {current / 10_000:.0f} bytes/reset còn giữ")
+
+    half = count // 2
+    start = time.perf_counter()
+    for timer in timers[:half]:
+        wheel.cancel(timer)
+    print(f"cancel      {per_op(time.perf_counter() - start, half)}  live={len(wheel)}")
+
+    heap = []
+    start = time.perf_counter()
+    for _ in range(count):
+        heapq.heappush(heap, (random.uniform(1, 3600), None))
+    print(f"heapq push  {per_op(time.perf_counter() - start, count)} (so sánh)")
+    wheel.shutdown()
+
+
+def bench_firing(count: int, spread: float, tick: float):
+    """count timer hết hạn rải đều trong spread giây trên wheel đang chạy"""
+    wheel = TimingWheel(tick=tick)
+    lateness = []
+    done = threading.Event()
+
+    def fired(deadline: float):
+        lateness.append(time.monotonic() - deadline)
+        if len(lateness) == count:
+            done.set()
+
+    wheel.start()
+    for _ in range(count):
+        delay = random.uniform(0.5, spread)
+        wheel.schedule(delay, fired, time.monotonic() + delay)
+
+    done.wait(spread + 10)
+    wheel.shutdown()
+    lateness.sort()
+    print(
+        f"fired {len(lateness)}/{count} timers trong {spread:.0f}s (tick {tick * 1000:.0f} ms): "
+        f"trễ p50={statistics.median(lateness) * 1000:.1f} ms "
+        f"p99={lateness[int(len(lateness) * 0.99)] * 1000:.1f} ms "
+        f"max={lateness[-1] * 1000:.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--timers", type=int, default=100_000)
+    parser.add_argument("--spread", type=float, default=5.0, help="Giây để rải deadline")
+    parser.add_argument("--tick", type=float, default=0.01)
+    args = parser.parse_args()
+
+    random.seed(1)
+    bench_operations(args.timers)
+    bench_firing(args.timers, args.spread, args.tick)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark reconnect storm với --ssl: --clients client kết nối tới relay
+server (process riêng, benchmarks._server), ngắt cùng lúc rồi kết nối lại
+với --concurrency kết nối song song:
+
+    - full:   như trước - mỗi kết nối một SSLContext mới, handshake đầy đủ
+    - resume: context dùng chung (common.tls.client_context) + session TLS
+              của lần kết nối trước
+
+Đo CPU của server và client cho mỗi kết nối, và time-to-ready (từ connect
+tới khi nhận AssignIdPacket).
+
+Chạy từ thư mục gốc (không có --cert / --key thì tạo cert tự ký bằng openssl):
+    python -m benchmarks.tls_reconnect [--clients 400] [--concurrency 64]
+"""
+
+import argparse
+import os
+import shutil
+import socket
+import ssl
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+
+from benchmarks._server import free_port, spawn
+from common.packets import AssignIdPacket, ClientInformationPacket
+from common.protocol import Protocol
+from common.tls import client_context
+
+
+def make_certificate(directory: str) -> tuple[str, str]:
+    openssl = shutil.which("openssl")
+    if openssl is None:
+        raise SystemExit("openssl not found - pass --cert and --key")
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(
+        [openssl, "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1"]
+        + ["-keyout", key, "-out", cert, "-subj", "/CN=127.0.0.1"],
+        check=True,
+        capture_output=True,
+    )
+    return cert, key
+
+
+def new_context(cert: str) -> ssl.SSLContext:
+    """SSLContext như client tạo trước khi có cache"""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.load_verify_locations(cert)
+    context.check_hostname = False
+    return context
+
+
+def connect(port: int, cert: str, mode: str, session: ssl.SSLSession | None = None):
+    """Trả về (socket, time-to-ready, session đã được resume)"""
+    start = time.perf_counter()
+    raw = socket.create_connection(("127.0.0.1", port), timeout=60)
+    context = new_context(cert) if mode == "full" else client_context(cert)
+    sock = context.wrap_socket(raw, server_hostname="127.0.0.1", session=session)
+    Protocol.send_packet(
+        sock,
+        ClientInformationPacket(os="bench", host_name="bench", device_id=os.urandom(8).hex()),
+    )
+    while not isinstance(Protocol.receive_packet(sock), AssignIdPacket):
+        pass
+    return sock, time.perf_counter() - start, sock.session_reused
+
+
+def storm(port: int, cert: str, key: str, mode: str, clients: int, concurrency: int):
+    server = spawn(port, "--ssl", "--cert", cert, "--key", key)
+    try:
+        process = psutil.Process(server.pid)
+        with ThreadPoolExecutor(concurrency) as pool:
+            first = list(pool.map(lambda _: connect(port, cert, mode), range(clients)))
+        # Ticket TLS 1.3 tới cùng dữ liệu đầu tiên của server - đã có sau AssignId
+        sessions = [sock.session if mode == "resume" else None for sock, _, _ in first]
+        for sock, _, _ in first:
+            sock.close()
+        time.sleep(1.0)
+
+        server_cpu = sum(process.cpu_times()[:2])
+        client_cpu = time.process_time()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(
+                pool.map(lambda session: connect(port, cert, mode, session), sessions)
+            )
+        elapsed = time.perf_counter() - start
+        server_cpu = sum(process.cpu_times()[:2]) - server_cpu
+        client_cpu = time.process_time() - client_cpu
+    finally:
+        server.kill()
+        server.wait()
+
+    ready = sorted(latency for _, latency, _ in results)
+    resumed = sum(reused for _, _, reused in results)
+    for sock, _, _ in results:
+        sock.close()
+    print(
+        f"{mode:6s} storm of {clients}: resumed {resumed}/{clients}, "
+        f"server CPU {server_cpu * 1000 / clients:.2f} ms/conn, "
+        f"client CPU {client_cpu * 1000 / clients:.2f} ms/conn, "
+        f"ready p50 {ready[clients // 2] * 1000:.0f} ms p95 {ready[int(clients * 0.95)] * 1000:.0f} ms, "
+        f"all ready in {elapsed:.2f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--cert")
+    parser.add_argument("--key")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        if args.cert and args.key:
+            cert, key = args.cert, args.key
+        else:
+            cert, key = make_certificate(directory)
+        for mode in ("full", "resume"):
+            storm(free_port(), cert, key, mode, args.clients, args.concurrency)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
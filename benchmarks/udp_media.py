@@ -0,0 +1,278 @@
+"""
+Benchmark đường UDP cho video qua proxy UDP làm mất datagram (ngẫu nhiên,
+hoặc theo cụm - mô hình Gilbert-Elliott):
+
+    1. transport: packetize -> proxy -> Reassembler, không FEC và FEC_GROUP.
+       Frame bị mất làm hỏng các frame sau tới keyframe kế tiếp (GOP 30) nếu
+       không xin keyframe - đếm số frame xem được và số lần phải xin keyframe.
+    2. relay: host gửi frame qua proxy tới relay server thật (--udp-media,
+       chạy trong process), controller nhận qua UDP - đếm frame và độ trễ.
+
+Chạy từ thư mục gốc:
+    python -m benchmarks.udp_media [--frames 900] [--loss 0.01,0.02,0.05]
+"""
+
+import argparse
+import logging
+import random
+import socket
+import statistics
+import threading
+import time
+
+from common import media_transport
+from common.config import Config
+from common.packets import AssignIdPacket, ClientInformationPacket, VideoStreamPacket
+from common.protocol import Protocol
+
+GOP = 30
+KEYFRAME_SIZE = 60000
+FRAME_SIZE = 8000
+
+
+class LossyProxy:
+    """
+    Chuyển tiếp datagram giữa một client và target, bỏ datagram dữ liệu theo
+    tỉ lệ loss (HELLO luôn qua để đường UDP được mở). burst: mất theo cụm,
+    trung bình vẫn xấp xỉ loss.
+    """
+
+    def __init__(self, target: tuple[str, int], loss: float, burst: bool, seed: int = 1):
+        self.target = target
+        self.loss = loss
+        self.burst = burst
+        self.dropped = 0
+        self.__random = random.Random(seed)
+        self.__bad = False
+        self.__client = None
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, media_transport.SOCKET_BUFFER)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.2)
+        self.address = self.sock.getsockname()
+        self.__stopped = threading.Event()
+        threading.Thread(target=self.__run, daemon=True).start()
+
+    def stop(self):
+        self.__stopped.set()
+
+    def __lose(self) -> bool:
+        if not self.burst:
+            return self.__random.random() < self.loss
+        # Trạng thái xấu kéo dài trung bình 1 / 0.3 datagram, mất hết trong đó
+        if self.__bad:
+            self.__bad = self.__random.random() >= 0.3
+        else:
+            self.__bad = self.__random.random() < self.loss * 0.3
+        return self.__bad
+
+    def __run(self):
+        while not self.__stopped.is_set():
+            try:
+                datagram, address = self.sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            if address == self.target:
+                if self.__client:
+                    self.sock.sendto(datagram, self.__client)
+                continue
+            self.__client = address
+            parsed = media_transport.parse(datagram)
+            if parsed and parsed[0] in (media_transport.DATA, media_transport.PARITY):
+                if self.__lose():
+                    self.dropped += 1
+                    continue
+            self.sock.sendto(datagram, self.target)
+
+
+def frame_payload(frame_no: int, rng: random.Random) -> bytes:
+    size = KEYFRAME_SIZE if frame_no % GOP == 1 else FRAME_SIZE
+    return frame_no.to_bytes(4, "big") + rng.randbytes(size - 4)
+
+
+def playable(received: set[int], frames: int) -> tuple[int, int]:
+    """
+    (frame xem được khi chỉ chờ keyframe định kỳ, số lần phải xin keyframe để
+    không phải chờ) - frame mất làm hỏng mọi frame sau nó tới keyframe kế tiếp
+    """
+    ok = requests = 0
+    broken = False
+    for frame_no in range(1, frames + 1):
+        if frame_no % GOP == 1:
+            broken = False
+        if frame_no not in received:
+            if not broken:
+                requests += 1
+            broken = True
+        elif not broken:
+            ok += 1
+    return ok, requests
+
+
+def run_transport(frames: int, loss: float, burst: bool, fec_group: int):
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, media_transport.SOCKET_BUFFER)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(0.5)
+    proxy = LossyProxy(receiver.getsockname(), loss, burst)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    reassembler = media_transport.Reassembler(fec_group=fec_group)
+    received = set()
+
+    def receive():
+        while True:
+            try:
+                datagram = receiver.recv(65535)
+            except socket.timeout:
+                return
+            kind, _, frame_no, index, count, total_length, data = media_transport.parse(datagram)
+            frame = reassembler.add(kind, frame_no, index, count, total_length, data)
+            if frame is not None:
+                received.add(int.from_bytes(frame[:4], "big"))
+
+    thread = threading.Thread(target=receive)
+    thread.start()
+    rng = random.Random(2)
+    datagrams = nbytes = 0
+    for frame_no in range(1, frames + 1):
+        for datagram in media_transport.packetize(
+            b"t" * media_transport.TOKEN_SIZE, frame_no, frame_payload(frame_no, rng), fec_group
+        ):
+            sender.sendto(datagram, proxy.address)
+            datagrams += 1
+            nbytes += len(datagram)
+        time.sleep(0.002)
+    thread.join()
+    proxy.stop()
+    for sock in (sender, receiver):
+        sock.close()
+
+    ok, requests = playable(received, frames)
+    print(
+        f"{'burst' if burst else 'random':6s} loss {loss:4.0%} fec={fec_group}: "
+        f"delivered {len(received)}/{frames}, playable without requests {ok}/{frames}, "
+        f"keyframe requests {requests}, recovered fragments {reassembler.recovered}, "
+        f"{datagrams} datagrams / {nbytes / 2**20:.1f} MiB"
+    )
+
+
+def connect(port: int, name: str) -> tuple[socket.socket, AssignIdPacket]:
+    sock = socket.create_connection(("127.0.0.1", port))
+    Protocol.send_packet(sock, ClientInformationPacket(os="bench", host_name=name, device_id=name))
+    while True:
+        packet = Protocol.receive_packet(sock)
+        if isinstance(packet, AssignIdPacket):
+            return sock, packet
+
+
+def open_path(sock: socket.socket, token: bytes):
+    sock.send(media_transport.hello(token))
+    kind = media_transport.parse(sock.recv(100))[0]
+    if kind != media_transport.HELLO_ACK:
+        raise RuntimeError("Relay did not acknowledge HELLO")
+
+
+def run_relay(port: int, frames: int, loss: float, burst: bool):
+    from server.session_manager import SessionManager
+
+    host_tcp, host_info = connect(port, "host")
+    controller_tcp, controller_info = connect(port, "controller")
+    session_id = SessionManager.create_session(controller_info.client_id, host_info.client_id)
+
+    proxy = LossyProxy(("127.0.0.1", port), loss, burst)
+    host_udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    host_udp.connect(proxy.address)
+    host_udp.settimeout(1.0)
+    open_path(host_udp, host_info.media_token)
+    controller_udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    controller_udp.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, media_transport.SOCKET_BUFFER)
+    controller_udp.connect(("127.0.0.1", port))
+    controller_udp.settimeout(1.0)
+    open_path(controller_udp, controller_info.media_token)
+
+    reassembler = media_transport.Reassembler()
+    received = set()
+    latencies = []
+
+    def receive():
+        while True:
+            try:
+                datagram = controller_udp.recv(65535)
+            except socket.timeout:
+                return
+            kind, _, frame_no, index, count, total_length, data = media_transport.parse(datagram)
+            if kind not in (media_transport.DATA, media_transport.PARITY):
+                continue  # HELLO_ACK của keepalive
+            frame = reassembler.add(kind, frame_no, index, count, total_length, data)
+            packet = media_transport.decode_packet(frame) if frame else None
+            if packet is not None:
+                received.add(packet.frame_seq)
+                latencies.append(time.monotonic() - packet.timestamps["sent"])
+
+    thread = threading.Thread(target=receive)
+    thread.start()
+    rng = random.Random(2)
+    last_hello = time.monotonic()
+    for frame_no in range(1, frames + 1):
+        if time.monotonic() - last_hello >= media_transport.KEEPALIVE_INTERVAL:
+            # Như MediaTransportService - relay bỏ đường UDP sau PATH_TIMEOUT
+            host_udp.send(media_transport.hello(host_info.media_token))
+            controller_udp.send(media_transport.hello(controller_info.media_token))
+            last_hello = time.monotonic()
+        packet = VideoStreamPacket(
+            session_id=None,
+            video_data=frame_payload(frame_no, rng),
+            frame_seq=frame_no,
+            timestamps={"sent": time.monotonic()},
+            keyframe=frame_no % GOP == 1,
+        )
+        payload = media_transport.encode_packet(packet)
+        for datagram in media_transport.packetize(host_info.media_token, frame_no, payload):
+            host_udp.send(datagram)
+        time.sleep(1 / 60)
+    thread.join()
+
+    ok, requests = playable(received, frames)
+    print(
+        f"relay {'burst' if burst else 'random':6s} loss {loss:4.0%} on host uplink: "
+        f"delivered {len(received)}/{frames}, playable without requests {ok}/{frames}, "
+        f"keyframe requests {requests}, latency p50 {statistics.median(latencies) * 1000:.1f} ms "
+        f"max {max(latencies) * 1000:.1f} ms"
+    )
+    proxy.stop()
+    SessionManager.end_session(session_id)
+    for sock in (host_udp, controller_udp, host_tcp, controller_tcp):
+        sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=900)
+    parser.add_argument("--loss", default="0.01,0.02,0.05")
+    parser.add_argument("--relay-loss", type=float, default=0.03)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    losses = [float(loss) for loss in args.loss.split(",")]
+    for burst in (False, True):
+        for loss in losses:
+            for fec_group in (0, media_transport.FEC_GROUP):
+                run_transport(args.frames, loss, burst, fec_group)
+
+    from server.server import Server
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    Config.udp_media = True
+    server = Server("127.0.0.1", port, False, None, None, 10)
+    threading.Thread(target=server.start, daemon=True).start()
+    time.sleep(0.5)
+    for burst in (False, True):
+        run_relay(port, args.frames // 3, args.relay_loss, burst)
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
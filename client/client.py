@@ -9,12 +9,19 @@ from PyQt5.QtWidgets import QApplication
 from PyQt5.QtGui import QFontDatabase, QFont, QIcon
 
 from client.gui.main_window import MainWindow
+from client.managers.client_manager import ClientManager
 from client.services.listener_service import ListenerService
 from client.services.sender_service import SenderService
+from client.services.ping_service import PingService
+from client.services.media_transport_service import MediaTransportService
+from client.services.peer_media_service import PeerMediaService
+from client.services.reconnect_service import ReconnectService
+from client.services.input_executor_service import InputExecutorService
 from client.services.keyboard_executor_service import KeyboardExecutorService
 from client.services.mouse_executor_service import MouseExecutorService
 from common.packets import ClientInformationPacket
 from common.protocol import Protocol
+from common.tls import TLSSessionCache, client_context
 from common.utils import get_hostname, get_hardware_id
 
 
@@ -111,55 +118,82 @@ class RemoteDesktopClient:
     def __connect_to_server(self):
         """Kết nối đến server."""
         try:
-            plain_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            if self.config["use_ssl"]:
-                context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-                context.load_verify_locations(self.config["cert_file"])
-                context.verify_mode = ssl.CERT_REQUIRED
-                context.check_hostname = False
-                self.socket = context.wrap_socket(
-                    plain_socket, server_hostname=self.config["server_host"]
-                )
-            else:
-                self.socket = plain_socket
-
-            self.socket.settimeout(10)
-            self.socket.connect(
-                (self.config["server_host"], self.config["server_port"])
+            ClientManager.set_server(
+                self.config["server_host"], self.config["server_port"]
             )
+            self.__open_connection()
             logger.info(
                 f"Successfully connected to server at {self.config['server_host']}:{self.config['server_port']}"
             )
 
-            # Gửi thông tin client lên server
-            self.__send_client_information()
-
             # Khởi tạo các dịch vụ sau khi kết nối thành công
             if not self.__init_services():
                 logger.error("Failed to initialize services")
                 return False
 
+            # Mất kết nối sau này: ReconnectService mở lại bằng cùng cách
+            ReconnectService.initialize(self.__open_connection, self.socket)
             return True
 
         except Exception as e:
             logger.error(f"Failed to connect to server - {e}")
             return False
 
-    def __send_client_information(self):
-        """Gửi thông tin client (OS, hostname, device_id) lên server."""
+    def __open_connection(self) -> socket.socket | ssl.SSLSocket:
+        """Mở kết nối (TCP / TLS) tới server và gửi thông tin client."""
+        plain_socket = sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         try:
-            if not self.socket:
-                raise RuntimeError("Socket is not initialized")
+            if self.config["use_ssl"]:
+                # Context và session được giữ lại: lần kết nối sau resume session
+                # thay vì handshake đầy đủ
+                context = client_context(self.config["cert_file"])
+                sock = context.wrap_socket(
+                    plain_socket,
+                    server_hostname=self.config["server_host"],
+                    session=TLSSessionCache.get(
+                        self.config["server_host"], self.config["server_port"]
+                    ),
+                )
+
+            sock.settimeout(10)
+            sock.connect((self.config["server_host"], self.config["server_port"]))
+            if isinstance(sock, ssl.SSLSocket):
+                TLSSessionCache.track(
+                    self.config["server_host"], self.config["server_port"], sock
+                )
+                logger.debug(
+                    f"TLS session {'resumed' if sock.session_reused else 'established'}"
+                )
+
+            # Gửi thông tin client lên server
+            self.__send_client_information(sock)
+        except Exception:
+            sock.close()
+            raise
 
+        self.socket = sock
+        return sock
+
+    def __send_client_information(self, sock: socket.socket | ssl.SSLSocket):
+        """
+        Gửi thông tin client (OS, hostname, device_id) lên server, kèm ID và
+        resume token khi kết nối lại.
+        """
+        try:
             os_info = platform.system()  # Windows, Linux, Darwin (macOS)
             hostname = get_hostname()
             device_id = get_hardware_id()
 
             client_info_packet = ClientInformationPacket(
-                os=os_info, host_name=hostname, device_id=device_id
+                os=os_info,
+                host_name=hostname,
+                device_id=device_id,
+                resume_id=ClientManager.get_client_id() or None,
+                resume_token=ClientManager.get_resume_token(),
+                device_key=ClientManager.get_device_key(),
             )
 
-            Protocol.send_packet(self.socket, client_info_packet)
+            Protocol.send_packet(sock, client_info_packet)
         except Exception as e:
             logger.error(f"Failed to send client information: {e}")
             raise
@@ -170,6 +204,7 @@ class RemoteDesktopClient:
             if self.socket:
                 SenderService.initialize(self.socket)
                 ListenerService.initialize(self.socket)
+                PingService.initialize()
 
                 # Khởi tạo KeyboardExecutorService và MouseExecutorService (cho máy host)
                 KeyboardExecutorService.initialize()
@@ -229,14 +264,23 @@ class RemoteDesktopClient:
                 self.main_window.cleanup()
                 self.main_window = None
 
+            ReconnectService.shutdown()
             if self.socket:
+                if isinstance(self.socket, ssl.SSLSocket):
+                    TLSSessionCache.release(
+                        self.config["server_host"], self.config["server_port"]
+                    )
                 try:
                     self.socket.close()
                 except Exception as e:
                     logger.error(f"Error closing socket: {e}")
                 self.socket = None
 
+            PingService.shutdown()
+            PeerMediaService.shutdown()
+            MediaTransportService.shutdown()
             ListenerService.shutdown()
+            InputExecutorService.shutdown()
             SenderService.shutdown()
             KeyboardExecutorService.shutdown()
 
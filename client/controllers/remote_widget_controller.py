@@ -2,9 +2,13 @@ import logging
 import time
 
 from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot, QTimer
-from PyQt5.QtGui import QPixmap
+from PyQt5.QtGui import QImage, QPixmap
 
 from client.services.keyboard_listener_service import KeyboardListenerService
+from client.managers.client_manager import ClientManager
+from common.config import Config
+from common.metrics import FrameTimingStats
+from common.pointer_motion import PointerMotionEncoder
 
 logger = logging.getLogger(__name__)
 
@@ -18,32 +22,68 @@ class RemoteWidgetController(QObject):
     disconnected = pyqtSignal()
     toggle_fullscreen = pyqtSignal()
     cursor_info_received = pyqtSignal(
-        str, tuple, bool
-    )  # cursor_type, position, visible
-
-    def __init__(self, remote_widget, session_id: str):
+        str, tuple, bool, str
+    )  # cursor_type, position, visible, shape_id
+    latency_stats_updated = pyqtSignal(str)  # Nội dung overlay độ trễ
+    monitors_updated = pyqtSignal(list, list)  # Monitor của host, monitor đang xem
+    monitor_changed = pyqtSignal(int)  # Cửa sổ chính chuyển sang monitor khác
+
+    # Từ thread nhận: MonitorListPacket (monitors, selected - rỗng nếu không áp dụng)
+    monitors_received = pyqtSignal(list, list)
+
+    # Chu kỳ gửi mouse move (giây)
+    DEFAULT_MOTION_INTERVAL = 0.016  # Chưa đo được RTT
+    # Không dưới nhịp cũ: chưa đo được băng thông còn trống của link
+    MIN_MOTION_INTERVAL = 0.016
+    MAX_MOTION_INTERVAL = 0.05
+    MAX_BACKLOGGED_MOTION_INTERVAL = 0.1
+    MOTION_INTERVAL_RTT_FACTOR = 0.25
+    MOTION_BACKLOG_THRESHOLD = 50  # Số packet chờ gửi coi là link bão hòa
+
+    # Local cursor echo (giây)
+    DEFAULT_CURSOR_RECONCILE_WINDOW = 0.3  # Chưa đo được RTT
+    MAX_CURSOR_RECONCILE_WINDOW = 1.0
+    CURSOR_RECONCILE_MARGIN = 0.1
+
+    def __init__(self, remote_widget, session_id: str, monitor: int | None = None):
         super().__init__()
         self.remote_widget = remote_widget
         self.session_id = session_id
+        # Cửa sổ riêng của một monitor (chế độ xem nhiều monitor) hay cửa sổ chính
+        self.is_monitor_window = monitor is not None
+        self.monitor = monitor if monitor is not None else 1  # Monitor đang hiển thị
 
         self.full_screen_pixmap: QPixmap | None = None
 
         self.__running = False
         self.__cleanup_done = False
 
-        # Throttling cho mouse move events
-        self.__last_mouse_position = None
-        self.__last_mouse_send_time = 0
-        self.__mouse_move_interval = 0.016  # ~60 FPS, 16ms
-        self.__pending_mouse_event = None
+        # Gom mouse move thành PointerMotionPacket, gửi theo chu kỳ thích ứng
+        self.__motion_encoder = PointerMotionEncoder()
+        self.__last_motion_send_time = 0.0
+        self.__buttons_down = set()
+
+        # Bitmap cursor host gửi (mỗi shape 1 lần): shape_id -> (QImage, hotspot)
+        self.__cursor_shapes: dict[str, tuple[QImage, tuple[int, int]]] = {}
 
-        # Timer để gửi mouse move event sau một khoảng thời gian
+        # Timer để gửi các mẫu đang gom khi hết chu kỳ
         self.__mouse_timer = QTimer()
-        self.__mouse_timer.timeout.connect(self.__send_pending_mouse_event)
-        self.__mouse_timer.setInterval(int(self.__mouse_move_interval * 1000))
+        self.__mouse_timer.setSingleShot(True)
+        self.__mouse_timer.timeout.connect(self.__flush_pointer_motion)
+
+        # Telemetry độ trễ theo từng giai đoạn của frame
+        self.__frame_timing = FrameTimingStats()
+        self.__latency_overlay_enabled = False
+        self.__latency_timer = QTimer()
+        self.__latency_timer.timeout.connect(self.__emit_latency_stats)
+        self.__latency_timer.setInterval(1000)
 
         self.__connect_signals()
 
+        if Config.latency_overlay:
+            self.__latency_overlay_enabled = True
+            self.__latency_timer.start()
+
         logger.info("RemoteWidgetController initialized")
         self.start()
 
@@ -54,6 +94,10 @@ class RemoteWidgetController(QObject):
         self.error_occurred.connect(self.remote_widget.show_error)
         self.toggle_fullscreen.connect(self.remote_widget.toggle_fullscreen_ui)
         self.cursor_info_received.connect(self.remote_widget.update_cursor_overlay)
+        self.latency_stats_updated.connect(self.remote_widget.update_latency_overlay)
+        self.monitors_updated.connect(self.remote_widget.update_monitor_selector)
+        self.monitor_changed.connect(self.remote_widget.reset_screen)
+        self.monitors_received.connect(self.handle_monitors_received)
 
         # View -> Controller
         self.remote_widget.disconnect_requested.connect(self.handle_disconnect_request)
@@ -62,6 +106,12 @@ class RemoteWidgetController(QObject):
         self.remote_widget.widget_unfocused.connect(self.on_widget_unfocused)
         self.remote_widget.key_event_occurred.connect(self.on_key_event)
         self.remote_widget.mouse_event_occurred.connect(self.on_mouse_event)
+        self.remote_widget.latency_overlay_toggled.connect(
+            self.toggle_latency_overlay
+        )
+        self.remote_widget.monitor_selection_requested.connect(
+            self.on_monitor_selection_requested
+        )
 
     def handle_video_config_received(
         self, width: int, height: int, fps: int, codec: str
@@ -93,21 +143,120 @@ class RemoteWidgetController(QObject):
         self.error_occurred.emit(error_message)
 
     def handle_cursor_info(
-        self, cursor_type: str, position: tuple[int, int], visible: bool
+        self,
+        cursor_type: str,
+        position: tuple[int, int],
+        visible: bool,
+        shape_id: str | None = None,
+        hotspot: tuple[int, int] = (0, 0),
+        shape_data: bytes | None = None,
     ):
         """Xử lý thông tin cursor nhận được từ server."""
         try:
-            self.cursor_info_received.emit(cursor_type, position, visible)
+            if shape_id and shape_data and shape_id not in self.__cursor_shapes:
+                image = QImage.fromData(shape_data, "PNG")
+                if not image.isNull():
+                    self.__cursor_shapes[shape_id] = (image, tuple(hotspot))
+
+            if shape_id not in self.__cursor_shapes:
+                # Chưa có bitmap (vd. packet đầu tiên tới trước khi widget sẵn sàng)
+                # -> widget dùng file cursor theo cursor_type
+                shape_id = ""
+
+            self.cursor_info_received.emit(cursor_type, position, visible, shape_id)
         except Exception as e:
             logger.error(f"Error handling cursor info: {e}", exc_info=True)
 
+    @pyqtSlot(list, list)
+    def handle_monitors_received(self, monitors: list, selected: list):
+        """Host báo danh sách monitor - đồng bộ cửa sổ theo monitor host đang stream."""
+        from client.managers.session_manager import SessionManager
+
+        if selected:
+            SessionManager.show_monitors(self.session_id, selected)
+        self.refresh_monitors()
+
+    def refresh_monitors(self):
+        """Cập nhật bộ chọn monitor theo SessionManager."""
+        from client.managers.session_manager import SessionManager
+
+        self.monitors_updated.emit(
+            SessionManager.get_monitors(self.session_id),
+            SessionManager.get_shown_monitors(self.session_id),
+        )
+
+    @pyqtSlot(list)
+    def on_monitor_selection_requested(self, monitors: list):
+        """Người dùng chọn monitor trên cửa sổ chính."""
+        from client.managers.session_manager import SessionManager
+
+        if monitors == SessionManager.get_shown_monitors(self.session_id):
+            return
+        SessionManager.select_monitors(self.session_id, monitors)
+        self.refresh_monitors()
+
+    def show_monitor(self, monitor: int):
+        """Cửa sổ chính hiển thị monitor khác - bỏ frame của monitor cũ."""
+        if monitor == self.monitor:
+            return
+        self.__flush_pointer_motion()
+        self.monitor = monitor
+        self.monitor_changed.emit(monitor)
+
+    def get_cursor_shape(self, shape_id: str) -> tuple[QImage, tuple[int, int]] | None:
+        """Bitmap + hotspot của cursor đã nhận, theo hash"""
+        return self.__cursor_shapes.get(shape_id)
+
+    def record_frame_timing(
+        self,
+        frame_seq: int,
+        timestamps: dict[str, float],
+        host_offset: float | None,
+    ):
+        """Ghi nhận timestamps của frame vừa decode (gọi từ thread decode)."""
+        self.__frame_timing.record_frame(
+            frame_seq,
+            timestamps,
+            host_offset,
+            ClientManager.get_server_clock_offset(),
+        )
+
+    def get_latency_stats(self) -> dict:
+        """Stats API: histogram độ trễ theo giai đoạn của session này."""
+        return self.__frame_timing.snapshot()
+
+    def reset_latency_stats(self):
+        self.__frame_timing.reset()
+
+    def set_latency_overlay_enabled(self, enabled: bool):
+        """Bật/tắt overlay độ trễ trên widget."""
+        self.__latency_overlay_enabled = enabled
+        if enabled:
+            self.__latency_timer.start()
+            self.__emit_latency_stats()
+        else:
+            self.__latency_timer.stop()
+            self.latency_stats_updated.emit("")
+
+    @pyqtSlot()
+    def toggle_latency_overlay(self):
+        self.set_latency_overlay_enabled(not self.__latency_overlay_enabled)
+
+    def __emit_latency_stats(self):
+        if self.__latency_overlay_enabled:
+            self.latency_stats_updated.emit(self.__frame_timing.format_summary())
+
     @pyqtSlot(str)
     def handle_disconnect_request(self, session_id: str):
         """Xử lý yêu cầu ngắt kết nối từ widget."""
         if session_id == self.session_id and not self.__cleanup_done:
             from client.managers.session_manager import SessionManager
 
-            SessionManager.remove_widget_session(self.session_id)
+            if self.is_monitor_window:
+                # Chỉ thôi xem monitor này, session vẫn tiếp tục
+                SessionManager.close_monitor_window(self.session_id, self.monitor)
+            else:
+                SessionManager.remove_widget_session(self.session_id)
             self.cleanup()
 
     @pyqtSlot()
@@ -136,6 +285,9 @@ class RemoteWidgetController(QObject):
         from common.packets import MousePacket
         from common.enums import MouseEventType, MouseButton
 
+        # Tọa độ trên ảnh của monitor -> tọa độ trên desktop ảo của host
+        position = self.__to_host_position(position)
+
         # Chuyển đổi event_type string sang enum
         try:
             mouse_event_type = MouseEventType[event_type]
@@ -150,47 +302,34 @@ class RemoteWidgetController(QObject):
             logger.error(f"Invalid mouse button: {button}")
             return
 
-        # Tối ưu cho mouse move events với throttling
         if mouse_event_type == MouseEventType.MOVE:
-            current_time = time.time()
+            # Chỉ cần giữ đường đi khi đang kéo thả
+            if not self.__motion_encoder.add(
+                position[0],
+                position[1],
+                time.monotonic(),
+                keep_path=bool(self.__buttons_down),
+            ):
+                return  # Vị trí không thay đổi
 
-            # Bỏ qua nếu vị trí không thay đổi
-            if position == self.__last_mouse_position:
+            if self.__mouse_timer.isActive():
                 return
 
-            # Throttle: chỉ gửi sau một khoảng thời gian
-            time_since_last_send = current_time - self.__last_mouse_send_time
-
-            if time_since_last_send >= self.__mouse_move_interval:
-                # Gửi ngay lập tức
-                packet = MousePacket(
-                    event_type=mouse_event_type,
-                    position=position,
-                    button=mouse_button,
-                    scroll_delta=scroll_delta,
-                    session_id=self.session_id,
-                )
-                SenderService.send_packet(packet)
-                self.__last_mouse_position = position
-                self.__last_mouse_send_time = current_time
-
-                # Clear pending event nếu có
-                self.__pending_mouse_event = None
-                if self.__mouse_timer.isActive():
-                    self.__mouse_timer.stop()
+            wait = self.__last_motion_send_time + self.__motion_interval() - time.monotonic()
+            if wait <= 0:
+                # Đã qua một chu kỳ kể từ lần gửi trước -> gửi ngay, không thêm độ trễ
+                self.__flush_pointer_motion()
             else:
-                # Lưu lại để gửi sau
-                self.__pending_mouse_event = (
-                    mouse_event_type,
-                    position,
-                    mouse_button,
-                    scroll_delta,
-                )
-
-                # Start timer nếu chưa chạy
-                if not self.__mouse_timer.isActive():
-                    self.__mouse_timer.start()
+                self.__mouse_timer.start(max(1, int(wait * 1000)))
         else:
+            # Gửi hết các mẫu di chuyển trước để host nhấn/nhả đúng vị trí và thứ tự
+            self.__flush_pointer_motion()
+
+            if mouse_event_type == MouseEventType.PRESS:
+                self.__buttons_down.add(mouse_button)
+            elif mouse_event_type == MouseEventType.RELEASE:
+                self.__buttons_down.discard(mouse_button)
+
             # Click, release, scroll - gửi ngay lập tức
             packet = MousePacket(
                 event_type=mouse_event_type,
@@ -207,28 +346,71 @@ class RemoteWidgetController(QObject):
                     f"Mouse {event_type} - Pos: {position}, Button: {button}, Scroll: {scroll_delta}"
                 )
 
-    def __send_pending_mouse_event(self):
-        """Gửi mouse move event đang chờ."""
-        if self.__pending_mouse_event:
-            from client.services.sender_service import SenderService
-            from common.packets import MousePacket
+    def __to_host_position(self, position: tuple) -> tuple[int, int]:
+        from client.managers.session_manager import SessionManager
+
+        left, top = SessionManager.get_monitor_origin(self.session_id, self.monitor)
+        return position[0] + left, position[1] + top
+
+    def get_cursor_reconcile_window(self) -> float:
+        """
+        Khoảng thời gian (giây) sau mouse move cuối mà widget vẫn tin vị trí
+        local hơn vị trí host báo về - vị trí từ host trễ ít nhất một RTT
+        """
+        from client.services.ping_service import PingService
+
+        rtt = PingService.get_session_rtt(self.session_id)
+        if rtt is None:
+            rtt = PingService.get_server_rtt()
+        if rtt is None:
+            return self.DEFAULT_CURSOR_RECONCILE_WINDOW
+        return min(
+            2 * rtt + self.CURSOR_RECONCILE_MARGIN, self.MAX_CURSOR_RECONCILE_WINDOW
+        )
+
+    def __motion_interval(self) -> float:
+        """
+        Chu kỳ gửi mouse move (giây), thích ứng theo link:
+            - RTT lớn: gửi thưa hơn, mỗi packet mang nhiều mẫu hơn (độ trễ
+              do gom nhỏ so với RTT); không nhanh hơn 16 ms kể cả trong LAN
+            - hàng đợi gửi bị dồn (link bão hòa): giãn chu kỳ để nhường băng thông
+        """
+        from client.services.ping_service import PingService
+        from client.services.sender_service import SenderService
 
-            event_type, position, button, scroll_delta = self.__pending_mouse_event
+        rtt = PingService.get_session_rtt(self.session_id)
+        if rtt is None:
+            rtt = PingService.get_server_rtt()
 
-            packet = MousePacket(
-                event_type=event_type,
-                position=position,
-                button=button,
-                scroll_delta=scroll_delta,
-                session_id=self.session_id,
+        if rtt is None:
+            interval = self.DEFAULT_MOTION_INTERVAL
+        else:
+            interval = min(
+                max(rtt * self.MOTION_INTERVAL_RTT_FACTOR, self.MIN_MOTION_INTERVAL),
+                self.MAX_MOTION_INTERVAL,
             )
-            SenderService.send_packet(packet)
 
-            self.__last_mouse_position = position
-            self.__last_mouse_send_time = time.time()
-            self.__pending_mouse_event = None
+        backlog = SenderService.get_queue_size()
+        if backlog > self.MOTION_BACKLOG_THRESHOLD:
+            interval = min(
+                interval * (1 + backlog / self.MOTION_BACKLOG_THRESHOLD),
+                self.MAX_BACKLOGGED_MOTION_INTERVAL,
+            )
+        return interval
+
+    def __flush_pointer_motion(self):
+        """Gửi các mẫu mouse move đang gom."""
+        from client.services.sender_service import SenderService
+
+        if self.__mouse_timer.isActive():
+            self.__mouse_timer.stop()
 
-        self.__mouse_timer.stop()
+        packet = self.__motion_encoder.flush(self.session_id)
+        if packet is None:
+            return
+
+        SenderService.send_packet(packet)
+        self.__last_motion_send_time = time.monotonic()
 
     def start(self):
         if self.__running:
@@ -254,7 +436,9 @@ class RemoteWidgetController(QObject):
             # Stop mouse timer
             if self.__mouse_timer.isActive():
                 self.__mouse_timer.stop()
-            
+            if self.__latency_timer.isActive():
+                self.__latency_timer.stop()
+
             # Dừng keyboard listener nếu còn chạy
             KeyboardListenerService.stop_listening(self.session_id)
 
@@ -1,5 +1,4 @@
 import logging
-import os
 from datetime import datetime
 
 from PyQt5.QtWidgets import (
@@ -247,6 +246,30 @@ class ChatWindow(QWidget):
         file_btn.clicked.connect(self.on_send_file)
         action_layout.addWidget(file_btn)
 
+        # Send folder button
+        folder_btn = QPushButton("Send Folder")
+        folder_btn.setStyleSheet(
+            """
+            QPushButton {
+                background-color: #fff;
+                color: #000;
+                border: 1px solid #ccc;
+                border-radius: 3px;
+                padding: 8px 15px;
+                font-size: 11px;
+            }
+            QPushButton:hover {
+                background-color: #f5f5f5;
+                border-color: #999;
+            }
+            QPushButton:pressed {
+                background-color: #e0e0e0;
+            }
+        """
+        )
+        folder_btn.clicked.connect(self.on_send_folder)
+        action_layout.addWidget(folder_btn)
+
         # Disconnect button
         disconnect_btn = QPushButton("Disconnect")
         disconnect_btn.setStyleSheet(
@@ -587,30 +610,37 @@ class ChatWindow(QWidget):
             self.message_input.clear()
 
     def on_send_file(self):
-        """Handle send file button click"""
-        file_path, _ = QFileDialog.getOpenFileName(
+        """Handle send file button click - chọn nhiều file thì gửi chung một lượt"""
+        file_paths, _ = QFileDialog.getOpenFileNames(
             self, "Chọn file để gửi", "", "All Files (*.*)"
         )
-        if file_path:
-            # Send file and get file_id for tracking
-            from client.managers.session_manager import SessionManager
-            from client.services.file_transfer_service import FileTransferService
+        if file_paths:
+            self._send_paths(file_paths)
 
-            # Get session_id
-            session_id = None
-            for sid, session in SessionManager._sessions.items():
-                if session.chat_window == self:
-                    session_id = sid
-                    break
+    def on_send_folder(self):
+        """Handle send folder button click"""
+        folder_path = QFileDialog.getExistingDirectory(self, "Chọn thư mục để gửi")
+        if folder_path:
+            self._send_paths([folder_path])
 
-            if session_id:
-                file_id = FileTransferService.send_file(
-                    session_id, file_path, self.role
-                )
-                if file_id:
-                    filename = os.path.basename(file_path)
-                    # Show in chat with file_id for tracking
-                    self.show_file_sending(file_id, filename, self.role)
+    def _send_paths(self, paths: list[str]):
+        """Send file and get file_id for tracking"""
+        from client.managers.session_manager import SessionManager
+        from client.services.file_transfer_service import FileTransferService
+
+        # Get session_id
+        session_id = None
+        for sid, session in SessionManager._sessions.items():
+            if session.chat_window == self:
+                session_id = sid
+                break
+
+        if session_id:
+            sent = FileTransferService.send_files(session_id, paths, self.role)
+            if sent:
+                file_id, filename = sent
+                # Show in chat with file_id for tracking
+                self.show_file_sending(file_id, filename, self.role)
 
     @pyqtSlot(str, str, str)
     def show_file_sending(self, file_id: str, filename: str, sender_role: str):
@@ -703,11 +733,19 @@ class ChatWindow(QWidget):
         """Update the partner hostname display"""
         self.partner_hostname = hostname
 
-    @pyqtSlot(str, str, int, str)
+    @pyqtSlot(str, str, int, str, int)
     def show_file_accept_dialog(
-        self, file_id: str, filename: str, filesize: int, sender_role: str
+        self,
+        file_id: str,
+        filename: str,
+        filesize: int,
+        sender_role: str,
+        file_count: int = -1,
     ):
-        """Show file transfer request in chat with Save/Cancel buttons"""
+        """
+        Show file transfer request in chat with Save/Cancel buttons.
+        file_count >= 0: thư mục / nhiều file, lưu vào một thư mục.
+        """
         # Determine sender name
         if sender_role == "controller":
             sender_name = self.partner_hostname if self.role == "host" else "You"
@@ -721,6 +759,8 @@ class ChatWindow(QWidget):
             size_str = f"{filesize / 1024:.1f} KB"
         else:
             size_str = f"{filesize / (1024 * 1024):.1f} MB"
+        if file_count >= 0:
+            size_str = f"{file_count} files, {size_str}"
 
         # Create file transfer widget with buttons
         file_widget = QFrame()
@@ -790,7 +830,7 @@ class ChatWindow(QWidget):
         )
         save_btn.clicked.connect(
             lambda: self._on_file_save(
-                file_id, filename, filesize, sender_role, file_widget
+                file_id, filename, filesize, sender_role, file_widget, file_count
             )
         )
         button_layout.addWidget(save_btn)
@@ -842,15 +882,19 @@ class ChatWindow(QWidget):
         filesize: int,
         sender_role: str,
         widget: QFrame,
+        file_count: int = -1,
     ):
         """Handle Save button click"""
         # Disable buttons immediately to prevent double-click
         self._disable_file_buttons(widget)
 
         # Show file dialog to choose save location
-        save_path, _ = QFileDialog.getSaveFileName(
-            self, "Save File As", filename, "All Files (*.*)"
-        )
+        if file_count >= 0:
+            save_path = QFileDialog.getExistingDirectory(self, "Save Files To")
+        else:
+            save_path, _ = QFileDialog.getSaveFileName(
+                self, "Save File As", filename, "All Files (*.*)"
+            )
 
         if save_path:
             from client.handlers.send_handler import SendHandler
@@ -864,19 +908,17 @@ class ChatWindow(QWidget):
                     break
 
             if session_id:
-                # Update transfer info with save_path
-                session = SessionManager._sessions.get(session_id)
-                if session:
-                    transfer = session.pending_file_transfers.get(file_id)
-                    if transfer:
-                        transfer["save_path"] = save_path
-
-                SendHandler.send_file_accept_packet(session_id, file_id)
-
-                # Update widget to show "Receiving..."
-                self._update_file_widget_status(
-                    widget, filename, "Receiving...", sender_role
-                )
+                # Tạo file tạm và gửi accept
+                if SessionManager.accept_file_transfer(session_id, file_id, save_path):
+                    # Update widget to show "Receiving..."
+                    self._update_file_widget_status(
+                        widget, filename, "Receiving...", sender_role
+                    )
+                else:
+                    SendHandler.send_file_reject_packet(session_id, file_id)
+                    self._update_file_widget_status(
+                        widget, filename, "Failed", sender_role
+                    )
         else:
             # User canceled save dialog - treat as reject
             self._on_file_cancel(file_id, filename, sender_role, widget)
@@ -895,6 +895,8 @@ class MainWindow(QMainWindow):
             remote_widget = RemoteWidget(session_id)
 
             SessionManager._sessions[session_id].widget = remote_widget
+            # MonitorListPacket có thể đã tới trước khi cửa sổ được tạo
+            remote_widget.controller.refresh_monitors()
 
             self.controller.connect_button_state_changed.emit(True, "")
 
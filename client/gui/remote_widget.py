@@ -1,15 +1,19 @@
 import logging
+import time
 
 from PyQt5.QtWidgets import (
     QWidget,
     QLabel,
+    QComboBox,
+    QHBoxLayout,
     QVBoxLayout,
     QSizePolicy,
 )
 from PyQt5.QtGui import QPixmap, QPainter, QPen
-from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot, QPoint
+from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot, QPoint, QTimer
 
 from client.controllers.remote_widget_controller import RemoteWidgetController
+from common.config import Config
 
 logger = logging.getLogger(__name__)
 
@@ -24,11 +28,16 @@ class RemoteWidget(QWidget):
     mouse_event_occurred = pyqtSignal(
         str, tuple, str, tuple
     )  # Sự kiện chuột (event_type, position, button, scroll_delta)
+    latency_overlay_toggled = pyqtSignal()  # Bật/tắt overlay độ trễ (Ctrl+Shift+L)
+    monitor_selection_requested = pyqtSignal(list)  # Các monitor muốn xem
 
-    def __init__(self, session_id: str):
+    def __init__(self, session_id: str, monitor: int | None = None):
         super().__init__()
         self.session_id = session_id
-        self.controller = RemoteWidgetController(self, self.session_id)
+        # None = cửa sổ chính của session (có bộ chọn monitor), số = cửa sổ
+        # riêng của một monitor khi xem nhiều monitor
+        self.monitor = monitor
+        self.controller = RemoteWidgetController(self, self.session_id, monitor)
         self.__cleanup_done = False
         self._closed_by_manager = (
             False  # Flag để biết widget được đóng từ SessionManager
@@ -39,10 +48,16 @@ class RemoteWidget(QWidget):
         )
 
         # Thông tin cursor từ server
-        self.__cursor_type = "normal"
+        self.__cursor_shape_key = None  # shape_id từ host, hoặc cursor_type khi fallback
+        self.__cursor_hotspot = (0, 0)
         self.__cursor_position = None  # (x, y) tương đối trên pixmap gốc
         self.__cursor_visible = True
-        self.__cursor_pixmaps = {}  # Cache cursor images
+        self.__cursor_pixmaps = {}  # Cache cursor: shape key -> (QPixmap, hotspot)
+
+        # Local echo: vẽ cursor ngay tại vị trí chuột local thay vì chờ host báo về
+        self.__cursor_echo = Config.cursor_echo
+        self.__local_cursor_pos = None  # (x, y) trên image_label
+        self.__last_local_move = 0.0
 
         # Cho phép widget nhận focus để lắng nghe sự kiện bàn phím và chuột
         self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
@@ -54,12 +69,32 @@ class RemoteWidget(QWidget):
         main_layout = QVBoxLayout(self)
         main_layout.setContentsMargins(0, 0, 0, 0)
         main_layout.setSpacing(0)
+        if self.monitor is None:
+            self.create_monitor_bar(main_layout)
+            self.setWindowTitle(f"PBL4 Remote Desktop")
+        else:
+            self.setWindowTitle(f"PBL4 Remote Desktop - Monitor {self.monitor}")
         self.create_screen_area(main_layout)
-        self.setWindowTitle(f"PBL4 Remote Desktop")
 
         # Tự động maximize window khi khởi tạo
         self.showMaximized()
 
+    def create_monitor_bar(self, parent_layout):
+        """Bộ chọn monitor - chỉ hiện khi host có nhiều hơn một monitor."""
+        self.monitor_bar = QWidget()
+        bar_layout = QHBoxLayout(self.monitor_bar)
+        bar_layout.setContentsMargins(8, 4, 8, 4)
+        bar_layout.addWidget(QLabel("Monitor:"))
+
+        self.monitor_selector = QComboBox()
+        self.monitor_selector.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.monitor_selector.activated.connect(self.__on_monitor_selected)
+        bar_layout.addWidget(self.monitor_selector)
+        bar_layout.addStretch()
+
+        self.monitor_bar.hide()
+        parent_layout.addWidget(self.monitor_bar)
+
     def create_screen_area(self, parent_layout):
         self.image_label = QLabel()
         self.image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -74,6 +109,28 @@ class RemoteWidget(QWidget):
 
         parent_layout.addWidget(self.image_label)
 
+        # Overlay hiển thị thống kê độ trễ (ẩn mặc định)
+        self.latency_label = QLabel(self.image_label)
+        self.latency_label.setStyleSheet(
+            "background-color: rgba(0, 0, 0, 160); color: #00ff7f;"
+            "font-family: monospace; font-size: 11px; padding: 6px;"
+        )
+        self.latency_label.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.latency_label.move(8, 8)
+        self.latency_label.hide()
+
+        # Overlay cursor - chỉ di chuyển label, không vẽ lại frame
+        self.cursor_label = QLabel(self.image_label)
+        self.cursor_label.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.cursor_label.setStyleSheet("background: transparent;")
+        self.cursor_label.hide()
+        self.__apply_cursor_shape("normal")
+
+        # Hết khoảng echo mà host không báo vị trí mới -> đồng bộ lại với host
+        self.__reconcile_timer = QTimer(self)
+        self.__reconcile_timer.setSingleShot(True)
+        self.__reconcile_timer.timeout.connect(self.__place_cursor_at_host_position)
+
     # --- Slots để nhận dữ liệu từ Controller ---
 
     @pyqtSlot(QPixmap)
@@ -84,23 +141,88 @@ class RemoteWidget(QWidget):
         # Scale và hiển thị
         self.__scale_and_display()
 
-    @pyqtSlot(str, tuple, bool)
-    def update_cursor_overlay(self, cursor_type: str, position: tuple, visible: bool):
-        """Cập nhật thông tin cursor và vẽ lại nếu có thay đổi."""
-        # Kiểm tra xem cursor có thay đổi không
-        cursor_changed = (
-            cursor_type != self.__cursor_type
-            or position != self.__cursor_position
-            or visible != self.__cursor_visible
-        )
+    @pyqtSlot(str, tuple, bool, str)
+    def update_cursor_overlay(
+        self, cursor_type: str, position: tuple, visible: bool, shape_id: str = ""
+    ):
+        """Cập nhật cursor theo thông tin host báo về."""
+        if (shape_id or cursor_type) != self.__cursor_shape_key:
+            self.__apply_cursor_shape(cursor_type, shape_id)
 
-        self.__cursor_type = cursor_type
         self.__cursor_position = position
         self.__cursor_visible = visible
 
-        # Chỉ vẽ lại khi cursor thay đổi, KHÔNG vẽ lại mỗi frame
-        if cursor_changed and self.__current_pixmap:
-            self.__scale_and_display()
+        # Đang echo: vị trí local mới hơn vị trí host (trễ một RTT)
+        if self.__is_echoing():
+            return
+
+        self.__place_cursor_at_host_position()
+
+    @pyqtSlot(str)
+    def update_latency_overlay(self, text: str):
+        """Cập nhật overlay độ trễ - chuỗi rỗng để ẩn."""
+        if not text:
+            self.latency_label.hide()
+            return
+        self.latency_label.setText(text)
+        self.latency_label.adjustSize()
+        self.latency_label.show()
+        self.latency_label.raise_()
+
+    @pyqtSlot(list, list)
+    def update_monitor_selector(self, monitors: list, selected: list):
+        """Điền bộ chọn monitor: từng monitor và "All monitors" (mỗi monitor một cửa sổ)."""
+        if self.monitor is not None:
+            return
+
+        self.monitor_selector.blockSignals(True)
+        self.monitor_selector.clear()
+        for info in monitors:
+            self.monitor_selector.addItem(
+                f"{info['index']}: {info['width']}x{info['height']}", [info["index"]]
+            )
+        if len(monitors) > 1:
+            self.monitor_selector.addItem(
+                "All monitors", [info["index"] for info in monitors]
+            )
+
+        current = next(
+            (
+                index
+                for index in range(self.monitor_selector.count())
+                if self.monitor_selector.itemData(index) == sorted(selected)
+            ),
+            -1,
+        )
+        self.monitor_selector.setCurrentIndex(current)
+        self.monitor_selector.blockSignals(False)
+        self.monitor_bar.setVisible(len(monitors) > 1)
+
+    @pyqtSlot(int)
+    def reset_screen(self, monitor: int):
+        """Cửa sổ chuyển sang monitor khác - bỏ frame cũ, chờ frame đầu của monitor mới."""
+        self.__current_pixmap = None
+        self.__last_mouse_pos = None
+        self.__local_cursor_pos = None
+        self.__cursor_position = None
+        self.cursor_label.hide()
+        self.image_label.clear()
+        self.image_label.setText(f"🖥️ Waiting for monitor {monitor}...")
+
+    def __on_monitor_selected(self, index: int):
+        monitors = self.monitor_selector.itemData(index)
+        if monitors:
+            self.monitor_selection_requested.emit(sorted(monitors))
+        self.setFocus()
+
+    def __cycle_monitor(self):
+        """Ctrl+Shift+M: chuyển sang lựa chọn tiếp theo trong bộ chọn monitor."""
+        count = self.monitor_selector.count()
+        if self.monitor is not None or count < 2:
+            return
+        index = (self.monitor_selector.currentIndex() + 1) % count
+        self.monitor_selector.setCurrentIndex(index)
+        self.__on_monitor_selected(index)
 
     @pyqtSlot(str)
     def show_error(self, message: str):
@@ -109,93 +231,125 @@ class RemoteWidget(QWidget):
         self.image_label.setText(f"Error: {message}")
 
     def __scale_and_display(self):
-        """Scale pixmap gốc và hiển thị vừa với widget, vẽ cursor nếu có."""
+        """Scale pixmap gốc và hiển thị vừa với widget."""
         if not self.__current_pixmap:
             return
 
-        # Tạo bản sao và vẽ cursor nếu cần
-        pixmap_to_display = self.__current_pixmap
-
-        if self.__cursor_visible and self.__cursor_position:
-            # Copy pixmap để vẽ cursor
-            pixmap_to_display = self.__current_pixmap.copy()
-            self.__draw_cursor_on_pixmap(pixmap_to_display)
-
         # Scale với FastTransformation để nhanh hơn
-        scaled_pixmap = pixmap_to_display.scaled(
+        scaled_pixmap = self.__current_pixmap.scaled(
             self.image_label.size(),
             Qt.AspectRatioMode.KeepAspectRatio,
             Qt.TransformationMode.FastTransformation,
         )
         self.image_label.setPixmap(scaled_pixmap)
 
-    def __draw_cursor_on_pixmap(self, pixmap: QPixmap):
-        """Vẽ cursor lên pixmap."""
-        if not self.__cursor_position:
-            return
-
-        cursor_x, cursor_y = self.__cursor_position
+        if not self.__is_echoing():
+            self.__place_cursor_at_host_position()
 
-        # Load cursor image
-        cursor_pixmap = self.__load_cursor_pixmap(self.__cursor_type)
+    def __is_echoing(self) -> bool:
+        """Chuột local vừa di chuyển trên vùng ảnh trong khoảng reconcile window"""
+        return (
+            self.__cursor_echo
+            and self.__local_cursor_pos is not None
+            and time.monotonic() - self.__last_local_move
+            < self.controller.get_cursor_reconcile_window()
+        )
 
-        if cursor_pixmap:
-            # Vẽ cursor image lên pixmap
-            painter = QPainter(pixmap)
-            painter.drawPixmap(cursor_x, cursor_y, cursor_pixmap)
-            painter.end()
-        else:
-            # Fallback: vẽ hình tròn đỏ nếu không load được cursor
-            painter = QPainter(pixmap)
-            pen = QPen(Qt.GlobalColor.red, 2)
-            painter.setPen(pen)
-            painter.setBrush(Qt.GlobalColor.red)
-            radius = 8
-            painter.drawEllipse(QPoint(cursor_x, cursor_y), radius, radius)
-            painter.end()
-
-    def __load_cursor_pixmap(self, cursor_type: str) -> QPixmap | None:
-        """Load cursor pixmap từ file."""
-        # Kiểm tra cache
-        if cursor_type in self.__cursor_pixmaps:
-            return self.__cursor_pixmaps[cursor_type]
+    def __apply_cursor_shape(self, cursor_type: str, shape_id: str = ""):
+        """Đổi hình cursor của overlay - ưu tiên bitmap host gửi, fallback theo cursor_type."""
+        shape_key = shape_id or cursor_type
+        self.__cursor_shape_key = shape_key
+
+        cached = self.__cursor_pixmaps.get(shape_key)
+        if cached is None:
+            cached = self.__load_cursor_shape(cursor_type, shape_id)
+            self.__cursor_pixmaps[shape_key] = cached
+
+        cursor_pixmap, self.__cursor_hotspot = cached
+        self.cursor_label.setPixmap(cursor_pixmap)
+        self.cursor_label.resize(cursor_pixmap.size())
+
+    def __load_cursor_shape(
+        self, cursor_type: str, shape_id: str
+    ) -> tuple[QPixmap, tuple[int, int]]:
+        """Tạo pixmap + hotspot cho cursor."""
+        if shape_id:
+            shape = self.controller.get_cursor_shape(shape_id)
+            if shape:
+                image, hotspot = shape
+                return QPixmap.fromImage(image), hotspot
 
         try:
-            from common.utils import get_cursor_image_path, load_cursor_image
-
-            cursor_path = get_cursor_image_path(cursor_type)
-            if not cursor_path:
-                return None
-
-            cursor_img = load_cursor_image(cursor_path)
-            if not cursor_img:
-                return None
-
-            # Convert PIL Image to QPixmap
-            import io
-
-            buffer = io.BytesIO()
-            cursor_img.save(buffer, format="PNG")
-            buffer.seek(0)
-            cursor_pixmap = QPixmap()
-            cursor_pixmap.loadFromData(buffer.read())
-
-            # Resize cursor nếu quá lớn
-            if cursor_pixmap.width() > 48 or cursor_pixmap.height() > 48:
-                cursor_pixmap = cursor_pixmap.scaled(
-                    48,
-                    48,
-                    Qt.AspectRatioMode.KeepAspectRatio,
-                    Qt.TransformationMode.SmoothTransformation,
-                )
-
-            # Cache lại
-            self.__cursor_pixmaps[cursor_type] = cursor_pixmap
-            return cursor_pixmap
+            from common.utils import get_cursor_shape
 
+            shape = get_cursor_shape(cursor_type)
+            if shape:
+                cursor_pixmap = QPixmap()
+                if cursor_pixmap.loadFromData(shape["shape_data"], "PNG"):
+                    return cursor_pixmap, shape["hotspot"]
         except Exception as e:
             logger.debug(f"Error loading cursor pixmap for {cursor_type}: {e}")
+
+        # Fallback: hình tròn đỏ nếu không load được cursor
+        radius = 8
+        cursor_pixmap = QPixmap(radius * 2 + 2, radius * 2 + 2)
+        cursor_pixmap.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(cursor_pixmap)
+        painter.setPen(QPen(Qt.GlobalColor.red, 2))
+        painter.setBrush(Qt.GlobalColor.red)
+        painter.drawEllipse(QPoint(radius + 1, radius + 1), radius, radius)
+        painter.end()
+        return cursor_pixmap, (radius + 1, radius + 1)
+
+    def __move_cursor_label(self, x: int, y: int):
+        hotspot_x, hotspot_y = self.__cursor_hotspot
+        self.cursor_label.move(x - hotspot_x, y - hotspot_y)
+        if not self.cursor_label.isVisible():
+            self.cursor_label.show()
+        self.cursor_label.raise_()
+
+    def __place_cursor_at_host_position(self):
+        """Đặt overlay cursor theo vị trí host báo về."""
+        if (
+            not self.__cursor_visible
+            or not self.__cursor_position
+            or not self.__current_pixmap
+        ):
+            self.cursor_label.hide()
+            return
+
+        label_pos = self.__map_image_to_label(self.__cursor_position)
+        if label_pos is None:
+            self.cursor_label.hide()
+            return
+        self.__move_cursor_label(*label_pos)
+
+    def __map_image_to_label(self, position: tuple) -> tuple[int, int] | None:
+        """Chuyển tọa độ trên ảnh gốc sang tọa độ trên image_label."""
+        geometry = self.__display_geometry()
+        if not geometry:
             return None
+        scale_factor, offset_x, offset_y = geometry
+        return (
+            int(position[0] * scale_factor) + offset_x,
+            int(position[1] * scale_factor) + offset_y,
+        )
+
+    def __display_geometry(self) -> tuple[float, int, int] | None:
+        """(scale, offset_x, offset_y) của ảnh đang hiển thị trong image_label."""
+        if not self.__current_pixmap:
+            return None
+        pixmap_width = self.__current_pixmap.width()
+        pixmap_height = self.__current_pixmap.height()
+        if not pixmap_width or not pixmap_height:
+            return None
+
+        label_width = self.image_label.width()
+        label_height = self.image_label.height()
+        scale_factor = min(label_width / pixmap_width, label_height / pixmap_height)
+        offset_x = (label_width - int(pixmap_width * scale_factor)) // 2
+        offset_y = (label_height - int(pixmap_height * scale_factor)) // 2
+        return scale_factor, offset_x, offset_y
 
     @pyqtSlot()
     def toggle_fullscreen_ui(self):
@@ -216,6 +370,14 @@ class RemoteWidget(QWidget):
                 self.close()
         elif event.key() == Qt.Key.Key_F11:
             self.fullscreen_requested.emit()
+        elif event.key() == Qt.Key.Key_L and event.modifiers() == (
+            Qt.KeyboardModifier.ControlModifier | Qt.KeyboardModifier.ShiftModifier
+        ):
+            self.latency_overlay_toggled.emit()
+        elif event.key() == Qt.Key.Key_M and event.modifiers() == (
+            Qt.KeyboardModifier.ControlModifier | Qt.KeyboardModifier.ShiftModifier
+        ):
+            self.__cycle_monitor()
         else:
             # Gửi sự kiện phím cho controller xử lý
             self.key_event_occurred.emit(event, "press")
@@ -244,6 +406,8 @@ class RemoteWidget(QWidget):
         super().leaveEvent(event)
         self.unsetCursor()
         self.__last_mouse_pos = None
+        self.__local_cursor_pos = None
+        self.__place_cursor_at_host_position()
         # Bỏ debug log để giảm overhead
 
     def mousePressEvent(self, event):
@@ -276,10 +440,22 @@ class RemoteWidget(QWidget):
             self.setCursor(Qt.CursorShape.BlankCursor)
             self.mouse_event_occurred.emit("MOVE", scaled_pos, "UNKNOWN", (0, 0))
             self.__last_mouse_pos = scaled_pos
+
+            if self.__cursor_echo:
+                # Vẽ cursor ngay tại vị trí local, host sẽ xác nhận sau một RTT
+                label_pos = self.image_label.mapFrom(self, event.pos())
+                self.__local_cursor_pos = (label_pos.x(), label_pos.y())
+                self.__last_local_move = time.monotonic()
+                self.__move_cursor_label(*self.__local_cursor_pos)
+                self.__reconcile_timer.start(
+                    int(self.controller.get_cursor_reconcile_window() * 1000)
+                )
         else:
             # Hiển thị lại con chuột khi ra ngoài vùng màn hình share
             self.unsetCursor()
             self.__last_mouse_pos = None
+            self.__local_cursor_pos = None
+            self.__place_cursor_at_host_position()
 
         super().mouseMoveEvent(event)
 
@@ -6,15 +6,25 @@ from client.controllers.main_window_controller import main_window_controller
 from client.managers.session_manager import SessionManager
 from client.services.keyboard_executor_service import KeyboardExecutorService
 from client.services.mouse_executor_service import MouseExecutorService
+from client.services.media_transport_service import MediaTransportService
+from client.services.peer_media_service import PeerMediaService
+from client.services.ping_service import PingService
+from common.config import Config
 from common.packets import (
     AssignIdPacket,
     ConnectionRequestPacket,
     ConnectionResponsePacket,
     KeyboardPacket,
+    KeyframeRequestPacket,
+    MonitorListPacket,
+    MonitorSelectPacket,
     MousePacket,
+    PeerCandidatesPacket,
+    PointerMotionPacket,
     SessionPacket,
     VideoConfigPacket,
     VideoStreamPacket,
+    CursorPacket,
     AuthenticationPasswordPacket,
     ChatMessagePacket,
     FileMetadataPacket,
@@ -22,6 +32,9 @@ from common.packets import (
     FileRejectPacket,
     FileChunkPacket,
     FileCompletePacket,
+    FileAckPacket,
+    FileSignaturePacket,
+    FileDeltaPacket,
     Packet,
 )
 
@@ -41,14 +54,23 @@ class ReceiveHandler:
             AuthenticationPasswordPacket: cls.__handle_authentication_password_packet,  # Host nhận
             VideoConfigPacket: cls.__handle_video_config_packet,
             VideoStreamPacket: cls.__handle_video_stream_packet,
+            CursorPacket: cls.__handle_cursor_packet,
+            KeyframeRequestPacket: cls.__handle_keyframe_request_packet,  # Host nhận
+            MonitorListPacket: cls.__handle_monitor_list_packet,
+            MonitorSelectPacket: cls.__handle_monitor_select_packet,  # Host nhận
+            PeerCandidatesPacket: cls.__handle_peer_candidates_packet,
             KeyboardPacket: cls.__handle_keyboard_packet,
             MousePacket: cls.__handle_mouse_packet,
+            PointerMotionPacket: cls.__handle_pointer_motion_packet,
             ChatMessagePacket: cls.__handle_chat_message_packet,
             FileMetadataPacket: cls.__handle_file_metadata_packet,
             FileAcceptPacket: cls.__handle_file_accept_packet,
             FileRejectPacket: cls.__handle_file_reject_packet,
             FileChunkPacket: cls.__handle_file_chunk_packet,
             FileCompletePacket: cls.__handle_file_complete_packet,
+            FileAckPacket: cls.__handle_file_ack_packet,
+            FileSignaturePacket: cls.__handle_file_signature_packet,
+            FileDeltaPacket: cls.__handle_file_delta_packet,
         }
         handler = packet_handlers.get(type(packet))
         if handler:
@@ -62,7 +84,21 @@ class ReceiveHandler:
         if not packet.client_id:
             logger.error("Received AssignIdPacket with empty fields.")
             return
+        ClientManager.set_resume_token(getattr(packet, "resume_token", None))
+        ClientManager.set_device_key(getattr(packet, "device_key", None))
         ClientManager.set_client_id(packet.client_id)
+        PingService.set_heartbeat_interval(packet.heartbeat_interval)
+        resumed = getattr(packet, "resumed", False)
+        if Config.udp_media and packet.media_token and packet.media_port:
+            if resumed:
+                MediaTransportService.shutdown()  # Token UDP cũ đã hết hiệu lực
+            MediaTransportService.initialize(
+                Config.ip, packet.media_port, packet.media_token
+            )
+        if resumed:
+            # Kết nối lại: cùng ID, session vẫn mở - video tiếp tục từ keyframe
+            SessionManager.resume_sessions()
+            return
         main_window_controller.on_client_id_received()
 
     @staticmethod
@@ -116,6 +152,8 @@ class ReceiveHandler:
                 packet.role,
                 partner_hostname=packet.partner_hostname or "Unknown",
             )
+            if Config.direct_media:
+                PeerMediaService.offer(packet.session_id)
 
         # Nếu session kết thúc, dọn dẹp
         elif (
@@ -157,6 +195,7 @@ class ReceiveHandler:
             packet.height,
             packet.fps,
             packet.codec,
+            monitor=getattr(packet, "monitor", 1),
         )
 
     @staticmethod
@@ -173,6 +212,71 @@ class ReceiveHandler:
             packet.video_data,
             cursor_type=getattr(packet, "cursor_type", None),
             cursor_position=getattr(packet, "cursor_position", None),
+            frame_seq=getattr(packet, "frame_seq", 0),
+            timestamps=getattr(packet, "timestamps", None),
+            clock_offset=getattr(packet, "clock_offset", None),
+            keyframe=getattr(packet, "keyframe", False),
+            monitor=getattr(packet, "monitor", 1),
+        )
+
+    @staticmethod
+    def __handle_keyframe_request_packet(packet: KeyframeRequestPacket):
+        """Xử lý KeyframeRequestPacket - controller mất frame, cần keyframe"""
+        if not packet.session_id:
+            logger.error("Received KeyframeRequestPacket with empty fields.")
+            return
+        from client.services.screen_share_service import screen_share_service
+
+        screen_share_service.request_keyframe(
+            packet.session_id, getattr(packet, "monitor", None)
+        )
+
+    @staticmethod
+    def __handle_monitor_list_packet(packet: MonitorListPacket):
+        """Xử lý MonitorListPacket - các monitor của host, monitor đang được stream"""
+        if not packet.session_id or not packet.monitors:
+            logger.error("Received MonitorListPacket with empty fields.")
+            return
+        SessionManager.handle_monitor_list(
+            packet.session_id, packet.monitors, packet.selected
+        )
+
+    @staticmethod
+    def __handle_monitor_select_packet(packet: MonitorSelectPacket):
+        """Xử lý MonitorSelectPacket - controller chọn monitor muốn xem"""
+        if not packet.session_id or not packet.monitors:
+            logger.error("Received MonitorSelectPacket with empty fields.")
+            return
+        from client.services.screen_share_service import screen_share_service
+
+        screen_share_service.select_monitors(packet.session_id, list(packet.monitors))
+
+    @staticmethod
+    def __handle_peer_candidates_packet(packet: PeerCandidatesPacket):
+        """Xử lý PeerCandidatesPacket - địa chỉ UDP của bên kia trong session"""
+        if not packet.session_id or not packet.token:
+            logger.error("Received PeerCandidatesPacket with empty fields.")
+            return
+        PeerMediaService.handle_candidates(
+            packet.session_id, packet.candidates, packet.token
+        )
+
+    @staticmethod
+    def __handle_cursor_packet(packet: CursorPacket):
+        """Xử lý CursorPacket - cập nhật overlay cursor của controller."""
+        if not packet.session_id or packet.position is None:
+            logger.error("Received CursorPacket with empty fields.")
+            return
+
+        SessionManager.handle_cursor_info(
+            packet.session_id,
+            packet.cursor_type,
+            packet.position,
+            packet.visible,
+            shape_id=packet.shape_id,
+            hotspot=packet.hotspot,
+            shape_data=packet.shape_data,
+            monitor=getattr(packet, "monitor", 1),
         )
 
     # ----------------------------
@@ -225,6 +329,11 @@ class ReceiveHandler:
             f"Executed mouse event: {packet.event_type.value} - Position: {packet.position} - Button: {packet.button.value}"
         )
 
+    @staticmethod
+    def __handle_pointer_motion_packet(packet: PointerMotionPacket):
+        """Xử lý PointerMotionPacket - di chuyển chuột trên máy host"""
+        MouseExecutorService.execute_pointer_motion(packet)
+
     @staticmethod
     def __handle_chat_message_packet(packet: ChatMessagePacket):
         """Xử lý ChatMessagePacket - hiển thị tin nhắn chat"""
@@ -249,6 +358,9 @@ class ReceiveHandler:
             packet.filename,
             packet.filesize,
             packet.sender_role,
+            packet.resume_id,
+            packet.file_count,
+            packet.delta,
         )
 
     @staticmethod
@@ -258,7 +370,9 @@ class ReceiveHandler:
             logger.error("Received FileAcceptPacket with empty fields.")
             return
 
-        SessionManager.handle_file_accept(packet.session_id, packet.file_id)
+        SessionManager.handle_file_accept(
+            packet.session_id, packet.file_id, packet.received_ranges
+        )
 
     @staticmethod
     def __handle_file_reject_packet(packet: FileRejectPacket):
@@ -282,6 +396,7 @@ class ReceiveHandler:
             packet.chunk_index,
             packet.chunk_data,
             packet.total_chunks,
+            packet.chunk_hash,
         )
 
     @staticmethod
@@ -292,5 +407,46 @@ class ReceiveHandler:
             return
 
         SessionManager.handle_file_complete(
-            packet.session_id, packet.file_id, packet.success, packet.message
+            packet.session_id,
+            packet.file_id,
+            packet.success,
+            packet.message,
+            packet.file_hash,
+        )
+
+    @staticmethod
+    def __handle_file_ack_packet(packet: FileAckPacket):
+        """Xử lý FileAckPacket - bên gửi nhận xác nhận chunk đã ghi"""
+        if not packet.file_id or not packet.ranges:
+            logger.error("Received FileAckPacket with empty fields.")
+            return
+
+        from client.services.file_transfer_service import FileTransferService
+
+        FileTransferService.handle_file_ack(packet.file_id, packet.ranges)
+
+    @staticmethod
+    def __handle_file_signature_packet(packet: FileSignaturePacket):
+        """Xử lý FileSignaturePacket - bên gửi nhận chấp nhận kèm checksum bản cũ"""
+        if not packet.session_id or not packet.file_id or packet.block_size <= 0:
+            logger.error("Received FileSignaturePacket with empty fields.")
+            return
+
+        SessionManager.handle_file_signature(
+            packet.session_id, packet.file_id, packet.block_size, packet.signature
+        )
+
+    @staticmethod
+    def __handle_file_delta_packet(packet: FileDeltaPacket):
+        """Xử lý FileDeltaPacket - nhận một đoạn delta của file"""
+        if not packet.session_id or not packet.file_id or packet.ops is None:
+            logger.error("Received FileDeltaPacket with empty fields.")
+            return
+
+        SessionManager.handle_file_delta(
+            packet.session_id,
+            packet.file_id,
+            packet.chunk_index,
+            packet.offset,
+            packet.ops,
         )
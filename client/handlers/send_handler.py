@@ -4,17 +4,27 @@ from common.packets import (
     AuthenticationPasswordPacket,
     ConnectionRequestPacket,
     KeyboardPacket,
+    KeyframeRequestPacket,
+    MonitorListPacket,
+    MonitorSelectPacket,
+    PeerCandidatesPacket,
     SessionPacket,
     VideoConfigPacket,
     VideoStreamPacket,
+    CursorPacket,
     ChatMessagePacket,
     FileMetadataPacket,
     FileAcceptPacket,
     FileRejectPacket,
     FileChunkPacket,
     FileCompletePacket,
+    FileAckPacket,
+    FileSignaturePacket,
+    FileDeltaPacket,
+    WindowUpdatePacket,
 )
 from common.enums import Status, KeyBoardEventType, KeyBoardType
+from common.protocol import FileRegion
 from client.managers.client_manager import ClientManager
 from client.services.sender_service import SenderService
 
@@ -63,6 +73,7 @@ class SendHandler:
         fps: int,
         codec: str,
         extradata: bytes,
+        monitor: int = 1,
     ):
         """Gửi VideoConfigPacket"""
         video_config_packet = VideoConfigPacket(
@@ -72,6 +83,7 @@ class SendHandler:
             fps=fps,
             codec=codec,
             extradata=extradata,
+            monitor=monitor,
         )
         SenderService.send_packet(video_config_packet)
 
@@ -81,16 +93,87 @@ class SendHandler:
         video_data: bytes,
         cursor_type: str | None = None,
         cursor_position: tuple[int, int] | None = None,
+        frame_seq: int = 0,
+        timestamps: dict[str, float] | None = None,
+        clock_offset: float | None = None,
+        keyframe: bool = False,
+        monitor: int = 1,
     ):
-        """Gửi VideoStreamPacket broadcast với thông tin cursor - server sẽ relay cho tất cả controller sessions"""
+        """Gửi VideoStreamPacket broadcast với thông tin cursor - server sẽ relay cho các controller session đang xem monitor"""
         video_stream_packet = VideoStreamPacket(
             session_id=None,
             video_data=video_data,
             cursor_type=cursor_type,
             cursor_position=cursor_position,
+            frame_seq=frame_seq,
+            timestamps=timestamps,
+            clock_offset=clock_offset,
+            keyframe=keyframe,
+            monitor=monitor,
         )
         SenderService.send_packet(video_stream_packet)
 
+    @classmethod
+    def send_keyframe_request_packet(cls, session_id: str, monitor: int | None = None):
+        """Gửi KeyframeRequestPacket - xin host gửi keyframe sau khi mất frame"""
+        keyframe_request_packet = KeyframeRequestPacket(
+            session_id=session_id, monitor=monitor
+        )
+        SenderService.send_packet(keyframe_request_packet)
+
+    @classmethod
+    def send_monitor_list_packet(
+        cls, session_id: str, monitors: list[dict[str, int]], selected: list[int]
+    ):
+        """Gửi MonitorListPacket - các monitor của host và monitor đang stream cho session"""
+        monitor_list_packet = MonitorListPacket(
+            session_id=session_id, monitors=monitors, selected=selected
+        )
+        SenderService.send_packet(monitor_list_packet)
+
+    @classmethod
+    def send_monitor_select_packet(cls, session_id: str, monitors: list[int]):
+        """Gửi MonitorSelectPacket - controller chọn monitor muốn xem"""
+        monitor_select_packet = MonitorSelectPacket(
+            session_id=session_id, monitors=monitors
+        )
+        SenderService.send_packet(monitor_select_packet)
+
+    @classmethod
+    def send_peer_candidates_packet(
+        cls, session_id: str, candidates: list[tuple[str, int]], token: bytes
+    ):
+        """Gửi PeerCandidatesPacket - địa chỉ UDP để bên kia thử kết nối trực tiếp"""
+        peer_candidates_packet = PeerCandidatesPacket(
+            session_id=session_id, candidates=candidates, token=token
+        )
+        SenderService.send_packet(peer_candidates_packet)
+
+    @classmethod
+    def send_cursor_packet(
+        cls,
+        session_id: str,
+        position: tuple[int, int],
+        visible: bool = True,
+        cursor_type: str = "normal",
+        shape_id: str | None = None,
+        hotspot: tuple[int, int] = (0, 0),
+        shape_data: bytes | None = None,
+        monitor: int = 1,
+    ):
+        """Gửi CursorPacket"""
+        cursor_packet = CursorPacket(
+            session_id=session_id,
+            position=position,
+            visible=visible,
+            cursor_type=cursor_type,
+            shape_id=shape_id,
+            hotspot=hotspot,
+            shape_data=shape_data,
+            monitor=monitor,
+        )
+        SenderService.send_packet(cursor_packet)
+
     @classmethod
     def send_keyboard_packet(
         cls,
@@ -130,6 +213,9 @@ class SendHandler:
         filename: str,
         filesize: int,
         sender_role: str,
+        resume_id: str | None = None,
+        file_count: int | None = None,
+        delta: bool = False,
     ):
         """Gửi FileMetadataPacket"""
         file_metadata_packet = FileMetadataPacket(
@@ -138,15 +224,24 @@ class SendHandler:
             filename=filename,
             filesize=filesize,
             sender_role=sender_role,
+            resume_id=resume_id,
+            file_count=file_count,
+            delta=delta,
         )
         SenderService.send_packet(file_metadata_packet)
 
     @classmethod
-    def send_file_accept_packet(cls, session_id: str, file_id: str):
+    def send_file_accept_packet(
+        cls,
+        session_id: str,
+        file_id: str,
+        received_ranges: list[tuple[int, int]] | None = None,
+    ):
         """Gửi FileAcceptPacket"""
         file_accept_packet = FileAcceptPacket(
             session_id=session_id,
             file_id=file_id,
+            received_ranges=received_ranges,
         )
         SenderService.send_packet(file_accept_packet)
 
@@ -165,8 +260,10 @@ class SendHandler:
         session_id: str,
         file_id: str,
         chunk_index: int,
-        chunk_data: bytes,
+        chunk_data: bytes | FileRegion,
         total_chunks: int,
+        chunk_hash: bytes | None = None,
+        compression: str | None = None,
     ):
         """Gửi FileChunkPacket"""
         file_chunk_packet = FileChunkPacket(
@@ -175,12 +272,19 @@ class SendHandler:
             chunk_index=chunk_index,
             chunk_data=chunk_data,
             total_chunks=total_chunks,
+            chunk_hash=chunk_hash,
+            compression=compression,
         )
         SenderService.send_packet(file_chunk_packet)
 
     @classmethod
     def send_file_complete_packet(
-        cls, session_id: str, file_id: str, success: bool, message: str = ""
+        cls,
+        session_id: str,
+        file_id: str,
+        success: bool,
+        message: str = "",
+        file_hash: str | None = None,
     ):
         """Gửi FileCompletePacket"""
         file_complete_packet = FileCompletePacket(
@@ -188,5 +292,60 @@ class SendHandler:
             file_id=file_id,
             success=success,
             message=message,
+            file_hash=file_hash,
         )
         SenderService.send_packet(file_complete_packet)
+
+    @classmethod
+    def send_file_ack_packet(
+        cls, session_id: str, file_id: str, ranges: list[tuple[int, int]]
+    ):
+        """Gửi FileAckPacket"""
+        file_ack_packet = FileAckPacket(
+            session_id=session_id,
+            file_id=file_id,
+            ranges=ranges,
+        )
+        SenderService.send_packet(file_ack_packet)
+
+    @classmethod
+    def send_file_signature_packet(
+        cls, session_id: str, file_id: str, block_size: int, signature: bytes
+    ):
+        """Gửi FileSignaturePacket"""
+        file_signature_packet = FileSignaturePacket(
+            session_id=session_id,
+            file_id=file_id,
+            block_size=block_size,
+            signature=signature,
+        )
+        SenderService.send_packet(file_signature_packet)
+
+    @classmethod
+    def send_file_delta_packet(
+        cls,
+        session_id: str,
+        file_id: str,
+        chunk_index: int,
+        offset: int,
+        ops: bytes,
+        compression: str | None = None,
+    ):
+        """Gửi FileDeltaPacket"""
+        file_delta_packet = FileDeltaPacket(
+            session_id=session_id,
+            file_id=file_id,
+            chunk_index=chunk_index,
+            offset=offset,
+            ops=ops,
+            compression=compression,
+        )
+        SenderService.send_packet(file_delta_packet)
+
+    @classmethod
+    def send_window_update_packet(cls, stream_id: str, increment: int):
+        """Gửi WindowUpdatePacket - trả credit của stream cho server"""
+        window_update_packet = WindowUpdatePacket(
+            stream_id=stream_id, increment=increment
+        )
+        SenderService.send_packet(window_update_packet)
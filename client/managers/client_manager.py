@@ -15,6 +15,10 @@ class ClientManager:
     __my_id: str = ""
     __custom_password: str | None = None  # Mật khẩu tự đặt
     __device_id: str = ""  # Hardware ID của máy
+    __server_clock_offset: float | None = None  # Ước lượng (server - local), giây
+    __resume_token: bytes | None = None  # Để kết nối lại mà giữ ID và session
+    __server: str = ""  # host:port của server - device key theo từng server
+    __device_key: bytes | None = None  # Để server cấp lại ID cố định của máy này
 
     @classmethod
     def generate_new_password(cls) -> str:
@@ -81,7 +85,60 @@ class ClientManager:
         """Lấy client ID đã được gán"""
         return cls.__my_id
 
+    @classmethod
+    def set_resume_token(cls, resume_token: bytes | None):
+        """Lưu token server cấp kèm ID (đổi sau mỗi lần kết nối)"""
+        cls.__resume_token = resume_token
+
+    @classmethod
+    def get_resume_token(cls) -> bytes | None:
+        return cls.__resume_token
+
+    @classmethod
+    def set_server(cls, host: str, port: int):
+        """Server đang dùng (trước khi kết nối)"""
+        cls.__server = f"{host}:{port}"
+        cls.__device_key = None
+
+    @classmethod
+    def get_device_key(cls) -> bytes | None:
+        """Device key đã lưu cho server, None nếu máy chưa đăng ký với server"""
+        if cls.__device_key is None:
+            try:
+                stored_key = PasswordManager.get_device_key(
+                    cls.__server, cls.__get_device_id()
+                )
+                if stored_key:
+                    cls.__device_key = bytes.fromhex(stored_key)
+            except Exception as e:
+                logger.debug(f"Failed to load device key: {e}")
+        return cls.__device_key
+
+    @classmethod
+    def set_device_key(cls, device_key: bytes | None):
+        """Lưu device key server cấp kèm ID (None = giữ key cũ)"""
+        if not device_key or device_key == cls.__device_key:
+            return
+        cls.__device_key = device_key
+        try:
+            PasswordManager.store_device_key(
+                cls.__server, cls.__get_device_id(), device_key.hex()
+            )
+        except Exception as e:
+            # Không lưu được: lần chạy sau máy này nhận ID mới
+            logger.warning(f"Failed to store device key: {e}")
+
     @classmethod
     def get_password(cls) -> str:
         """Lấy mật khẩu tạm thời hiện tại"""
         return cls.__my_password
+
+    @classmethod
+    def set_server_clock_offset(cls, offset: float | None):
+        """Cập nhật ước lượng clock offset giữa server và máy này"""
+        cls.__server_clock_offset = offset
+
+    @classmethod
+    def get_server_clock_offset(cls) -> float | None:
+        """Lấy ước lượng clock offset (server - local), None nếu chưa đo"""
+        return cls.__server_clock_offset
@@ -1,4 +1,7 @@
 import logging
+import os
+import time
+from threading import Thread
 from typing import Dict, Any, Optional
 from dataclasses import dataclass, field
 from PyQt5.QtGui import QPixmap, QImage
@@ -6,6 +9,21 @@ from common.h264 import H264Decoder
 
 logger = logging.getLogger(__name__)
 
+KEYFRAME_RETRY = 1.0  # Giây - xin lại keyframe nếu chưa tới (request cũng có thể mất)
+PRIMARY_MONITOR = 1
+
+
+@dataclass
+class MonitorView:
+    """Luồng video của một monitor của host mà controller đang xem."""
+
+    widget: Optional[Any] = None  # Cửa sổ riêng của monitor, None = cửa sổ chính
+    decoder: Optional[Any] = None
+    # frame_seq cuối cùng đã decode, chờ keyframe sau khi mất frame
+    last_frame_seq: Optional[int] = None
+    awaiting_keyframe: bool = True
+    keyframe_requested_at: float = 0.0
+
 
 @dataclass
 class SessionResources:
@@ -13,13 +31,19 @@ class SessionResources:
 
     role: str
     partner_hostname: str = "Unknown"
-    decoder: Optional[Any] = None
     widget: Optional[Any] = None
     chat_window: Optional[Any] = None  # Chat window for host role
     pending_file_transfers: Dict[str, Dict[str, Any]] = field(
         default_factory=dict
     )  # File transfer state
     chat_messages: list = field(default_factory=list)  # Store chat history
+    # Video: các monitor của host (MonitorListPacket) và monitor đang xem.
+    # Monitor nhỏ nhất hiện trên cửa sổ chính, các monitor khác mỗi cái một cửa sổ
+    monitors: list = field(default_factory=list)
+    views: Dict[int, MonitorView] = field(
+        default_factory=lambda: {PRIMARY_MONITOR: MonitorView()}
+    )
+    pending_monitor_selections: int = 0  # MonitorSelectPacket host chưa trả lời
 
 
 class SessionManager:
@@ -102,22 +126,25 @@ class SessionManager:
         height: int,
         fps: int,
         codec: str,
+        monitor: int = PRIMARY_MONITOR,
     ):
-        """Xử lý dữ liệu config video cho session."""
+        """Xử lý dữ liệu config video của một monitor cho session."""
         session = cls._sessions.get(session_id)
+        view = session.views.get(monitor) if session else None
+        widget = cls.__view_widget(session, view)
 
-        if not session or not session.widget:
+        if not view or not widget:
             logger.warning(
-                f"Cannot handle config data for unknown or incomplete session: {session_id}"
+                f"Cannot handle config data for unknown or incomplete session: {session_id} (monitor {monitor})"
             )
             return
 
-        session.decoder = H264Decoder(extradata=extradata)
+        view.decoder = H264Decoder(extradata=extradata)
+        view.awaiting_keyframe = True  # Decoder mới cần bắt đầu từ keyframe
+        view.keyframe_requested_at = 0.0
 
         try:
-            session.widget.controller.handle_video_config_received(
-                width, height, fps, codec
-            )
+            widget.controller.handle_video_config_received(width, height, fps, codec)
         except Exception as e:
             logger.error(
                 f"Error handling config data for session {session_id}: {e}",
@@ -131,6 +158,11 @@ class SessionManager:
         video_data: bytes,
         cursor_type: str | None = None,
         cursor_position: tuple[int, int] | None = None,
+        frame_seq: int = 0,
+        timestamps: dict[str, float] | None = None,
+        clock_offset: float | None = None,
+        keyframe: bool = False,
+        monitor: int = PRIMARY_MONITOR,
     ):
         """Xử lý dữ liệu video nhận được cho session. Có thể kèm cursor info."""
         session = cls._sessions.get(session_id)
@@ -138,20 +170,32 @@ class SessionManager:
             logger.warning(f"Received video data for unknown session: {session_id}")
             return
 
-        decoder = session.decoder
-        if not decoder:
-            logger.warning(f"No decoder found for session: {session_id}")
+        view = session.views.get(monitor)
+        if not view:
+            return  # Frame của monitor vừa thôi xem
+
+        decoder = view.decoder
+        widget = cls.__view_widget(session, view)
+        if not decoder or not widget:
+            logger.warning(
+                f"Incomplete session resources for session: {session_id} (monitor {monitor})"
+            )
             return
 
-        if not session or not session.decoder or not session.widget:
-            logger.warning(f"Incomplete session resources for session: {session_id}")
+        if not cls.__accept_video_frame(session_id, monitor, view, frame_seq, keyframe):
             return
 
         try:
-            pil_image = session.decoder.decode(video_data)
+            pil_image = decoder.decode(video_data)
             if not pil_image:
                 return  # Frame chưa hoàn chỉnh (B-frame)
 
+            if timestamps is not None:
+                timestamps["decode"] = time.monotonic()
+                widget.controller.record_frame_timing(
+                    frame_seq, timestamps, clock_offset
+                )
+
             # Chuyển PIL Image -> QPixmap
             img_data = pil_image.tobytes("raw", "RGB")
             qimage = QImage(
@@ -164,14 +208,14 @@ class SessionManager:
             pixmap = QPixmap.fromImage(qimage)
 
             # Gửi frame cho widget - Qt signals đã thread-safe, emit trực tiếp
-            session.widget.controller.frame_decoded.emit(pixmap)
+            widget.controller.frame_decoded.emit(pixmap)
 
             # Nếu có thông tin con trỏ, gửi luôn để overlay vẽ lên frame
             if cursor_type and cursor_position is not None:
                 try:
                     # visible default là True (chúng ta không gửi visible riêng)
-                    session.widget.controller.cursor_info_received.emit(
-                        cursor_type, cursor_position, True
+                    widget.controller.cursor_info_received.emit(
+                        cursor_type, cursor_position, True, ""
                     )
                 except Exception:
                     logger.debug(
@@ -185,9 +229,59 @@ class SessionManager:
                 exc_info=True,
             )
 
+    @staticmethod
+    def __view_widget(
+        session: SessionResources | None, view: MonitorView | None
+    ) -> Any | None:
+        """Cửa sổ hiển thị luồng video của monitor"""
+        if not session or not view:
+            return None
+        return view.widget or session.widget
+
+    @staticmethod
+    def __accept_video_frame(
+        session_id: str, monitor: int, view: MonitorView, frame_seq: int, keyframe: bool
+    ) -> bool:
+        """
+        Kiểm tra frame có decode được không: frame tới muộn bị bỏ, mất frame (gap
+        frame_seq) thì bỏ mọi frame tới keyframe tiếp theo và xin host gửi keyframe
+        """
+        last = view.last_frame_seq
+        if last is not None and frame_seq <= last:
+            return False
+        if last is not None and frame_seq != last + 1 and not view.awaiting_keyframe:
+            logger.debug(
+                f"Lost video frames {last + 1}..{frame_seq - 1} of monitor {monitor} in session {session_id}"
+            )
+            view.awaiting_keyframe = True
+            view.keyframe_requested_at = 0.0
+        view.last_frame_seq = frame_seq
+
+        if keyframe:
+            view.awaiting_keyframe = False
+            return True
+        if not view.awaiting_keyframe:
+            return True
+
+        now = time.monotonic()
+        if now - view.keyframe_requested_at >= KEYFRAME_RETRY:
+            view.keyframe_requested_at = now
+            from client.handlers.send_handler import SendHandler
+
+            SendHandler.send_keyframe_request_packet(session_id, monitor)
+        return False
+
     @classmethod
     def handle_cursor_info(
-        cls, session_id: str, cursor_type: str, position: tuple[int, int], visible: bool
+        cls,
+        session_id: str,
+        cursor_type: str,
+        position: tuple[int, int],
+        visible: bool,
+        shape_id: str | None = None,
+        hotspot: tuple[int, int] = (0, 0),
+        shape_data: bytes | None = None,
+        monitor: int = PRIMARY_MONITOR,
     ):
         """Xử lý thông tin cursor nhận được cho session."""
         session = cls._sessions.get(session_id)
@@ -197,14 +291,140 @@ class SessionManager:
             )
             return
 
+        widget = cls.__view_widget(session, session.views.get(monitor))
+        if not widget:
+            return  # Cursor của monitor vừa thôi xem
+
         try:
-            session.widget.controller.handle_cursor_info(cursor_type, position, visible)
+            widget.controller.handle_cursor_info(
+                cursor_type, position, visible, shape_id, hotspot, shape_data
+            )
         except Exception as e:
             logger.error(
                 f"Error handling cursor info for session {session_id}: {e}",
                 exc_info=True,
             )
 
+    # ---------
+    # Chọn monitor (controller)
+    # ---------
+
+    @classmethod
+    def handle_monitor_list(
+        cls, session_id: str, monitors: list[dict[str, int]], selected: list[int]
+    ):
+        """Host báo danh sách monitor và các monitor đang stream cho session."""
+        session = cls._sessions.get(session_id)
+        if not session or session.role != "controller":
+            return
+
+        session.monitors = list(monitors)
+        if session.pending_monitor_selections > 0:
+            session.pending_monitor_selections -= 1
+        # Còn lựa chọn mới hơn chưa được trả lời thì giữ các cửa sổ như hiện tại
+        applied = list(selected) if session.pending_monitor_selections == 0 else []
+
+        if session.widget:
+            session.widget.controller.monitors_received.emit(session.monitors, applied)
+
+    @classmethod
+    def get_monitors(cls, session_id: str) -> list[dict[str, int]]:
+        session = cls._sessions.get(session_id)
+        return list(session.monitors) if session else []
+
+    @classmethod
+    def get_shown_monitors(cls, session_id: str) -> list[int]:
+        session = cls._sessions.get(session_id)
+        return sorted(session.views) if session else []
+
+    @classmethod
+    def get_monitor_origin(cls, session_id: str, monitor: int) -> tuple[int, int]:
+        """Góc trên trái của monitor trên desktop ảo của host"""
+        session = cls._sessions.get(session_id)
+        if session:
+            for info in session.monitors:
+                if info.get("index") == monitor:
+                    return info["left"], info["top"]
+        return 0, 0
+
+    @classmethod
+    def select_monitors(cls, session_id: str, monitors: list[int]):
+        """
+        Controller chọn monitor muốn xem (gọi trên Qt main thread): mở / đóng
+        cửa sổ ngay rồi báo host; host gửi config của monitor mới.
+        """
+        session = cls._sessions.get(session_id)
+        if not session or session.role != "controller" or not monitors:
+            return
+
+        cls.show_monitors(session_id, monitors)
+        session.pending_monitor_selections += 1
+
+        from client.handlers.send_handler import SendHandler
+
+        SendHandler.send_monitor_select_packet(session_id, sorted(set(monitors)))
+
+    @classmethod
+    def show_monitors(cls, session_id: str, monitors: list[int]):
+        """
+        Đặt cửa sổ cho các monitor (gọi trên Qt main thread). Monitor đang xem
+        giữ decoder, chỉ đổi cửa sổ hiển thị nếu cần.
+        """
+        session = cls._sessions.get(session_id)
+        if not session or not monitors:
+            return
+
+        monitors = sorted(set(monitors))
+        previous, views = session.views, {}
+        for index in monitors:
+            view = previous.pop(index, None) or MonitorView()
+            if index == monitors[0]:
+                cls.__close_monitor_widget(view)
+            elif view.widget is None:
+                view.widget = cls.__create_monitor_widget(session_id, index)
+            views[index] = view
+        session.views = views
+
+        for view in previous.values():
+            cls.__close_monitor_widget(view)
+
+        if session.widget:
+            session.widget.controller.show_monitor(monitors[0])
+
+    @classmethod
+    def close_monitor_window(cls, session_id: str, monitor: int):
+        """Người dùng đóng cửa sổ riêng của một monitor - thôi xem monitor đó"""
+        session = cls._sessions.get(session_id)
+        if not session:
+            return
+        view = session.views.get(monitor)
+        if view and view.widget:
+            view.widget._closed_by_manager = True  # Cửa sổ đang tự đóng
+        remaining = [index for index in session.views if index != monitor]
+        if remaining:
+            cls.select_monitors(session_id, remaining)
+
+    @staticmethod
+    def __create_monitor_widget(session_id: str, monitor: int) -> Any:
+        from client.gui.remote_widget import RemoteWidget
+
+        widget = RemoteWidget(session_id, monitor=monitor)
+        widget.show()
+        return widget
+
+    @staticmethod
+    def __close_monitor_widget(view: MonitorView):
+        """Đóng cửa sổ riêng của monitor (monitor chuyển sang cửa sổ chính / thôi xem)"""
+        widget, view.widget = view.widget, None
+        if widget and hasattr(widget, "close"):
+            widget._closed_by_manager = True
+
+            from PyQt5.QtCore import QMetaObject, Qt
+
+            QMetaObject.invokeMethod(
+                widget, "close", Qt.ConnectionType.QueuedConnection
+            )
+
     # ---------
     # Xử lý khi session kết thúc
     # ---------
@@ -226,7 +446,19 @@ class SessionManager:
                 )
                 logger.info(f"Chat window closed for controller session {session_id}")
 
+            cls.stop_file_transfers(session_id)
+
+            for view in session.views.values():
+                cls.__close_monitor_widget(view)
+
             del cls._sessions[session_id]
+
+            from client.services.ping_service import PingService
+            from client.services.peer_media_service import PeerMediaService
+
+            PingService.remove_session(session_id)
+            PeerMediaService.remove_session(session_id)
+
             from client.handlers.send_handler import SendHandler
 
             logger.info(f"Send end session packet for: {session_id}")
@@ -251,9 +483,11 @@ class SessionManager:
 
                 ListenerService.stop_video_queue(session_id)
 
-                # Cleanup decoder trước
-                if session.decoder and hasattr(session.decoder, "close"):
-                    session.decoder.close()
+                # Cleanup decoder trước, đóng các cửa sổ monitor riêng
+                for view in session.views.values():
+                    if view.decoder and hasattr(view.decoder, "close"):
+                        view.decoder.close()
+                    cls.__close_monitor_widget(view)
 
                 # Đóng widget sau - phải đóng trong Qt main thread
                 if session.widget and hasattr(session.widget, "close"):
@@ -281,8 +515,12 @@ class SessionManager:
 
             elif session.role == "host":
                 from client.services.screen_share_service import screen_share_service
+                from client.services.input_executor_service import (
+                    InputExecutorService,
+                )
 
                 screen_share_service.remove_session(session_id)
+                InputExecutorService.remove_session(session_id)
 
                 # Close chat window
                 if session.chat_window and hasattr(session.chat_window, "close"):
@@ -297,8 +535,15 @@ class SessionManager:
                     f"Attempted to remove session with unknown role: {session_id}"
                 )
 
+            cls.stop_file_transfers(session_id)
             del cls._sessions[session_id]
 
+            from client.services.ping_service import PingService
+            from client.services.peer_media_service import PeerMediaService
+
+            PingService.remove_session(session_id)
+            PeerMediaService.remove_session(session_id)
+
             # Chỉ gửi end packet khi được yêu cầu (chủ động disconnect)
             if send_end_packet:
                 from client.handlers.send_handler import SendHandler
@@ -315,6 +560,42 @@ class SessionManager:
         else:
             logger.warning(f"Attempted to remove non-existent session: {session_id}")
 
+    @classmethod
+    def stop_file_transfers(cls, session_id: str):
+        """Dừng các file đang gửi; file đang nhận dở giữ lại để nhận tiếp"""
+        session = cls._sessions.get(session_id)
+        if not session:
+            return
+
+        from client.services.file_transfer_service import FileTransferService
+
+        FileTransferService.cancel_session_transfers(session_id)
+        transfers = list(session.pending_file_transfers.values())
+        session.pending_file_transfers.clear()
+        for transfer in transfers:
+            if transfer.get("writer"):
+                transfer["writer"].close()
+
+    @classmethod
+    def resume_sessions(cls):
+        """
+        Đã kết nối lại server và server còn giữ các session: không cần kết nối
+        lại với đối tác, chỉ cần keyframe mới vì frame trong lúc mất kết nối đã mất
+        """
+        from client.handlers.send_handler import SendHandler
+        from client.services.screen_share_service import screen_share_service
+
+        now = time.monotonic()
+        for session_id, session in list(cls._sessions.items()):
+            if session.role == "host":
+                screen_share_service.request_keyframe(session_id)
+            elif session.role == "controller":
+                for view in session.views.values():
+                    view.awaiting_keyframe = True
+                    view.keyframe_requested_at = now
+                SendHandler.send_keyframe_request_packet(session_id)
+        logger.info(f"Resumed {len(cls._sessions)} session(s) after reconnect")
+
     @classmethod
     def cleanup_all_sessions(cls):
         """Dọn dẹp tất cả sessions - dùng khi đóng ứng dụng."""
@@ -373,8 +654,11 @@ class SessionManager:
         filename: str,
         filesize: int,
         sender_role: str,
+        resume_id: str | None = None,
+        file_count: int | None = None,
+        delta: bool = False,
     ):
-        """Handle incoming file metadata"""
+        """Handle incoming file metadata - file_count khác None là thư mục / nhiều file"""
         session = cls._sessions.get(session_id)
         if not session:
             logger.warning(f"Received file metadata for unknown session: {session_id}")
@@ -384,8 +668,12 @@ class SessionManager:
         session.pending_file_transfers[file_id] = {
             "filename": filename,
             "filesize": filesize,
-            "chunks_received": [],
+            "resume_id": resume_id,
+            "file_count": file_count,
+            "delta": delta,  # Bên gửi gửi được delta nếu save_path đã có bản cũ
+            "writer": None,  # ChunkFileWriter / ArchiveWriter, tạo khi người dùng chọn nơi lưu
             "save_path": None,
+            "file_hash": None,  # Bên gửi báo trong FileCompletePacket
         }
 
         # Show accept/reject dialog in main thread
@@ -400,10 +688,133 @@ class SessionManager:
                 Q_ARG(str, filename),
                 Q_ARG(int, filesize),
                 Q_ARG(str, sender_role),
+                Q_ARG(int, -1 if file_count is None else file_count),
+            )
+
+    @classmethod
+    def accept_file_transfer(cls, session_id: str, file_id: str, save_path: str) -> bool:
+        """
+        Receiver chấp nhận file: tạo file tạm cấp phát trước (hoặc mở lại file
+        nhận dở của cùng file) rồi gửi FileAcceptPacket kèm các chunk đã có.
+        Với thư mục / nhiều file, save_path là thư mục đích để giải nén.
+        Nếu save_path đã có bản cũ và bên gửi hỗ trợ, trả lời bằng checksum
+        bản cũ (FileSignaturePacket) để chỉ nhận phần thay đổi.
+        Trả về False nếu không tạo được file (vd. không đủ dung lượng).
+        """
+        session = cls._sessions.get(session_id)
+        if not session:
+            return False
+
+        transfer = session.pending_file_transfers.get(file_id)
+        if not transfer:
+            logger.warning(f"File transfer {file_id} not found for session {session_id}")
+            return False
+
+        if transfer.get("delta") and cls.__has_delta_basis(save_path):
+            # Tính checksum file cũ mất vài giây với file lớn - không chặn UI
+            transfer["save_path"] = save_path
+            Thread(
+                target=cls.__accept_with_delta,
+                args=(session_id, file_id, save_path),
+                daemon=True,
+            ).start()
+            return True
+
+        return cls.__accept_full(session_id, file_id, transfer, save_path)
+
+    @staticmethod
+    def __has_delta_basis(save_path: str) -> bool:
+        """save_path có bản cũ đủ lớn để gửi delta (ưu tiên nhận tiếp nếu có file nhận dở)"""
+        from client.services.file_delta import DELTA_MIN_SIZE
+        from client.services.file_writer import MAP_SUFFIX, PART_SUFFIX
+
+        if os.path.exists(save_path + PART_SUFFIX + MAP_SUFFIX):
+            return False
+        try:
+            return os.path.isfile(save_path) and os.path.getsize(save_path) >= DELTA_MIN_SIZE
+        except OSError:
+            return False
+
+    @classmethod
+    def __accept_with_delta(cls, session_id: str, file_id: str, save_path: str):
+        """Tính checksum bản cũ rồi gửi FileSignaturePacket - lỗi thì nhận cả file"""
+        from client.handlers.send_handler import SendHandler
+        from client.services.file_delta import (
+            DeltaFileWriter,
+            choose_block_size,
+            compute_signature,
+        )
+        from client.services.file_transfer_service import CHUNK_SIZE
+
+        session = cls._sessions.get(session_id)
+        transfer = session.pending_file_transfers.get(file_id) if session else None
+        if not transfer:
+            return
+
+        try:
+            block_size = choose_block_size(os.path.getsize(save_path))
+            signature = compute_signature(save_path, block_size)
+            writer = DeltaFileWriter(
+                save_path, transfer["filesize"], CHUNK_SIZE, block_size
             )
+        except OSError as e:
+            logger.warning(
+                f"Cannot use {save_path} as delta basis ({e}), receiving the whole file"
+            )
+            if not cls.__accept_full(session_id, file_id, transfer, save_path):
+                SendHandler.send_file_reject_packet(session_id, file_id)
+                cls.__fail_file_receive(session_id, file_id, str(e))
+            return
+
+        if session_id not in cls._sessions:
+            # Phiên đã kết thúc trong lúc tính checksum
+            writer.abort()
+            return
+        transfer["writer"] = writer
+        SendHandler.send_file_signature_packet(session_id, file_id, block_size, signature)
+        logger.info(
+            f"Requested delta for {file_id}: {len(signature)} byte signature, {block_size} byte blocks"
+        )
 
     @classmethod
-    def handle_file_accept(cls, session_id: str, file_id: str):
+    def __accept_full(
+        cls, session_id: str, file_id: str, transfer: dict, save_path: str
+    ) -> bool:
+        """Tạo writer nhận cả file (hoặc archive) và gửi FileAcceptPacket"""
+        from client.handlers.send_handler import SendHandler
+        from client.services.file_transfer_service import CHUNK_SIZE
+        from client.services.file_archive import ArchiveWriter
+        from client.services.file_writer import ChunkFileWriter
+
+        try:
+            if transfer.get("file_count") is not None:
+                writer = ArchiveWriter(
+                    save_path, transfer["filesize"], CHUNK_SIZE, file_id
+                )
+            else:
+                writer = ChunkFileWriter(
+                    save_path, transfer["filesize"], CHUNK_SIZE, transfer["resume_id"]
+                )
+        except OSError as e:
+            logger.error(f"Cannot prepare {save_path} for file {file_id}: {e}")
+            return False
+
+        transfer["writer"] = writer
+        transfer["save_path"] = save_path
+        SendHandler.send_file_accept_packet(
+            session_id,
+            file_id,
+            writer.received_ranges() if writer.resumed_chunks else None,
+        )
+        return True
+
+    @classmethod
+    def handle_file_accept(
+        cls,
+        session_id: str,
+        file_id: str,
+        received_ranges: list[tuple[int, int]] | None = None,
+    ):
         """Handle file accept notification (sender receives this)"""
         session = cls._sessions.get(session_id)
         if not session:
@@ -418,7 +829,25 @@ class SessionManager:
         # Start sending chunks
         from client.services.file_transfer_service import FileTransferService
 
-        FileTransferService.start_sending_chunks(file_id)
+        FileTransferService.start_sending_chunks(file_id, received_ranges)
+
+    @classmethod
+    def handle_file_signature(
+        cls, session_id: str, file_id: str, block_size: int, signature: bytes
+    ):
+        """Receiver chấp nhận và đã có bản cũ - bên gửi chỉ gửi delta"""
+        session = cls._sessions.get(session_id)
+        if not session:
+            logger.warning(f"Received file signature for unknown session: {session_id}")
+            return
+
+        session.pending_file_transfers[file_id] = {
+            "save_path": None,
+        }
+
+        from client.services.file_transfer_service import FileTransferService
+
+        FileTransferService.start_sending_delta(file_id, block_size, signature)
 
     @classmethod
     def handle_file_reject(cls, session_id: str, file_id: str):
@@ -452,22 +881,83 @@ class SessionManager:
         chunk_index: int,
         chunk_data: bytes,
         total_chunks: int,
+        chunk_hash: bytes | None = None,
     ):
-        """Handle incoming file chunk"""
+        """Handle incoming file chunk - kiểm tra hash và ghi thẳng xuống đĩa tại offset của chunk"""
         session = cls._sessions.get(session_id)
         if not session:
             return
 
         transfer = session.pending_file_transfers.get(file_id)
-        if not transfer:
+        if not transfer or not hasattr(transfer.get("writer"), "write_chunk"):
             return
 
-        # Store chunk
-        transfer["chunks_received"].append((chunk_index, chunk_data))
+        from client.handlers.send_handler import SendHandler
+        from client.services.file_transfer_service import ACK_EVERY_CHUNKS
+
+        writer = transfer["writer"]
+        try:
+            finished = writer.write_chunk(chunk_index, chunk_data, chunk_hash)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error writing chunk {chunk_index} of file {file_id}: {e}")
+            # Giữ các chunk đã ghi đúng - gửi lại sẽ chỉ gửi phần còn thiếu
+            cls.__fail_file_receive(
+                session_id, file_id, str(e), notify_sender=True, keep_partial=True
+            )
+            return
+
+        # Xác nhận chunk đã ghi để bên gửi gửi tiếp (credit window)
+        ranges = writer.take_unacked(ACK_EVERY_CHUNKS)
+        if ranges:
+            SendHandler.send_file_ack_packet(session_id, file_id, ranges)
+
+        if finished:
+            cls.__finish_file_receive(session_id, file_id)
+
+    @classmethod
+    def handle_file_delta(
+        cls,
+        session_id: str,
+        file_id: str,
+        chunk_index: int,
+        offset: int,
+        ops: bytes,
+    ):
+        """Handle incoming delta - dựng phần file tương ứng từ bản cũ + literal"""
+        session = cls._sessions.get(session_id)
+        if not session:
+            return
+
+        transfer = session.pending_file_transfers.get(file_id)
+        if not transfer or not hasattr(transfer.get("writer"), "write_delta"):
+            return
+
+        from client.handlers.send_handler import SendHandler
+        from client.services.file_transfer_service import ACK_EVERY_CHUNKS
+
+        writer = transfer["writer"]
+        try:
+            finished = writer.write_delta(chunk_index, offset, ops)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error applying delta {chunk_index} of file {file_id}: {e}")
+            cls.__fail_file_receive(session_id, file_id, str(e), notify_sender=True)
+            return
+
+        ranges = writer.take_unacked(ACK_EVERY_CHUNKS)
+        if ranges:
+            SendHandler.send_file_ack_packet(session_id, file_id, ranges)
+
+        if finished:
+            cls.__finish_file_receive(session_id, file_id)
 
     @classmethod
     def handle_file_complete(
-        cls, session_id: str, file_id: str, success: bool, message: str
+        cls,
+        session_id: str,
+        file_id: str,
+        success: bool,
+        message: str,
+        file_hash: str | None = None,
     ):
         """Handle file transfer completion"""
         session = cls._sessions.get(session_id)
@@ -487,89 +977,121 @@ class SessionManager:
 
         if is_receiver:
             if success:
-                # Write all chunks to file
-                try:
-                    # Sort chunks by index
-                    chunks = sorted(transfer["chunks_received"], key=lambda x: x[0])
-                    with open(transfer["save_path"], "wb") as f:
-                        for _, chunk_data in chunks:
-                            f.write(chunk_data)
-
-                    logger.info(f"File {file_id} saved to {transfer['save_path']}")
-
-                    # Send confirmation back to sender
-                    from client.handlers.send_handler import SendHandler
-
-                    SendHandler.send_file_complete_packet(
-                        session_id=session_id,
-                        file_id=file_id,
-                        success=True,
-                        message="File saved successfully",
-                    )
+                # Chunk có thể vẫn đang được ghi trên thread khác - bên nào
+                # hoàn tất sau cùng sẽ finalize
+                transfer["file_hash"] = file_hash
+                if transfer["writer"].mark_sender_done():
+                    cls.__finish_file_receive(session_id, file_id)
+            else:
+                logger.warning(f"File transfer {file_id} failed: {message}")
+                cls.__fail_file_receive(
+                    session_id, file_id, message, keep_partial=True
+                )
+            return
 
-                    # Update UI in main thread
-                    if session.chat_window:
-                        from PyQt5.QtCore import QMetaObject, Qt, Q_ARG
-
-                        QMetaObject.invokeMethod(
-                            session.chat_window,
-                            "update_file_transfer_status",
-                            Qt.ConnectionType.QueuedConnection,
-                            Q_ARG(str, file_id),
-                            Q_ARG(str, "File Received"),
-                        )
-                except Exception as e:
-                    logger.error(f"Error saving file {file_id}: {e}")
-
-                    # Send failure confirmation back to sender
-                    from client.handlers.send_handler import SendHandler
-
-                    SendHandler.send_file_complete_packet(
-                        session_id=session_id,
-                        file_id=file_id,
-                        success=False,
-                        message=str(e),
-                    )
+        # Sender side
+        if not success:
+            # Receiver gave up (hash mismatch, write error...) - stop the thread
+            # still sending chunks instead of waiting for its ack timeout
+            from client.services.file_transfer_service import FileTransferService
 
-                    if session.chat_window:
-                        from PyQt5.QtCore import QMetaObject, Qt, Q_ARG
+            FileTransferService.cancel_transfer(file_id)
 
-                        QMetaObject.invokeMethod(
-                            session.chat_window,
-                            "update_file_transfer_status",
-                            Qt.ConnectionType.QueuedConnection,
-                            Q_ARG(str, file_id),
-                            Q_ARG(str, "Failed"),
-                        )
+        cls.__update_file_transfer_status(
+            session, file_id, "File Sent" if success else "Failed"
+        )
+
+        # Remove from pending
+        session.pending_file_transfers.pop(file_id, None)
+
+    @classmethod
+    def __finish_file_receive(cls, session_id: str, file_id: str):
+        """Đổi tên file tạm sang save_path và báo cho bên gửi"""
+        from client.handlers.send_handler import SendHandler
+
+        session = cls._sessions.get(session_id)
+        if not session:
+            return
+        transfer = session.pending_file_transfers.pop(file_id, None)
+        if not transfer:
+            return
+
+        try:
+            transfer["writer"].finalize(transfer.get("file_hash"))
+        except (OSError, ValueError) as e:
+            logger.error(f"Error saving file {file_id}: {e}")
+            transfer["writer"].abort()
+            SendHandler.send_file_complete_packet(
+                session_id=session_id,
+                file_id=file_id,
+                success=False,
+                message=str(e),
+            )
+            cls.__update_file_transfer_status(session, file_id, "Failed")
+            return
+
+        logger.info(f"File {file_id} saved to {transfer['save_path']}")
+
+        # Send confirmation back to sender
+        SendHandler.send_file_complete_packet(
+            session_id=session_id,
+            file_id=file_id,
+            success=True,
+            message="File saved successfully",
+        )
+        cls.__update_file_transfer_status(session, file_id, "File Received")
+
+    @classmethod
+    def __fail_file_receive(
+        cls,
+        session_id: str,
+        file_id: str,
+        message: str,
+        notify_sender: bool = False,
+        keep_partial: bool = False,
+    ):
+        """Hủy file đang nhận - giữ file tạm để nhận tiếp nếu keep_partial"""
+        session = cls._sessions.get(session_id)
+        if not session:
+            return
+        transfer = session.pending_file_transfers.pop(file_id, None)
+        if not transfer:
+            return
+
+        if transfer.get("writer"):
+            if keep_partial:
+                transfer["writer"].close()
             else:
-                logger.warning(f"File transfer {file_id} failed: {message}")
-                if session.chat_window:
-                    from PyQt5.QtCore import QMetaObject, Qt, Q_ARG
+                transfer["writer"].abort()
 
-                    QMetaObject.invokeMethod(
-                        session.chat_window,
-                        "update_file_transfer_status",
-                        Qt.ConnectionType.QueuedConnection,
-                        Q_ARG(str, file_id),
-                        Q_ARG(str, "Failed"),
-                    )
-        else:
-            # Sender side
-            if session.chat_window:
-                from PyQt5.QtCore import QMetaObject, Qt, Q_ARG
+        if notify_sender:
+            from client.handlers.send_handler import SendHandler
 
-                status = "File Sent" if success else "Failed"
-                QMetaObject.invokeMethod(
-                    session.chat_window,
-                    "update_file_transfer_status",
-                    Qt.ConnectionType.QueuedConnection,
-                    Q_ARG(str, file_id),
-                    Q_ARG(str, status),
-                )
+            SendHandler.send_file_complete_packet(
+                session_id=session_id,
+                file_id=file_id,
+                success=False,
+                message=message,
+            )
+        cls.__update_file_transfer_status(session, file_id, "Failed")
 
-        # Remove from pending
-        if file_id in session.pending_file_transfers:
-            del session.pending_file_transfers[file_id]
+    @staticmethod
+    def __update_file_transfer_status(
+        session: SessionResources, file_id: str, status: str
+    ):
+        """Update UI in main thread"""
+        if not session.chat_window:
+            return
+
+        from PyQt5.QtCore import QMetaObject, Qt, Q_ARG
+
+        QMetaObject.invokeMethod(
+            session.chat_window,
+            "update_file_transfer_status",
+            Qt.ConnectionType.QueuedConnection,
+            Q_ARG(str, file_id),
+            Q_ARG(str, status),
+        )
 
     @classmethod
     def get_all_sessions_info(cls) -> Dict[str, Dict[str, Any]]:
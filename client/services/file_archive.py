@@ -0,0 +1,350 @@
+import logging
+import os
+import shutil
+import struct
+import threading
+
+from client.services.file_writer import (
+    DIGEST_SIZE,
+    chunk_digest,
+    new_file_hasher,
+    to_ranges,
+)
+
+logger = logging.getLogger(__name__)
+
+# Archive = chuỗi entry liên tiếp: header + tên (UTF-8, phân cách "/") + dữ liệu.
+# Không có padding nên nhiều file nhỏ nằm chung một chunk.
+ENTRY_HEADER = struct.Struct("<BHQ")  # kind, name_len, size
+ENTRY_FILE = 0
+ENTRY_DIR = 1
+
+READ_SIZE = 256 * 1024
+
+# (đường dẫn nguồn, tên trong archive, kind, size)
+ArchiveEntry = tuple[str, str, int, int]
+
+
+def collect_entries(paths: list[str]) -> list[ArchiveEntry]:
+    """
+    Liệt kê các file / thư mục cần gửi. Mỗi path được đặt ở gốc archive theo
+    tên của nó, thư mục được duyệt đệ quy (bỏ qua symlink và file đặc biệt).
+    """
+    entries: list[ArchiveEntry] = []
+    for path in paths:
+        path = os.path.abspath(path)
+        base_dir = os.path.dirname(path)
+
+        if os.path.isfile(path):
+            entries.append(
+                (path, os.path.basename(path), ENTRY_FILE, os.path.getsize(path))
+            )
+            continue
+        if not os.path.isdir(path):
+            logger.warning(f"Skipping {path}: not a regular file or directory")
+            continue
+
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            files.sort()
+            rel_root = os.path.relpath(root, base_dir)
+            entries.append((root, _archive_name(rel_root), ENTRY_DIR, 0))
+            for name in files:
+                full_path = os.path.join(root, name)
+                if os.path.islink(full_path) or not os.path.isfile(full_path):
+                    continue
+                entries.append(
+                    (
+                        full_path,
+                        _archive_name(os.path.join(rel_root, name)),
+                        ENTRY_FILE,
+                        os.path.getsize(full_path),
+                    )
+                )
+    return entries
+
+
+def archive_size(entries: list[ArchiveEntry]) -> int:
+    """Kích thước chính xác của archive - biết trước để chia chunk như một file"""
+    return sum(
+        ENTRY_HEADER.size + len(name.encode()) + size for _, name, _, size in entries
+    )
+
+
+def _archive_name(rel_path: str) -> str:
+    return rel_path.replace(os.sep, "/")
+
+
+class ArchiveReader:
+    """
+    Đọc archive như một file (read(n)) - header và dữ liệu được sinh dần khi
+    đọc, không tạo file archive tạm trên đĩa.
+    """
+
+    def __init__(self, entries: list[ArchiveEntry]):
+        self.__parts = self.__iter_parts(entries)
+        self.__buffer = bytearray()
+
+    @staticmethod
+    def __iter_parts(entries: list[ArchiveEntry]):
+        for source, name, kind, size in entries:
+            encoded_name = name.encode()
+            yield ENTRY_HEADER.pack(kind, len(encoded_name), size) + encoded_name
+            if kind != ENTRY_FILE or not size:
+                continue
+
+            # Chỉ gửi đúng size đã khai báo trong metadata
+            with open(source, "rb") as f:
+                remaining = size
+                while remaining:
+                    data = f.read(min(remaining, READ_SIZE))
+                    if not data:
+                        raise OSError(f"{source} changed during transfer")
+                    remaining -= len(data)
+                    yield data
+
+    def read(self, size: int) -> bytes:
+        while len(self.__buffer) < size:
+            part = next(self.__parts, None)
+            if part is None:
+                break
+            self.__buffer += part
+        data = bytes(self.__buffer[:size])
+        del self.__buffer[:size]
+        return data
+
+    def close(self):
+        self.__parts.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ArchiveExtractor:
+    """Giải nén archive theo luồng - feed() dữ liệu liên tiếp theo thứ tự"""
+
+    def __init__(self, dest_dir: str):
+        self.dest_dir = dest_dir
+        self.file_count = 0
+        self.__header = bytearray()
+        self.__file = None
+        self.__remaining = 0
+
+    def feed(self, data: bytes):
+        view = memoryview(data)
+        while view:
+            if self.__file is not None:
+                size = min(self.__remaining, len(view))
+                self.__file.write(view[:size])
+                self.__remaining -= size
+                view = view[size:]
+                if not self.__remaining:
+                    self.__close_file()
+                continue
+
+            needed = ENTRY_HEADER.size
+            if len(self.__header) >= ENTRY_HEADER.size:
+                needed += ENTRY_HEADER.unpack_from(self.__header)[1]
+            take = min(needed - len(self.__header), len(view))
+            self.__header += view[:take]
+            view = view[take:]
+
+            if len(self.__header) == ENTRY_HEADER.size:
+                # Vừa đủ header - còn phải đọc tên (name_len > 0)
+                if not ENTRY_HEADER.unpack_from(self.__header)[1]:
+                    raise ValueError("Archive entry without a name")
+                continue
+            if len(self.__header) == needed:
+                self.__start_entry()
+
+    def __start_entry(self):
+        kind, name_len, size = ENTRY_HEADER.unpack_from(self.__header)
+        name = bytes(self.__header[ENTRY_HEADER.size :]).decode()
+        self.__header.clear()
+        path = self.__safe_path(name)
+
+        if kind == ENTRY_DIR:
+            os.makedirs(path, exist_ok=True)
+            return
+        if kind != ENTRY_FILE:
+            raise ValueError(f"Unknown archive entry kind {kind}")
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.__file = open(path, "wb")
+        self.__remaining = size
+        self.file_count += 1
+        if not size:
+            self.__close_file()
+
+    def __safe_path(self, name: str) -> str:
+        """Chặn đường dẫn tuyệt đối / ".." - chỉ được ghi trong dest_dir"""
+        parts = name.split("/")
+        if any(
+            part in ("", ".", "..") or "\\" in part or ":" in part for part in parts
+        ):
+            raise ValueError(f"Unsafe path in archive: {name!r}")
+        return os.path.join(self.dest_dir, *parts)
+
+    def __close_file(self):
+        self.__file.close()
+        self.__file = None
+
+    def finish(self):
+        """Kiểm tra archive đã kết thúc trọn vẹn"""
+        if self.__file is not None or self.__header:
+            raise ValueError("Archive truncated")
+
+    def close(self):
+        if self.__file is not None:
+            self.__close_file()
+
+
+class ArchiveWriter:
+    """
+    Nhận archive (thư mục / nhiều file) qua cùng pipeline chunk với
+    ChunkFileWriter và giải nén ngay khi có đoạn dữ liệu liên tiếp vào thư mục
+    tạm trong save_dir. Chunk đến sớm được giữ trong bộ nhớ tới khi chunk trước
+    đến - bị giới hạn bởi credit window vì chỉ chunk đã giải nén mới được ack.
+
+    Cùng interface với ChunkFileWriter; archive không nhận tiếp được nên
+    close() cũng xóa thư mục tạm.
+    """
+
+    def __init__(self, save_dir: str, filesize: int, chunk_size: int, file_id: str):
+        self.save_path = save_dir
+        self.staging_path = os.path.join(save_dir, f".{file_id}.part")
+        self.filesize = filesize
+        self.chunk_size = chunk_size
+        self.total_chunks = (filesize + chunk_size - 1) // chunk_size
+        self.resumed_chunks = 0
+
+        self.__lock = threading.Lock()
+        self.__received = bytearray(self.total_chunks)
+        self.__digests = bytearray(self.total_chunks * DIGEST_SIZE)
+        self.__pending: dict[int, bytes] = {}
+        self.__next_index = 0  # Chunk tiếp theo cần giải nén
+        self.__unacked: list[int] = []
+        self.__sender_done = False
+        self.__finished = False
+
+        os.makedirs(self.staging_path)
+        self.__extractor = ArchiveExtractor(self.staging_path)
+
+    def write_chunk(
+        self, chunk_index: int, chunk_data: bytes, chunk_hash: bytes | None = None
+    ) -> bool:
+        """
+        Kiểm tra chunk và giải nén phần dữ liệu đã liên tiếp. Trả về True nếu
+        lần ghi này hoàn tất archive - khi đó người gọi phải finalize().
+        """
+        if not 0 <= chunk_index < self.total_chunks:
+            raise ValueError(
+                f"Chunk index {chunk_index} out of range (total {self.total_chunks})"
+            )
+
+        expected = min(self.chunk_size, self.filesize - chunk_index * self.chunk_size)
+        if len(chunk_data) != expected:
+            raise ValueError(
+                f"Chunk {chunk_index} has {len(chunk_data)} bytes, expected {expected}"
+            )
+
+        digest = chunk_digest(chunk_data)
+        if chunk_hash is not None and digest != chunk_hash:
+            raise ValueError(f"Chunk {chunk_index} hash mismatch")
+
+        with self.__lock:
+            if self.__received[chunk_index]:
+                return False
+            self.__received[chunk_index] = 1
+            offset = chunk_index * DIGEST_SIZE
+            self.__digests[offset : offset + DIGEST_SIZE] = digest
+            self.__pending[chunk_index] = chunk_data
+
+            while self.__next_index in self.__pending:
+                self.__extractor.feed(self.__pending.pop(self.__next_index))
+                self.__unacked.append(self.__next_index)
+                self.__next_index += 1
+            return self.__claim_finish()
+
+    def mark_sender_done(self) -> bool:
+        """Bên gửi báo đã gửi hết. Trả về True nếu archive đã giải nén xong"""
+        with self.__lock:
+            self.__sender_done = True
+            return self.__claim_finish()
+
+    def __claim_finish(self) -> bool:
+        if (
+            self.__finished
+            or not self.__sender_done
+            or self.__next_index < self.total_chunks
+        ):
+            return False
+        self.__finished = True
+        return True
+
+    @property
+    def received_count(self) -> int:
+        return self.__next_index
+
+    @property
+    def file_count(self) -> int:
+        return self.__extractor.file_count
+
+    def received_ranges(self) -> list[tuple[int, int]]:
+        return []
+
+    def take_unacked(self, min_count: int = 1) -> list[tuple[int, int]]:
+        """Các chunk đã giải nén chưa xác nhận dưới dạng khoảng [start, end)"""
+        with self.__lock:
+            if len(self.__unacked) < min_count:
+                return []
+            indices = self.__unacked[:]
+            self.__unacked.clear()
+        return to_ranges(indices)
+
+    def file_hash(self) -> str:
+        hasher = new_file_hasher()
+        with self.__lock:
+            hasher.update(self.__digests)
+        return hasher.hexdigest()
+
+    def finalize(self, expected_hash: str | None = None):
+        """
+        Kiểm tra hash, chuyển các mục ở gốc archive từ thư mục tạm sang
+        save_dir (thêm hậu tố " (n)" nếu trùng tên) rồi xóa thư mục tạm.
+        """
+        if expected_hash is not None and self.file_hash() != expected_hash:
+            raise ValueError("File hash mismatch")
+        self.__extractor.finish()
+        self.__extractor.close()
+
+        for name in sorted(os.listdir(self.staging_path)):
+            os.replace(
+                os.path.join(self.staging_path, name),
+                _unique_path(os.path.join(self.save_path, name)),
+            )
+        os.rmdir(self.staging_path)
+
+    def close(self):
+        self.abort()
+
+    def abort(self):
+        """Hủy nhận - xóa thư mục tạm"""
+        with self.__lock:
+            self.__pending.clear()
+            self.__extractor.close()
+        shutil.rmtree(self.staging_path, ignore_errors=True)
+
+
+def _unique_path(path: str) -> str:
+    """path nếu chưa tồn tại, ngược lại "name (2).ext", "name (3).ext", ..."""
+    if not os.path.exists(path):
+        return path
+    root, ext = os.path.splitext(path)
+    n = 2
+    while os.path.exists(f"{root} ({n}){ext}"):
+        n += 1
+    return f"{root} ({n}){ext}"
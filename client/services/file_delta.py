@@ -0,0 +1,366 @@
+import hashlib
+import logging
+import math
+import os
+import struct
+import threading
+import zlib
+
+from client.services.file_writer import (
+    PART_SUFFIX,
+    chunk_digest,
+    new_file_hasher,
+    preallocate,
+    read_at,
+    to_ranges,
+    write_at,
+)
+
+logger = logging.getLogger(__name__)
+
+# Kiểu rsync: receiver gửi checksum từng block của file cũ tại save_path,
+# sender chỉ gửi dữ liệu mới (literal) và tham chiếu tới block receiver đã có.
+DELTA_MIN_SIZE = 1024 * 1024  # File cũ nhỏ hơn thì gửi nguyên file
+MIN_BLOCK_SIZE = 2 * 1024
+MAX_BLOCK_SIZE = 64 * 1024
+
+STRONG_SIZE = 16
+BLOCK_SIGNATURE = struct.Struct("<I16s")  # adler32 (rolling), BLAKE2b-128
+OP_COPY = struct.Struct("<cII")  # b"C", block_index, block_count
+OP_LITERAL = struct.Struct("<cI")  # b"L", length + dữ liệu
+MAX_PACKET_SPAN = 64 * 1024 * 1024  # Output tối đa một FileDeltaPacket mô tả
+PROBE_BLOCKS = 16  # Số vị trí block phía trước được thử trước khi cuộn từng byte
+
+_ADLER_MOD = 65521
+_COPY_READ_SIZE = 1024 * 1024
+
+
+def choose_block_size(basis_size: int) -> int:
+    """Block ~ sqrt(kích thước file) như rsync, làm tròn xuống bội số 1 KiB"""
+    block_size = int(math.sqrt(basis_size)) & ~1023
+    return min(max(block_size, MIN_BLOCK_SIZE), MAX_BLOCK_SIZE)
+
+
+def _strong(block: bytes) -> bytes:
+    return hashlib.blake2b(block, digest_size=STRONG_SIZE).digest()
+
+
+def compute_signature(path: str, block_size: int) -> bytes:
+    """Checksum các block đầy đủ của file (block cuối thiếu được bỏ qua)"""
+    parts = []
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if len(block) < block_size:
+                break
+            parts.append(BLOCK_SIGNATURE.pack(zlib.adler32(block), _strong(block)))
+    return b"".join(parts)
+
+
+class DeltaEncoder:
+    """
+    Duyệt file mới (bytes / mmap) và sinh các FileDeltaPacket dưới dạng
+    (offset, ops, out_len): ops ghi ra output bắt đầu từ offset, dài out_len.
+
+    Mỗi vị trí block được kiểm tra trước (một lần adler32 bằng C). Khi không
+    khớp, thử tiếp vài vị trí block phía trước: nếu có block khớp thì dữ liệu
+    chỉ bị sửa tại chỗ. Chỉ khi không có mới cuộn checksum từng byte (chậm, bằng
+    Python) để tìm lại block bị lệch do chèn / xóa dữ liệu.
+    """
+
+    def __init__(self, data, block_size: int, signature: bytes, packet_size: int):
+        self.data = data
+        self.block_size = block_size
+        self.packet_size = packet_size
+        self.__table: dict[int, dict[bytes, int]] = {}
+        for block_index, (weak, strong) in enumerate(
+            BLOCK_SIGNATURE.iter_unpack(signature)
+        ):
+            self.__table.setdefault(weak, {}).setdefault(strong, block_index)
+
+        self.__ops = bytearray()
+        self.__packet_offset = 0
+        self.__out_len = 0
+        self.__copy_start = 0
+        self.__copy_count = 0
+
+    def __iter__(self):
+        data = self.data
+        block_size = self.block_size
+        size = len(data)
+        last = size - block_size
+        literal_start = pos = 0
+
+        while pos <= last:
+            block_index = self.__match(pos, zlib.adler32(data[pos : pos + block_size]))
+            if block_index is None:
+                found = self.__probe_aligned(pos, last) or self.__roll(pos, last)
+                if found is None:
+                    pos += block_size
+                    continue
+                pos, block_index = found
+
+            yield from self.__add_literal(literal_start, pos)
+            yield from self.__add_copy(block_index)
+            pos += block_size
+            literal_start = pos
+
+        yield from self.__add_literal(literal_start, size)
+        packet = self.__flush()
+        if packet:
+            yield packet
+
+    def __match(self, pos: int, weak: int) -> int | None:
+        strongs = self.__table.get(weak)
+        if strongs is None:
+            return None
+        return strongs.get(_strong(self.data[pos : pos + self.block_size]))
+
+    def __probe_aligned(self, pos: int, last: int) -> tuple[int, int] | None:
+        """Vị trí block đầu tiên phía sau pos (cùng căn lề) khớp với một block cũ"""
+        block_size = self.block_size
+        for step in range(1, PROBE_BLOCKS + 1):
+            probe = pos + step * block_size
+            if probe > last:
+                break
+            block_index = self.__match(
+                probe, zlib.adler32(self.data[probe : probe + block_size])
+            )
+            if block_index is not None:
+                return probe, block_index
+        return None
+
+    def __roll(self, pos: int, last: int) -> tuple[int, int] | None:
+        """Cuộn cửa sổ từ pos+1 tới hết block hiện tại, trả về (vị trí, block) khớp đầu tiên"""
+        data = self.data
+        table = self.__table
+        block_size = self.block_size
+        weak = zlib.adler32(data[pos : pos + block_size])
+        a = weak & 0xFFFF
+        b = weak >> 16
+
+        for start in range(pos, min(pos + block_size, last + 1) - 1):
+            removed = data[start]
+            a = (a - removed + data[start + block_size]) % _ADLER_MOD
+            b = (b - block_size * removed + a - 1) % _ADLER_MOD
+            weak = (b << 16) | a
+            if weak in table:
+                block_index = self.__match(start + 1, weak)
+                if block_index is not None:
+                    return start + 1, block_index
+        return None
+
+    def __add_literal(self, start: int, end: int):
+        while start < end:
+            self.__end_copy_run()
+            length = min(end - start, self.packet_size)
+            self.__ops += OP_LITERAL.pack(b"L", length)
+            self.__ops += self.data[start : start + length]
+            self.__out_len += length
+            start += length
+            packet = self.__flush_if_full()
+            if packet:
+                yield packet
+
+    def __add_copy(self, block_index: int):
+        if self.__copy_count and block_index == self.__copy_start + self.__copy_count:
+            self.__copy_count += 1
+        else:
+            self.__end_copy_run()
+            self.__copy_start = block_index
+            self.__copy_count = 1
+        self.__out_len += self.block_size
+        packet = self.__flush_if_full()
+        if packet:
+            yield packet
+
+    def __end_copy_run(self):
+        if self.__copy_count:
+            self.__ops += OP_COPY.pack(b"C", self.__copy_start, self.__copy_count)
+            self.__copy_count = 0
+
+    def __flush_if_full(self):
+        if len(self.__ops) >= self.packet_size or self.__out_len >= MAX_PACKET_SPAN:
+            return self.__flush()
+        return None
+
+    def __flush(self) -> tuple[int, bytes, int] | None:
+        self.__end_copy_run()
+        if not self.__out_len:
+            return None
+        packet = (self.__packet_offset, bytes(self.__ops), self.__out_len)
+        self.__packet_offset += self.__out_len
+        self.__ops.clear()
+        self.__out_len = 0
+        return packet
+
+
+class DeltaFileWriter:
+    """
+    Dựng file mới từ FileDeltaPacket: block tham chiếu đọc từ file cũ
+    (save_path), literal lấy từ packet, ghi vào <save_path>.part tại offset của
+    packet nên packet có thể tới không theo thứ tự. Hoàn tất khi đã ghi đủ
+    filesize byte VÀ bên gửi báo FileComplete; finalize() đọc lại file để so
+    hash cả file với bên gửi rồi mới thay file cũ.
+
+    Cùng interface với ChunkFileWriter; delta không nhận tiếp được nên close()
+    cũng xóa file tạm.
+    """
+
+    def __init__(self, save_path: str, filesize: int, chunk_size: int, block_size: int):
+        self.save_path = save_path
+        self.part_path = save_path + PART_SUFFIX
+        self.filesize = filesize
+        self.chunk_size = chunk_size
+        self.block_size = block_size
+        self.resumed_chunks = 0
+
+        self.__lock = threading.Lock()
+        # close() chờ các lần ghi đang chạy xong rồi mới đóng fd
+        self.__writes_done = threading.Condition(self.__lock)
+        self.__writing = 0
+        self.__written = 0
+        self.__unacked: list[int] = []
+        self.__sender_done = False
+        self.__finished = False
+
+        self.__basis_fd = os.open(save_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        self.__basis_blocks = os.fstat(self.__basis_fd).st_size // block_size
+        self.__fd = None
+        try:
+            flags = os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+            self.__fd = os.open(self.part_path, flags, 0o644)
+            preallocate(self.__fd, filesize)
+        except OSError:
+            self.abort()
+            raise
+
+    def write_delta(self, chunk_index: int, offset: int, ops: bytes) -> bool:
+        """
+        Áp dụng một FileDeltaPacket. Trả về True nếu lần ghi này hoàn tất file
+        (bên gửi đã báo xong) - khi đó người gọi phải finalize().
+        """
+        with self.__lock:
+            if self.__fd is None:
+                raise ValueError(f"Writer for {self.save_path} is closed")
+            fd, basis_fd = self.__fd, self.__basis_fd
+            self.__writing += 1
+        pos = offset
+        try:
+            i = 0
+            while i < len(ops):
+                code = ops[i : i + 1]
+                if code == b"C":
+                    _, block_index, block_count = OP_COPY.unpack_from(ops, i)
+                    i += OP_COPY.size
+                    if block_index + block_count > self.__basis_blocks:
+                        raise ValueError(f"Delta references missing block {block_index}")
+                    length = block_count * self.block_size
+                    self.__check_bounds(pos, length)
+                    self.__copy_blocks(
+                        basis_fd, fd, block_index * self.block_size, pos, length
+                    )
+                elif code == b"L":
+                    _, length = OP_LITERAL.unpack_from(ops, i)
+                    i += OP_LITERAL.size
+                    if i + length > len(ops):
+                        raise ValueError("Truncated delta literal")
+                    self.__check_bounds(pos, length)
+                    write_at(fd, ops[i : i + length], pos)
+                    i += length
+                else:
+                    raise ValueError(f"Unknown delta op {code!r}")
+                pos += length
+        finally:
+            with self.__lock:
+                self.__writing -= 1
+                if not self.__writing:
+                    self.__writes_done.notify_all()
+
+        with self.__lock:
+            self.__written += pos - offset
+            self.__unacked.append(chunk_index)
+            return self.__claim_finish()
+
+    def __check_bounds(self, pos: int, length: int):
+        if pos + length > self.filesize:
+            raise ValueError(f"Delta writes past end of file ({pos + length} > {self.filesize})")
+
+    @staticmethod
+    def __copy_blocks(basis_fd: int, fd: int, src: int, dst: int, length: int):
+        while length:
+            data = read_at(basis_fd, min(length, _COPY_READ_SIZE), src)
+            if not data:
+                raise ValueError("Basis file changed during transfer")
+            write_at(fd, data, dst)
+            src += len(data)
+            dst += len(data)
+            length -= len(data)
+
+    def mark_sender_done(self) -> bool:
+        """Bên gửi báo đã gửi hết. Trả về True nếu đã ghi đủ file"""
+        with self.__lock:
+            self.__sender_done = True
+            return self.__claim_finish()
+
+    def __claim_finish(self) -> bool:
+        if (
+            self.__finished
+            or not self.__sender_done
+            or self.__written < self.filesize
+        ):
+            return False
+        self.__finished = True
+        return True
+
+    @property
+    def received_count(self) -> int:
+        return self.__written
+
+    def received_ranges(self) -> list[tuple[int, int]]:
+        return []
+
+    def take_unacked(self, min_count: int = 1) -> list[tuple[int, int]]:
+        """Các FileDeltaPacket đã ghi chưa xác nhận dưới dạng khoảng [start, end)"""
+        with self.__lock:
+            if len(self.__unacked) < min_count:
+                return []
+            indices = sorted(self.__unacked)
+            self.__unacked.clear()
+        return to_ranges(indices)
+
+    def file_hash(self) -> str:
+        """Hash cả file giống ChunkFileWriter (hash của các chunk hash) - đọc lại file tạm"""
+        hasher = new_file_hasher()
+        offset = 0
+        while offset < self.filesize:
+            hasher.update(chunk_digest(read_at(self.__fd, self.chunk_size, offset)))
+            offset += self.chunk_size
+        return hasher.hexdigest()
+
+    def finalize(self, expected_hash: str | None = None):
+        """Kiểm tra hash cả file rồi thay file cũ bằng file mới"""
+        if expected_hash is not None and self.file_hash() != expected_hash:
+            raise ValueError("File hash mismatch")
+        self.__close()
+        os.replace(self.part_path, self.save_path)
+
+    def close(self):
+        self.abort()
+
+    def abort(self):
+        """Hủy nhận - xóa file tạm, giữ nguyên file cũ"""
+        self.__close()
+        try:
+            os.remove(self.part_path)
+        except FileNotFoundError:
+            pass
+
+    def __close(self):
+        with self.__lock:
+            self.__writes_done.wait_for(lambda: not self.__writing)
+            fds = (self.__fd, self.__basis_fd)
+            self.__fd = self.__basis_fd = None
+        for fd in fds:
+            if fd is not None:
+                os.close(fd)
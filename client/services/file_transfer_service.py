@@ -1,25 +1,147 @@
+import hashlib
 import logging
+import mmap
 import os
 import uuid
 from datetime import datetime
-from threading import Thread, Event
+from threading import Condition, Thread, Event
 import time
 
 from client.handlers.send_handler import SendHandler
+from client.services.file_delta import DELTA_MIN_SIZE, DeltaEncoder
+from client.services.file_archive import (
+    ENTRY_FILE,
+    ArchiveReader,
+    archive_size,
+    collect_entries,
+)
+from client.services.file_writer import chunk_digest, new_file_hasher
+from common import compression
+from common.compression import CompressionPolicy
+from common.config import Config
+from common.protocol import FileRegion
 
 logger = logging.getLogger(__name__)
 
 # Chunk size: 256KB
 CHUNK_SIZE = 256 * 1024
 
+# Receiver sends a FileAckPacket every this many written chunks
+ACK_EVERY_CHUNKS = 2
+
+
+class TransferWindow:
+    """
+    Credit window of one outgoing file: bounds the bytes sent but not yet
+    acknowledged by the receiver. The window is 2 x measured throughput x RTT,
+    so it doubles every RTT while the link has headroom and stops growing
+    once throughput saturates.
+    """
+
+    MIN_WINDOW = 4 * CHUNK_SIZE
+    INITIAL_WINDOW = 8 * CHUNK_SIZE
+    MAX_WINDOW = 64 * 1024 * 1024
+    DEFAULT_RTT = 0.05  # Used until an RTT has been measured
+    RATE_ALPHA = 0.5  # Throughput EWMA weight
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.__condition = Condition()
+        self.__unacked: dict[int, int] = {}  # chunk_index -> bytes in flight
+        self.__in_flight = 0
+        self.__window = self.INITIAL_WINDOW
+        self.__rate = None  # bytes/s
+        self.__sample_start = time.monotonic()
+        self.__sample_bytes = 0
+        self.__cancelled = False
+
+    @property
+    def window(self) -> int:
+        return self.__window
+
+    def acquire(self, chunk_index: int, nbytes: int, timeout: float) -> bool:
+        """
+        Wait for enough credit to send chunk_index (nbytes). Returns False if the
+        transfer was canceled, raises TimeoutError if nothing is acknowledged
+        within timeout.
+        """
+        with self.__condition:
+            ready = self.__condition.wait_for(
+                lambda: self.__cancelled
+                or self.__in_flight == 0
+                or self.__in_flight + nbytes <= self.__window,
+                timeout=timeout,
+            )
+            if self.__cancelled:
+                return False
+            if not ready:
+                raise TimeoutError("No acknowledgement from receiver")
+            self.__unacked[chunk_index] = nbytes
+            self.__in_flight += nbytes
+            return True
+
+    def on_ack(self, ranges: list[tuple[int, int]]):
+        """Receiver acknowledged the chunk ranges [start, end)"""
+        acked_bytes = 0
+        with self.__condition:
+            for start, end in ranges:
+                for chunk_index in range(start, end):
+                    acked_bytes += self.__unacked.pop(chunk_index, 0)
+            if not acked_bytes:
+                return
+
+            self.__in_flight = max(self.__in_flight - acked_bytes, 0)
+            self.__update_window(acked_bytes)
+            self.__condition.notify_all()
+
+    def __update_window(self, acked_bytes: int):
+        rtt = self.__rtt()
+        self.__sample_bytes += acked_bytes
+        now = time.monotonic()
+        elapsed = now - self.__sample_start
+        if elapsed < rtt:
+            return
+
+        sample = self.__sample_bytes / elapsed
+        self.__rate = (
+            sample
+            if self.__rate is None
+            else self.RATE_ALPHA * sample + (1 - self.RATE_ALPHA) * self.__rate
+        )
+        self.__sample_start = now
+        self.__sample_bytes = 0
+        self.__window = int(
+            min(max(2 * self.__rate * rtt, self.MIN_WINDOW), self.MAX_WINDOW)
+        )
+
+    def __rtt(self) -> float:
+        from client.services.ping_service import PingService
+
+        rtt = PingService.get_session_rtt(self.session_id)
+        if rtt is None:
+            rtt = PingService.get_server_rtt()
+        return rtt if rtt else self.DEFAULT_RTT
+
+    def cancel(self):
+        with self.__condition:
+            self.__cancelled = True
+            self.__condition.notify_all()
+
 
 class FileTransferService:
     """Service to handle file transfers with chunking"""
 
     # Dictionary to track pending file transfers waiting for accept
-    # Format: {file_id: {"session_id": str, "file_path": str, "filesize": int, "event": Event}}
+    # Format: {file_id: {"session_id": str, "file_path": str, "filesize": int, "event": Event,
+    #                    "entries": list | None}} - entries is set for folder / multi-file batches
     _pending_transfers = {}
 
+    # Transfers currently sending chunks: {file_id: TransferWindow}
+    _active_transfers: dict[str, TransferWindow] = {}
+
+    # Give up if the receiver acknowledges nothing for this long
+    ACK_TIMEOUT = 30.0
+
     @staticmethod
     def send_file(session_id: str, file_path: str, sender_role: str):
         """Send a file in chunks"""
@@ -39,6 +161,8 @@ class FileTransferService:
                 filename=filename,
                 filesize=filesize,
                 sender_role=sender_role,
+                resume_id=FileTransferService._resume_id(file_path),
+                delta=Config.file_delta and filesize >= DELTA_MIN_SIZE,
             )
 
             # Store transfer info and wait for accept before sending chunks
@@ -48,6 +172,7 @@ class FileTransferService:
                 "file_path": file_path,
                 "filesize": filesize,
                 "event": accept_event,
+                "entries": None,
             }
 
             logger.info(f"File metadata sent for {filename}, waiting for accept...")
@@ -59,30 +184,146 @@ class FileTransferService:
             return None
 
     @staticmethod
-    def _send_chunks(session_id: str, file_id: str, file_path: str, filesize: int):
-        """Send file chunks (runs in background thread)"""
+    def send_files(session_id: str, paths: list[str], sender_role: str):
+        """
+        Send folders and/or several files as one batch: a single metadata/accept
+        round trip, then one archive streamed through the normal chunk pipeline
+        (small files share chunks). Returns (file_id, display name) or None.
+        """
+        if len(paths) == 1 and os.path.isfile(paths[0]):
+            file_id = FileTransferService.send_file(session_id, paths[0], sender_role)
+            return (file_id, os.path.basename(paths[0])) if file_id else None
+
+        try:
+            entries = collect_entries(paths)
+            if not entries:
+                logger.error(f"Nothing to send in {paths}")
+                return None
+
+            file_id = str(uuid.uuid4())
+            if len(paths) == 1:
+                name = os.path.basename(os.path.normpath(paths[0]))
+            else:
+                name = f"{len(paths)} items"
+            filesize = archive_size(entries)
+            file_count = sum(1 for entry in entries if entry[2] == ENTRY_FILE)
+
+            # Register before the metadata goes out so a fast accept finds it
+            FileTransferService._pending_transfers[file_id] = {
+                "session_id": session_id,
+                "file_path": None,
+                "filesize": filesize,
+                "event": Event(),
+                "entries": entries,
+            }
+            SendHandler.send_file_metadata_packet(
+                session_id=session_id,
+                file_id=file_id,
+                filename=name,
+                filesize=filesize,
+                sender_role=sender_role,
+                file_count=file_count,
+            )
+
+            logger.info(
+                f"Batch metadata sent for {name} ({file_count} files, {filesize} bytes), waiting for accept..."
+            )
+            return file_id, name
+
+        except Exception as e:
+            logger.error(f"Error sending files: {e}", exc_info=True)
+            return None
+
+    @staticmethod
+    def _resume_id(file_path: str) -> str:
+        """
+        Identity of the file content for resuming: the receiver only reuses a
+        partial download whose resume_id matches (same name, size and mtime)
+        """
+        stat = os.stat(file_path)
+        key = f"{os.path.basename(file_path)}\0{stat.st_size}\0{stat.st_mtime_ns}"
+        return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def _send_chunks(
+        window: TransferWindow,
+        file_id: str,
+        file_path: str,
+        filesize: int,
+        received_ranges: list[tuple[int, int]] | None = None,
+        entries: list | None = None,
+    ):
+        """
+        Send file chunks (runs in background thread). Chunks the receiver
+        already has are skipped, but still hashed so the whole-file hash is
+        computed in the same pass. With entries, the chunks are read from an
+        archive of those files generated on the fly.
+        """
+        session_id = window.session_id
         try:
             total_chunks = (filesize + CHUNK_SIZE - 1) // CHUNK_SIZE
 
-            with open(file_path, "rb") as f:
+            already_received = bytearray(total_chunks)
+            for start, end in received_ranges or ():
+                for chunk_index in range(max(start, 0), min(end, total_chunks)):
+                    already_received[chunk_index] = 1
+            if received_ranges:
+                logger.info(
+                    f"Resuming {file_id}: receiver already has {sum(already_received)}/{total_chunks} chunks"
+                )
+
+            file_hasher = new_file_hasher()
+            policy = CompressionPolicy(allow_zstd=Config.zstd)
+            # Incompressible chunks of a plain file go out with sendfile when the
+            # connection is not TLS; the chunk is only read here to be hashed
+            use_sendfile = Config.sendfile and not Config.ssl and not entries
+            buffer = memoryview(bytearray(CHUNK_SIZE))
+            source = ArchiveReader(entries) if entries else open(file_path, "rb")
+            with source as f:
                 for chunk_index in range(total_chunks):
-                    chunk_data = f.read(CHUNK_SIZE)
+                    if entries:
+                        chunk_data = f.read(CHUNK_SIZE)
+                    else:
+                        chunk_data = buffer[: f.readinto(buffer)]
 
                     if not chunk_data:
                         break
 
+                    chunk_hash = chunk_digest(chunk_data)
+                    file_hasher.update(chunk_hash)
+                    if already_received[chunk_index]:
+                        continue
+
+                    codec = policy.choose(chunk_data)
+                    if use_sendfile and codec == compression.NONE:
+                        chunk_data = FileRegion(
+                            file_path, chunk_index * CHUNK_SIZE, len(chunk_data)
+                        )
+                    elif not entries:
+                        chunk_data = bytes(chunk_data)  # buffer is reused
+
+                    # Wait for credit instead of sleeping a fixed interval
+                    if not window.acquire(
+                        chunk_index, len(chunk_data), FileTransferService.ACK_TIMEOUT
+                    ):
+                        logger.info(f"Transfer {file_id} canceled")
+                        return
+
                     SendHandler.send_file_chunk_packet(
                         session_id=session_id,
                         file_id=file_id,
                         chunk_index=chunk_index,
                         chunk_data=chunk_data,
                         total_chunks=total_chunks,
+                        chunk_hash=chunk_hash,
+                        compression=codec,
                     )
 
-                    time.sleep(0.01)
-
             SendHandler.send_file_complete_packet(
-                session_id=session_id, file_id=file_id, success=True
+                session_id=session_id,
+                file_id=file_id,
+                success=True,
+                file_hash=file_hasher.hexdigest(),
             )
             logger.info(f"File {file_id} sent")
 
@@ -94,23 +335,119 @@ class FileTransferService:
                 success=False,
                 message=str(e),
             )
+        finally:
+            FileTransferService._active_transfers.pop(file_id, None)
 
     @staticmethod
-    def start_sending_chunks(file_id: str):
+    def _send_delta(
+        window: TransferWindow,
+        file_id: str,
+        file_path: str,
+        block_size: int,
+        signature: bytes,
+    ):
+        """
+        Send only what the receiver's older copy is missing (runs in background
+        thread). The whole-file hash is computed over CHUNK_SIZE chunks as in
+        _send_chunks, as the encoder moves through the file.
+        """
+        session_id = window.session_id
+        try:
+            sent_bytes = 0
+            file_hasher = new_file_hasher()
+            policy = CompressionPolicy(allow_zstd=Config.zstd)
+            with open(file_path, "rb") as f, mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            ) as data:
+                hashed = 0
+                encoder = DeltaEncoder(data, block_size, signature, CHUNK_SIZE)
+                for chunk_index, (offset, ops, out_len) in enumerate(encoder):
+                    while hashed + CHUNK_SIZE <= offset + out_len:
+                        file_hasher.update(
+                            chunk_digest(data[hashed : hashed + CHUNK_SIZE])
+                        )
+                        hashed += CHUNK_SIZE
+
+                    if not window.acquire(
+                        chunk_index, len(ops), FileTransferService.ACK_TIMEOUT
+                    ):
+                        logger.info(f"Transfer {file_id} canceled")
+                        return
+
+                    SendHandler.send_file_delta_packet(
+                        session_id=session_id,
+                        file_id=file_id,
+                        chunk_index=chunk_index,
+                        offset=offset,
+                        ops=ops,
+                        compression=policy.choose(ops),
+                    )
+                    sent_bytes += len(ops)
+
+                if hashed < len(data):
+                    file_hasher.update(chunk_digest(data[hashed:]))
+                filesize = len(data)
+
+            SendHandler.send_file_complete_packet(
+                session_id=session_id,
+                file_id=file_id,
+                success=True,
+                file_hash=file_hasher.hexdigest(),
+            )
+            logger.info(
+                f"File {file_id} sent as delta: {sent_bytes} bytes for a {filesize} byte file"
+            )
+
+        except Exception as e:
+            logger.error(f"Error sending delta for file {file_id}: {e}", exc_info=True)
+            SendHandler.send_file_complete_packet(
+                session_id=session_id,
+                file_id=file_id,
+                success=False,
+                message=str(e),
+            )
+        finally:
+            FileTransferService._active_transfers.pop(file_id, None)
+
+    @staticmethod
+    def handle_file_ack(file_id: str, ranges: list[tuple[int, int]]):
+        """Chunks acknowledged by the receiver - release credit to the sender thread"""
+        window = FileTransferService._active_transfers.get(file_id)
+        if window:
+            window.on_ack(ranges)
+
+    @staticmethod
+    def cancel_session_transfers(session_id: str):
+        """Stop outgoing transfers of a session that has ended"""
+        for file_id, window in list(FileTransferService._active_transfers.items()):
+            if window.session_id == session_id:
+                window.cancel()
+        for file_id, transfer in list(FileTransferService._pending_transfers.items()):
+            if transfer["session_id"] == session_id:
+                FileTransferService._pending_transfers.pop(file_id, None)
+
+    @staticmethod
+    def start_sending_chunks(
+        file_id: str, received_ranges: list[tuple[int, int]] | None = None
+    ):
         """Start sending chunks after file is accepted"""
         transfer = FileTransferService._pending_transfers.get(file_id)
         if not transfer:
             logger.warning(f"Transfer {file_id} not found in pending transfers")
             return False
 
-        # Start sending chunks in a background thread
+        # Start sending chunks in a background thread. The window is registered
+        # first so cancel_transfer can stop the thread from its first chunk.
+        window = FileTransferService.__register_window(transfer["session_id"], file_id)
         thread = Thread(
             target=FileTransferService._send_chunks,
             args=(
-                transfer["session_id"],
+                window,
                 file_id,
                 transfer["file_path"],
                 transfer["filesize"],
+                received_ranges,
+                transfer.get("entries"),
             ),
             daemon=True,
         )
@@ -122,14 +459,48 @@ class FileTransferService:
         logger.info(f"Started sending chunks for file {file_id}")
         return True
 
+    @staticmethod
+    def start_sending_delta(file_id: str, block_size: int, signature: bytes):
+        """Start sending a delta after the receiver answered with its block signature"""
+        transfer = FileTransferService._pending_transfers.pop(file_id, None)
+        if not transfer:
+            logger.warning(f"Transfer {file_id} not found in pending transfers")
+            return False
+
+        window = FileTransferService.__register_window(transfer["session_id"], file_id)
+        thread = Thread(
+            target=FileTransferService._send_delta,
+            args=(
+                window,
+                file_id,
+                transfer["file_path"],
+                block_size,
+                signature,
+            ),
+            daemon=True,
+        )
+        thread.start()
+
+        logger.info(f"Started sending delta for file {file_id}")
+        return True
+
+    @staticmethod
+    def __register_window(session_id: str, file_id: str) -> TransferWindow:
+        window = TransferWindow(session_id)
+        FileTransferService._active_transfers[file_id] = window
+        return window
+
     @staticmethod
     def cancel_transfer(file_id: str):
-        """Cancel a pending file transfer"""
-        if file_id in FileTransferService._pending_transfers:
-            del FileTransferService._pending_transfers[file_id]
+        """Cancel a transfer waiting for accept, or stop one that is sending chunks"""
+        canceled = FileTransferService._pending_transfers.pop(file_id, None) is not None
+        window = FileTransferService._active_transfers.get(file_id)
+        if window:
+            window.cancel()
+            canceled = True
+        if canceled:
             logger.info(f"Canceled file transfer {file_id}")
-            return True
-        return False
+        return canceled
 
     @staticmethod
     def send_chat_message(session_id: str, sender_role: str, message: str):
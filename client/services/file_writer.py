@@ -0,0 +1,332 @@
+import hashlib
+import logging
+import os
+import struct
+import threading
+
+logger = logging.getLogger(__name__)
+
+PART_SUFFIX = ".part"
+MAP_SUFFIX = ".map"  # <save_path>.part.map - bitmap + hash từng chunk để nhận tiếp
+
+DIGEST_SIZE = 16  # BLAKE2b-128 cho mỗi chunk
+_MAP_MAGIC = b"PBLPART1"
+_MAP_HEADER = struct.Struct("<8s16sQI")  # magic, resume_id, filesize, chunk_size
+_EMPTY_DIGEST = bytes(DIGEST_SIZE)
+
+_seek_lock = threading.Lock()  # os.lseek + đọc/ghi khi không có os.pwrite / os.pread
+
+
+def chunk_digest(chunk_data: bytes) -> bytes:
+    """Hash của một chunk (gửi kèm FileChunkPacket)"""
+    return hashlib.blake2b(chunk_data, digest_size=DIGEST_SIZE).digest()
+
+
+def new_file_hasher():
+    """Hash cả file = hash của các chunk hash theo thứ tự - cập nhật dần khi đọc/ghi chunk"""
+    return hashlib.blake2b(digest_size=32)
+
+
+class ChunkFileWriter:
+    """
+    Ghi file đang nhận thẳng xuống đĩa - mỗi chunk ghi tại offset
+    chunk_index * chunk_size của file tạm <save_path>.part (cấp phát trước),
+    đổi tên nguyên tử sang save_path khi đã đủ chunk.
+
+    Chunk có thể tới không theo thứ tự (ListenerService xử lý song song) nên
+    việc hoàn tất chỉ xảy ra khi đã đủ chunk VÀ bên gửi đã báo FileComplete -
+    đúng một trong hai lời gọi write_chunk / mark_sender_done trả về True.
+
+    Hash từng chunk được kiểm tra khi nhận và lưu vào <save_path>.part.map
+    (slot rỗng = chưa có chunk). Nếu kết nối đứt, lần gửi lại cùng file
+    (cùng resume_id) mở lại file tạm và chỉ cần các chunk còn thiếu.
+    """
+
+    def __init__(
+        self,
+        save_path: str,
+        filesize: int,
+        chunk_size: int,
+        resume_id: str | None = None,
+    ):
+        self.save_path = save_path
+        self.part_path = save_path + PART_SUFFIX
+        self.map_path = self.part_path + MAP_SUFFIX
+        self.filesize = filesize
+        self.chunk_size = chunk_size
+        self.total_chunks = (filesize + chunk_size - 1) // chunk_size
+        self.resumed_chunks = 0
+
+        self.__lock = threading.Lock()
+        # close() chờ các lần ghi đang chạy xong rồi mới đóng fd (số fd có thể
+        # bị dùng lại cho file khác ngay sau os.close)
+        self.__writes_done = threading.Condition(self.__lock)
+        self.__writing = 0
+        self.__received = bytearray(self.total_chunks)
+        self.__digests = bytearray(self.total_chunks * DIGEST_SIZE)
+        self.__received_count = 0
+        self.__unacked: list[int] = []  # Chunk đã ghi nhưng chưa gửi FileAckPacket
+        self.__sender_done = False
+        self.__finished = False
+        resume_key = _resume_key(resume_id)
+        self.__header = _MAP_HEADER.pack(_MAP_MAGIC, resume_key, filesize, chunk_size)
+
+        self.__fd = None
+        self.__map_fd = None
+        try:
+            if not (resume_key != bytes(16) and self.__open_existing()):
+                self.__create()
+        except OSError:
+            self.__close()
+            self.__remove_files()
+            raise
+
+    def __create(self):
+        flags = os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+        self.__fd = os.open(self.part_path, flags, 0o644)
+        preallocate(self.__fd, self.filesize)
+
+        self.__map_fd = os.open(self.map_path, flags, 0o644)
+        write_at(self.__map_fd, self.__header, 0)
+        os.ftruncate(self.__map_fd, _MAP_HEADER.size + len(self.__digests))
+
+    def __open_existing(self) -> bool:
+        """Mở lại file tạm của lần nhận trước nếu cùng file, trả về False nếu không dùng được"""
+        if not (os.path.exists(self.part_path) and os.path.exists(self.map_path)):
+            return False
+
+        with open(self.map_path, "rb") as f:
+            header = f.read(_MAP_HEADER.size)
+            digests = f.read(len(self.__digests))
+        if header != self.__header or len(digests) != len(self.__digests):
+            return False
+        if os.path.getsize(self.part_path) != self.filesize:
+            return False
+
+        flags = os.O_RDWR | getattr(os, "O_BINARY", 0)
+        self.__fd = os.open(self.part_path, flags)
+        self.__map_fd = os.open(self.map_path, flags)
+
+        self.__digests[:] = digests
+        for chunk_index in range(self.total_chunks):
+            offset = chunk_index * DIGEST_SIZE
+            if digests[offset : offset + DIGEST_SIZE] != _EMPTY_DIGEST:
+                self.__received[chunk_index] = 1
+        self.__received_count = self.resumed_chunks = sum(self.__received)
+        logger.info(
+            f"Resuming {self.save_path}: {self.resumed_chunks}/{self.total_chunks} chunks already received"
+        )
+        return True
+
+    def write_chunk(
+        self, chunk_index: int, chunk_data: bytes, chunk_hash: bytes | None = None
+    ) -> bool:
+        """
+        Kiểm tra và ghi một chunk vào đúng vị trí. Trả về True nếu lần ghi này
+        hoàn tất file (bên gửi đã báo xong) - khi đó người gọi phải finalize().
+        """
+        if not 0 <= chunk_index < self.total_chunks:
+            raise ValueError(
+                f"Chunk index {chunk_index} out of range (total {self.total_chunks})"
+            )
+
+        offset = chunk_index * self.chunk_size
+        expected = min(self.chunk_size, self.filesize - offset)
+        if len(chunk_data) != expected:
+            raise ValueError(
+                f"Chunk {chunk_index} has {len(chunk_data)} bytes, expected {expected}"
+            )
+
+        digest = chunk_digest(chunk_data)
+        if chunk_hash is not None and digest != chunk_hash:
+            raise ValueError(f"Chunk {chunk_index} hash mismatch")
+
+        with self.__lock:
+            if self.__fd is None:
+                raise ValueError(f"Writer for {self.save_path} is closed")
+            fd, map_fd = self.__fd, self.__map_fd
+            self.__writing += 1
+        try:
+            write_at(fd, chunk_data, offset)
+            # Ghi hash sau dữ liệu: nếu bị ngắt giữa chừng chunk chỉ bị gửi lại
+            write_at(map_fd, digest, _MAP_HEADER.size + chunk_index * DIGEST_SIZE)
+        finally:
+            with self.__lock:
+                self.__writing -= 1
+                if not self.__writing:
+                    self.__writes_done.notify_all()
+
+        with self.__lock:
+            if not self.__received[chunk_index]:
+                self.__received[chunk_index] = 1
+                self.__received_count += 1
+                self.__unacked.append(chunk_index)
+            offset = chunk_index * DIGEST_SIZE
+            self.__digests[offset : offset + DIGEST_SIZE] = digest
+            return self.__claim_finish()
+
+    def mark_sender_done(self) -> bool:
+        """Bên gửi báo đã gửi hết. Trả về True nếu file đã đủ chunk"""
+        with self.__lock:
+            self.__sender_done = True
+            return self.__claim_finish()
+
+    def __claim_finish(self) -> bool:
+        if (
+            self.__finished
+            or not self.__sender_done
+            or self.__received_count < self.total_chunks
+        ):
+            return False
+        self.__finished = True
+        return True
+
+    @property
+    def received_count(self) -> int:
+        return self.__received_count
+
+    def received_ranges(self) -> list[tuple[int, int]]:
+        """Các khoảng chunk [start, end) đã có (gửi trong FileAcceptPacket khi nhận tiếp)"""
+        with self.__lock:
+            indices = [i for i in range(self.total_chunks) if self.__received[i]]
+        return to_ranges(indices)
+
+    def take_unacked(self, min_count: int = 1) -> list[tuple[int, int]]:
+        """
+        Lấy các chunk đã ghi chưa xác nhận dưới dạng khoảng [start, end),
+        rỗng nếu chưa đủ min_count chunk
+        """
+        with self.__lock:
+            if len(self.__unacked) < min_count:
+                return []
+            indices = sorted(self.__unacked)
+            self.__unacked.clear()
+        return to_ranges(indices)
+
+    def file_hash(self) -> str:
+        """Hash cả file từ các chunk hash đã lưu - không cần đọc lại dữ liệu"""
+        hasher = new_file_hasher()
+        with self.__lock:
+            hasher.update(self.__digests)
+        return hasher.hexdigest()
+
+    def finalize(self, expected_hash: str | None = None):
+        """
+        Kiểm tra hash cả file, đóng file tạm và đổi tên sang save_path.
+        ValueError nếu hash không khớp với bên gửi.
+        """
+        if expected_hash is not None and self.file_hash() != expected_hash:
+            raise ValueError("File hash mismatch")
+        self.__close()
+        os.replace(self.part_path, self.save_path)
+        self.__remove(self.map_path)
+
+    def close(self):
+        """Đóng nhưng giữ file tạm + map để nhận tiếp lần sau"""
+        self.__close()
+
+    def abort(self):
+        """Hủy nhận - xóa file tạm"""
+        self.__close()
+        self.__remove_files()
+
+    def __close(self):
+        with self.__lock:
+            self.__writes_done.wait_for(lambda: not self.__writing)
+            fds = (self.__fd, self.__map_fd)
+            self.__fd = self.__map_fd = None
+        for fd in fds:
+            if fd is not None:
+                os.close(fd)
+
+    def __remove_files(self):
+        self.__remove(self.part_path)
+        self.__remove(self.map_path)
+
+    @staticmethod
+    def __remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def preallocate(fd: int, size: int):
+    """Cấp phát trước dung lượng - báo lỗi đầy đĩa ngay khi accept"""
+    if not size:
+        return
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError as e:
+            # Một số filesystem (tmpfs cũ, NFS) không hỗ trợ fallocate
+            logger.debug(f"posix_fallocate failed ({e}), falling back to ftruncate")
+    os.ftruncate(fd, size)
+
+
+def write_at(fd: int, data: bytes, offset: int):
+    """Ghi toàn bộ data tại offset - an toàn khi nhiều thread cùng ghi một fd"""
+    view = memoryview(data)
+    if hasattr(os, "pwrite"):
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+        return
+
+    # Windows không có os.pwrite - seek + write phải đi cùng nhau
+    with _seek_lock:
+        os.lseek(fd, offset, os.SEEK_SET)
+        while view:
+            view = view[os.write(fd, view) :]
+
+
+def read_at(fd: int, size: int, offset: int) -> bytes:
+    """Đọc tối đa size byte tại offset (ít hơn nếu hết file)"""
+    if hasattr(os, "pread"):
+        parts = []
+        while size:
+            data = os.pread(fd, size, offset)
+            if not data:
+                break
+            parts.append(data)
+            size -= len(data)
+            offset += len(data)
+        return b"".join(parts)
+
+    with _seek_lock:
+        os.lseek(fd, offset, os.SEEK_SET)
+        parts = []
+        while size:
+            data = os.read(fd, size)
+            if not data:
+                break
+            parts.append(data)
+            size -= len(data)
+        return b"".join(parts)
+
+
+def to_ranges(indices: list[int]) -> list[tuple[int, int]]:
+    """[0, 1, 2, 5, 6] -> [(0, 3), (5, 7)] - indices đã sắp xếp"""
+    if not indices:
+        return []
+    ranges = []
+    start = end = indices[0]
+    for chunk_index in indices[1:]:
+        if chunk_index == end + 1:
+            end = chunk_index
+            continue
+        ranges.append((start, end + 1))
+        start = end = chunk_index
+    ranges.append((start, end + 1))
+    return ranges
+
+
+def _resume_key(resume_id: str | None) -> bytes:
+    """resume_id (hex 16 byte) -> bytes, toàn 0 nếu không có / không hợp lệ"""
+    try:
+        key = bytes.fromhex(resume_id) if resume_id else b""
+    except ValueError:
+        key = b""
+    return key if len(key) == 16 else bytes(16)
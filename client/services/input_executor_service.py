@@ -0,0 +1,188 @@
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+
+from common.enums import MouseEventType
+from common.packets import KeyboardPacket, MousePacket, PointerMotionPacket
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SessionInputQueue:
+    """Hàng đợi input có thứ tự của một session."""
+
+    max_pending: int
+    pending: deque = field(default_factory=deque)
+    condition: threading.Condition = field(default_factory=threading.Condition)
+    stopped: bool = False
+    thread: threading.Thread | None = None
+    buttons_down: set = field(default_factory=set)  # Theo thứ tự đưa vào queue
+
+
+class InputExecutorService:
+    """
+    Thực thi input từ controller trên máy host - mỗi session một thread:
+        - PRESS / RELEASE / SCROLL / phím được thực thi đúng thứ tự nhận
+        - các MOVE / PointerMotion liên tiếp được gộp lại, chỉ thực thi vị trí cuối
+          cùng (trừ khi đang giữ nút - khi đó giữ nguyên đường kéo thả)
+    Thay cho việc đẩy từng packet vào thread pool chung (có thể chạy lệch thứ tự).
+    """
+
+    MAX_PENDING = 256
+    # Queue đầy mà không còn MOVE để bỏ: PRESS / RELEASE / phím vẫn được thêm
+    # tới giới hạn cứng này (không bao giờ chặn thread nhận)
+    HARD_LIMIT = 4 * MAX_PENDING
+
+    __queues: dict[str | None, SessionInputQueue] = {}
+    __ended: set[str | None] = set()  # Session đã remove_session - không tạo lại queue
+    __lock = threading.Lock()
+
+    @classmethod
+    def submit(cls, packet: MousePacket | PointerMotionPacket | KeyboardPacket):
+        """Đưa sự kiện input vào queue của session (gọi từ thread nhận, không chặn)"""
+        session_queue = cls.__get_or_create_queue(packet.session_id)
+        if session_queue is None:
+            # Packet đến muộn sau khi session đã kết thúc
+            logger.debug(f"Dropping input for unknown session {packet.session_id}")
+            return
+        is_move = cls.__is_move(packet)
+
+        with session_queue.condition:
+            if session_queue.stopped:
+                return
+            pending = session_queue.pending
+
+            if (
+                is_move
+                and pending
+                and cls.__is_move(pending[-1])
+                and (
+                    isinstance(packet, MousePacket) or not session_queue.buttons_down
+                )
+            ):
+                pending[-1] = packet
+                return
+
+            if len(pending) >= session_queue.max_pending:
+                if is_move:
+                    # Vị trí mới hơn sẽ tới ngay sau, bỏ MOVE này
+                    return
+                # Không được bỏ PRESS/RELEASE: nhường chỗ bằng MOVE cũ nhất,
+                # không còn MOVE thì cho queue vượt max_pending
+                oldest_move = next(
+                    (index for index, queued in enumerate(pending) if cls.__is_move(queued)),
+                    None,
+                )
+                if oldest_move is not None:
+                    del pending[oldest_move]
+                elif len(pending) >= cls.HARD_LIMIT:
+                    logger.warning(
+                        f"Input queue full for session {packet.session_id}, dropping {packet}"
+                    )
+                    return
+
+            pending.append(packet)
+            # Chỉ ghi nhận nút khi sự kiện thực sự vào queue
+            if isinstance(packet, MousePacket):
+                if packet.event_type == MouseEventType.PRESS:
+                    session_queue.buttons_down.add(packet.button)
+                elif packet.event_type == MouseEventType.RELEASE:
+                    session_queue.buttons_down.discard(packet.button)
+            session_queue.condition.notify_all()
+
+    @staticmethod
+    def __is_move(packet) -> bool:
+        if isinstance(packet, PointerMotionPacket):
+            return True
+        return (
+            isinstance(packet, MousePacket)
+            and packet.event_type == MouseEventType.MOVE
+        )
+
+    @classmethod
+    def __get_or_create_queue(cls, session_id: str | None) -> SessionInputQueue | None:
+        """Queue của session, None nếu session không tồn tại / đã kết thúc"""
+        from client.managers.session_manager import SessionManager
+
+        with cls.__lock:
+            session_queue = cls.__queues.get(session_id)
+            if session_queue is None:
+                # Kiểm tra trong lock: remove_session chạy giữa lúc kiểm tra và
+                # lúc tạo sẽ để lại worker cho session đã chết
+                if (
+                    session_id in cls.__ended
+                    or session_id not in SessionManager._sessions
+                ):
+                    return None
+                session_queue = SessionInputQueue(cls.MAX_PENDING)
+                session_queue.thread = threading.Thread(
+                    target=cls.__worker,
+                    args=(session_queue,),
+                    daemon=True,
+                    name=f"InputExecutor-{session_id}",
+                )
+                cls.__queues[session_id] = session_queue
+                session_queue.thread.start()
+            return session_queue
+
+    @classmethod
+    def __worker(cls, session_queue: SessionInputQueue):
+        from client.handlers.receive_handler import ReceiveHandler
+
+        while True:
+            with session_queue.condition:
+                session_queue.condition.wait_for(
+                    lambda: session_queue.pending or session_queue.stopped
+                )
+                if session_queue.stopped:
+                    break
+                packet = session_queue.pending.popleft()
+                session_queue.condition.notify_all()
+
+            try:
+                ReceiveHandler.handle_packet(packet)
+            except Exception as e:
+                logger.error(f"Error executing input {packet}: {e}", exc_info=True)
+
+    @classmethod
+    def remove_session(cls, session_id: str | None):
+        """Dừng worker của session và nhả các phím modifier / nút chuột còn giữ"""
+        with cls.__lock:
+            cls.__ended.add(session_id)
+            session_queue = cls.__queues.pop(session_id, None)
+        if session_queue is None:
+            return
+
+        cls.__stop_queue(session_queue)
+
+        from client.services.keyboard_executor_service import (
+            KeyboardExecutorService,
+        )
+        from client.services.mouse_executor_service import MouseExecutorService
+
+        KeyboardExecutorService.clear_all_modifiers()
+        MouseExecutorService.release_all_buttons()
+        logger.debug(f"Input executor stopped for session: {session_id}")
+
+    @classmethod
+    def shutdown(cls):
+        with cls.__lock:
+            session_queues = list(cls.__queues.values())
+            cls.__queues.clear()
+            cls.__ended.clear()
+        for session_queue in session_queues:
+            cls.__stop_queue(session_queue)
+
+    @staticmethod
+    def __stop_queue(session_queue: SessionInputQueue):
+        with session_queue.condition:
+            session_queue.stopped = True
+            session_queue.pending.clear()
+            session_queue.condition.notify_all()
+        if (
+            session_queue.thread
+            and session_queue.thread is not threading.current_thread()
+        ):
+            session_queue.thread.join(timeout=1)
@@ -1,11 +1,23 @@
 import logging
 import threading
 import socket
+import time
 from concurrent.futures import ThreadPoolExecutor
 from queue import Queue
 
-from common.packets import Packet, VideoStreamPacket
+from common.packets import (
+    CursorPacket,
+    KeyboardPacket,
+    MousePacket,
+    Packet,
+    PingPacket,
+    PointerMotionPacket,
+    PongPacket,
+    VideoStreamPacket,
+    WindowUpdatePacket,
+)
 from common.protocol import Protocol
+from common.streams import WindowTracker, uses_credit
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +29,7 @@ class ListenerService:
     __thread_pool = None
     __video_queues = {}
     __max_workers = 50
+    __credit = WindowTracker()  # Credit trả cho server khi đã xử lý dữ liệu file
 
     @classmethod
     def initialize(cls, sock: socket.socket):
@@ -32,24 +45,61 @@ class ListenerService:
         cls.__receiving_thread.start()
         logger.info("ListenerService initialized and receiving thread started")
 
+    @classmethod
+    def replace_socket(cls, sock: socket.socket):
+        """Đã kết nối lại: nhận tiếp từ socket mới"""
+        cls.__credit.reset()
+        cls.__socket = sock
+
     @classmethod
     def __receive_worker(cls):
         """Worker thread để nhận dữ liệu từ socket."""
+        last_receive = time.monotonic()
         while not cls.__shutdown_event.is_set():
-            if cls.__socket:
+            sock = cls.__socket
+            if sock:
                 try:
-                    packet = Protocol.receive_packet(cls.__socket)
-                    if packet:
+                    packet = Protocol.receive_packet(sock)
+                    last_receive = time.monotonic()
+                    if isinstance(packet, (PingPacket, PongPacket)):
+                        # Xử lý ngay để timestamp không bị lệch bởi thread pool
+                        from client.services.ping_service import PingService
+
+                        PingService.handle_packet(packet, time.monotonic())
+                    elif isinstance(packet, WindowUpdatePacket):
+                        from client.services.sender_service import SenderService
+
+                        SenderService.window_update(packet.stream_id, packet.increment)
+                    elif packet:
                         cls.__submit_packet_for_processing(packet)
                 except socket.timeout:
-                    continue
+                    from client.services.ping_service import PingService
+
+                    # Server trả pong mỗi chu kỳ ping - im lặng lâu là kết nối đã chết
+                    if time.monotonic() - last_receive < 3 * PingService.get_interval():
+                        continue
+                    cls.__connection_lost(sock, "no data from server")
+                    last_receive = time.monotonic()
                 except (ConnectionError, OSError) as e:
-                    # Socket đã đóng hoặc kết nối bị ngắt - thoát gracefully
-                    logger.debug(f"Connection closed in listener: {e}")
-                    break
+                    # Socket đã đóng hoặc kết nối bị ngắt - kết nối lại
+                    cls.__connection_lost(sock, e)
+                    last_receive = time.monotonic()
                 except Exception as e:
                     logger.error(f"Error in listener worker - {e}", exc_info=True)
-                    break
+                    cls.__connection_lost(sock, e)
+                    last_receive = time.monotonic()
+
+    @classmethod
+    def __connection_lost(cls, sock: socket.socket, reason):
+        """Chờ ReconnectService thay socket (hoặc shutdown)"""
+        if cls.__shutdown_event.is_set():
+            return
+        logger.debug(f"Connection closed in listener: {reason}")
+        from client.services.reconnect_service import ReconnectService
+
+        ReconnectService.connection_lost(sock)
+        while cls.__socket is sock and not cls.__shutdown_event.wait(0.05):
+            pass
 
     @classmethod
     def shutdown(cls):
@@ -68,6 +118,11 @@ class ListenerService:
         cls.__socket = None
         logger.info("ListenerService shutdown completed")
 
+    @classmethod
+    def submit_packet(cls, packet: Packet):
+        """Đưa packet nhận từ đường khác (UDP media) vào cùng luồng xử lý"""
+        cls.__submit_packet_for_processing(packet)
+
     @classmethod
     def __submit_packet_for_processing(cls, packet: Packet):
         """Submit packet vào thread pool để xử lý."""
@@ -77,21 +132,32 @@ class ListenerService:
             return
 
         if isinstance(packet, VideoStreamPacket):
-            session_id = packet.session_id
-            if session_id not in cls.__video_queues:
-                cls.__video_queues[session_id] = Queue()
-                # Submit worker để xử lý video packets theo thứ tự cho session này
-                cls.__thread_pool.submit(cls.__process_video_queue, session_id)
-
-            cls.__video_queues[session_id].put(packet)
+            if packet.timestamps is not None:
+                packet.timestamps["receive"] = time.monotonic()
+            # Mỗi monitor một luồng H.264 riêng - decode song song
+            key = (packet.session_id, getattr(packet, "monitor", 1))
+            if key not in cls.__video_queues:
+                cls.__video_queues[key] = Queue()
+                # Submit worker để xử lý video packets theo thứ tự cho monitor này
+                cls.__thread_pool.submit(cls.__process_video_queue, key)
+
+            cls.__video_queues[key].put(packet)
+        elif isinstance(packet, (MousePacket, PointerMotionPacket, KeyboardPacket)):
+            # Input phải thực thi đúng thứ tự -> worker riêng theo session
+            from client.services.input_executor_service import InputExecutorService
+
+            InputExecutorService.submit(packet)
+        elif isinstance(packet, CursorPacket):
+            # Xử lý ngay trên thread nhận: rẻ (chỉ emit signal) và giữ đúng thứ tự
+            cls.__process_packet(packet)
         else:
             # Các packet khác có thể xử lý song song
             cls.__thread_pool.submit(cls.__process_packet, packet)
 
     @classmethod
-    def __process_video_queue(cls, session_id: str):
-        """Xử lý video packets theo thứ tự cho một session."""
-        queue = cls.__video_queues.get(session_id)
+    def __process_video_queue(cls, key: tuple[str, int]):
+        """Xử lý video packets theo thứ tự cho một monitor của session."""
+        queue = cls.__video_queues.get(key)
         if not queue:
             return
 
@@ -106,17 +172,17 @@ class ListenerService:
                 continue
 
         # Cleanup queue khi worker exits
-        if session_id in cls.__video_queues:
-            del cls.__video_queues[session_id]
-            logger.debug(f"Cleaned up video queue for session: {session_id}")
+        if key in cls.__video_queues:
+            del cls.__video_queues[key]
+            logger.debug(f"Cleaned up video queue for session: {key[0]} (monitor {key[1]})")
 
     @classmethod
     def stop_video_queue(cls, session_id: str):
-        """Dừng video queue cho session cụ thể."""
-        if session_id in cls.__video_queues:
-            queue = cls.__video_queues[session_id]
-            queue.put(None)  # Signal để worker thread thoát
-            logger.debug(f"Signaled video queue to stop for session: {session_id}")
+        """Dừng các video queue (mọi monitor) của session cụ thể."""
+        for key, queue in list(cls.__video_queues.items()):
+            if key[0] == session_id:
+                queue.put(None)  # Signal để worker thread thoát
+                logger.debug(f"Signaled video queue to stop for session: {session_id}")
 
     @classmethod
     def __process_packet(cls, packet: Packet):
@@ -129,3 +195,15 @@ class ListenerService:
             logger.error(
                 f"Error processing packet {type(packet).__name__}: {e}", exc_info=True
             )
+        finally:
+            if uses_credit(packet):
+                cls.__return_credit(packet)
+
+    @classmethod
+    def __return_credit(cls, packet: Packet):
+        """Dữ liệu file đã xử lý xong - trả credit để server gửi tiếp stream đó"""
+        update = cls.__credit.consumed(packet)
+        if update:
+            from client.handlers.send_handler import SendHandler
+
+            SendHandler.send_window_update_packet(*update)
@@ -0,0 +1,157 @@
+import logging
+import socket
+import threading
+import time
+
+from common import media_transport
+from common.packets import CursorPacket, Packet, VideoStreamPacket
+
+logger = logging.getLogger(__name__)
+
+
+class MediaTransportService:
+    """
+    Đường UDP tới server cho video / cursor (--udp-media). Kết nối TCP vẫn giữ
+    cho mọi packet khác; media chỉ đi UDP khi server đã trả lời HELLO trong
+    PATH_TIMEOUT, ngược lại SenderService gửi qua TCP như bình thường.
+    """
+
+    __socket: socket.socket | None = None
+    __token: bytes | None = None
+    __receiving_thread = None
+    __shutdown_event = threading.Event()
+    __last_reply = 0.0  # Lần cuối server trả lời HELLO
+    __frame_no = 0
+    __send_lock = threading.Lock()
+    __reassembler = media_transport.Reassembler()
+
+    @classmethod
+    def initialize(cls, server_host: str, port: int, token: bytes):
+        """Mở socket UDP tới server và bắt đầu gửi HELLO (gọi khi nhận AssignIdPacket)"""
+        if cls.__socket:
+            return
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, media_transport.SOCKET_BUFFER
+            )
+            sock.setsockopt(
+                socket.SOL_SOCKET, socket.SO_SNDBUF, media_transport.SOCKET_BUFFER
+            )
+            sock.connect((server_host, port))
+            sock.settimeout(media_transport.KEEPALIVE_INTERVAL)
+        except OSError as e:
+            logger.warning(f"UDP media transport unavailable, using TCP: {e}")
+            return
+
+        cls.__socket = sock
+        cls.__token = token
+        cls.__shutdown_event.clear()
+        cls.__receiving_thread = threading.Thread(
+            target=cls.__receive_worker, daemon=True, name="MediaTransport"
+        )
+        cls.__receiving_thread.start()
+        logger.info(f"UDP media transport to {server_host}:{port} started")
+
+    @classmethod
+    def shutdown(cls):
+        cls.__shutdown_event.set()
+        if cls.__receiving_thread:
+            cls.__receiving_thread.join()
+            cls.__receiving_thread = None
+        if cls.__socket:
+            cls.__socket.close()
+            cls.__socket = None
+        cls.__last_reply = 0.0
+
+    @classmethod
+    def is_active(cls) -> bool:
+        return (
+            cls.__socket is not None
+            and time.monotonic() - cls.__last_reply <= media_transport.PATH_TIMEOUT
+        )
+
+    @classmethod
+    def send_packet(cls, packet: Packet) -> bool:
+        """Gửi packet media qua UDP; False nếu packet phải đi TCP"""
+        sock = cls.__socket
+        if (
+            sock is None
+            or not media_transport.is_datagram_packet(packet)
+            or not cls.is_active()
+        ):
+            return False
+
+        if isinstance(packet, VideoStreamPacket) and packet.timestamps is not None:
+            packet.timestamps["send"] = time.monotonic()
+        payload = media_transport.encode_packet(packet)
+        with cls.__send_lock:
+            cls.__frame_no = (cls.__frame_no + 1) & 0xFFFFFFFF
+            for datagram in media_transport.packetize(
+                cls.__token, cls.__frame_no, payload
+            ):
+                try:
+                    sock.send(datagram)
+                except OSError as e:
+                    logger.debug(f"UDP media send failed: {e}")
+                    break
+        return True
+
+    @classmethod
+    def __receive_worker(cls):
+        """Nhận datagram từ server, gửi HELLO mỗi KEEPALIVE_INTERVAL"""
+        next_hello = 0.0
+        while not cls.__shutdown_event.is_set():
+            sock = cls.__socket
+            if sock is None:
+                return
+
+            now = time.monotonic()
+            if now >= next_hello:
+                next_hello = now + media_transport.KEEPALIVE_INTERVAL
+                try:
+                    sock.send(media_transport.hello(cls.__token))
+                except OSError:
+                    pass  # ICMP unreachable từ lần gửi trước - thử lại lần sau
+
+            try:
+                sock.settimeout(max(0.01, next_hello - time.monotonic()))
+                datagram = sock.recv(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                continue
+
+            try:
+                cls.__handle_datagram(datagram)
+            except Exception as e:
+                logger.error(f"Error handling media datagram: {e}")
+
+    @classmethod
+    def __handle_datagram(cls, datagram: bytes):
+        parsed = media_transport.parse(datagram)
+        if parsed is None:
+            return
+        kind, token, frame_no, index, count, total_length, data = parsed
+        if token != cls.__token:
+            return
+
+        if kind == media_transport.HELLO_ACK:
+            if not cls.is_active():
+                logger.info("UDP media path to server is up")
+            cls.__last_reply = time.monotonic()
+            return
+
+        if kind == media_transport.HELLO:
+            return
+
+        payload = cls.__reassembler.add(kind, frame_no, index, count, total_length, data)
+        if payload is None:
+            return
+        packet = media_transport.decode_packet(payload)
+        if not isinstance(packet, (VideoStreamPacket, CursorPacket)):
+            return
+
+        from client.services.listener_service import ListenerService
+
+        ListenerService.submit_packet(packet)
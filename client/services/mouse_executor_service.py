@@ -2,8 +2,9 @@ import logging
 
 import pynput.mouse as mouse
 
-from common.packets import MousePacket
+from common.packets import MousePacket, PointerMotionPacket
 from common.enums import MouseEventType, MouseButton
+from common.pointer_motion import decode_pointer_motion, final_position
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +22,7 @@ class MouseExecutorService:
     }
 
     __mouse_controller = None
+    __pressed_buttons: set = set()  # Các nút đang giữ (đang kéo thả)
 
     @classmethod
     def initialize(cls):
@@ -57,6 +59,25 @@ class MouseExecutorService:
         except Exception as e:
             logger.error(f"Error executing mouse event: {e}", exc_info=True)
 
+    @classmethod
+    def execute_pointer_motion(cls, packet: PointerMotionPacket):
+        """
+        Thực thi PointerMotionPacket: khi đang giữ nút (kéo thả) phát lại toàn bộ
+        đường đi để ứng dụng vẽ/chọn vùng nhận đủ điểm, ngược lại chỉ cần vị trí cuối
+        """
+        if not cls.__mouse_controller:
+            logger.warning("Mouse controller not initialized")
+            return
+
+        try:
+            if cls.__pressed_buttons:
+                for x, y, _ in decode_pointer_motion(packet):
+                    cls.__mouse_controller.position = (x, y)
+            else:
+                cls.__mouse_controller.position = final_position(packet)
+        except Exception as e:
+            logger.error(f"Error executing pointer motion: {e}", exc_info=True)
+
     @classmethod
     def __execute_move(cls, packet: MousePacket):
         """Thực thi di chuyển chuột"""
@@ -81,6 +102,7 @@ class MouseExecutorService:
 
             # Nhấn nút
             cls.__mouse_controller.press(button)
+            cls.__pressed_buttons.add(button)
             logger.debug(f"Mouse pressed: {packet.button.value} at ({x}, {y})")
         except Exception as e:
             logger.error(f"Error pressing mouse button: {e}", exc_info=True)
@@ -100,6 +122,7 @@ class MouseExecutorService:
 
             # Nhả nút
             cls.__mouse_controller.release(button)
+            cls.__pressed_buttons.discard(button)
             logger.debug(f"Mouse released: {packet.button.value} at ({x}, {y})")
         except Exception as e:
             logger.error(f"Error releasing mouse button: {e}", exc_info=True)
@@ -122,8 +145,21 @@ class MouseExecutorService:
         except Exception as e:
             logger.error(f"Error scrolling mouse: {e}", exc_info=True)
 
+    @classmethod
+    def release_all_buttons(cls):
+        """Nhả các nút chuột còn đang giữ (session kết thúc giữa lúc kéo thả)"""
+        if not cls.__mouse_controller:
+            return
+        for button in list(cls.__pressed_buttons):
+            try:
+                cls.__mouse_controller.release(button)
+            except Exception:
+                pass
+        cls.__pressed_buttons.clear()
+
     @classmethod
     def shutdown(cls):
         """Dọn dẹp tài nguyên"""
         cls.__mouse_controller = None
+        cls.__pressed_buttons.clear()
         logger.info("MouseExecutorService shutdown")
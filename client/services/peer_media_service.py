@@ -0,0 +1,329 @@
+import logging
+import secrets
+import socket
+import threading
+import time
+
+from common import media_transport
+from common.config import Config
+from common.packets import CursorPacket, Packet, VideoStreamPacket
+
+logger = logging.getLogger(__name__)
+
+PROBE_INTERVAL = 0.2  # Giây - nhịp thử các địa chỉ trong PROBE_WINDOW đầu
+PROBE_WINDOW = 5.0  # Sau đó thử lại theo nhịp keepalive
+MAX_CANDIDATES = 8
+
+
+class _PeerLink:
+    """Đường trực tiếp của một session"""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        # Peer gửi kèm token này - datagram không có token đúng bị bỏ
+        self.token = secrets.token_bytes(media_transport.TOKEN_SIZE)
+        self.peer_token: bytes | None = None
+        self.candidates: list[tuple[str, int]] = []
+        self.address: tuple[str, int] | None = None  # Địa chỉ peer đã trả lời HELLO
+        self.last_ack = 0.0
+        self.probe_until = 0.0
+        self.next_probe = 0.0
+        self.frame_no = 0
+        self.reassembler = media_transport.Reassembler()
+
+    def is_up(self, now: float) -> bool:
+        return (
+            self.address is not None
+            and now - self.last_ack <= media_transport.PATH_TIMEOUT
+        )
+
+
+class PeerMediaService:
+    """
+    Đường media trực tiếp host <-> controller (--direct-media). Sau
+    SESSION_STARTED hai bên trao đổi địa chỉ UDP qua server
+    (PeerCandidatesPacket), rồi gửi HELLO tới mọi địa chỉ của bên kia; địa chỉ
+    đầu tiên trả lời HELLO_ACK được dùng. Host gửi video / cursor của session
+    thẳng qua đường này, các session chưa có (hoặc vừa mất) đường trực tiếp
+    vẫn đi qua relay - session không bị gián đoạn.
+    """
+
+    __socket: socket.socket | None = None
+    __links: dict[str, _PeerLink] = {}  # session_id -> link
+    __tokens: dict[bytes, _PeerLink] = {}
+    __thread = None
+    __shutdown_event = threading.Event()
+    __lock = threading.Lock()
+
+    @classmethod
+    def offer(cls, session_id: str):
+        """Session mới bắt đầu: gửi địa chỉ UDP của mình cho bên kia qua server"""
+        if Config.ssl:
+            # Datagram không được mã hóa - giữ media trong kết nối TLS
+            return
+        sock = cls.__ensure_socket()
+        if sock is None:
+            return
+
+        link = _PeerLink(session_id)
+        with cls.__lock:
+            old = cls.__links.pop(session_id, None)
+            if old:
+                cls.__tokens.pop(old.token, None)
+            cls.__links[session_id] = link
+            cls.__tokens[link.token] = link
+
+        from client.handlers.send_handler import SendHandler
+
+        SendHandler.send_peer_candidates_packet(
+            session_id, cls.__local_candidates(sock.getsockname()[1]), link.token
+        )
+
+    @classmethod
+    def handle_candidates(
+        cls, session_id: str, candidates: list[tuple[str, int]], token: bytes
+    ):
+        """Nhận địa chỉ của bên kia - bắt đầu thử kết nối"""
+        with cls.__lock:
+            link = cls.__links.get(session_id)
+            if link is None:
+                return
+            link.peer_token = bytes(token)[: media_transport.TOKEN_SIZE]
+            link.candidates = list(dict.fromkeys(tuple(c) for c in candidates))[
+                :MAX_CANDIDATES
+            ]
+            link.probe_until = time.monotonic() + PROBE_WINDOW
+            link.next_probe = 0.0
+        logger.debug(f"Peer candidates for session {session_id}: {link.candidates}")
+        sock = cls.__socket
+        if sock:
+            # Thử ngay, không đợi worker hết timeout recv
+            cls.__probe(sock, time.monotonic())
+
+    @classmethod
+    def remove_session(cls, session_id: str):
+        with cls.__lock:
+            link = cls.__links.pop(session_id, None)
+            if link:
+                cls.__tokens.pop(link.token, None)
+
+    @classmethod
+    def is_direct(cls, session_id: str) -> bool:
+        with cls.__lock:
+            link = cls.__links.get(session_id)
+        return link is not None and link.is_up(time.monotonic())
+
+    @classmethod
+    def shutdown(cls):
+        cls.__shutdown_event.set()
+        if cls.__thread:
+            cls.__thread.join()
+            cls.__thread = None
+        with cls.__lock:
+            cls.__links.clear()
+            cls.__tokens.clear()
+        if cls.__socket:
+            cls.__socket.close()
+            cls.__socket = None
+
+    @classmethod
+    def send_packet(cls, packet: Packet) -> bool:
+        """
+        Gửi packet media qua đường trực tiếp. Video broadcast (session_id None)
+        được tách theo các session đang xem monitor của frame khi có ít nhất
+        một session đi trực tiếp: session trực tiếp nhận qua UDP, session còn
+        lại nhận bản sao có session_id qua relay (relay chỉ chuyển cho đúng
+        session đó). False = gửi như cũ.
+        """
+        if cls.__socket is None or not media_transport.is_datagram_packet(packet):
+            return False
+
+        now = time.monotonic()
+        with cls.__lock:
+            direct = {
+                session_id: link
+                for session_id, link in cls.__links.items()
+                if link.is_up(now)
+            }
+        if not direct:
+            return False
+
+        if packet.session_id is not None:
+            link = direct.get(packet.session_id)
+            if link is None:
+                return False
+            cls.__send(link, packet)
+            return True
+
+        from client.services.screen_share_service import screen_share_service
+        from client.services.sender_service import SenderService
+
+        # Chỉ các session đang xem monitor của frame
+        for session_id in screen_share_service.get_viewers(packet.monitor):
+            copy = VideoStreamPacket(
+                **{
+                    **packet.__dict__,
+                    "session_id": session_id,
+                    "timestamps": (
+                        dict(packet.timestamps)
+                        if packet.timestamps is not None
+                        else None
+                    ),
+                }
+            )
+            link = direct.get(session_id)
+            if link:
+                cls.__send(link, copy)
+            else:
+                SenderService.send_packet(copy)
+        return True
+
+    @classmethod
+    def __send(cls, link: _PeerLink, packet: VideoStreamPacket | CursorPacket):
+        if isinstance(packet, VideoStreamPacket) and packet.timestamps is not None:
+            packet.timestamps["send"] = time.monotonic()
+        payload = media_transport.encode_packet(packet)
+        with cls.__lock:
+            link.frame_no = (link.frame_no + 1) & 0xFFFFFFFF
+            frame_no = link.frame_no
+        sock = cls.__socket
+        if sock is None or link.peer_token is None:
+            return
+        for datagram in media_transport.packetize(link.peer_token, frame_no, payload):
+            try:
+                sock.sendto(datagram, link.address)
+            except OSError as e:
+                logger.debug(f"Direct media send failed: {e}")
+                break
+
+    @classmethod
+    def __ensure_socket(cls) -> socket.socket | None:
+        with cls.__lock:
+            if cls.__socket:
+                return cls.__socket
+            try:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sock.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_RCVBUF, media_transport.SOCKET_BUFFER
+                )
+                sock.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_SNDBUF, media_transport.SOCKET_BUFFER
+                )
+                sock.bind(("0.0.0.0", 0))
+            except OSError as e:
+                logger.warning(f"Direct media path unavailable: {e}")
+                return None
+
+            cls.__socket = sock
+            cls.__shutdown_event.clear()
+            cls.__thread = threading.Thread(
+                target=cls.__worker, daemon=True, name="PeerMedia"
+            )
+            cls.__thread.start()
+            return sock
+
+    @staticmethod
+    def __local_candidates(port: int) -> list[tuple[str, int]]:
+        """Địa chỉ của máy này: IP dùng để tới server trước, rồi các IP khác"""
+        addresses = []
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+                probe.connect((Config.ip, Config.port))  # Không gửi gì, chỉ chọn route
+                addresses.append(probe.getsockname()[0])
+        except OSError:
+            pass
+        try:
+            addresses += [
+                address
+                for address in socket.gethostbyname_ex(socket.gethostname())[2]
+                if not address.startswith("127.")
+            ]
+        except OSError:
+            pass
+        return [(address, port) for address in dict.fromkeys(addresses)][
+            :MAX_CANDIDATES
+        ]
+
+    @classmethod
+    def __worker(cls):
+        """Gửi HELLO tới các địa chỉ của peer và nhận datagram"""
+        while not cls.__shutdown_event.is_set():
+            sock = cls.__socket
+            if sock is None:
+                return
+            next_probe = cls.__probe(sock, time.monotonic())
+            try:
+                sock.settimeout(max(0.01, next_probe - time.monotonic()))
+                datagram, address = sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                continue
+
+            try:
+                cls.__handle_datagram(sock, datagram, address)
+            except Exception as e:
+                logger.error(f"Error handling peer datagram from {address}: {e}")
+
+    @classmethod
+    def __probe(cls, sock: socket.socket, now: float) -> float:
+        """Gửi HELLO tới hạn, trả về thời điểm cần gửi tiếp"""
+        with cls.__lock:
+            links = list(cls.__links.values())
+        next_probe = now + media_transport.KEEPALIVE_INTERVAL
+        for link in links:
+            if link.peer_token is None:
+                continue
+            if now >= link.next_probe:
+                interval = (
+                    PROBE_INTERVAL
+                    if now < link.probe_until and not link.is_up(now)
+                    else media_transport.KEEPALIVE_INTERVAL
+                )
+                link.next_probe = now + interval
+                # Đường đang dùng chỉ cần keepalive; chưa có / vừa mất thì thử mọi địa chỉ
+                targets = [link.address] if link.is_up(now) else link.candidates
+                for address in targets:
+                    try:
+                        sock.sendto(media_transport.hello(link.peer_token), address)
+                    except OSError:
+                        pass
+            next_probe = min(next_probe, link.next_probe)
+        return next_probe
+
+    @classmethod
+    def __handle_datagram(
+        cls, sock: socket.socket, datagram: bytes, address: tuple[str, int]
+    ):
+        parsed = media_transport.parse(datagram)
+        if parsed is None:
+            return
+        kind, token, frame_no, index, count, total_length, data = parsed
+        with cls.__lock:
+            link = cls.__tokens.get(token)
+        if link is None:
+            return
+
+        if kind == media_transport.HELLO:
+            if link.peer_token is not None:
+                sock.sendto(media_transport.hello_ack(link.peer_token), address)
+            return
+        if kind == media_transport.HELLO_ACK:
+            if not link.is_up(time.monotonic()) or link.address != address:
+                logger.info(
+                    f"Direct media path for session {link.session_id} via {address}"
+                )
+            link.address = address
+            link.last_ack = time.monotonic()
+            return
+
+        payload = link.reassembler.add(kind, frame_no, index, count, total_length, data)
+        if payload is None:
+            return
+        packet = media_transport.decode_packet(payload)
+        if packet is None or packet.session_id != link.session_id:
+            return
+
+        from client.services.listener_service import ListenerService
+
+        ListenerService.submit_packet(packet)
@@ -0,0 +1,142 @@
+import logging
+import threading
+from itertools import count
+
+from common.config import Config
+from common.metrics import RttEstimator
+from common.packets import PingPacket, PongPacket
+from client.managers.client_manager import ClientManager
+from client.services.sender_service import SenderService
+
+logger = logging.getLogger(__name__)
+
+
+class PingService:
+    """
+    Đo RTT và clock offset liên tục:
+        - client <-> server (PingPacket không có session_id)
+        - end-to-end tới đối tác qua relay (PingPacket có session_id)
+    Các component khác đọc kết quả qua get_server_link() / get_session_link().
+    """
+
+    __thread = None
+    __shutdown_event = threading.Event()
+    __ping_ids = count(1)
+    __server_link = RttEstimator()
+    __session_links: dict[str, RttEstimator] = {}
+    __lock = threading.Lock()
+    __interval: float | None = None
+
+    @classmethod
+    def initialize(cls):
+        """Bắt đầu gửi ping định kỳ"""
+        if cls.__thread and cls.__thread.is_alive():
+            return
+        cls.__shutdown_event.clear()
+        cls.__thread = threading.Thread(
+            target=cls.__ping_worker, daemon=True, name="PingService"
+        )
+        cls.__thread.start()
+        logger.info(f"PingService started (interval={cls.get_interval()}s)")
+
+    @classmethod
+    def shutdown(cls):
+        cls.__shutdown_event.set()
+        if cls.__thread:
+            cls.__thread.join(timeout=2)
+            cls.__thread = None
+
+    @classmethod
+    def get_interval(cls) -> float:
+        return cls.__interval or Config.ping_interval
+
+    @classmethod
+    def set_heartbeat_interval(cls, heartbeat_interval: float | None):
+        """Ping cũng là heartbeat - không được thưa hơn interval server yêu cầu"""
+        if not heartbeat_interval:
+            cls.__interval = None
+            return
+        cls.__interval = min(Config.ping_interval, heartbeat_interval)
+
+    @classmethod
+    def __ping_worker(cls):
+        while not cls.__shutdown_event.wait(timeout=cls.get_interval()):
+            try:
+                SenderService.send_packet(
+                    PingPacket(
+                        ping_id=next(cls.__ping_ids),
+                        rtt=cls.__server_link.srtt,
+                        rttvar=cls.__server_link.rttvar,
+                    )
+                )
+
+                from client.managers.session_manager import SessionManager
+
+                # Chỉ phía controller ping end-to-end, host chỉ trả lời pong
+                for session_id, session in list(SessionManager._sessions.items()):
+                    if session.role != "controller":
+                        continue
+                    SenderService.send_packet(
+                        PingPacket(ping_id=next(cls.__ping_ids), session_id=session_id)
+                    )
+            except Exception as e:
+                logger.error(f"Error sending ping: {e}")
+
+    @classmethod
+    def handle_packet(cls, packet: PingPacket | PongPacket, receive_ts: float):
+        """Xử lý ping/pong ngay trên thread nhận (receive_ts = lúc nhận từ socket)"""
+        if isinstance(packet, PingPacket):
+            # Đối tác ping end-to-end -> trả lời qua relay
+            SenderService.send_packet(
+                PongPacket(
+                    ping_id=packet.ping_id,
+                    origin_ts=packet.origin_ts,
+                    receive_ts=receive_ts,
+                    session_id=packet.session_id,
+                )
+            )
+            return
+
+        if packet.session_id is None:
+            estimator = cls.__server_link
+        else:
+            with cls.__lock:
+                estimator = cls.__session_links.setdefault(
+                    packet.session_id, RttEstimator()
+                )
+
+        estimator.update(
+            packet.origin_ts, packet.receive_ts, packet.reply_ts, receive_ts
+        )
+
+        if packet.session_id is None:
+            ClientManager.set_server_clock_offset(estimator.offset)
+
+    @classmethod
+    def remove_session(cls, session_id: str):
+        with cls.__lock:
+            cls.__session_links.pop(session_id, None)
+
+    @classmethod
+    def get_server_rtt(cls) -> float | None:
+        """SRTT tới server (giây), None nếu chưa đo được"""
+        return cls.__server_link.srtt
+
+    @classmethod
+    def get_session_rtt(cls, session_id: str) -> float | None:
+        """SRTT end-to-end tới đối tác của session (giây)"""
+        with cls.__lock:
+            estimator = cls.__session_links.get(session_id)
+        return estimator.srtt if estimator else None
+
+    @classmethod
+    def get_server_link(cls) -> dict:
+        """Stats link client <-> server: srtt, rttvar, min_rtt, offset (ms)"""
+        return cls.__server_link.snapshot()
+
+    @classmethod
+    def get_session_link(cls, session_id: str) -> dict | None:
+        """Stats link end-to-end với đối tác của session"""
+        with cls.__lock:
+            estimator = cls.__session_links.get(session_id)
+        return estimator.snapshot() if estimator else None
@@ -0,0 +1,142 @@
+import logging
+import random
+import socket
+import ssl
+import threading
+import time
+from typing import Callable
+
+from common.packets import AssignIdPacket
+from common.protocol import Protocol
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_MIN_DELAY = 0.1  # Giây - lần thử đầu gần như ngay lập tức (mạng chập chờn)
+RECONNECT_MAX_DELAY = 5.0
+
+
+class ReconnectService:
+    """
+    Kết nối lại server khi kết nối TCP bị ngắt. Lần thử đầu ngay lập tức, sau
+    đó chờ theo exponential backoff (có jitter để hàng loạt client không cùng
+    thử một lúc khi server khởi động lại). Client gửi lại ID và resume token:
+    nếu server còn giữ chỗ (trong --resume-grace) thì ID, các session và mật
+    khẩu đã xác thực được giữ nguyên, host chỉ cần gửi keyframe mới.
+    """
+
+    __connect: Callable[[], socket.socket | ssl.SSLSocket] | None = None
+    __socket: socket.socket | ssl.SSLSocket | None = None  # Kết nối hiện tại
+    __thread = None
+    __shutdown_event = threading.Event()
+    __lock = threading.Lock()
+
+    @classmethod
+    def initialize(
+        cls,
+        connect: Callable[[], socket.socket | ssl.SSLSocket],
+        sock: socket.socket | ssl.SSLSocket,
+    ):
+        """
+        :param connect: Mở kết nối mới tới server và gửi ClientInformationPacket
+        :param sock: Kết nối hiện tại
+        """
+        cls.__connect = connect
+        cls.__socket = sock
+        cls.__shutdown_event.clear()
+
+    @classmethod
+    def shutdown(cls):
+        cls.__shutdown_event.set()
+        if cls.__thread:
+            cls.__thread.join(timeout=RECONNECT_MAX_DELAY)
+            cls.__thread = None
+
+    @classmethod
+    def connection_lost(cls, sock: socket.socket | ssl.SSLSocket):
+        """Listener / sender báo kết nối bị ngắt (gọi nhiều lần cũng được)"""
+        with cls.__lock:
+            if (
+                cls.__shutdown_event.is_set()
+                or cls.__connect is None
+                or sock is not cls.__socket
+                or (cls.__thread and cls.__thread.is_alive())
+            ):
+                return
+            cls.__thread = threading.Thread(
+                target=cls.__reconnect_worker, daemon=True, name="Reconnect"
+            )
+            cls.__thread.start()
+
+    @classmethod
+    def __reconnect_worker(cls):
+        from client.controllers.main_window_controller import main_window_controller
+        from client.services.sender_service import SenderService
+
+        lost_at = time.monotonic()
+        logger.warning("Connection to server lost. Reconnecting...")
+        SenderService.suspend()
+        main_window_controller.on_ui_show_notification(
+            "Connection to server lost. Reconnecting...", "warning"
+        )
+
+        delay = RECONNECT_MIN_DELAY
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                sock = cls.__connect()
+                assign_id_packet = Protocol.receive_packet(sock)
+                if not isinstance(assign_id_packet, AssignIdPacket):
+                    sock.close()  # Vd. server đầy (ConnectionResponsePacket)
+                    raise ConnectionError(f"Unexpected reply {assign_id_packet}")
+                break
+            except Exception as e:
+                logger.debug(f"Reconnect attempt {attempts} failed: {e}")
+
+            # Jitter: chờ trong [delay/2, delay*1.5)
+            if cls.__shutdown_event.wait(delay * (0.5 + random.random())):
+                return
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+        cls.__resumed(sock, assign_id_packet, time.monotonic() - lost_at, attempts)
+
+    @classmethod
+    def __resumed(
+        cls,
+        sock: socket.socket | ssl.SSLSocket,
+        assign_id_packet: AssignIdPacket,
+        downtime: float,
+        attempts: int,
+    ):
+        from client.controllers.main_window_controller import main_window_controller
+        from client.handlers.receive_handler import ReceiveHandler
+        from client.managers.session_manager import SessionManager
+        from client.services.listener_service import ListenerService
+        from client.services.sender_service import SenderService
+
+        old_socket, cls.__socket = cls.__socket, sock
+        if not assign_id_packet.resumed:
+            # Server không còn giữ chỗ: ID mới, các session cũ đã kết thúc
+            for session_id in list(SessionManager._sessions):
+                SessionManager.remove_session(session_id, send_end_packet=False)
+
+        SenderService.replace_socket(sock)
+        ListenerService.replace_socket(sock)
+        ReceiveHandler.handle_packet(assign_id_packet)
+        if old_socket:
+            try:
+                old_socket.close()
+            except OSError:
+                pass
+
+        logger.info(
+            f"Reconnected after {downtime:.2f}s ({attempts} attempts, "
+            f"{'session resumed' if assign_id_packet.resumed else 'new client ID'})"
+        )
+        if assign_id_packet.resumed:
+            main_window_controller.on_ui_show_notification("Reconnected to server.", "info")
+        else:
+            main_window_controller.on_ui_show_notification(
+                "Reconnected to server with a new ID. Previous sessions have ended.",
+                "warning",
+            )
@@ -1,113 +1,281 @@
 import threading
 import time
 import logging
-from typing import Set
 
 from pynput.mouse import Controller
 import mss
+from mss.base import MSSBase
 
 from common.h264 import H264Encoder
-from common.utils import capture_frame, get_cursor_info_for_monitor
+from common.utils import capture_frame, get_cursor_info_for_monitor, get_cursor_shape
 from client.handlers.send_handler import SendHandler
+from client.managers.client_manager import ClientManager
 from common.config import Config
 
 logger = logging.getLogger(__name__)
 
+PRIMARY_MONITOR = 1  # sct.monitors[0] là cả desktop ảo, monitor thật bắt đầu từ 1
+
+
+class _MonitorStream:
+    """Pipeline của một monitor: thread capture (mss riêng) và encoder riêng"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.viewers: set[str] = set()  # Các session đang xem monitor này
+        # Mỗi lần start có Event riêng, worker của lần trước (đang thoát) không
+        # chạy tiếp khi monitor được start lại
+        self.running = threading.Event()
+        self.thread: threading.Thread | None = None
+        self.encoder: H264Encoder | None = None
+        self.screen_config: dict | None = None  # Dict chứa monitor info
+        self.extradata: bytes | None = None  # SPS/PPS của encoder hiện tại
+        self.idle_since = 0.0  # Lúc người xem cuối rời đi
+        self.frame_seq = 0  # Số thứ tự frame riêng của monitor
+
 
 class ScreenShareService:
     """
-    Screen sharing service - capture 1 lần, gửi cho nhiều sessions.
+    Screen sharing service - mỗi monitor capture 1 lần, gửi cho mọi session
+    đang xem monitor đó. Mỗi monitor có thread và H264Encoder riêng nên các
+    monitor được encode song song; monitor không ai xem không capture / encode.
+    Cursor được lấy mẫu trên thread riêng (cursor_rate Hz) và gửi bằng CursorPacket,
+    không phụ thuộc tốc độ frame video.
+
+    Người xem cuối của một monitor rời đi (đóng session hoặc chuyển monitor)
+    thì encoder và handle capture của monitor được giữ ấm keep_warm giây:
+    chuyển lại monitor đó trong thời gian này nhận VideoConfigPacket ngay từ
+    extradata đã lưu và frame đầu tiên là IDR, không phải mở lại mss / x264.
     """
 
-    def __init__(self, fps: int = 30, gop_size: int = 60, bitrate: int = 2_000_000):
-        self.__monitor_number = 1
+    def __init__(
+        self,
+        fps: int = 30,
+        gop_size: int = 60,
+        bitrate: int = 2_000_000,
+        cursor_rate: int = 120,
+        keep_warm: float = 0,
+    ):
         self.__fps = fps
+        self.__cursor_rate = cursor_rate
         self.__gop_size = gop_size
         self.__bitrate = bitrate
-
-        # Quản lý sessions
-        self.__active_sessions: Set[str] = set()
+        self.__keep_warm = keep_warm
+
+        # Quản lý sessions: session -> các monitor đang xem
+        self.__session_monitors: dict[str, set[int]] = {}
+        self.__streams: dict[int, _MonitorStream] = {}  # Chỉ số monitor -> pipeline
+        # Danh sách monitor (như MonitorListPacket.monitors), cập nhật mỗi khi
+        # một pipeline mở encoder
+        self.__monitors: list[dict[str, int]] | None = None
         self.__sessions_lock = threading.RLock()
-
-        # Streaming state
-        self.__is_running = threading.Event()
-        self.__streaming_thread = None
+        # Báo cho các worker khi danh sách người xem thay đổi
+        self.__sessions_changed = threading.Condition(self.__sessions_lock)
         self.__mouse_controller = Controller()
 
-        # Encoder (sẽ được tạo khi có session đầu tiên)
-        self.__encoder = None
-        self.__screen_config = None  # Dict chứa monitor info
-
-        # Cache cursor info để chỉ gửi khi thay đổi
-        self.__last_cursor_type = None
-        self.__last_cursor_position = None
+        # Cursor: chỉ gửi khi thay đổi, bitmap mỗi shape chỉ gửi 1 lần cho mỗi
+        # (session, monitor) - mỗi monitor là một cửa sổ riêng bên controller
+        self.__cursor_running = threading.Event()
+        self.__cursor_thread = None
+        self.__last_cursor_state: dict[int, tuple] = {}  # monitor -> (type, position, visible)
+        self.__cursor_shapes_sent: dict[tuple[str, int], set[str]] = {}
 
         logger.info("CentralizedScreenShareService initialized")
 
     def add_session(self, session_id: str):
-        """Thêm session cần stream tới và gửi config ngay lập tức."""
+        """
+        Thêm session cần stream tới, bắt đầu với monitor chính. Controller
+        nhận danh sách monitor và có thể chọn lại bằng MonitorSelectPacket.
+        """
         with self.__sessions_lock:
-            self.__active_sessions.add(session_id)
+            self.__session_monitors.setdefault(session_id, set())
+            self.__set_session_monitors(session_id, {PRIMARY_MONITOR})
 
-            if not self.__encoder:
-                self.__initialize_encoder()
+            if not self.__cursor_running.is_set():
+                self.__start_cursor_sampler()
 
-            self.__send_config_to_session(session_id)
+    def select_monitors(self, session_id: str, monitors: list[int]):
+        """
+        Controller chọn monitor muốn xem. Monitor đang chạy / còn ấm gửi config
+        và keyframe ngay, monitor không còn ai xem được giữ ấm.
+        """
+        with self.__sessions_lock:
+            if session_id not in self.__session_monitors:
+                return
+
+            count = len(self.__get_monitors())
+            selected = {
+                monitor
+                for monitor in monitors
+                if isinstance(monitor, int) and 1 <= monitor <= count
+            }
+            if not selected:
+                logger.warning(
+                    f"Session {session_id} selected no valid monitor: {monitors}"
+                )
+                # Báo lại danh sách hiện tại để controller đồng bộ
+                self.__send_monitor_list(session_id)
+                return
 
-            if not self.__is_running.is_set():
-                self.__start_streaming()
+            self.__set_session_monitors(session_id, selected)
+        logger.debug(f"Session {session_id} watching monitors {sorted(selected)}")
 
-    def __initialize_encoder(self):
-        """Khởi tạo encoder với dummy frame để có extradata."""
-        try:
-            with mss.mss(with_cursor=True) as sct:
-                monitor = sct.monitors[self.__monitor_number]
-                width, height = monitor["width"], monitor["height"]
-
-                self.__encoder = H264Encoder(
-                    width=width,
-                    height=height,
-                    fps=self.__fps,
-                    gop_size=self.__gop_size,
-                    bitrate=self.__bitrate,
-                )
+    def get_viewers(self, monitor: int) -> set[str]:
+        """Các session đang xem monitor"""
+        with self.__sessions_lock:
+            stream = self.__streams.get(monitor)
+            return set(stream.viewers) if stream else set()
+
+    def __set_session_monitors(self, session_id: str, selected: set[int]):
+        """Đổi các monitor session xem (gọi khi đang giữ __sessions_lock)"""
+        previous = self.__session_monitors[session_id]
+        self.__session_monitors[session_id] = selected
+
+        # Gửi trước video: server lọc video broadcast theo danh sách này
+        self.__send_monitor_list(session_id)
+
+        for index in previous - selected:
+            self.__remove_viewer(index, session_id)
+        for index in sorted(selected - previous):
+            self.__add_viewer(index, session_id)
+
+    def __add_viewer(self, index: int, session_id: str):
+        stream = self.__streams.get(index)
+        if stream is None:
+            stream = self.__streams[index] = _MonitorStream(index)
+        stream.viewers.add(session_id)
+        self.__cursor_shapes_sent[(session_id, index)] = set()
+        self.__last_cursor_state.pop(index, None)  # Gửi lại trạng thái cursor
+
+        if stream.encoder:
+            self.__send_config_to_session(stream, session_id)
+            # Người xem mới chỉ giải mã được từ IDR
+            stream.encoder.request_keyframe()
+
+        if stream.running.is_set():
+            self.__sessions_changed.notify_all()
+        else:
+            self.__start_stream(stream)
+
+    def __remove_viewer(self, index: int, session_id: str):
+        self.__cursor_shapes_sent.pop((session_id, index), None)
+        stream = self.__streams.get(index)
+        if stream is None or session_id not in stream.viewers:
+            return
+        stream.viewers.discard(session_id)
 
-                self.__screen_config = {
-                    "monitor": monitor,
-                    "width": width,
-                    "height": height,
-                }
+        if not stream.viewers and stream.running.is_set():
+            # Worker của monitor giữ ấm encoder hoặc dừng
+            stream.idle_since = time.monotonic()
+            self.__sessions_changed.notify_all()
 
-                img = capture_frame(
-                    sct_instance=sct,
-                    monitor=monitor,
-                )
+    def __get_monitors(self) -> list[dict[str, int]]:
+        """Danh sách monitor của máy - lần đầu mở mss để đọc"""
+        if self.__monitors is None:
+            try:
+                with mss.mss(with_cursor=False) as sct:
+                    self.__monitors = self.__describe_monitors(sct.monitors)
+            except Exception as e:
+                logger.error(f"Error listing monitors: {e}")
+                return []
+        return self.__monitors
+
+    @staticmethod
+    def __describe_monitors(monitors: list[dict]) -> list[dict[str, int]]:
+        return [
+            {
+                "index": index,
+                "left": monitor["left"],
+                "top": monitor["top"],
+                "width": monitor["width"],
+                "height": monitor["height"],
+            }
+            for index, monitor in enumerate(monitors)
+            if index > 0
+        ]
+
+    def __send_monitor_list(self, session_id: str):
+        try:
+            SendHandler.send_monitor_list_packet(
+                session_id=session_id,
+                monitors=self.__get_monitors(),
+                selected=sorted(self.__session_monitors.get(session_id, ())),
+            )
+        except Exception as e:
+            logger.error(f"Error sending monitor list to {session_id}: {e}")
+
+    def __initialize_encoder(self, stream: _MonitorStream, sct: MSSBase):
+        """Tạo encoder cho monitor và gửi config cho các session đang chờ."""
+        try:
+            # mss của worker đọc lại danh sách monitor (có thể đã cắm / rút màn hình)
+            self.__monitors = self.__describe_monitors(sct.monitors)
+            if stream.index >= len(sct.monitors):
+                raise ValueError(f"Monitor {stream.index} not found")
+
+            monitor = sct.monitors[stream.index]
+            width, height = monitor["width"], monitor["height"]
+
+            stream.encoder = H264Encoder(
+                width=width,
+                height=height,
+                fps=self.__fps,
+                gop_size=self.__gop_size,
+                bitrate=self.__bitrate,
+            )
+
+            stream.screen_config = {
+                "monitor": monitor,
+                "width": width,
+                "height": height,
+            }
+
+            # Global header: SPS/PPS có ngay khi mở codec. Encoder chỉ xuất
+            # extradata sau frame đầu thì encode một dummy frame như trước
+            stream.extradata = stream.encoder.get_extradata()
+            if not stream.extradata:
+                img = capture_frame(sct_instance=sct, monitor=monitor)
                 if img:
-                    self.__encoder.encode(img)
-                    logger.debug(
-                        f"Encoder initialized with dummy frame: {width}x{height}@{self.__fps}fps"
-                    )
-                else:
-                    logger.warning(
-                        "Failed to capture dummy frame for encoder initialization"
-                    )
+                    stream.encoder.encode(img)
+                    stream.encoder.request_keyframe()
+                    stream.extradata = stream.encoder.get_extradata()
+            if not stream.extradata:
+                logger.warning(f"Encoder of monitor {stream.index} produced no extradata")
+            logger.debug(
+                f"Encoder initialized for monitor {stream.index}: "
+                f"{width}x{height}@{self.__fps}fps"
+            )
+
+            for session_id in stream.viewers:
+                self.__send_config_to_session(stream, session_id)
 
         except Exception as e:
-            logger.error(f"Error initializing encoder: {e}", exc_info=True)
-
-    def __send_config_to_session(self, session_id: str):
-        """Gửi video config cho session cụ thể."""
-        if self.__encoder and self.__screen_config:
-            extradata = self.__encoder.get_extradata()
+            logger.error(
+                f"Error initializing encoder for monitor {stream.index}: {e}",
+                exc_info=True,
+            )
+
+    @staticmethod
+    def __close_encoder(stream: _MonitorStream):
+        if stream.encoder:
+            stream.encoder.close()
+            stream.encoder = None
+            stream.screen_config = None
+            stream.extradata = None
+
+    def __send_config_to_session(self, stream: _MonitorStream, session_id: str):
+        """Gửi video config của monitor cho session cụ thể."""
+        if stream.encoder and stream.screen_config:
+            extradata = stream.extradata
             if extradata:
                 try:
                     SendHandler.send_video_config_packet(
                         session_id=session_id,
-                        width=self.__screen_config["width"],
-                        height=self.__screen_config["height"],
+                        width=stream.screen_config["width"],
+                        height=stream.screen_config["height"],
                         fps=self.__fps,
                         codec="h264",
                         extradata=extradata,
+                        monitor=stream.index,
                     )
 
                 except Exception as e:
@@ -117,124 +285,126 @@ class ScreenShareService:
                     f"Cannot send config to {session_id}: encoder not ready or no extradata"
                 )
 
+    def request_keyframe(self, session_id: str, monitor: int | None = None):
+        """
+        Controller mất frame - frame tiếp theo của monitor là keyframe (dùng
+        chung cho mọi session xem monitor). monitor None = mọi monitor session xem.
+        """
+        with self.__sessions_lock:
+            watching = self.__session_monitors.get(session_id)
+            if not watching:
+                return
+            for index in watching if monitor is None else watching & {monitor}:
+                stream = self.__streams.get(index)
+                if stream and stream.encoder:
+                    stream.encoder.request_keyframe()
+        logger.debug(f"Keyframe requested by session {session_id} (monitor {monitor})")
+
     def remove_session(self, session_id: str):
         """Xóa session khỏi danh sách stream."""
         with self.__sessions_lock:
-            if session_id in self.__active_sessions:
-                self.__active_sessions.remove(session_id)
-                logger.debug(
-                    f"Removed session from centralized streaming: {session_id}"
-                )
-
-            if not self.__active_sessions and self.__is_running.is_set():
-                self.__stop_streaming()
-
-    def __start_streaming(self):
-        """Bắt đầu streaming (private method)."""
-        if self.__is_running.is_set():
-            logger.warning("Centralized streaming already running")
-            return
-
-        self.__is_running.set()
-        self.__streaming_thread = threading.Thread(
-            target=self.__stream_worker, daemon=True, name="CentralizedScreenStreamer"
+            monitors = self.__session_monitors.pop(session_id, None)
+            if monitors is None:
+                return
+            for index in monitors:
+                self.__remove_viewer(index, session_id)
+            self.__sessions_changed.notify_all()
+            logger.debug(f"Removed session from centralized streaming: {session_id}")
+
+    def __start_stream(self, stream: _MonitorStream):
+        """Bắt đầu pipeline của một monitor (gọi khi đang giữ __sessions_lock)."""
+        running = threading.Event()
+        running.set()
+        stream.running = running
+        stream.thread = threading.Thread(
+            target=self.__stream_worker,
+            args=(stream, running),
+            daemon=True,
+            name=f"ScreenStreamer-{stream.index}",
         )
-        self.__streaming_thread.start()
-        logger.info("Centralized screen streaming started")
-
-    def __stop_streaming(self):
-        """Dừng streaming (private method)."""
-        if not self.__is_running.is_set():
-            return
-
-        self.__is_running.clear()
-        if self.__streaming_thread:
-            self.__streaming_thread.join(timeout=5.0)
-
-        # Cleanup encoder
-        if self.__encoder:
-            self.__encoder.close()
-            self.__encoder = None
-            self.__screen_config = None
-
-        logger.info("Centralized screen streaming stopped")
-
-    def __stream_worker(self):
-        """Thread worker: capture 1 lần → encode 1 lần → gửi cho tất cả sessions."""
+        stream.thread.start()
+        logger.info(f"Screen streaming of monitor {stream.index} started")
+
+    def __start_cursor_sampler(self):
+        """Bắt đầu lấy mẫu cursor (gọi khi đang giữ __sessions_lock)."""
+        self.__cursor_running.set()
+        self.__cursor_thread = threading.Thread(
+            target=self.__cursor_worker,
+            daemon=True,
+            name="CursorSampler",
+        )
+        self.__cursor_thread.start()
+
+    def __wait_for_viewers(self, stream: _MonitorStream, running: threading.Event) -> bool:
+        """
+        Monitor không còn ai xem: chờ người xem mới trong thời gian giữ ấm (gọi
+        khi đang giữ __sessions_lock). Hết thời gian thì dừng pipeline và đóng
+        encoder, trả về False.
+        """
+        deadline = stream.idle_since + self.__keep_warm
+        while running.is_set() and not stream.viewers:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                running.clear()
+                self.__close_encoder(stream)
+                logger.info(f"Screen streaming of monitor {stream.index} stopped")
+                return False
+            self.__sessions_changed.wait(remaining)
+        return running.is_set()
+
+    def __stream_worker(self, stream: _MonitorStream, running: threading.Event):
+        """Thread worker: capture monitor 1 lần → encode 1 lần → gửi cho các session đang xem."""
         frame_delay = 1.0 / self.__fps
 
-        with mss.mss(with_cursor=True) as sct:
-            try:
-                while self.__is_running.is_set():
+        try:
+            with mss.mss(with_cursor=False) as sct:
+                while running.is_set():
                     loop_start = time.perf_counter()
 
-                    # Kiểm tra có sessions không
                     with self.__sessions_lock:
-                        if not self.__active_sessions:
-                            break
+                        if not stream.viewers:
+                            if not self.__wait_for_viewers(stream, running):
+                                break
+                            continue
 
-                    # Encoder sẽ được khởi tạo trong add_session(), nhưng double-check
-                    if not self.__encoder or not self.__screen_config:
-                        logger.warning(
-                            "Encoder not initialized, initializing in stream worker..."
-                        )
-                        with self.__sessions_lock:
-                            self.__initialize_encoder()
+                        if not stream.encoder or not stream.screen_config:
+                            self.__initialize_encoder(stream, sct)
 
+                    encoder, screen_config = stream.encoder, stream.screen_config
                     # Kiểm tra lại sau khi khởi tạo
-                    if not self.__encoder or not self.__screen_config:
+                    if not encoder or not screen_config:
                         logger.error("Failed to initialize encoder, skipping frame")
                         time.sleep(frame_delay)
                         continue
 
                     # CAPTURE 1 LẦN
+                    capture_ts = time.monotonic()
                     img = capture_frame(
                         sct_instance=sct,
-                        monitor=self.__screen_config["monitor"],
+                        monitor=screen_config["monitor"],
                     )
 
                     if not img:
                         time.sleep(frame_delay)
                         continue
 
-                    # LẤY THÔNG TIN CURSOR - chỉ khi thay đổi
-                    cursor_info = get_cursor_info_for_monitor(
-                        self.__screen_config["monitor"], self.__mouse_controller
-                    )
+                    video_data = encoder.encode(img)
+                    encode_ts = time.monotonic()
 
-                    # Kiểm tra xem cursor có thay đổi không
-                    cursor_changed = False
-                    cursor_type_to_send = None
-                    cursor_pos_to_send = None
-
-                    if cursor_info:
-                        current_type = cursor_info.get("cursor_type")
-                        current_pos = cursor_info.get("position")
-
-                        # Chỉ gửi khi type hoặc position thay đổi
-                        if (
-                            current_type != self.__last_cursor_type
-                            or current_pos != self.__last_cursor_position
-                        ):
-                            cursor_changed = True
-                            cursor_type_to_send = current_type
-                            cursor_pos_to_send = current_pos
-                            self.__last_cursor_type = current_type
-                            self.__last_cursor_position = current_pos
-
-                    video_data = self.__encoder.encode(img)
-
-                    # Gửi video packet - chỉ kèm cursor info khi có thay đổi
+                    # Gửi video packet - cursor đi bằng CursorPacket riêng
                     if video_data:
+                        stream.frame_seq += 1
                         try:
                             SendHandler.send_video_stream_packet(
                                 video_data=video_data,
-                                cursor_type=(
-                                    cursor_type_to_send if cursor_changed else None
-                                ),
-                                cursor_position=(
-                                    cursor_pos_to_send if cursor_changed else None
-                                ),
+                                frame_seq=stream.frame_seq,
+                                timestamps={
+                                    "capture": capture_ts,
+                                    "encode": encode_ts,
+                                },
+                                clock_offset=ClientManager.get_server_clock_offset(),
+                                keyframe=encoder.keyframe,
+                                monitor=stream.index,
                             )
 
                         except Exception as e:
@@ -246,11 +416,95 @@ class ScreenShareService:
                     if sleep_time > 0:
                         time.sleep(sleep_time)
 
+        except Exception as e:
+            logger.error(
+                f"Stream error on monitor {stream.index}: {e}", exc_info=True
+            )
+        finally:
+            with self.__sessions_lock:
+                if running.is_set():
+                    # Thoát vì lỗi - người xem sau start lại từ đầu
+                    running.clear()
+                    self.__close_encoder(stream)
+
+    def __cursor_worker(self):
+        """Thread worker: lấy mẫu cursor theo nhịp riêng, chỉ gửi khi thay đổi."""
+        sample_delay = 1.0 / self.__cursor_rate
+
+        while True:
+            with self.__sessions_lock:
+                if not self.__session_monitors:
+                    # Session cuối đã rời đi - session sau start lại thread
+                    self.__cursor_running.clear()
+                    self.__last_cursor_state.clear()
+                    return
+            loop_start = time.perf_counter()
+            try:
+                self.__sample_cursor()
             except Exception as e:
-                logger.error(f"Centralized stream error: {e}", exc_info=True)
+                logger.error(f"Cursor sampler error: {e}")
+
+            sleep_time = sample_delay - (time.perf_counter() - loop_start)
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+
+    def __sample_cursor(self):
+        """Lấy trạng thái cursor trên mỗi monitor đang được xem và gửi CursorPacket nếu thay đổi."""
+        with self.__sessions_lock:
+            targets = [
+                (stream.index, stream.screen_config["monitor"], list(stream.viewers))
+                for stream in self.__streams.values()
+                if stream.viewers and stream.screen_config
+            ]
+
+        for index, monitor, viewers in targets:
+            last_state = self.__last_cursor_state.get(index)
+            cursor_info = get_cursor_info_for_monitor(monitor, self.__mouse_controller)
+            if cursor_info:
+                state = (
+                    cursor_info["cursor_type"],
+                    cursor_info["position"],
+                    cursor_info["visible"],
+                )
+            elif last_state and last_state[2]:
+                # Cursor rời khỏi monitor -> ẩn trên cửa sổ của monitor này
+                state = (last_state[0], last_state[1], False)
+            else:
+                continue
+
+            if state == last_state:
+                continue
+            self.__last_cursor_state[index] = state
+
+            cursor_type, position, visible = state
+            shape = get_cursor_shape(cursor_type)
+
+            for session_id in viewers:
+                shapes_sent = self.__cursor_shapes_sent.get((session_id, index))
+                if shapes_sent is None:
+                    continue  # Vừa thôi xem monitor
+                shape_data = None
+                if shape and shape["shape_id"] not in shapes_sent:
+                    shapes_sent.add(shape["shape_id"])
+                    shape_data = shape["shape_data"]
+
+                SendHandler.send_cursor_packet(
+                    session_id=session_id,
+                    position=position,
+                    visible=visible,
+                    cursor_type=cursor_type,
+                    shape_id=shape["shape_id"] if shape else None,
+                    hotspot=shape["hotspot"] if shape else (0, 0),
+                    shape_data=shape_data,
+                    monitor=index,
+                )
 
 
 bitrate = int(2_000_000 * (Config.fps / 25.0) * 1.2)
 screen_share_service = ScreenShareService(
-    fps=Config.fps, gop_size=Config.fps, bitrate=bitrate
+    fps=Config.fps,
+    gop_size=Config.fps,
+    bitrate=bitrate,
+    cursor_rate=Config.cursor_rate,
+    keep_warm=Config.encoder_keep_warm,
 )
@@ -2,16 +2,22 @@ from common.protocol import Protocol
 import logging
 import threading
 import socket
-from queue import Queue, Empty
-from common.packets import Packet
+import time
+from queue import Empty
+from common.packets import Packet, PingPacket, PongPacket, VideoStreamPacket
+from common.streams import StreamQueue
+from client.services.media_transport_service import MediaTransportService
+from client.services.peer_media_service import PeerMediaService
 
 logger = logging.getLogger(__name__)
 
 
 class SenderService:
-    __queue = Queue(maxsize=5000)  # Tăng lên để hỗ trợ multiple sessions
+    # Tăng lên để hỗ trợ multiple sessions; chia lượt theo stream để file lớn không chặn video / input
+    __queue = StreamQueue(maxsize=5000)
     __sending_thread = None
     __shutdown_event = threading.Event()
+    __connected = threading.Event()  # Cleared khi mất kết nối, chờ ReconnectService
     __socket = None
 
     @classmethod
@@ -19,6 +25,7 @@ class SenderService:
         """Khởi tạo dịch vụ gửi dữ liệu với socket đã kết nối."""
         cls.__socket = sock
         cls.__shutdown_event.clear()
+        cls.__connected.set()
         cls.__sending_thread = threading.Thread(target=cls.__send_worker, daemon=True)
         cls.__sending_thread.start()
         logger.info("SenderService initialized and sending thread started")
@@ -27,14 +34,35 @@ class SenderService:
     def __send_worker(cls):
         """Worker thread để gửi dữ liệu từ hàng đợi."""
         while not cls.__shutdown_event.is_set():
+            if not cls.__connected.wait(timeout=0.1):
+                continue  # Đang kết nối lại - packet chờ trong queue
+            sock = cls.__socket
             try:
                 packet = cls.__queue.get(timeout=0.01)
-                if cls.__socket:
-                    Protocol.send_packet(cls.__socket, packet)
+                if sock is not cls.__socket:
+                    # Đã kết nối lại trong lúc chờ - gửi qua socket mới
+                    cls.__queue.requeue(packet)
+                    continue
+                if sock:
+                    if (
+                        isinstance(packet, VideoStreamPacket)
+                        and packet.timestamps is not None
+                    ):
+                        packet.timestamps["send"] = time.monotonic()
+                    elif isinstance(packet, PingPacket):
+                        packet.origin_ts = time.monotonic()
+                    elif isinstance(packet, PongPacket):
+                        packet.reply_ts = time.monotonic()
+                    Protocol.send_packet(sock, packet)
                 else:
                     logger.error("Socket is None, cannot send packet")
             except Empty:
                 continue
+            except (ConnectionError, OSError) as e:
+                logger.debug(f"Connection lost in sender: {e}")
+                from client.services.reconnect_service import ReconnectService
+
+                ReconnectService.connection_lost(sock)
             except Exception as e:
                 logger.error(f"Error in sender worker - {e}")
 
@@ -46,11 +74,41 @@ class SenderService:
             cls.__sending_thread.join()
         cls.__socket = None
 
+    @classmethod
+    def suspend(cls):
+        """Mất kết nối: ngừng gửi, video mới bị bỏ cho tới khi kết nối lại"""
+        cls.__connected.clear()
+
+    @classmethod
+    def replace_socket(cls, sock: socket.socket):
+        """Đã kết nối lại: gửi tiếp phần còn trong queue qua socket mới"""
+        # Video cũ vô nghĩa (host gửi keyframe), dữ liệu đang bay đã mất -> credit mới
+        cls.__queue.discard_streams("video/")
+        cls.__queue.reset_credit()
+        cls.__socket = sock
+        cls.__connected.set()
+
+    @classmethod
+    def window_update(cls, stream_id: str, increment: int):
+        """Server trả credit cho một stream"""
+        cls.__queue.window_update(stream_id, increment)
+
+    @classmethod
+    def get_queue_size(cls) -> int:
+        """Số packet đang chờ gửi - backlog tăng nghĩa là link đang bão hòa"""
+        return cls.__queue.qsize()
+
     @classmethod
     def send_packet(cls, packet: Packet):
         """Đưa dữ liệu vào hàng đợi để gửi."""
         if cls.__shutdown_event.is_set():
             return
+        if PeerMediaService.send_packet(packet):
+            return  # Video / cursor đã đi thẳng tới controller
+        if MediaTransportService.send_packet(packet):
+            return  # Video / cursor đã đi đường UDP
+        if not cls.__connected.is_set() and isinstance(packet, VideoStreamPacket):
+            return  # Đang kết nối lại - frame sẽ cũ khi gửi được
         if cls.__socket:
             try:
                 cls.__queue.put(packet, block=False)
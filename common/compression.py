@@ -0,0 +1,100 @@
+import lz4.frame as lz4
+
+try:
+    import zstandard
+except ImportError:  # zstd là tùy chọn - chỉ dùng khi bật --zstd
+    zstandard = None
+
+# Giá trị header "Compression" (lz4-hc giải nén như lz4 nên trên dây vẫn là "lz4")
+NONE = "none"
+LZ4 = "lz4"
+LZ4_HC = "lz4-hc"
+ZSTD = "zstd"
+
+CODECS = (NONE, LZ4, LZ4_HC, ZSTD)
+
+LZ4_HC_LEVEL = lz4.COMPRESSIONLEVEL_MINHC
+ZSTD_LEVEL = 6
+
+
+def zstd_available() -> bool:
+    return zstandard is not None
+
+
+def compress(data: bytes, codec: str) -> tuple[bytes, str]:
+    """Nén data, trả về (dữ liệu, giá trị header Compression)"""
+    if codec == LZ4:
+        return lz4.compress(data), LZ4
+    if codec == LZ4_HC:
+        return lz4.compress(data, compression_level=LZ4_HC_LEVEL), LZ4
+    if codec == ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data), ZSTD
+    if codec == NONE:
+        return data, NONE
+    raise ValueError(f"Unknown compression codec: {codec}")
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == NONE:
+        return data
+    if codec == LZ4:
+        return lz4.decompress(data)
+    if codec == ZSTD:
+        if zstandard is None:
+            raise ValueError("Received zstd packet but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown compression codec: {codec}")
+
+
+class CompressionPolicy:
+    """
+    Chọn codec cho một lượt truyền file dựa trên tỉ lệ nén LZ4 của một mẫu
+    nhỏ trong các chunk đầu (và định kỳ sau đó - archive nhiều file có thể đổi
+    loại dữ liệu giữa chừng):
+
+    - Dữ liệu đã nén (zip, jpg, mp4, ...): không nén, tiết kiệm CPU hai đầu và relay
+    - Dữ liệu nén rất tốt (text, log, csv): LZ4-HC, hoặc zstd nếu được bật
+    - Còn lại: LZ4 mặc định
+    """
+
+    SAMPLE_CHUNKS = 4  # Số chunk đầu được lấy mẫu
+    RESAMPLE_EVERY = 32  # Sau đó lấy mẫu lại mỗi ngần này chunk
+    SAMPLE_SIZE = 64 * 1024
+    WINDOW = 4  # Số mẫu gần nhất dùng để quyết định
+
+    INCOMPRESSIBLE_RATIO = 0.9  # Nén không được tới 10% -> bỏ nén
+    HIGH_RATIO = 0.4  # Nén còn dưới 40% -> nén mạnh hơn
+
+    def __init__(self, allow_zstd: bool = False):
+        self.__allow_zstd = allow_zstd and zstd_available()
+        self.__count = 0
+        self.__ratios: list[float] = []
+        self.codec = LZ4
+
+    def choose(self, data: bytes) -> str:
+        """Codec cho chunk tiếp theo"""
+        count = self.__count
+        self.__count += 1
+        if count < self.SAMPLE_CHUNKS or count % self.RESAMPLE_EVERY == 0:
+            self.__ratios.append(sample_ratio(data, self.SAMPLE_SIZE))
+            del self.__ratios[: -self.WINDOW]
+            self.codec = self.__decide(sum(self.__ratios) / len(self.__ratios))
+        return self.codec
+
+    def __decide(self, ratio: float) -> str:
+        if ratio >= self.INCOMPRESSIBLE_RATIO:
+            return NONE
+        if ratio <= self.HIGH_RATIO:
+            return ZSTD if self.__allow_zstd else LZ4_HC
+        return LZ4
+
+
+def sample_ratio(data: bytes, sample_size: int) -> float:
+    """Tỉ lệ nén LZ4 của một mẫu ở giữa data (1.0 = không nén được)"""
+    if not data:
+        return 1.0
+    start = max((len(data) - sample_size) // 2, 0)
+    sample = data[start : start + sample_size]
+    return len(lz4.compress(sample)) / len(sample)
@@ -8,11 +8,32 @@ class Config:
     ip: str = "127.0.0.1"
     port: int = 5000
     fps: int = 25
+    cursor_rate: int = 120
+    encoder_keep_warm: float = 30.0
     max_clients: int = 10
+    backlog: int = 128
+    handshake_workers: int = 32
+    handshake_timeout: float = 5.0
     session_timeout: int = 3600
     ssl: bool = False
     cert: str | None = None
     key: str | None = None
+    latency_overlay: bool = False
+    cursor_echo: bool = True
+    file_delta: bool = True
+    zstd: bool = False
+    sendfile: bool = True
+    udp_media: bool = False
+    direct_media: bool = False
+    ping_interval: float = 2.0
+    heartbeat_interval: float = 5.0
+    heartbeat_misses: int = 3
+    idle_timeout: float = 0
+    resume_grace: float = 30.0
+    device_db: str | None = None
+    file_spool: bool = False
+    spool_dir: str | None = None
+    spool_limit: int = 4096
 
     @classmethod
     def save(cls, args: Namespace):
@@ -50,6 +50,7 @@ class PacketType(Enum):
 
     KEYBOARD = "input/keyboard"
     MOUSE = "input/mouse"
+    POINTER_MOTION = "input/pointer-motion"
 
     ASSIGN_ID = "auth/assign-id"
     CLIENT_INFORMATION = "auth/client-info"
@@ -58,6 +59,11 @@ class PacketType(Enum):
     CONNECTION_RESPONSE = "auth/connection-response"
 
     SESSION = "session/control"
+    PEER_CANDIDATES = "session/peer-candidates"
+
+    PING = "control/ping"
+    PONG = "control/pong"
+    WINDOW_UPDATE = "control/window-update"
 
     CHAT_MESSAGE = "comm/chat"
     FILE_METADATA = "comm/file-metadata"
@@ -65,9 +71,16 @@ class PacketType(Enum):
     FILE_REJECT = "comm/file-reject"
     FILE_CHUNK = "comm/file-chunk"
     FILE_COMPLETE = "comm/file-complete"
+    FILE_ACK = "comm/file-ack"
+    FILE_SIGNATURE = "comm/file-signature"
+    FILE_DELTA = "comm/file-delta"
 
     VIDEO_STREAM = "media/video-stream"
     VIDEO_CONFIG = "media/video-config"
+    CURSOR = "media/cursor"
+    KEYFRAME_REQUEST = "media/keyframe-request"
+    MONITOR_LIST = "media/monitor-list"
+    MONITOR_SELECT = "media/monitor-select"
 
     @classmethod
     def get(cls, value) -> "PacketType":
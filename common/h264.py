@@ -11,6 +11,8 @@ class H264Encoder:
     def __init__(self, width, height, fps=30, gop_size=60, bitrate=2_000_000):
         self.gop_size = gop_size
         self.frame_count = 0
+        self.keyframe = False  # Output của lần encode gần nhất là keyframe
+        self.__force_keyframe = False
 
         self.extradata = None
 
@@ -41,8 +43,9 @@ class H264Encoder:
         frame = av.VideoFrame.from_image(image)
         frame.pts = self.frame_count
 
-        if self.frame_count % self.gop_size == 0:
+        if self.frame_count % self.gop_size == 0 or self.__force_keyframe:
             frame.pict_type = PictureType.I
+            self.__force_keyframe = False
 
         self.frame_count += 1
         packets = self.codec.encode(frame)
@@ -51,10 +54,17 @@ class H264Encoder:
             self.extradata = bytes(self.codec.extradata)
 
         if not packets:
+            self.keyframe = False
             return None
 
+        self.keyframe = any(p.is_keyframe for p in packets)
+
         return b"".join(bytes(p) for p in packets)
 
+    def request_keyframe(self):
+        """Frame tiếp theo sẽ là I-frame (bên xem bị mất frame)"""
+        self.__force_keyframe = True
+
     def get_extradata(self) -> bytes | None:
         """Lấy SPS/PPS headers."""
         if self.extradata:
@@ -0,0 +1,251 @@
+import pickle
+import struct
+import time
+
+from common.packets import CursorPacket, Packet, VideoStreamPacket
+from common.safe_deserializer import SafeDeserializer
+
+# Datagram media (tùy chọn --udp-media): video và vị trí cursor đi bằng UDP
+# giữa client và relay để một segment bị mất không chặn mọi frame phía sau như
+# trên TCP. Mỗi packet media được pickle thành một "frame" và chia thành các
+# fragment vừa một datagram; mỗi nhóm FEC_GROUP fragment có thêm một fragment
+# parity (XOR) nên mất 1 fragment trong nhóm vẫn khôi phục được. Frame không
+# khôi phục được thì bỏ - bên xem phát hiện qua frame_seq và xin keyframe.
+#
+# Datagram = HEADER + dữ liệu:
+#   version, kind, token (8 byte, server cấp qua TCP trong AssignIdPacket),
+#   frame_no, index (số fragment, hoặc số nhóm với PARITY), count (số fragment
+#   dữ liệu của frame), total_length (số byte của frame)
+HEADER = struct.Struct("!BB8sIHHI")
+VERSION = 1
+DATA = 0
+PARITY = 1
+HELLO = 2  # Mở / giữ đường UDP (token của bên nhận)
+HELLO_ACK = 3  # Trả lời HELLO (token của bên đã gửi HELLO)
+
+TOKEN_SIZE = 8
+FRAGMENT_SIZE = 1200  # Dưới MTU thông dụng sau IP/UDP header và tunnel
+FEC_GROUP = 8  # 1 parity cho mỗi 8 fragment (~12.5% overhead)
+MAX_FRAME_SIZE = 8 * 1024 * 1024
+MAX_PENDING_FRAMES = 32
+REASSEMBLY_TIMEOUT = 0.5  # Giây - frame chưa đủ sau thời gian này coi như mất
+KEEPALIVE_INTERVAL = 1.0  # Client gửi HELLO mỗi khoảng này (giữ NAT mapping)
+PATH_TIMEOUT = 3 * KEEPALIVE_INTERVAL  # Không có HELLO -> quay về TCP
+SOCKET_BUFFER = 4 * 1024 * 1024  # Keyframe lớn đi thành một loạt datagram
+
+_FRAME_NO_MASK = 0xFFFFFFFF
+
+
+def is_datagram_packet(packet: Packet) -> bool:
+    """
+    Packet được phép đi bằng datagram. Cursor kèm bitmap (chỉ gửi một lần cho
+    mỗi shape) vẫn đi TCP vì mất là mất luôn.
+    """
+    if isinstance(packet, VideoStreamPacket):
+        return True
+    return isinstance(packet, CursorPacket) and packet.shape_data is None
+
+
+def encode_packet(packet: Packet) -> bytes:
+    return pickle.dumps(packet, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode_packet(payload: bytes) -> Packet | None:
+    """Giải mã frame đã ghép - chỉ chấp nhận packet media"""
+    try:
+        packet = SafeDeserializer.safe_loads(payload)
+    except ValueError:
+        return None
+    return packet if is_datagram_packet(packet) else None
+
+
+def newer(frame_no: int, other: int) -> bool:
+    """frame_no đến sau other (so sánh có tính vòng lại của số 32 bit)"""
+    diff = (frame_no - other) & _FRAME_NO_MASK
+    return 0 < diff < 0x80000000
+
+
+def hello(token: bytes) -> bytes:
+    return HEADER.pack(VERSION, HELLO, token, 0, 0, 0, 0)
+
+
+def hello_ack(token: bytes) -> bytes:
+    return HEADER.pack(VERSION, HELLO_ACK, token, 0, 0, 0, 0)
+
+
+def parse(datagram: bytes) -> tuple[int, bytes, int, int, int, int, bytes] | None:
+    """(kind, token, frame_no, index, count, total_length, data) hoặc None nếu sai định dạng"""
+    if len(datagram) < HEADER.size:
+        return None
+    version, kind, token, frame_no, index, count, total_length = HEADER.unpack_from(
+        datagram
+    )
+    if version != VERSION or kind not in (DATA, PARITY, HELLO, HELLO_ACK):
+        return None
+    return kind, token, frame_no, index, count, total_length, datagram[HEADER.size :]
+
+
+def packetize(
+    token: bytes, frame_no: int, payload: bytes, fec_group: int = FEC_GROUP
+) -> list[bytes]:
+    """Chia frame thành các datagram, parity của mỗi nhóm đi ngay sau nhóm đó"""
+    total_length = len(payload)
+    if total_length > MAX_FRAME_SIZE:
+        raise ValueError(f"Media frame too large: {total_length} bytes")
+    count = max(1, -(-total_length // FRAGMENT_SIZE))
+
+    datagrams = []
+    group_size = fec_group or count
+    for group_start in range(0, count, group_size):
+        parity = 0
+        width = 0
+        for index in range(group_start, min(group_start + group_size, count)):
+            fragment = payload[index * FRAGMENT_SIZE : (index + 1) * FRAGMENT_SIZE]
+            datagrams.append(
+                HEADER.pack(
+                    VERSION, DATA, token, frame_no, index, count, total_length
+                )
+                + fragment
+            )
+            if fec_group:
+                # Fragment đầu nhóm dài nhất (chỉ fragment cuối frame có thể ngắn hơn)
+                width = width or len(fragment)
+                parity ^= int.from_bytes(fragment.ljust(width, b"\0"), "big")
+        if fec_group:
+            datagrams.append(
+                HEADER.pack(
+                    VERSION,
+                    PARITY,
+                    token,
+                    frame_no,
+                    group_start // group_size,
+                    count,
+                    total_length,
+                )
+                + parity.to_bytes(width, "big")
+            )
+    return datagrams
+
+
+class _Frame:
+    __slots__ = ("count", "total_length", "fragments", "parity", "missing", "created")
+
+    def __init__(self, count: int, total_length: int, created: float):
+        self.count = count
+        self.total_length = total_length
+        self.fragments: list[bytes | None] = [None] * count
+        self.parity: dict[int, bytes] = {}
+        self.missing = count
+        self.created = created
+
+    def fragment_length(self, index: int) -> int:
+        if index < self.count - 1:
+            return FRAGMENT_SIZE
+        return self.total_length - (self.count - 1) * FRAGMENT_SIZE
+
+    def recover(self, group: int, fec_group: int) -> bool:
+        """Khôi phục fragment duy nhất bị mất trong nhóm bằng parity"""
+        parity = self.parity.get(group)
+        if parity is None:
+            return False
+        indexes = range(group * fec_group, min((group + 1) * fec_group, self.count))
+        lost = [index for index in indexes if self.fragments[index] is None]
+        if len(lost) != 1:
+            return False
+
+        value = int.from_bytes(parity, "big")
+        for index in indexes:
+            fragment = self.fragments[index]
+            if fragment is not None:
+                value ^= int.from_bytes(fragment.ljust(len(parity), b"\0"), "big")
+        index = lost[0]
+        self.fragments[index] = value.to_bytes(len(parity), "big")[
+            : self.fragment_length(index)
+        ]
+        self.missing -= 1
+        return True
+
+
+class Reassembler:
+    """
+    Ghép fragment thành frame cho một bên gửi. Frame được trả về theo thứ tự
+    frame_no: frame cũ hơn frame vừa trả bị bỏ (video phía sau đã tham chiếu
+    tới nó thì cũng sẽ xin keyframe, cursor cũ thì vô nghĩa).
+    """
+
+    def __init__(self, fec_group: int = FEC_GROUP):
+        self.fec_group = fec_group
+        self.__frames: dict[int, _Frame] = {}
+        self.__last: int | None = None  # frame_no đã trả gần nhất
+        self.delivered = 0
+        self.recovered = 0  # Fragment khôi phục bằng parity
+        self.lost = 0  # frame_no bị bỏ qua giữa hai frame đã trả
+
+    def add(
+        self,
+        kind: int,
+        frame_no: int,
+        index: int,
+        count: int,
+        total_length: int,
+        data: bytes,
+        now: float | None = None,
+    ) -> bytes | None:
+        """Nhận một fragment, trả về frame nếu vừa ghép đủ"""
+        if self.__last is not None and not newer(frame_no, self.__last):
+            return None  # Trùng hoặc tới muộn
+
+        now = time.monotonic() if now is None else now
+        frame = self.__frames.get(frame_no)
+        if frame is None:
+            if (
+                total_length > MAX_FRAME_SIZE
+                or count != max(1, -(-total_length // FRAGMENT_SIZE))
+            ):
+                return None
+            self.__expire(now)
+            frame = self.__frames[frame_no] = _Frame(count, total_length, now)
+        elif frame.count != count or frame.total_length != total_length:
+            return None
+
+        group_size = self.fec_group or count
+        if kind == PARITY:
+            if index * group_size >= count or index in frame.parity:
+                return None
+            if len(data) != frame.fragment_length(index * group_size):
+                return None
+            frame.parity[index] = data
+            group = index
+        else:
+            if index >= count or frame.fragments[index] is not None:
+                return None
+            if len(data) != frame.fragment_length(index):
+                return None
+            frame.fragments[index] = data
+            frame.missing -= 1
+            group = index // group_size
+
+        if frame.missing and self.fec_group and frame.recover(group, group_size):
+            self.recovered += 1
+        if frame.missing:
+            return None
+        return self.__deliver(frame_no, frame)
+
+    def __deliver(self, frame_no: int, frame: _Frame) -> bytes:
+        for pending in list(self.__frames):
+            if not newer(pending, frame_no):
+                # Frame cũ hơn chưa ghép xong không còn được trả nữa
+                del self.__frames[pending]
+        if self.__last is not None:
+            # Mọi frame_no bị bỏ qua (mất hẳn hoặc ghép không kịp) tính là mất
+            self.lost += ((frame_no - self.__last) & _FRAME_NO_MASK) - 1
+        self.__last = frame_no
+        self.delivered += 1
+        return b"".join(frame.fragments)
+
+    def __expire(self, now: float):
+        for frame_no, frame in list(self.__frames.items()):
+            if now - frame.created > REASSEMBLY_TIMEOUT:
+                del self.__frames[frame_no]
+        while len(self.__frames) >= MAX_PENDING_FRAMES:
+            del self.__frames[min(self.__frames, key=lambda n: self.__frames[n].created)]
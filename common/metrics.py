@@ -0,0 +1,270 @@
+import bisect
+import threading
+import time
+from collections import deque
+
+
+class LatencyHistogram:
+    """
+    Histogram độ trễ (ms) với các bucket cố định - record O(log buckets), không cấp phát
+    """
+
+    BUCKET_EDGES_MS = (
+        0.5, 1, 2, 3, 5, 7.5, 10, 15, 20, 30, 40, 50, 75,
+        100, 150, 200, 300, 500, 750, 1000, 2000, 5000,
+    )
+
+    def __init__(self):
+        self.__counts = [0] * (len(self.BUCKET_EDGES_MS) + 1)  # bucket cuối là overflow
+        self.__total = 0
+        self.__sum = 0.0
+        self.__max = 0.0
+
+    def record(self, value_ms: float):
+        """Ghi nhận một mẫu độ trễ"""
+        if value_ms < 0:
+            value_ms = 0.0
+        self.__counts[bisect.bisect_left(self.BUCKET_EDGES_MS, value_ms)] += 1
+        self.__total += 1
+        self.__sum += value_ms
+        if value_ms > self.__max:
+            self.__max = value_ms
+
+    @property
+    def count(self) -> int:
+        return self.__total
+
+    def percentile(self, p: float) -> float:
+        """Ước lượng percentile (cận trên của bucket chứa percentile)"""
+        if not self.__total:
+            return 0.0
+        rank = p / 100.0 * self.__total
+        seen = 0
+        for index, count in enumerate(self.__counts):
+            seen += count
+            if seen >= rank and count:
+                if index < len(self.BUCKET_EDGES_MS):
+                    return min(float(self.BUCKET_EDGES_MS[index]), self.__max)
+                return self.__max
+        return self.__max
+
+    def snapshot(self) -> dict[str, float]:
+        return {
+            "count": self.__total,
+            "mean_ms": self.__sum / self.__total if self.__total else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.__max,
+        }
+
+    def reset(self):
+        self.__counts = [0] * len(self.__counts)
+        self.__total = 0
+        self.__sum = 0.0
+        self.__max = 0.0
+
+
+class FrameTimingStats:
+    """
+    Thống kê độ trễ theo từng giai đoạn của một luồng video (phía controller).
+
+    Timestamps trong frame là time.monotonic() của từng máy:
+        capture, encode, send      -> đồng hồ host
+        relay_in, relay_out        -> đồng hồ server
+        receive, decode            -> đồng hồ controller
+    Các giai đoạn đi qua hai đồng hồ khác nhau chỉ được tính khi đã có
+    ước lượng clock offset (server - local) của cả hai đầu.
+    """
+
+    # stage -> (mốc bắt đầu, mốc kết thúc)
+    STAGES = {
+        "encode": ("capture", "encode"),
+        "send_queue": ("encode", "send"),
+        "uplink": ("send", "relay_in"),
+        "relay": ("relay_in", "relay_out"),
+        "downlink": ("relay_out", "receive"),
+        "decode": ("receive", "decode"),
+        "glass_to_glass": ("capture", "decode"),
+    }
+
+    __HOST_KEYS = {"capture", "encode", "send"}
+    __SERVER_KEYS = {"relay_in", "relay_out"}
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__histograms = {stage: LatencyHistogram() for stage in self.STAGES}
+        self.__frames = 0
+        self.__lost_frames = 0
+        self.__last_seq: int | None = None
+
+    def record_frame(
+        self,
+        frame_seq: int,
+        timestamps: dict[str, float],
+        host_offset: float | None,
+        local_offset: float | None,
+    ):
+        """
+        Ghi nhận timestamps của một frame đã decode xong.
+
+        :param host_offset: clock offset (server - host) do host ước lượng
+        :param local_offset: clock offset (server - controller) của máy này
+        """
+        with self.__lock:
+            self.__frames += 1
+            if self.__last_seq is not None and frame_seq > self.__last_seq + 1:
+                self.__lost_frames += frame_seq - self.__last_seq - 1
+            if self.__last_seq is None or frame_seq > self.__last_seq:
+                self.__last_seq = frame_seq
+
+            for stage, (start_key, end_key) in self.STAGES.items():
+                start = self.__to_server_clock(
+                    start_key, timestamps, host_offset, local_offset
+                )
+                end = self.__to_server_clock(
+                    end_key, timestamps, host_offset, local_offset
+                )
+                if start is None or end is None:
+                    continue
+                self.__histograms[stage].record((end - start) * 1000.0)
+
+    def __to_server_clock(
+        self,
+        key: str,
+        timestamps: dict[str, float],
+        host_offset: float | None,
+        local_offset: float | None,
+    ) -> float | None:
+        """Quy đổi mốc thời gian về đồng hồ server (hoặc giữ nguyên nếu cùng máy)"""
+        value = timestamps.get(key)
+        if value is None:
+            return None
+        if key in self.__SERVER_KEYS:
+            return value
+        offset = host_offset if key in self.__HOST_KEYS else local_offset
+        if offset is None:
+            return None
+        return value + offset
+
+    def snapshot(self) -> dict:
+        """Lấy thống kê hiện tại (dùng cho stats API / overlay)"""
+        with self.__lock:
+            return {
+                "frames": self.__frames,
+                "lost_frames": self.__lost_frames,
+                "stages": {
+                    stage: histogram.snapshot()
+                    for stage, histogram in self.__histograms.items()
+                },
+            }
+
+    def format_summary(self) -> str:
+        """Chuỗi tóm tắt ngắn gọn để hiển thị trên overlay"""
+        stats = self.snapshot()
+        lines = [f"frames: {stats['frames']}  lost: {stats['lost_frames']}"]
+        for stage, values in stats["stages"].items():
+            if not values["count"]:
+                lines.append(f"{stage:<15} -")
+                continue
+            lines.append(
+                f"{stage:<15} p50 {values['p50_ms']:6.1f}  "
+                f"p95 {values['p95_ms']:6.1f}  max {values['max_ms']:6.1f} ms"
+            )
+        return "\n".join(lines)
+
+    def reset(self):
+        with self.__lock:
+            for histogram in self.__histograms.values():
+                histogram.reset()
+            self.__frames = 0
+            self.__lost_frames = 0
+            self.__last_seq = None
+
+
+class RttEstimator:
+    """
+    Ước lượng RTT (SRTT/RTTVAR kiểu RFC 6298) và clock offset kiểu NTP.
+
+    Với t0 (gửi ping), t1 (peer nhận), t2 (peer gửi pong), t3 (nhận pong):
+        rtt    = (t3 - t0) - (t2 - t1)
+        offset = ((t1 - t0) + (t2 - t3)) / 2   # đồng hồ peer - đồng hồ local
+    Offset lấy từ mẫu có RTT nhỏ nhất trong cửa sổ gần nhất (clock filter của NTP),
+    vì mẫu đó ít bị ảnh hưởng bởi hàng đợi bất đối xứng nhất.
+    """
+
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+    OFFSET_WINDOW = 8
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__srtt: float | None = None
+        self.__rttvar: float | None = None
+        self.__min_rtt: float | None = None
+        self.__samples: deque[tuple[float, float]] = deque(maxlen=self.OFFSET_WINDOW)
+        self.__sample_count = 0
+        self.__last_update = 0.0
+
+    def update(self, t0: float, t1: float, t2: float, t3: float) -> float:
+        """Thêm một mẫu ping/pong, trả về RTT của mẫu (giây)"""
+        rtt = max(0.0, (t3 - t0) - (t2 - t1))
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+
+        with self.__lock:
+            if self.__srtt is None or self.__rttvar is None:
+                self.__srtt = rtt
+                self.__rttvar = rtt / 2
+            else:
+                self.__rttvar = (1 - self.BETA) * self.__rttvar + self.BETA * abs(
+                    self.__srtt - rtt
+                )
+                self.__srtt = (1 - self.ALPHA) * self.__srtt + self.ALPHA * rtt
+
+            if self.__min_rtt is None or rtt < self.__min_rtt:
+                self.__min_rtt = rtt
+            self.__samples.append((rtt, offset))
+            self.__sample_count += 1
+            self.__last_update = time.monotonic()
+
+        return rtt
+
+    @property
+    def srtt(self) -> float | None:
+        return self.__srtt
+
+    @property
+    def rttvar(self) -> float | None:
+        return self.__rttvar
+
+    @property
+    def rto(self) -> float | None:
+        if self.__srtt is None or self.__rttvar is None:
+            return None
+        return self.__srtt + 4 * self.__rttvar
+
+    @property
+    def offset(self) -> float | None:
+        with self.__lock:
+            if not self.__samples:
+                return None
+            return min(self.__samples)[1]
+
+    @property
+    def last_update(self) -> float:
+        return self.__last_update
+
+    def snapshot(self) -> dict[str, float | int | None]:
+        offset = self.offset
+        with self.__lock:
+            return {
+                "srtt_ms": self.__srtt * 1000 if self.__srtt is not None else None,
+                "rttvar_ms": (
+                    self.__rttvar * 1000 if self.__rttvar is not None else None
+                ),
+                "min_rtt_ms": (
+                    self.__min_rtt * 1000 if self.__min_rtt is not None else None
+                ),
+                "offset_ms": offset * 1000 if offset is not None else None,
+                "samples": self.__sample_count,
+            }
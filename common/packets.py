@@ -10,10 +10,26 @@ from common.enums import (
 class ClientInformationPacket:
     """Thông tin của client"""
 
-    def __init__(self, os: str, host_name: str, device_id: str):
+    def __init__(
+        self,
+        os: str,
+        host_name: str,
+        device_id: str,
+        resume_id: str | None = None,
+        resume_token: bytes | None = None,
+        device_key: bytes | None = None,
+    ):
         self.os = os
         self.host_name = host_name
         self.device_id = device_id
+        # Key server đã cấp cho thiết bị - để nhận lại ID cố định của thiết bị
+        self.device_key = device_key
+        # Kết nối lại: xin giữ ID cũ và các session đang mở (token từ AssignIdPacket)
+        self.resume_id = resume_id
+        self.resume_token = resume_token
+
+    def __repr__(self):
+        return f"ClientInformationPacket(os={self.os}, host_name={self.host_name}, resume_id={self.resume_id})"
 
 
 class AssignIdPacket:
@@ -21,11 +37,32 @@ class AssignIdPacket:
     Server cấp ID cho client
     """
 
-    def __init__(self, client_id: str):
+    def __init__(
+        self,
+        client_id: str,
+        heartbeat_interval: float | None = None,
+        media_port: int | None = None,
+        media_token: bytes | None = None,
+        resume_token: bytes | None = None,
+        resumed: bool = False,
+        device_key: bytes | None = None,
+    ):
         self.client_id = client_id
+        self.heartbeat_interval = heartbeat_interval  # Client phải gửi ít nhất 1 packet mỗi khoảng này
+        # Server nhận media qua UDP ở port này (None = chỉ dùng TCP); token gắn
+        # datagram với client, chỉ được gửi qua kết nối TCP
+        self.media_port = media_port
+        self.media_token = media_token
+        # Token để kết nối lại trong thời gian chờ (đổi sau mỗi lần cấp);
+        # resumed = server đã giữ lại ID và session của kết nối trước
+        self.resume_token = resume_token
+        self.resumed = resumed
+        # ID gắn với thiết bị: client lưu key để lần sau lấy lại ID này (None =
+        # ID chỉ dùng cho kết nối này, giữ key cũ)
+        self.device_key = device_key
 
     def __repr__(self):
-        return f"AssignIdPacket(client_id={self.client_id})"
+        return f"AssignIdPacket(client_id={self.client_id}, heartbeat_interval={self.heartbeat_interval}, media_port={self.media_port}, resumed={self.resumed})"
 
 
 class ConnectionRequestPacket:
@@ -90,6 +127,74 @@ class SessionPacket:
         return f"SessionPacket(status={self.status}), session_id={self.session_id})"
 
 
+class PeerCandidatesPacket:
+    """
+    Địa chỉ UDP một bên của session có thể nhận media trực tiếp, trao đổi qua
+    server sau SESSION_STARTED. Server thêm địa chỉ nó thấy (sau NAT) trước khi
+    chuyển cho bên kia. Bên kia gửi datagram kèm token để bên này nhận ra.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        candidates: list[tuple[str, int]],
+        token: bytes,
+    ):
+        self.session_id = session_id
+        self.candidates = candidates  # [(ip, port)], ưu tiên theo thứ tự
+        self.token = token
+
+    def __repr__(self):
+        return f"PeerCandidatesPacket(session_id={self.session_id}, candidates={self.candidates})"
+
+
+class PingPacket:
+    """
+    Gói tin đo RTT / clock offset.
+    session_id = None: server trả lời; ngược lại relay tới đối tác trong session (end-to-end)
+    """
+
+    def __init__(
+        self,
+        ping_id: int,
+        origin_ts: float = 0.0,
+        session_id: str | None = None,
+        rtt: float | None = None,
+        rttvar: float | None = None,
+    ):
+        self.ping_id = ping_id
+        self.origin_ts = origin_ts  # t0 - đóng dấu khi gửi (đồng hồ bên gửi)
+        self.session_id = session_id
+        self.rtt = rtt  # SRTT hiện tại của bên gửi tới server (giây), để server đọc
+        self.rttvar = rttvar
+
+    def __repr__(self):
+        return f"PingPacket(ping_id={self.ping_id}, session_id={self.session_id})"
+
+
+class PongPacket:
+    """
+    Gói tin trả lời PingPacket (kiểu NTP: t0, t1, t2 - t3 do bên nhận pong tự đóng dấu)
+    """
+
+    def __init__(
+        self,
+        ping_id: int,
+        origin_ts: float,
+        receive_ts: float,
+        reply_ts: float = 0.0,
+        session_id: str | None = None,
+    ):
+        self.ping_id = ping_id
+        self.origin_ts = origin_ts  # t0 - copy từ ping
+        self.receive_ts = receive_ts  # t1 - lúc nhận ping (đồng hồ bên trả lời)
+        self.reply_ts = reply_ts  # t2 - đóng dấu khi gửi pong (đồng hồ bên trả lời)
+        self.session_id = session_id
+
+    def __repr__(self):
+        return f"PongPacket(ping_id={self.ping_id}, session_id={self.session_id})"
+
+
 class VideoStreamPacket:
     """
     Gói tin chứa luồng video và thông tin cursor
@@ -101,14 +206,72 @@ class VideoStreamPacket:
         video_data: bytes,
         cursor_type: str | None = None,
         cursor_position: tuple[int, int] | None = None,
+        frame_seq: int = 0,
+        timestamps: dict[str, float] | None = None,
+        clock_offset: float | None = None,
+        keyframe: bool = False,
+        monitor: int = 1,
     ):
         self.video_data = video_data
         self.session_id = session_id
         self.cursor_type = cursor_type  # "normal", "text", "hand", "wait", etc.
         self.cursor_position = cursor_position  # Vị trí tương đối trên monitor
+        self.frame_seq = frame_seq  # Số thứ tự frame (phát hiện frame bị mất)
+        # Các mốc time.monotonic(): capture, encode, send (host), relay_in, relay_out (server)
+        self.timestamps = timestamps
+        self.clock_offset = clock_offset  # Ước lượng (server - host) của host, giây
+        self.keyframe = keyframe  # Frame giải mã được mà không cần frame trước
+        self.monitor = monitor  # Chỉ số monitor (như sct.monitors) - mỗi monitor một luồng H.264
+
+    def __repr__(self):
+        return f"VideoStreamPacket(seq={self.frame_seq}, size={len(self.video_data)}, keyframe={self.keyframe}, session_id={self.session_id}, monitor={self.monitor}, cursor={self.cursor_type}@{self.cursor_position})"
+
+
+class CursorPacket:
+    """
+    Gói tin cursor của host - gửi theo nhịp riêng, không phụ thuộc frame video.
+    shape_data (PNG) chỉ kèm theo lần đầu một shape_id được gửi trong session,
+    các lần sau controller lấy từ cache theo shape_id
+    """
+
+    def __init__(
+        self,
+        session_id: str | None,
+        position: tuple[int, int],
+        visible: bool = True,
+        cursor_type: str = "normal",
+        shape_id: str | None = None,
+        hotspot: tuple[int, int] = (0, 0),
+        shape_data: bytes | None = None,
+        monitor: int = 1,
+    ):
+        self.session_id = session_id
+        self.position = position  # Vị trí tương đối trên monitor
+        self.visible = visible
+        self.cursor_type = cursor_type  # Fallback khi controller chưa có shape_id
+        self.shape_id = shape_id  # Hash nội dung bitmap
+        self.hotspot = hotspot
+        self.shape_data = shape_data
+        self.monitor = monitor
+
+    def __reduce__(self):
+        # Pickle dạng tuple như PointerMotionPacket - packet gửi tới 120 lần/giây
+        return (
+            CursorPacket,
+            (
+                self.session_id,
+                self.position,
+                self.visible,
+                self.cursor_type,
+                self.shape_id,
+                self.hotspot,
+                self.shape_data,
+                self.monitor,
+            ),
+        )
 
     def __repr__(self):
-        return f"VideoStreamPacket(size={len(self.video_data)}, session_id={self.session_id}, cursor={self.cursor_type}@{self.cursor_position})"
+        return f"CursorPacket(session_id={self.session_id}, monitor={self.monitor}, position={self.position}, visible={self.visible}, shape={self.shape_id}, has_data={self.shape_data is not None})"
 
 
 class VideoConfigPacket:
@@ -124,6 +287,7 @@ class VideoConfigPacket:
         fps: int,
         codec: str,
         extradata: bytes,
+        monitor: int = 1,
     ):
         self.session_id = session_id
         self.width = width
@@ -131,6 +295,57 @@ class VideoConfigPacket:
         self.fps = fps
         self.codec = codec  # "h264"
         self.extradata = extradata  # SPS/PPS
+        self.monitor = monitor  # Encoder của monitor nào
+
+
+class KeyframeRequestPacket:
+    """
+    Controller xin host gửi keyframe: frame video bị mất (datagram không khôi
+    phục được, hoặc relay bỏ khi queue đầy) nên các frame sau không giải mã đúng
+    """
+
+    def __init__(self, session_id: str, monitor: int | None = None):
+        self.session_id = session_id
+        self.monitor = monitor  # None = mọi monitor session đang xem
+
+    def __repr__(self):
+        return f"KeyframeRequestPacket(session_id={self.session_id}, monitor={self.monitor})"
+
+
+class MonitorListPacket:
+    """
+    Host gửi cho controller khi session bắt đầu và mỗi khi danh sách monitor
+    đang xem thay đổi. Server ghi nhận selected để chỉ chuyển video broadcast
+    của các monitor này cho session.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        monitors: list[dict[str, int]],
+        selected: list[int],
+    ):
+        self.session_id = session_id
+        # [{"index", "left", "top", "width", "height"}] - tọa độ trên desktop ảo của host
+        self.monitors = monitors
+        self.selected = selected  # Chỉ số các monitor đang stream cho session
+
+    def __repr__(self):
+        return f"MonitorListPacket(session_id={self.session_id}, monitors={len(self.monitors)}, selected={self.selected})"
+
+
+class MonitorSelectPacket:
+    """
+    Controller chọn monitor muốn xem (một hoặc nhiều - mỗi monitor một luồng
+    video riêng). Host trả lời bằng MonitorListPacket với danh sách đã áp dụng.
+    """
+
+    def __init__(self, session_id: str, monitors: list[int]):
+        self.session_id = session_id
+        self.monitors = monitors
+
+    def __repr__(self):
+        return f"MonitorSelectPacket(session_id={self.session_id}, monitors={self.monitors})"
 
 
 class KeyboardPacket:
@@ -177,6 +392,34 @@ class MousePacket:
         return f"MousePacket(event_type={self.event_type}, button={self.button}, position={self.position}, scroll_delta={self.scroll_delta})"
 
 
+class PointerMotionPacket:
+    """
+    Gói tin di chuyển chuột dạng gọn (thay cho MousePacket MOVE)
+
+    (x, y) là vị trí mẫu đầu tiên, samples là các mẫu tiếp theo đóng gói
+    struct "<hhH" (dx, dy, dt_ms) so với mẫu liền trước - xem common/pointer_motion.py
+    """
+
+    def __init__(
+        self,
+        x: int,
+        y: int,
+        samples: bytes = b"",
+        session_id: str | None = None,
+    ):
+        self.x = x
+        self.y = y
+        self.samples = samples
+        self.session_id = session_id
+
+    def __reduce__(self):
+        # Pickle dạng tuple thay vì __dict__ - bỏ tên thuộc tính khỏi mỗi packet
+        return (PointerMotionPacket, (self.x, self.y, self.samples, self.session_id))
+
+    def __repr__(self):
+        return f"PointerMotionPacket(x={self.x}, y={self.y}, samples={len(self.samples) // 6})"
+
+
 class ChatMessagePacket:
     """
     Gói tin chat message
@@ -206,12 +449,19 @@ class FileMetadataPacket:
         filename: str,
         filesize: int,
         sender_role: str,
+        resume_id: str | None = None,
+        file_count: int | None = None,
+        delta: bool = False,
     ):
         self.session_id = session_id
         self.file_id = file_id
         self.filename = filename
         self.filesize = filesize
         self.sender_role = sender_role  # "host" or "controller"
+        self.resume_id = resume_id  # Định danh file (tên, kích thước, mtime) để nhận tiếp
+        # Khác None: gửi thư mục / nhiều file dưới dạng một archive, filesize là kích thước archive
+        self.file_count = file_count
+        self.delta = delta  # Bên gửi hỗ trợ gửi delta nếu receiver đã có bản cũ
 
     def __repr__(self):
         return f"FileMetadataPacket(file_id={self.file_id}, filename={self.filename}, size={self.filesize})"
@@ -222,9 +472,15 @@ class FileAcceptPacket:
     Gói tin chấp nhận nhận file
     """
 
-    def __init__(self, session_id: str, file_id: str):
+    def __init__(
+        self,
+        session_id: str,
+        file_id: str,
+        received_ranges: list[tuple[int, int]] | None = None,
+    ):
         self.session_id = session_id
         self.file_id = file_id
+        self.received_ranges = received_ranges  # Chunk [start, end) đã có - bên gửi bỏ qua
 
     def __repr__(self):
         return f"FileAcceptPacket(file_id={self.file_id})"
@@ -255,12 +511,18 @@ class FileChunkPacket:
         chunk_index: int,
         chunk_data: bytes,
         total_chunks: int,
+        chunk_hash: bytes | None = None,
+        compression: str | None = None,
     ):
         self.session_id = session_id
         self.file_id = file_id
         self.chunk_index = chunk_index
+        # protocol.FileRegion khi gửi bằng sendfile, bytearray khi nhận frame bulk
         self.chunk_data = chunk_data
         self.total_chunks = total_chunks
+        self.chunk_hash = chunk_hash  # BLAKE2b-128 của chunk_data
+        # Codec Protocol dùng cho gói này (CompressionPolicy của lượt truyền), None = mặc định
+        self.compression = compression
 
     def __repr__(self):
         return f"FileChunkPacket(file_id={self.file_id}, chunk={self.chunk_index}/{self.total_chunks})"
@@ -271,16 +533,95 @@ class FileCompletePacket:
     Gói tin thông báo file đã gửi xong
     """
 
-    def __init__(self, session_id: str, file_id: str, success: bool, message: str = ""):
+    def __init__(
+        self,
+        session_id: str,
+        file_id: str,
+        success: bool,
+        message: str = "",
+        file_hash: str | None = None,
+    ):
         self.session_id = session_id
         self.file_id = file_id
         self.success = success
         self.message = message
+        self.file_hash = file_hash  # Hash của toàn bộ chunk hash theo thứ tự
 
     def __repr__(self):
         return f"FileCompletePacket(file_id={self.file_id}, success={self.success})"
 
 
+class FileAckPacket:
+    """
+    Gói tin xác nhận các chunk đã ghi xuống đĩa (receiver -> sender),
+    mỗi lần xác nhận cấp thêm credit để bên gửi gửi tiếp
+    """
+
+    def __init__(self, session_id: str, file_id: str, ranges: list[tuple[int, int]]):
+        self.session_id = session_id
+        self.file_id = file_id
+        self.ranges = ranges  # Các khoảng chunk [start, end) mới ghi từ lần ack trước
+
+    def __repr__(self):
+        return f"FileAckPacket(file_id={self.file_id}, ranges={self.ranges})"
+
+
+class FileSignaturePacket:
+    """
+    Gói tin chấp nhận file kèm checksum các block của bản cũ receiver đang có
+    (receiver -> sender) - bên gửi trả lời bằng FileDeltaPacket thay vì FileChunkPacket
+    """
+
+    def __init__(self, session_id: str, file_id: str, block_size: int, signature: bytes):
+        self.session_id = session_id
+        self.file_id = file_id
+        self.block_size = block_size
+        self.signature = signature  # Mỗi block: adler32 (4 byte) + BLAKE2b-128
+
+    def __repr__(self):
+        return f"FileSignaturePacket(file_id={self.file_id}, block_size={self.block_size}, blocks={len(self.signature) // 20})"
+
+
+class FileDeltaPacket:
+    """
+    Gói tin chứa một đoạn delta: các lệnh copy block từ bản cũ / literal,
+    ghi ra file mới bắt đầu từ offset
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        file_id: str,
+        chunk_index: int,
+        offset: int,
+        ops: bytes,
+        compression: str | None = None,
+    ):
+        self.session_id = session_id
+        self.file_id = file_id
+        self.chunk_index = chunk_index
+        self.offset = offset
+        self.ops = ops
+        self.compression = compression  # Như FileChunkPacket.compression
+
+    def __repr__(self):
+        return f"FileDeltaPacket(file_id={self.file_id}, chunk={self.chunk_index}, offset={self.offset}, size={len(self.ops)})"
+
+
+class WindowUpdatePacket:
+    """
+    Gói tin trả credit cho một stream trên một chặng (client <-> server,
+    không được relay): bên nhận đã xử lý xong increment byte dữ liệu của stream
+    """
+
+    def __init__(self, stream_id: str, increment: int):
+        self.stream_id = stream_id
+        self.increment = increment
+
+    def __repr__(self):
+        return f"WindowUpdatePacket(stream_id={self.stream_id}, increment={self.increment})"
+
+
 Packet = (
     AssignIdPacket
     | ClientInformationPacket
@@ -288,14 +629,26 @@ Packet = (
     | ConnectionResponsePacket
     | KeyboardPacket
     | MousePacket
+    | PointerMotionPacket
     | AuthenticationPasswordPacket
     | SessionPacket
+    | PeerCandidatesPacket
+    | PingPacket
+    | PongPacket
     | VideoStreamPacket
     | VideoConfigPacket
+    | KeyframeRequestPacket
+    | MonitorListPacket
+    | MonitorSelectPacket
+    | CursorPacket
     | ChatMessagePacket
     | FileMetadataPacket
     | FileAcceptPacket
     | FileRejectPacket
     | FileChunkPacket
     | FileCompletePacket
+    | FileAckPacket
+    | FileSignaturePacket
+    | FileDeltaPacket
+    | WindowUpdatePacket
 )
@@ -44,3 +44,17 @@ class PasswordManager:
         Xóa mật khẩu đã lưu
         """
         keyring.delete_password("RemoteDesktopApp", device_id)
+
+    @staticmethod
+    def store_device_key(server: str, device_id: str, device_key: str):
+        """
+        Lưu device key do server cấp (mỗi server một key)
+        """
+        keyring.set_password("RemoteDesktopApp", f"{device_id}@{server}", device_key)
+
+    @staticmethod
+    def get_device_key(server: str, device_id: str) -> str | None:
+        """
+        Lấy device key đã lưu cho server
+        """
+        return keyring.get_password("RemoteDesktopApp", f"{device_id}@{server}")
@@ -0,0 +1,87 @@
+import struct
+
+from common.packets import PointerMotionPacket
+
+SAMPLE = struct.Struct("<hhH")  # dx, dy, dt_ms so với mẫu liền trước
+
+_DELTA_MIN = -32768
+_DELTA_MAX = 32767
+_DT_MAX = 65535
+
+
+class PointerMotionEncoder:
+    """
+    Gom các mẫu vị trí chuột giữa hai lần gửi thành một PointerMotionPacket.
+    Mẫu trùng vị trí với mẫu trước bị bỏ qua. Khi không giữ nút chuột, host chỉ
+    cần vị trí cuối nên chỉ giữ lại mẫu mới nhất (keep_path=False).
+    """
+
+    def __init__(self):
+        self.__origin: tuple[int, int] | None = None
+        self.__last: tuple[int, int] | None = None
+        self.__last_time = 0.0
+        self.__samples = bytearray()
+
+    def add(self, x: int, y: int, timestamp: float, keep_path: bool = True) -> bool:
+        """Thêm mẫu (timestamp theo time.monotonic()), trả về False nếu trùng vị trí"""
+        if self.__last == (x, y):
+            return False
+
+        if self.__origin is None or self.__last is None or not keep_path:
+            self.__origin = (x, y)
+            self.__samples.clear()
+        else:
+            dx = x - self.__last[0]
+            dy = y - self.__last[1]
+            if not (
+                _DELTA_MIN <= dx <= _DELTA_MAX and _DELTA_MIN <= dy <= _DELTA_MAX
+            ):
+                # Không biểu diễn được bằng int16 -> chỉ giữ vị trí mới nhất
+                self.__origin = (x, y)
+                self.__samples.clear()
+            else:
+                dt_ms = min(int((timestamp - self.__last_time) * 1000), _DT_MAX)
+                self.__samples += SAMPLE.pack(dx, dy, dt_ms)
+
+        self.__last = (x, y)
+        self.__last_time = timestamp
+        return True
+
+    @property
+    def pending(self) -> bool:
+        return self.__origin is not None
+
+    def flush(self, session_id: str | None) -> PointerMotionPacket | None:
+        """Tạo packet từ các mẫu đang gom, None nếu không có mẫu nào"""
+        if self.__origin is None:
+            return None
+
+        packet = PointerMotionPacket(
+            x=self.__origin[0],
+            y=self.__origin[1],
+            samples=bytes(self.__samples),
+            session_id=session_id,
+        )
+        self.__origin = None
+        self.__samples.clear()
+        return packet
+
+
+def decode_pointer_motion(packet: PointerMotionPacket) -> list[tuple[int, int, int]]:
+    """Giải mã packet thành danh sách (x, y, dt_ms) - mẫu đầu có dt_ms = 0"""
+    x, y = packet.x, packet.y
+    positions = [(x, y, 0)]
+    for dx, dy, dt_ms in SAMPLE.iter_unpack(packet.samples):
+        x += dx
+        y += dy
+        positions.append((x, y, dt_ms))
+    return positions
+
+
+def final_position(packet: PointerMotionPacket) -> tuple[int, int]:
+    """Vị trí cuối cùng của packet"""
+    x, y = packet.x, packet.y
+    for dx, dy, _ in SAMPLE.iter_unpack(packet.samples):
+        x += dx
+        y += dy
+    return x, y
@@ -1,29 +1,66 @@
+import os
 import pickle
 import socket
 import ssl
 
-import lz4.frame as lz4
-
+from common import compression
 from common.enums import PacketType
-from common.packets import Packet
+from common.packets import FileChunkPacket, Packet
 from common.safe_deserializer import SafeDeserializer
 
 
+class FileRegion:
+    """
+    Đoạn file làm chunk_data của FileChunkPacket: Protocol gửi thẳng từ file
+    bằng socket.sendfile thay vì đọc vào bytes, pickle rồi gửi. Mở file theo
+    path lúc gửi nên không phụ thuộc file object của thread đọc.
+    """
+
+    def __init__(self, path: str, offset: int, length: int):
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __repr__(self):
+        return f"FileRegion({self.path!r}, offset={self.offset}, length={self.length})"
+
+
 class Protocol:
     """
     Packet format:
 
         Packet-Length: <length>\r\n
         Packet-Type: <packet_type>\r\n
-        Compressed: <true|false>\r\n
+        Compression: <none|lz4|zstd>\r\n
+        [Bulk-Length: <length>\r\n]
         \r\n
         <payload>
+        [<bulk data>]
+
+    Codec do packet chọn (thuộc tính compression, vd. FileChunkPacket theo
+    CompressionPolicy của lượt truyền), mặc định LZ4. Header cũ
+    "Compressed: <true|false>" vẫn được chấp nhận khi nhận.
 
+    FileChunkPacket không nén được gửi dạng bulk: payload là packet với
+    chunk_data rỗng, dữ liệu chunk đi nguyên bản ngay sau đó (sendfile từ
+    FileRegion ở bên gửi, recv_into thẳng vào buffer chunk ở bên nhận).
     """
 
     __MAX_PACKET_SIZE = 50 * 1024 * 1024
-    __NO_COMPRESSION_PACKET_TYPES = {PacketType.VIDEO_STREAM}
+    __NO_COMPRESSION_PACKET_TYPES = {
+        PacketType.VIDEO_STREAM,
+        PacketType.PING,  # Gói tin nhỏ, nén LZ4 chỉ làm tăng kích thước
+        PacketType.PONG,
+        PacketType.POINTER_MOTION,
+        PacketType.CURSOR,  # Vị trí vài chục byte, bitmap đã là PNG
+    }
+    __MIN_COMPRESS_SIZE = 256  # Payload nhỏ hơn gần như không nén được
     __HEADER_DELIMITER = b"\r\n\r\n"  # Delimiter giữa headers và body
+    __MSG_MORE = getattr(socket, "MSG_MORE", 0)  # Gộp header với dữ liệu sendfile
+    __HEADER_PEEK_SIZE = 256  # Đủ cho mọi header hiện có
 
     @staticmethod
     def __receive(sock: socket.socket | ssl.SSLSocket, size: int) -> bytes:
@@ -39,12 +76,41 @@ class Protocol:
         return bytes(data)
 
     @staticmethod
+    def __receive_into(sock: socket.socket | ssl.SSLSocket, size: int) -> bytearray:
+        """Nhận đúng size byte thẳng vào một buffer (không qua bytes trung gian)"""
+        data = bytearray(size)
+        view = memoryview(data)
+        while view:
+            received = sock.recv_into(view)
+            if not received:
+                raise ConnectionError("Connection closed unexpectedly")
+            view = view[received:]
+        return data
+
+    @staticmethod
+    def __send_region(sock: socket.socket | ssl.SSLSocket, region: FileRegion):
+        with open(region.path, "rb") as f:
+            sent = sock.sendfile(f, region.offset, region.length)
+        if sent != region.length:
+            raise OSError(f"{region.path} changed during transfer")
+
+    @classmethod
     def __receive_until_delimiter(
-        sock: socket.socket | ssl.SSLSocket, delimiter: bytes
+        cls, sock: socket.socket | ssl.SSLSocket, delimiter: bytes
     ) -> bytes:
         """
         Nhận dữ liệu từ socket cho đến khi gặp delimiter
         """
+        if not isinstance(sock, ssl.SSLSocket):
+            # Socket thường: MSG_PEEK cả header rồi nhận đúng phần đó (2 syscall
+            # thay vì 1 syscall mỗi byte). SSLSocket không hỗ trợ flags.
+            peeked = sock.recv(cls.__HEADER_PEEK_SIZE, socket.MSG_PEEK)
+            if not peeked:
+                raise ConnectionError("Connection closed unexpectedly")
+            end = peeked.find(delimiter)
+            if end >= 0:
+                return cls.__receive(sock, end + len(delimiter))[:end]
+
         data = bytearray()
         delimiter_len = len(delimiter)
 
@@ -86,26 +152,41 @@ class Protocol:
         cls,
         socket: socket.socket | ssl.SSLSocket,
         packet: Packet,
-    ) -> None:
+    ) -> int:
         """
         Gửi gói tin
 
         :param socket: Gói tin được gửi đến socket này
+        :return: Số byte đã gửi (cả header)
         """
 
         try:
+            if isinstance(packet, FileChunkPacket) and (
+                isinstance(packet.chunk_data, FileRegion)
+                or packet.compression == compression.NONE
+            ):
+                return cls.__send_bulk(socket, packet)
+
             # Serialize packet
             payload = pickle.dumps(packet, protocol=pickle.HIGHEST_PROTOCOL)
 
             # Sử dụng PacketType.get(packet) để lấy packet type
             packet_type = PacketType.get(packet)
 
-            is_compressed = False
-            if packet_type not in cls.__NO_COMPRESSION_PACKET_TYPES:
-                compressed = lz4.compress(payload)
-                is_compressed = True
-            else:
-                compressed = payload
+            codec = getattr(packet, "compression", None)
+            if codec is None:
+                if (
+                    packet_type in cls.__NO_COMPRESSION_PACKET_TYPES
+                    or len(payload) < cls.__MIN_COMPRESS_SIZE
+                ):
+                    codec = compression.NONE
+                else:
+                    codec = compression.LZ4
+
+            compressed, codec = compression.compress(payload, codec)
+            if codec != compression.NONE and len(compressed) >= len(payload):
+                # Nén không có lợi - gửi nguyên bản để bên nhận khỏi giải nén
+                compressed, codec = payload, compression.NONE
 
             length = len(compressed)
             if length > cls.__MAX_PACKET_SIZE:
@@ -114,16 +195,48 @@ class Protocol:
             headers = {
                 "Packet-Length": str(length),
                 "Packet-Type": packet_type.value if packet_type else "UNKNOWN",
-                "Compressed": "true" if is_compressed else "false",
+                "Compression": codec,
             }
 
             header_data = cls.__build_headers(headers)
 
-            socket.sendall(header_data + cls.__HEADER_DELIMITER + compressed)
+            frame = header_data + cls.__HEADER_DELIMITER + compressed
+            socket.sendall(frame)
+            return len(frame)
 
         except pickle.PicklingError as e:
             raise ValueError(f"Failed to serialize packet: {e}") from e
 
+    @classmethod
+    def __send_bulk(
+        cls, socket: socket.socket | ssl.SSLSocket, packet: FileChunkPacket
+    ) -> int:
+        """Gửi FileChunkPacket dạng bulk: packet không kèm dữ liệu + dữ liệu thô"""
+        chunk_data = packet.chunk_data
+        header_packet = FileChunkPacket(**{**packet.__dict__, "chunk_data": b""})
+        payload = pickle.dumps(header_packet, protocol=pickle.HIGHEST_PROTOCOL)
+
+        length = len(chunk_data)
+        if length > cls.__MAX_PACKET_SIZE:
+            raise ValueError(f"Packet too large: {length} bytes")
+
+        headers = {
+            "Packet-Length": str(len(payload)),
+            "Packet-Type": PacketType.FILE_CHUNK.value,
+            "Compression": compression.NONE,
+            "Bulk-Length": str(length),
+        }
+        header_data = cls.__build_headers(headers) + cls.__HEADER_DELIMITER + payload
+
+        if isinstance(chunk_data, FileRegion):
+            # SSLSocket không nhận flags - sendfile của nó cũng chỉ là read + send
+            flags = 0 if isinstance(socket, ssl.SSLSocket) else cls.__MSG_MORE
+            socket.sendall(header_data, flags)
+            cls.__send_region(socket, chunk_data)
+        else:
+            socket.sendall(header_data + chunk_data)
+        return len(header_data) + length
+
     @classmethod
     def receive_packet(cls, socket: socket.socket | ssl.SSLSocket) -> Packet:
         """
@@ -139,15 +252,28 @@ class Protocol:
             raise ValueError("Missing Packet-Length header")
         if "Packet-Type" not in headers:
             raise ValueError("Missing Packet-Type header")
-        if "Compressed" not in headers:
-            raise ValueError("Missing Compressed header")
+        if "Compression" in headers:
+            codec = headers["Compression"].lower()
+        elif "Compressed" in headers:
+            codec = (
+                compression.LZ4
+                if headers["Compressed"].lower() == "true"
+                else compression.NONE
+            )
+        else:
+            raise ValueError("Missing Compression header")
 
         length = int(headers["Packet-Length"])
         packet_type = headers["Packet-Type"]
-        is_compressed = headers["Compressed"].lower() == "true"
+        bulk_length = int(headers.get("Bulk-Length", -1))
 
         if length < 0 or length > cls.__MAX_PACKET_SIZE:
             raise ValueError(f"Invalid packet length: {length}")
+        if bulk_length > cls.__MAX_PACKET_SIZE or (
+            bulk_length >= 0
+            and (packet_type != PacketType.FILE_CHUNK.value or codec != compression.NONE)
+        ):
+            raise ValueError(f"Invalid bulk frame: {packet_type}, {bulk_length} bytes")
 
         valid_packet_types = {pt.value for pt in PacketType}
         if packet_type not in valid_packet_types:
@@ -157,13 +283,10 @@ class Protocol:
         if len(payload_data) == 0:
             raise ValueError("No payload data")
 
-        if is_compressed:
-            try:
-                payload = lz4.decompress(payload_data)
-            except Exception as e:
-                raise ValueError(f"LZ4 decompression failed: {e}") from e
-        else:
-            payload = payload_data
+        try:
+            payload = compression.decompress(payload_data, codec)
+        except Exception as e:
+            raise ValueError(f"{codec} decompression failed: {e}") from e
 
         try:
             packet = SafeDeserializer.safe_loads(payload)
@@ -183,4 +306,7 @@ class Protocol:
                 f"Packet type mismatch: header={packet_type}, actual={actual_packet_type.value}"
             )
 
+        if bulk_length >= 0:
+            packet.chunk_data = cls.__receive_into(socket, bulk_length)
+
         return packet
@@ -0,0 +1,316 @@
+import threading
+import time
+from collections import deque
+from queue import Empty, Full
+from typing import Any, Callable
+
+from common.packets import (
+    ChatMessagePacket,
+    FileChunkPacket,
+    FileCompletePacket,
+    FileDeltaPacket,
+    FileRejectPacket,
+    Packet,
+    VideoConfigPacket,
+    VideoStreamPacket,
+)
+
+# Mỗi kết nối TCP chia thành các stream logic (giống HTTP/2):
+#   - control: input, ping/pong, cursor, session, ack... - luôn được gửi trước
+#   - video/<session>/<monitor>, chat/<session>, file/<file_id>: chia băng thông đều nhau
+#     bằng deficit round robin
+# Dữ liệu file (chunk / delta) còn bị giới hạn bởi credit window của stream
+# theo từng chặng (client <-> server): bên nhận trả credit bằng
+# WindowUpdatePacket khi đã xử lý xong dữ liệu.
+CONTROL_STREAM = "control"
+
+STREAM_WINDOW = 4 * 1024 * 1024  # Credit ban đầu của mỗi stream (byte)
+WINDOW_UPDATE_THRESHOLD = STREAM_WINDOW // 4  # Gom credit tới ngưỡng này mới báo
+QUANTUM = 64 * 1024  # Byte mỗi lượt round robin
+SMALL_PACKET_COST = 64
+
+
+def stream_id(packet: Packet) -> str:
+    """Stream của packet - cùng một kết quả ở mọi chặng"""
+    file_id = getattr(packet, "file_id", None)
+    if file_id is not None:
+        # Mọi packet của một file đi chung stream để FileComplete không vượt chunk
+        return f"file/{file_id}"
+    if isinstance(packet, (VideoStreamPacket, VideoConfigPacket)):
+        # Mỗi monitor một stream - các monitor chia đều băng thông
+        return f"video/{packet.session_id}/{packet.monitor}"
+    if isinstance(packet, ChatMessagePacket):
+        return f"chat/{packet.session_id}"
+    return CONTROL_STREAM
+
+
+def flow_size(packet: Packet) -> int:
+    """Số byte packet tiêu tốn trong credit window (0 = không bị giới hạn)"""
+    if isinstance(packet, FileChunkPacket):
+        return len(packet.chunk_data)
+    if isinstance(packet, FileDeltaPacket):
+        return len(packet.ops)
+    return 0
+
+
+def ends_stream(packet: Packet) -> bool:
+    return isinstance(packet, (FileCompletePacket, FileRejectPacket))
+
+
+def uses_credit(packet: Packet) -> bool:
+    """Packet bên nhận phải báo cho WindowTracker sau khi xử lý"""
+    return flow_size(packet) > 0 or ends_stream(packet)
+
+
+def _cost(packet: Packet) -> int:
+    """Ước lượng kích thước trên dây để chia lượt round robin"""
+    size = flow_size(packet)
+    if size:
+        return size
+    if isinstance(packet, VideoStreamPacket):
+        return len(packet.video_data)
+    return SMALL_PACKET_COST
+
+
+class StreamQueue:
+    """
+    Hàng đợi gửi của một kết nối, thay cho queue.Queue FIFO (cùng các method
+    put / put_nowait / get / get_nowait / qsize / empty, cùng exception Full /
+    Empty). Stream control được lấy trước, các stream còn lại được lấy xen kẽ
+    theo deficit round robin nên một luồng file lớn không thể chặn video, chat
+    hay các file khác. Packet dữ liệu file chỉ được lấy khi stream còn credit.
+
+    put(..., packet=p) khi item là wrapper của packet p (vd. SpooledPacket);
+    on_sent được gọi khi item được lấy ra để gửi.
+    """
+
+    def __init__(self, maxsize: int = 0, window: int = STREAM_WINDOW):
+        self.maxsize = maxsize
+        self.__window = window
+        self.__condition = threading.Condition()
+        self.__control: deque = deque()
+        self.__streams: dict[str, deque] = {}
+        self.__active: deque[str] = deque()  # Stream (khác control) đang có packet
+        self.__deficit: dict[str, int] = {}
+        self.__credit: dict[str, int] = {}
+        self.__fresh_turn = True
+        self.__count = 0
+
+    def put(
+        self,
+        item: Any,
+        block: bool = True,
+        timeout: float | None = None,
+        packet: Packet | None = None,
+        on_sent: Callable[[], None] | None = None,
+    ):
+        packet = item if packet is None else packet
+        stream = stream_id(packet)
+        entry = (item, packet, on_sent)
+
+        with self.__condition:
+            if self.maxsize > 0 and self.__count >= self.maxsize:
+                if not block:
+                    raise Full
+                if not self.__condition.wait_for(
+                    lambda: self.__count < self.maxsize, timeout
+                ):
+                    raise Full
+
+            if stream == CONTROL_STREAM:
+                self.__control.append(entry)
+            else:
+                queue = self.__streams.get(stream)
+                if queue is None:
+                    queue = self.__streams[stream] = deque()
+                if not queue:
+                    self.__active.append(stream)
+                queue.append(entry)
+            self.__count += 1
+            self.__condition.notify_all()
+
+    def put_nowait(self, item: Any, **kwargs):
+        self.put(item, block=False, **kwargs)
+
+    def get(self, block: bool = True, timeout: float | None = None) -> Any:
+        with self.__condition:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while True:
+                entry = self.__pick()
+                if entry is not None:
+                    break
+                if not block:
+                    raise Empty
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise Empty
+                self.__condition.wait(remaining)
+            self.__count -= 1
+            self.__condition.notify_all()
+
+        item, _, on_sent = entry
+        if on_sent is not None:
+            on_sent()
+        return item
+
+    def get_nowait(self) -> Any:
+        return self.get(block=False)
+
+    def requeue(self, item: Any, packet: Packet | None = None):
+        """
+        Trả item vừa get() về đầu stream của nó mà chưa gửi (vd. kết nối lấy
+        ra đã bị resume thay thế) - kết nối mới gửi nó trước các packet sau nó.
+        Không giới hạn bởi maxsize, on_sent đã được gọi khi get().
+        """
+        packet = item if packet is None else packet
+        stream = stream_id(packet)
+        entry = (item, packet, None)
+
+        with self.__condition:
+            if stream == CONTROL_STREAM:
+                self.__control.appendleft(entry)
+            else:
+                queue = self.__streams.get(stream)
+                if queue is None:
+                    queue = self.__streams[stream] = deque()
+                if not queue:
+                    self.__active.appendleft(stream)
+                    self.__fresh_turn = True
+                queue.appendleft(entry)
+                size = flow_size(packet)
+                if size and stream in self.__credit:
+                    self.__credit[stream] += size
+            self.__count += 1
+            self.__condition.notify_all()
+
+    def __pick(self):
+        if self.__control:
+            return self.__control.popleft()
+
+        blocked = 0
+        while self.__active and blocked < len(self.__active):
+            stream = self.__active[0]
+            queue = self.__streams[stream]
+            _, packet, _ = queue[0]
+            size = flow_size(packet)
+
+            if size and self.__credit.get(stream, self.__window) <= 0:
+                # Hết credit - chờ WindowUpdate, không tích lũy lượt
+                self.__deficit[stream] = 0
+                self.__next_stream()
+                blocked += 1
+                continue
+            blocked = 0
+
+            if self.__fresh_turn:
+                self.__deficit[stream] = self.__deficit.get(stream, 0) + QUANTUM
+                self.__fresh_turn = False
+
+            cost = _cost(packet)
+            if cost > self.__deficit[stream]:
+                self.__next_stream()
+                continue
+
+            entry = queue.popleft()
+            self.__deficit[stream] -= cost
+            if size:
+                self.__credit[stream] = self.__credit.get(stream, self.__window) - size
+            if ends_stream(packet):
+                self.__credit.pop(stream, None)
+            if not queue:
+                del self.__streams[stream]
+                self.__deficit.pop(stream, None)
+                self.__active.popleft()
+                self.__fresh_turn = True
+            return entry
+        return None
+
+    def __next_stream(self):
+        self.__active.rotate(-1)
+        self.__fresh_turn = True
+
+    def window_update(self, stream: str, increment: int):
+        """Bên nhận trả credit cho stream"""
+        with self.__condition:
+            if stream not in self.__credit:
+                return  # Stream đã kết thúc
+            self.__credit[stream] += increment
+            self.__condition.notify_all()
+
+    def reset_credit(self):
+        """
+        Kết nối mới (resume): dữ liệu đang bay trên kết nối cũ đã mất, bên
+        nhận không trả credit cho nó nữa - mọi stream bắt đầu lại với window đầy
+        """
+        with self.__condition:
+            self.__credit.clear()
+            self.__condition.notify_all()
+
+    def discard_streams(self, prefix: str) -> int:
+        """Bỏ packet đang chờ của các stream bắt đầu bằng prefix (vd. video cũ)"""
+        dropped = []
+        with self.__condition:
+            for stream in [s for s in self.__streams if s.startswith(prefix)]:
+                dropped.extend(self.__streams.pop(stream))
+                self.__deficit.pop(stream, None)
+                self.__active.remove(stream)
+            self.__fresh_turn = True
+            self.__count -= len(dropped)
+            self.__condition.notify_all()
+
+        for _, _, on_sent in dropped:
+            if on_sent is not None:
+                on_sent()
+        return len(dropped)
+
+    def qsize(self) -> int:
+        with self.__condition:
+            return self.__count
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def clear(self):
+        with self.__condition:
+            self.__control.clear()
+            self.__streams.clear()
+            self.__active.clear()
+            self.__deficit.clear()
+            self.__count = 0
+            self.__condition.notify_all()
+
+
+class WindowTracker:
+    """
+    Phía nhận của credit window: cộng dồn byte đã xử lý theo stream, trả về
+    lượng credit cần báo (WindowUpdatePacket) khi đã đủ ngưỡng.
+    """
+
+    def __init__(self, threshold: int = WINDOW_UPDATE_THRESHOLD):
+        self.threshold = threshold
+        self.__consumed: dict[str, int] = {}
+        self.__lock = threading.Lock()
+
+    def consumed(self, packet: Packet) -> tuple[str, int] | None:
+        """(stream, increment) nếu cần gửi WindowUpdate cho packet vừa xử lý"""
+        size = flow_size(packet)
+        if not size:
+            if ends_stream(packet):
+                # Stream kết thúc - bên gửi cũng bỏ credit của stream
+                with self.__lock:
+                    self.__consumed.pop(stream_id(packet), None)
+            return None
+
+        stream = stream_id(packet)
+        with self.__lock:
+            total = self.__consumed.get(stream, 0) + size
+            if total < self.threshold:
+                self.__consumed[stream] = total
+                return None
+            self.__consumed.pop(stream, None)
+        return stream, total
+
+    def reset(self):
+        """Kết nối mới - bên gửi đã bắt đầu lại với window đầy"""
+        with self.__lock:
+            self.__consumed.clear()
@@ -0,0 +1,94 @@
+import functools
+import os
+import ssl
+import threading
+import time
+
+# Context được dựng một lần cho mỗi bộ cert (nạp cert chain / CA là phần tốn
+# CPU nhất khi tạo context) và dùng lại cho mọi kết nối. Session TLS chỉ
+# resume được với đúng context đã tạo ra nó, nên client cũng phải giữ context.
+
+SERVER_TICKETS = 1  # Mỗi lần kết nối lại chỉ cần một ticket (mặc định OpenSSL là 2)
+
+
+@functools.lru_cache(maxsize=4)
+def _server_context(cert_file: str, key_file: str, _mtimes: tuple) -> ssl.SSLContext:
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile=cert_file, keyfile=key_file)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.options |= ssl.OP_NO_RENEGOTIATION
+    context.num_tickets = SERVER_TICKETS
+    return context
+
+
+@functools.lru_cache(maxsize=4)
+def _client_context(cert_file: str, _mtime: float) -> ssl.SSLContext:
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.load_verify_locations(cert_file)
+    context.verify_mode = ssl.CERT_REQUIRED
+    context.check_hostname = False
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    return context
+
+
+def server_context(cert_file: str, key_file: str) -> ssl.SSLContext:
+    """Context phía server; dựng lại khi file cert / key thay đổi"""
+    mtimes = (os.path.getmtime(cert_file), os.path.getmtime(key_file))
+    return _server_context(cert_file, key_file, mtimes)
+
+
+def client_context(cert_file: str) -> ssl.SSLContext:
+    """Context phía client (tin cert của server); dựng lại khi file thay đổi"""
+    return _client_context(cert_file, os.path.getmtime(cert_file))
+
+
+class TLSSessionCache:
+    """
+    Session TLS của client theo (host, port) để lần kết nối sau resume thay vì
+    handshake đầy đủ. Với TLS 1.3 ticket tới sau handshake (cùng dữ liệu đầu
+    tiên từ server) nên cache giữ socket đang dùng và đọc session khi cần.
+    """
+
+    __sockets: dict[tuple[str, int], ssl.SSLSocket] = {}
+    __sessions: dict[tuple[str, int], ssl.SSLSession] = {}
+    __lock = threading.Lock()
+
+    @classmethod
+    def get(cls, host: str, port: int) -> ssl.SSLSession | None:
+        """Session còn hạn cho server, None nếu phải handshake đầy đủ"""
+        key = (host, port)
+        with cls.__lock:
+            cls.__snapshot(key)
+            session = cls.__sessions.get(key)
+            if session and time.time() >= session.time + session.timeout:
+                del cls.__sessions[key]
+                session = None
+            return session
+
+    @classmethod
+    def track(cls, host: str, port: int, sock: ssl.SSLSocket):
+        """Ghi nhận kết nối mới tới server"""
+        key = (host, port)
+        with cls.__lock:
+            cls.__snapshot(key)
+            cls.__sockets[key] = sock
+
+    @classmethod
+    def release(cls, host: str, port: int):
+        """Lưu session trước khi đóng socket (socket đã đóng không còn session)"""
+        key = (host, port)
+        with cls.__lock:
+            cls.__snapshot(key)
+            cls.__sockets.pop(key, None)
+
+    @classmethod
+    def __snapshot(cls, key: tuple[str, int]):
+        sock = cls.__sockets.get(key)
+        if sock is None:
+            return
+        try:
+            session = sock.session
+        except (AttributeError, ValueError):
+            session = None
+        if session is not None:
+            cls.__sessions[key] = session
@@ -1,4 +1,7 @@
+import hashlib
+import io
 import secrets
+import struct
 import sys
 import socket
 import subprocess
@@ -48,9 +51,6 @@ if sys.platform == "win32":
             ("ptScreenPos", POINT),
         ]
 
-    # Cache cho cursor images
-    _cursor_cache = {}
-
     def get_cursor_info():
         """Lấy thông tin cursor hiện tại trên Windows"""
         cursor_info = CURSORINFO()
@@ -91,81 +91,140 @@ if sys.platform == "win32":
             print(f"Error detecting cursor type: {e}")
             return "normal"
 
-    def load_cursor_image(cursor_path: str) -> Image.Image | None:
-        """Load cursor image từ file .cur hoặc .ani"""
-        try:
-            # Kiểm tra cache trước
-            if cursor_path in _cursor_cache:
-                return _cursor_cache[cursor_path]
-
-            # File .ani không thể load trực tiếp bằng PIL, dùng normal select thay thế
-            if cursor_path.endswith(".ani"):
-                base_dir = os.path.dirname(cursor_path)
-                fallback_path = os.path.join(base_dir, "Normal Select.cur")
-                if os.path.exists(fallback_path):
-                    cursor_path = fallback_path
-                else:
-                    return None
-
-            # Load cursor image
-            cursor_img = Image.open(cursor_path)
-
-            # Convert sang RGBA nếu chưa phải
-            if cursor_img.mode != "RGBA":
-                cursor_img = cursor_img.convert("RGBA")
-
-            # Cache lại
-            _cursor_cache[cursor_path] = cursor_img
-            return cursor_img
 
-        except Exception as e:
-            print(f"Error loading cursor image {cursor_path}: {e}")
-            return None
+# Cache cho cursor images
+_cursor_cache = {}
+_cursor_shape_cache = {}
 
-    def get_cursor_image_path(cursor_type: str = "normal") -> str | None:
-        """Lấy đường dẫn đến file cursor dựa trên loại cursor"""
-        # Tìm thư mục assets/cursors
-        current_file = Path(__file__)
-        project_root = current_file.parent.parent
-        cursors_dir = project_root / "assets" / "cursors"
 
-        if not cursors_dir.exists():
-            return None
+def load_cursor_image(cursor_path: str) -> Image.Image | None:
+    """Load cursor image từ file .cur hoặc .ani"""
+    try:
+        # Kiểm tra cache trước
+        if cursor_path in _cursor_cache:
+            return _cursor_cache[cursor_path]
+
+        # File .ani không thể load trực tiếp bằng PIL, dùng normal select thay thế
+        if cursor_path.endswith(".ani"):
+            base_dir = os.path.dirname(cursor_path)
+            fallback_path = os.path.join(base_dir, "Normal Select.cur")
+            if os.path.exists(fallback_path):
+                cursor_path = fallback_path
+            else:
+                return None
+
+        # Load cursor image
+        cursor_img = Image.open(cursor_path)
+
+        # Convert sang RGBA nếu chưa phải
+        if cursor_img.mode != "RGBA":
+            cursor_img = cursor_img.convert("RGBA")
+
+        # Cache lại
+        _cursor_cache[cursor_path] = cursor_img
+        return cursor_img
 
-        # Map cursor type to filename
-        cursor_map = {
-            "normal": "Normal Select.cur",
-            "text": "Text Select.cur",
-            "hand": "Link Select.cur",
-            "wait": "Busy.ani",
-            "working": "working in background.cur",
-            "cross": "Precision Select.cur",
-            "move": "Move.cur",
-            "resize_nwse": "Diagonal Resize 1.cur",
-            "resize_nesw": "Diagonal Resize 2.cur",
-            "resize_we": "Horizontal Resize.cur",
-            "resize_ns": "Vertical Resize.cur",
-            "help": "Help Select.cur",
-            "no": "Unavailable.ani",
-            "alternate": "Alternate Select.cur",
-            "person": "Person Select.cur",
-            "handwriting": "Handwriting.cur",
-            "location": "Location Select.cur",
-        }
+    except Exception as e:
+        print(f"Error loading cursor image {cursor_path}: {e}")
+        return None
+
+def get_cursor_image_path(cursor_type: str = "normal") -> str | None:
+    """Lấy đường dẫn đến file cursor dựa trên loại cursor"""
+    # Tìm thư mục assets/cursors
+    current_file = Path(__file__)
+    project_root = current_file.parent.parent
+    cursors_dir = project_root / "assets" / "cursors"
+
+    if not cursors_dir.exists():
+        return None
+
+    # Map cursor type to filename
+    cursor_map = {
+        "normal": "Normal Select.cur",
+        "text": "Text Select.cur",
+        "hand": "Link Select.cur",
+        "wait": "Busy.ani",
+        "working": "working in background.cur",
+        "cross": "Precision Select.cur",
+        "move": "Move.cur",
+        "resize_nwse": "Diagonal Resize 1.cur",
+        "resize_nesw": "Diagonal Resize 2.cur",
+        "resize_we": "Horizontal Resize.cur",
+        "resize_ns": "Vertical Resize.cur",
+        "help": "Help Select.cur",
+        "no": "Unavailable.ani",
+        "alternate": "Alternate Select.cur",
+        "person": "Person Select.cur",
+        "handwriting": "Handwriting.cur",
+        "location": "Location Select.cur",
+    }
+
+    filename = cursor_map.get(cursor_type, "Normal Select.cur")
+    cursor_path = cursors_dir / filename
+
+    if cursor_path.exists():
+        return str(cursor_path)
+
+    # Fallback to normal cursor
+    fallback_path = cursors_dir / "Normal Select.cur"
+    if fallback_path.exists():
+        return str(fallback_path)
+
+    return None
+
+
+def read_cursor_hotspot(cursor_path: str) -> tuple[int, int]:
+    """Đọc hotspot từ header file .cur (ICONDIR + entry đầu tiên)"""
+    try:
+        with open(cursor_path, "rb") as f:
+            header = f.read(22)
+        _, image_type, count = struct.unpack_from("<HHH", header)
+        if image_type != 2 or count < 1:  # 2 = cursor, 1 = icon
+            return (0, 0)
+        return struct.unpack_from("<HH", header, 10)
+    except (OSError, struct.error):
+        return (0, 0)
 
-        filename = cursor_map.get(cursor_type, "Normal Select.cur")
-        cursor_path = cursors_dir / filename
 
-        if cursor_path.exists():
-            return str(cursor_path)
+def get_cursor_shape(cursor_type: str, max_size: int = 48) -> dict | None:
+    """
+    Lấy hình dạng cursor để gửi cho controller: PNG (tối đa max_size px), hotspot
+    đã scale theo ảnh và shape_id là hash nội dung PNG (controller cache theo hash).
+    """
+    if cursor_type in _cursor_shape_cache:
+        return _cursor_shape_cache[cursor_type]
 
-        # Fallback to normal cursor
-        fallback_path = cursors_dir / "Normal Select.cur"
-        if fallback_path.exists():
-            return str(fallback_path)
+    cursor_path = get_cursor_image_path(cursor_type)
+    if not cursor_path:
+        return None
+    if cursor_path.endswith(".ani"):
+        # Giống load_cursor_image: .ani dùng normal select thay thế
+        cursor_path = os.path.join(os.path.dirname(cursor_path), "Normal Select.cur")
 
+    cursor_img = load_cursor_image(cursor_path)
+    if not cursor_img:
         return None
 
+    hotspot_x, hotspot_y = read_cursor_hotspot(cursor_path)
+    width, height = cursor_img.size
+    if width > max_size or height > max_size:
+        cursor_img = cursor_img.copy()
+        cursor_img.thumbnail((max_size, max_size))
+        hotspot_x = hotspot_x * cursor_img.width // width
+        hotspot_y = hotspot_y * cursor_img.height // height
+
+    buffer = io.BytesIO()
+    cursor_img.save(buffer, format="PNG")
+    shape_data = buffer.getvalue()
+
+    shape = {
+        "shape_id": hashlib.blake2b(shape_data, digest_size=8).hexdigest(),
+        "shape_data": shape_data,
+        "hotspot": (hotspot_x, hotspot_y),
+    }
+    _cursor_shape_cache[cursor_type] = shape
+    return shape
+
 
 def generate_numeric_id(num_digits: int = 9) -> str:
     """
@@ -235,11 +294,9 @@ def get_cursor_info_for_monitor(
     monitor: dict, mouse_controller: Controller
 ) -> dict | None:
     """
-    Lấy thông tin cursor hiện tại cho một monitor cụ thể (chỉ trên Windows).
+    Lấy thông tin cursor hiện tại cho một monitor cụ thể.
+    Hình dạng cursor chỉ lấy được trên Windows, các nền tảng khác luôn là "normal".
     """
-    if sys.platform != "win32":
-        return None
-
     try:
         # Lấy vị trí chuột toàn cục
         mouse_x, mouse_y = mouse_controller.position
@@ -256,7 +313,7 @@ def get_cursor_info_for_monitor(
             return None
 
         # Lấy thông tin cursor hiện tại
-        cursor_info = get_cursor_info()
+        cursor_info = get_cursor_info() if sys.platform == "win32" else None
         cursor_type = "normal"
         visible = True
 
@@ -53,6 +53,65 @@ def get_parser():
         metavar="FPS",
         help="Screen sharing frame rate (client only, default: 25 FPS)",
     )
+    general.add_argument(
+        "--cursor-rate",
+        type=int,
+        default=120,
+        metavar="HZ",
+        help="Cursor sampling rate, independent of the video frame rate (client only, default: 120 Hz)",
+    )
+    general.add_argument(
+        "--encoder-keep-warm",
+        type=float,
+        default=30.0,
+        metavar="SECONDS",
+        help="Keep the screen encoder open this long after the last viewer leaves so the next session starts instantly (client only, default: 30, 0 = close immediately)",
+    )
+    general.add_argument(
+        "--latency-overlay",
+        action="store_true",
+        help="Show per-stage frame latency overlay on remote screens (client only, toggle with Ctrl+Shift+L)",
+    )
+    general.add_argument(
+        "--no-cursor-echo",
+        dest="cursor_echo",
+        action="store_false",
+        help="Draw the remote cursor only at host-reported positions instead of echoing local mouse moves (client only)",
+    )
+    general.add_argument(
+        "--no-file-delta",
+        dest="file_delta",
+        action="store_false",
+        help="Always send whole files, even when the receiver already has an older copy (client only)",
+    )
+    general.add_argument(
+        "--zstd",
+        action="store_true",
+        help="Use zstd for highly compressible file transfers (client only, requires the zstandard package on both clients and the server)",
+    )
+    general.add_argument(
+        "--no-sendfile",
+        dest="sendfile",
+        action="store_false",
+        help="Read incompressible file chunks into memory instead of sending them with sendfile when SSL is off (client only)",
+    )
+    general.add_argument(
+        "--udp-media",
+        action="store_true",
+        help="Send video and cursor updates over UDP with forward error correction, keeping TCP for everything else (client and server, not available with --ssl)",
+    )
+    general.add_argument(
+        "--direct-media",
+        action="store_true",
+        help="Try a direct UDP path to the session partner for video and cursor updates, falling back to the server relay (client only, not available with --ssl)",
+    )
+    general.add_argument(
+        "--ping-interval",
+        type=float,
+        default=2.0,
+        metavar="SECONDS",
+        help="Interval between RTT/clock-offset pings (client only, default: 2.0 seconds)",
+    )
     general.add_argument(
         "-mc",
         "--max-clients",
@@ -61,6 +120,27 @@ def get_parser():
         metavar="MAX_CLIENTS",
         help="Maximum number of concurrent clients (server only, default: 10)",
     )
+    general.add_argument(
+        "--backlog",
+        type=int,
+        default=128,
+        metavar="SIZE",
+        help="Listen backlog for pending connections (server only, default: 128)",
+    )
+    general.add_argument(
+        "--handshake-workers",
+        type=int,
+        default=32,
+        metavar="COUNT",
+        help="Number of concurrent connection handshakes (server only, default: 32)",
+    )
+    general.add_argument(
+        "--handshake-timeout",
+        type=float,
+        default=5.0,
+        metavar="SECONDS",
+        help="Deadline for TLS handshake and client registration (server only, default: 5.0 seconds)",
+    )
     general.add_argument(
         "-st",
         "--session-timeout",
@@ -70,6 +150,59 @@ def get_parser():
         help="Session timeout duration in seconds (server only, default: 3600 seconds)",
     )
 
+    general.add_argument(
+        "--heartbeat-interval",
+        type=float,
+        default=5.0,
+        metavar="SECONDS",
+        help="Expected interval between client heartbeats (server only, default: 5.0 seconds)",
+    )
+    general.add_argument(
+        "--heartbeat-misses",
+        type=int,
+        default=3,
+        metavar="COUNT",
+        help="Missed heartbeats before a client is evicted (server only, default: 3)",
+    )
+    general.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=0,
+        metavar="SECONDS",
+        help="Disconnect clients that send nothing but heartbeats for this long (server only, default: 0 = disabled)",
+    )
+    general.add_argument(
+        "--resume-grace",
+        type=float,
+        default=30.0,
+        metavar="SECONDS",
+        help="Keep a dropped client's ID and sessions this long so it can reconnect without re-authenticating (server only, default: 30, 0 = disabled)",
+    )
+    general.add_argument(
+        "--device-db",
+        default=None,
+        metavar="FILE",
+        help="SQLite file that keeps each device's client ID across server restarts (server only, default: in memory)",
+    )
+    general.add_argument(
+        "--file-spool",
+        action="store_true",
+        help="Buffer relayed file data on disk and forward it at the receiver's pace (server only)",
+    )
+    general.add_argument(
+        "--spool-dir",
+        default=None,
+        metavar="DIR",
+        help="Directory for the file spool (server only, default: system temp directory)",
+    )
+    general.add_argument(
+        "--spool-limit",
+        type=int,
+        default=4096,
+        metavar="MB",
+        help="Maximum disk space used by the file spool (server only, default: 4096 MB)",
+    )
+
     security = parser.add_argument_group("Security Options")
     security.add_argument(
         "--ssl",
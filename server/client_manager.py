@@ -1,33 +1,44 @@
+import hmac
+import secrets
 import socket
 import ssl
 import threading
-from typing import TypedDict
-from queue import Queue
+import time
+from typing import Literal, TypedDict
+import queue
 import logging
 
-from common.packets import Packet
+from common.packets import Packet, WindowUpdatePacket
+from common.streams import StreamQueue, WindowTracker
 
 logger = logging.getLogger(__name__)
 
 ClientInfo = TypedDict(
     "ClientInfo",
     {
-        "socket": socket.socket | ssl.SSLSocket,
+        "socket": socket.socket | ssl.SSLSocket | None,  # None khi đang chờ resume
         "ip": str,
         "id": str,
         "os": str,
         "host_name": str,
         "device_id": str,
-        "queue": Queue[Packet],  # Hàng đợi để gửi gói tin
+        "queue": StreamQueue,  # Hàng đợi để gửi gói tin, chia lượt theo stream
+        "credit": WindowTracker,  # Credit trả lại cho dữ liệu file client gửi lên
+        "link": dict[str, float | None],  # RTT do client đo và báo lên qua PingPacket
+        "resume_token": bytes | None,  # Token client dùng để kết nối lại
+        "parked_at": float | None,  # Lúc kết nối bị ngắt (client đang chờ resume)
     },
 )
 
+RESUME_TOKEN_SIZE = 16
+
 
 class ClientManager:
     __active_clients: dict[str, ClientInfo] = {}
     __socket_to_id: dict[socket.socket | ssl.SSLSocket, str] = (
         {}
     )  # Mapping nhanh từ socket đến ID
+    __superseded: set[socket.socket | ssl.SSLSocket] = set()  # Kết nối cũ đã bị resume thay
     __lock = threading.Lock()
 
     @classmethod
@@ -39,6 +50,7 @@ class ClientManager:
         os: str = "",
         host_name: str = "",
         device_id: str = "",
+        resume_token: bytes | None = None,
     ):
         with cls.__lock:
             client_info = ClientInfo(
@@ -48,11 +60,128 @@ class ClientManager:
                 os=os,
                 host_name=host_name,
                 device_id=device_id,
-                queue=Queue(maxsize=2048),
+                queue=StreamQueue(maxsize=2048),
+                credit=WindowTracker(),
+                link={"srtt": None, "rttvar": None, "updated_at": None},
+                resume_token=resume_token,
+                parked_at=None,
             )
             cls.__active_clients[client_id] = client_info
             cls.__socket_to_id[client_socket] = client_id
 
+    @staticmethod
+    def new_resume_token() -> bytes:
+        return secrets.token_bytes(RESUME_TOKEN_SIZE)
+
+    @classmethod
+    def resume_client(
+        cls,
+        client_id: str,
+        resume_token: bytes,
+        client_socket: socket.socket | ssl.SSLSocket,
+        client_ip: str,
+        new_resume_token: bytes,
+    ) -> bool:
+        """
+        Gắn kết nối mới vào client cũ nếu token đúng. Client có thể đang chờ
+        resume hoặc kết nối cũ chưa bị phát hiện là đã chết (half-open) - kết
+        nối cũ bị đóng và không dọn dẹp gì khi thoát.
+        """
+        if not isinstance(resume_token, bytes):
+            return False
+        with cls.__lock:
+            client_info = cls.__active_clients.get(client_id)
+            if (
+                not client_info
+                or not client_info["resume_token"]
+                or not hmac.compare_digest(client_info["resume_token"], resume_token)
+            ):
+                return False
+
+            old_socket = client_info["socket"]
+            if old_socket is not None:
+                cls.__socket_to_id.pop(old_socket, None)
+                cls.__superseded.add(old_socket)
+
+            client_info["socket"] = client_socket
+            client_info["ip"] = client_ip
+            client_info["resume_token"] = new_resume_token
+            client_info["parked_at"] = None
+            # Dữ liệu đang bay trên kết nối cũ đã mất: credit bắt đầu lại ở cả hai
+            # chiều, video cũ trong hàng đợi không còn giá trị (host gửi keyframe)
+            client_info["credit"].reset()
+            client_info["queue"].reset_credit()
+            dropped = client_info["queue"].discard_streams("video/")
+            cls.__socket_to_id[client_socket] = client_id
+
+        if old_socket is not None:
+            try:
+                old_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        logger.debug(f"Client {client_id} resumed, dropped {dropped} stale video packets")
+        return True
+
+    @classmethod
+    def detach_client(
+        cls,
+        client_id: str,
+        client_socket: socket.socket | ssl.SSLSocket,
+        parked_at: float | None,
+    ) -> Literal["parked", "superseded", "removed"]:
+        """
+        Kết nối của client đã đóng:
+            - "superseded": kết nối đã bị resume thay thế, không cần làm gì
+            - "parked": client được giữ lại (ID, session, hàng đợi) chờ resume,
+              parked_at đánh dấu lần ngắt này cho remove_parked_client
+            - "removed": client đã bị xóa - người gọi dọn dẹp session, ...
+        """
+        with cls.__lock:
+            if client_socket in cls.__superseded:
+                cls.__superseded.discard(client_socket)
+                return "superseded"
+
+            client_info = cls.__active_clients.get(client_id)
+            if not client_info or client_info["socket"] is not client_socket:
+                return "removed"  # Đã bị xóa trước đó (vd. evict)
+
+            cls.__socket_to_id.pop(client_socket, None)
+            if parked_at is not None:
+                client_info["socket"] = None
+                client_info["parked_at"] = parked_at
+                return "parked"
+
+        cls.remove_client(client_id)
+        return "removed"
+
+    @classmethod
+    def remove_parked_client(cls, client_id: str, parked_at: float) -> bool:
+        """Hết thời gian chờ: xóa client nếu nó vẫn chưa kết nối lại"""
+        with cls.__lock:
+            client_info = cls.__active_clients.get(client_id)
+            if (
+                not client_info
+                or client_info["socket"] is not None
+                or client_info["parked_at"] != parked_at
+            ):
+                return False
+        cls.remove_client(client_id)
+        return True
+
+    @classmethod
+    def is_client_parked(cls, client_id: str) -> bool:
+        with cls.__lock:
+            client_info = cls.__active_clients.get(client_id)
+            return client_info is not None and client_info["socket"] is None
+
+    @classmethod
+    def is_current_socket(
+        cls, client_id: str, client_socket: socket.socket | ssl.SSLSocket
+    ) -> bool:
+        with cls.__lock:
+            client_info = cls.__active_clients.get(client_id)
+            return client_info is not None and client_info["socket"] is client_socket
+
     @classmethod
     def remove_client(cls, client_id: str) -> None:
         with cls.__lock:
@@ -65,7 +194,7 @@ class ClientManager:
                     logger.warning(
                         f"Client {client_id} disconnected. Discarding {client_info['queue'].qsize()} unsent packets"
                     )
-                    client_info["queue"].queue.clear()
+                    client_info["queue"].clear()
 
     @classmethod
     def get_client_info(cls, client: str | socket.socket | ssl.SSLSocket):
@@ -89,11 +218,53 @@ class ClientManager:
             return None
 
     @classmethod
-    def get_client_queue(cls, client_id: str) -> Queue[Packet] | None:
+    def get_client_queue(cls, client_id: str) -> StreamQueue | None:
         with cls.__lock:
             client_info = cls.__active_clients.get(client_id)
             return client_info["queue"] if client_info else None
 
+    @classmethod
+    def return_credit(cls, client_id: str, packet: Packet) -> None:
+        """
+        Dữ liệu file client gửi lên đã rời server (gửi đi, ghi vào spool hoặc
+        bị bỏ) - trả credit của stream để client gửi tiếp
+        """
+        with cls.__lock:
+            client_info = cls.__active_clients.get(client_id)
+        if not client_info:
+            return
+
+        update = client_info["credit"].consumed(packet)
+        if update:
+            stream_id, increment = update
+            try:
+                client_info["queue"].put_nowait(
+                    WindowUpdatePacket(stream_id=stream_id, increment=increment)
+                )
+            except queue.Full:
+                logger.warning(f"Queue full for {client_id}, dropping window update")
+
+    @classmethod
+    def update_link_stats(
+        cls, client_id: str, srtt: float | None, rttvar: float | None
+    ) -> None:
+        """Cập nhật RTT mà client báo lên"""
+        with cls.__lock:
+            client_info = cls.__active_clients.get(client_id)
+            if client_info:
+                client_info["link"] = {
+                    "srtt": srtt,
+                    "rttvar": rttvar,
+                    "updated_at": time.monotonic(),
+                }
+
+    @classmethod
+    def get_link_stats(cls, client_id: str) -> dict[str, float | None] | None:
+        """Lấy RTT gần nhất của client (giây), None nếu client không tồn tại"""
+        with cls.__lock:
+            client_info = cls.__active_clients.get(client_id)
+            return dict(client_info["link"]) if client_info else None
+
     @classmethod
     def is_client_exist(cls, client_id: str) -> bool:
         with cls.__lock:
@@ -112,6 +283,9 @@ class ClientManager:
                 info = cls.__active_clients.pop(client_id, None)
 
                 if info:
+                    if info["socket"] is None:
+                        continue  # Đang chờ resume - không có kết nối
+
                     # Xóa mapping
                     cls.__socket_to_id.pop(info["socket"], None)
 
@@ -130,4 +304,5 @@ class ClientManager:
                         )
 
             cls.__socket_to_id.clear()
+            cls.__superseded.clear()
             logger.info("All clients cleared")
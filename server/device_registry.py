@@ -0,0 +1,240 @@
+import hashlib
+import hmac
+import logging
+import secrets
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+# ID client là số 9 chữ số. Mỗi ID được cấp ứng với một "slot" tăng dần
+# 0, 1, 2, ...; slot được hoán vị bằng Feistel (khóa bí mật của server) thành
+# ID trông ngẫu nhiên. Hoán vị là song ánh nên hai slot khác nhau luôn cho hai
+# ID khác nhau - cấp ID là O(1), không cần thử lại hay tra xem ID đã dùng chưa.
+ID_DIGITS = 9
+ID_BASE = 10 ** (ID_DIGITS - 1)
+ID_SPACE = 10**ID_DIGITS - ID_BASE  # 900 triệu ID
+_HALF_BITS = 15  # Miền Feistel 2^30 >= ID_SPACE, slot ngoài ID_SPACE được hoán vị tiếp
+_HALF_MASK = (1 << _HALF_BITS) - 1
+FEISTEL_ROUNDS = 4
+
+SECRET_SIZE = 32
+DEVICE_KEY_SIZE = 16
+FLUSH_INTERVAL = 5.0  # Giây - nhịp ghi các thiết bị mới xuống SQLite
+
+
+class DeviceRegistry:
+    """
+    Gắn thiết bị (device_id của ClientInformationPacket) với ID client để thiết
+    bị kết nối lại nhận lại ID cũ. Index nằm trong bộ nhớ (hash của device_id
+    -> slot); khi có --device-db, index và bộ đếm slot được nạp lúc khởi động
+    và ghi xuống SQLite định kỳ.
+
+    device_id không bí mật (vd. /etc/machine-id), nên lần đăng ký đầu server
+    cấp device key cho thiết bị; muốn lấy lại ID phải gửi kèm key này. Key
+    được tính lại từ secret của server nên không phải lưu.
+    """
+
+    __secret = b""
+    __round_tables: list[tuple[int, ...]] = []
+    __devices: dict[int, int] = {}  # hash của device_id -> slot
+    __next_slot = 0
+    __in_use: set[str] = set()  # ID đang được client (kể cả đang chờ resume) giữ
+    __dirty: dict[int, int] = {}  # Thay đổi chưa ghi xuống SQLite
+    __db: sqlite3.Connection | None = None
+    __db_lock = threading.Lock()
+    __flush_thread: threading.Thread | None = None
+    __shutdown_event = threading.Event()
+    __lock = threading.Lock()
+
+    @classmethod
+    def start(cls, path: str | None = None):
+        """Khởi tạo registry, nạp từ file SQLite nếu có (None = chỉ trong bộ nhớ)"""
+        secret = None
+        devices: dict[int, int] = {}
+        next_slot = 0
+        if path:
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value BLOB)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS devices "
+                "(device INTEGER PRIMARY KEY, slot INTEGER NOT NULL) WITHOUT ROWID"
+            )
+            meta = dict(db.execute("SELECT name, value FROM meta"))
+            secret = meta.get("secret")
+            if secret is not None:
+                next_slot = int(meta.get("next_slot", 0))
+                devices = dict(db.execute("SELECT device, slot FROM devices"))
+            cls.__db = db
+
+        if secret is None:
+            secret = secrets.token_bytes(SECRET_SIZE)
+            if cls.__db:
+                with cls.__db:
+                    cls.__db.execute("DELETE FROM devices")
+                    cls.__db.executemany(
+                        "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                        [("secret", secret), ("next_slot", 0)],
+                    )
+
+        with cls.__lock:
+            cls.__secret = secret
+            cls.__round_tables = cls.__make_round_tables(secret)
+            cls.__devices = devices
+            cls.__next_slot = next_slot
+            cls.__in_use.clear()
+            cls.__dirty.clear()
+
+        if cls.__db:
+            cls.__shutdown_event.clear()
+            cls.__flush_thread = threading.Thread(
+                target=cls.__flush_worker, daemon=True, name="DeviceRegistry"
+            )
+            cls.__flush_thread.start()
+            logger.info(f"Device registry loaded {len(devices)} devices from {path}")
+
+    @classmethod
+    def shutdown(cls):
+        cls.__shutdown_event.set()
+        if cls.__flush_thread:
+            cls.__flush_thread.join()
+            cls.__flush_thread = None
+        if cls.__db:
+            cls.flush()
+            with cls.__db_lock:
+                cls.__db.close()
+                cls.__db = None
+
+    @classmethod
+    def bind(cls, device_id: str, device_key: bytes | None) -> tuple[str, bytes]:
+        """
+        ID và device key của thiết bị. Thiết bị mới, hoặc key sai / không có
+        (vd. máy khác giả device_id, keyring bị xóa) được gắn với ID mới - ID
+        cũ không bao giờ được trao cho bên không có key.
+        Chưa đánh dấu ID là đang dùng - xem acquire().
+        """
+        device = cls.__device_hash(device_id)
+        with cls.__lock:
+            slot = cls.__devices.get(device)
+            if slot is None or not (
+                isinstance(device_key, bytes)
+                and hmac.compare_digest(cls.__device_key(device, slot), device_key)
+            ):
+                slot = cls.__new_slot()
+                cls.__devices[device] = slot
+                if cls.__db:
+                    cls.__dirty[device] = slot
+            return cls.__client_id(slot), cls.__device_key(device, slot)
+
+    @classmethod
+    def acquire(cls, client_id: str) -> bool:
+        """Đánh dấu ID đang dùng, False nếu client khác đang giữ ID"""
+        with cls.__lock:
+            if client_id in cls.__in_use:
+                return False
+            cls.__in_use.add(client_id)
+            return True
+
+    @classmethod
+    def allocate(cls) -> str:
+        """ID mới không gắn với thiết bị nào, đã đánh dấu đang dùng"""
+        with cls.__lock:
+            client_id = cls.__client_id(cls.__new_slot())
+            cls.__in_use.add(client_id)
+            return client_id
+
+    @classmethod
+    def release(cls, client_id: str):
+        """Client rời hẳn - ID trả lại cho thiết bị của nó"""
+        with cls.__lock:
+            cls.__in_use.discard(client_id)
+
+    @classmethod
+    def get_device_count(cls) -> int:
+        with cls.__lock:
+            return len(cls.__devices)
+
+    @classmethod
+    def flush(cls):
+        """Ghi các thiết bị mới / đổi ID xuống SQLite trong một transaction"""
+        with cls.__db_lock:
+            if cls.__db is None:
+                return
+            with cls.__lock:
+                dirty, cls.__dirty = cls.__dirty, {}
+                next_slot = cls.__next_slot
+            if not dirty:
+                return
+            try:
+                with cls.__db:
+                    cls.__db.executemany(
+                        "INSERT OR REPLACE INTO devices VALUES (?, ?)", dirty.items()
+                    )
+                    # Cùng transaction với devices: slot đã ghi không bao giờ bị cấp lại
+                    cls.__db.execute(
+                        "UPDATE meta SET value = ? WHERE name = 'next_slot'",
+                        (next_slot,),
+                    )
+            except sqlite3.Error as e:
+                logger.error(f"Failed to save device registry: {e}")
+                with cls.__lock:
+                    # Giữ lại để lần sau ghi tiếp, thay đổi mới hơn được ưu tiên
+                    cls.__dirty = {**dirty, **cls.__dirty}
+
+    @classmethod
+    def __flush_worker(cls):
+        while not cls.__shutdown_event.wait(FLUSH_INTERVAL):
+            cls.flush()
+
+    @classmethod
+    def __new_slot(cls) -> int:
+        if cls.__next_slot >= ID_SPACE:
+            raise RuntimeError("Client ID space exhausted")
+        slot = cls.__next_slot
+        cls.__next_slot += 1
+        return slot
+
+    @classmethod
+    def __client_id(cls, slot: int) -> str:
+        """Hoán vị slot thành ID (cycle walking trên miền Feistel 2^30)"""
+        value = slot
+        while True:
+            left, right = value >> _HALF_BITS, value & _HALF_MASK
+            for table in cls.__round_tables:
+                left, right = right, left ^ table[right]
+            value = (left << _HALF_BITS) | right
+            if value < ID_SPACE:
+                return str(ID_BASE + value)
+
+    @classmethod
+    def __device_hash(cls, device_id: str) -> int:
+        """Hash có khóa của device_id - file SQLite không chứa hardware ID thật"""
+        digest = hashlib.blake2b(
+            device_id.encode(), key=cls.__secret, person=b"device", digest_size=8
+        ).digest()
+        return int.from_bytes(digest, "big") >> 1  # Vừa INTEGER có dấu của SQLite
+
+    @classmethod
+    def __device_key(cls, device: int, slot: int) -> bytes:
+        return hashlib.blake2b(
+            device.to_bytes(8, "big") + slot.to_bytes(8, "big"),
+            key=cls.__secret,
+            person=b"device-key",
+            digest_size=DEVICE_KEY_SIZE,
+        ).digest()
+
+    @staticmethod
+    def __make_round_tables(secret: bytes) -> list[tuple[int, ...]]:
+        """Hàm vòng Feistel dạng bảng tra (2^15 giá trị mỗi vòng) sinh từ secret"""
+        size = 1 << _HALF_BITS
+        stream = hashlib.shake_256(b"client-id" + secret).digest(
+            FEISTEL_ROUNDS * size * 2
+        )
+        values = memoryview(stream).cast("H")
+        return [
+            tuple(value & _HALF_MASK for value in values[i * size : (i + 1) * size])
+            for i in range(FEISTEL_ROUNDS)
+        ]
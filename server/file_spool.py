@@ -0,0 +1,381 @@
+import logging
+import os
+import pickle
+import queue
+import shutil
+import struct
+import tempfile
+import threading
+from collections import deque
+
+from common.packets import FileChunkPacket, FileCompletePacket, FileDeltaPacket
+from server.client_manager import ClientManager
+
+logger = logging.getLogger(__name__)
+
+# Spool = chuỗi record: độ dài (4 byte) + packet đã pickle, chia thành nhiều
+# segment để phần đã gửi xong được xóa khỏi đĩa ngay cả khi file chưa truyền hết.
+RECORD_HEADER = struct.Struct("<I")
+SEGMENT_SIZE = 16 * 1024 * 1024
+# Spool của một lượt truyền: phần chưa được receiver ack nằm trong TransferWindow
+# của bên gửi (tối đa 64 MiB, client/services/file_transfer_service.py), giới
+# hạn gấp 4 lần để dư địa. STREAM_WINDOW (4 MiB) chỉ là credit chặng client ->
+# server, server trả lại ngay khi đã ghi vào spool nên không giới hạn spool.
+TRANSFER_LIMIT = 256 * 1024 * 1024
+IN_FLIGHT = 4  # Số packet lấy từ spool được nằm trong queue của receiver
+PUT_TIMEOUT = 0.5
+
+SpooledPackets = FileChunkPacket | FileDeltaPacket | FileCompletePacket
+
+
+class SpooledPacket:
+    """Packet từ spool trong queue gửi của receiver - chiếm một slot tới khi được lấy ra"""
+
+    __slots__ = ("packet", "__slots")
+
+    def __init__(self, packet: SpooledPackets, slots: threading.Semaphore):
+        self.packet = packet
+        self.__slots = slots
+
+    def take(self) -> SpooledPackets:
+        """Gọi bởi sender_worker khi lấy ra khỏi queue - trả slot cho pump"""
+        self.__slots.release()
+        return self.packet
+
+
+class _Segment:
+    def __init__(self, directory: str):
+        fd, self.path = tempfile.mkstemp(suffix=".spool", dir=directory)
+        self.file = os.fdopen(fd, "w+b")
+        self.size = 0
+        self.read_pos = 0
+
+    def close(self):
+        self.file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class _Transfer:
+    """Các packet của một file đang chờ gửi tới receiver, lưu trên đĩa"""
+
+    def __init__(self, session_id: str, file_id: str, receiver_id: str):
+        self.session_id = session_id
+        self.file_id = file_id
+        self.receiver_id = receiver_id
+        self.segments: deque[_Segment] = deque()
+        self.size = 0  # Byte đang chiếm trên đĩa
+        self.pending = 0  # Số record chưa đọc
+        self.completed = False  # Đã chuyển FileCompletePacket cho receiver
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def append(self, directory: str, record: bytes) -> bool:
+        with self.lock:
+            if self.closed:
+                return False
+            segment = self.segments[-1] if self.segments else None
+            if segment is None or segment.size >= SEGMENT_SIZE:
+                segment = _Segment(directory)
+                self.segments.append(segment)
+            segment.file.seek(segment.size)
+            segment.file.write(record)
+            segment.size += len(record)
+            self.size += len(record)
+            self.pending += 1
+            return True
+
+    def pop(self) -> tuple[bytes | None, int]:
+        """Record tiếp theo và số byte đĩa được giải phóng"""
+        with self.lock:
+            if not self.pending:
+                return None, 0
+            segment = self.segments[0]
+            segment.file.seek(segment.read_pos)
+            (length,) = RECORD_HEADER.unpack(segment.file.read(RECORD_HEADER.size))
+            data = segment.file.read(length)
+            segment.read_pos += RECORD_HEADER.size + length
+            self.pending -= 1
+
+            freed = 0
+            if segment.read_pos == segment.size:
+                freed = segment.size
+                self.size -= freed
+                if segment.size >= SEGMENT_SIZE:
+                    # Segment đầy và đã đọc hết -> xóa
+                    self.segments.popleft()
+                    segment.close()
+                else:
+                    # Đã gửi hết - ghi đè lại từ đầu thay vì tạo file mới mỗi chunk
+                    segment.size = segment.read_pos = 0
+            return data, freed
+
+    def close_if_drained(self) -> bool:
+        """Đóng transfer nếu không còn record chờ gửi (nguyên tử với append)"""
+        with self.lock:
+            if self.pending:
+                return False
+            self.closed = True
+            return True
+
+    def close(self) -> int:
+        with self.lock:
+            self.closed = True
+            freed = self.size
+            while self.segments:
+                self.segments.popleft().close()
+            self.size = 0
+            self.pending = 0
+            return freed
+
+
+class _ReceiverPump(threading.Thread):
+    """
+    Chuyển packet từ spool sang queue gửi của một receiver theo tốc độ của
+    receiver: chỉ IN_FLIGHT packet được nằm trong queue cùng lúc, các transfer
+    được lấy xen kẽ nhau.
+    """
+
+    def __init__(self, receiver_id: str):
+        super().__init__(name=f"FileSpool-{receiver_id}", daemon=True)
+        self.receiver_id = receiver_id
+        self.transfers: deque[_Transfer] = deque()
+        self.condition = threading.Condition()
+        self.slots = threading.Semaphore(IN_FLIGHT)
+        self.stopped = False
+
+    def add(self, transfer: _Transfer):
+        with self.condition:
+            self.transfers.append(transfer)
+
+    def discard(self, transfer: _Transfer):
+        with self.condition:
+            if transfer in self.transfers:
+                self.transfers.remove(transfer)
+
+    def notify(self):
+        with self.condition:
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                transfer = self.condition.wait_for(self.__next_transfer)
+                if self.stopped:
+                    return
+
+            while not self.slots.acquire(timeout=PUT_TIMEOUT):
+                if self.stopped:
+                    return
+            data, freed = transfer.pop()
+            FileSpool._release(freed)
+            if data is None:
+                self.slots.release()
+                continue
+
+            packet = pickle.loads(data)
+            if not self.__deliver(SpooledPacket(packet, self.slots)):
+                FileSpool.drop_receiver(self.receiver_id)
+                return
+            if isinstance(packet, FileCompletePacket):
+                transfer.completed = True
+            if transfer.completed and transfer.close_if_drained():
+                # Chunk relay song song có thể tới sau FileComplete - chỉ xóa khi đã hết
+                FileSpool._remove(transfer)
+
+    def __next_transfer(self) -> _Transfer | bool:
+        if self.stopped:
+            return True
+        for _ in range(len(self.transfers)):
+            transfer = self.transfers[0]
+            self.transfers.rotate(-1)
+            if transfer.pending:
+                return transfer
+        return False
+
+    def __deliver(self, item: SpooledPacket) -> bool:
+        while not self.stopped:
+            receiver_queue = ClientManager.get_client_queue(self.receiver_id)
+            if not receiver_queue:
+                logger.warning(
+                    f"Receiver {self.receiver_id} not found. Dropping spooled transfers"
+                )
+                return False
+            try:
+                receiver_queue.put(item, timeout=PUT_TIMEOUT, packet=item.packet)
+                return True
+            except queue.Full:
+                continue
+        return True
+
+
+class FileSpool:
+    """
+    Store-and-forward cho dữ liệu file qua relay: chunk / delta được ghi vào
+    spool trên đĩa thay vì queue trong RAM, rồi được đẩy sang receiver theo
+    tốc độ nó nhận. RAM dùng cho mỗi receiver tối đa IN_FLIGHT packet, bất kể
+    số lượng và kích thước file đang truyền.
+    """
+
+    __transfers: dict[tuple[str, str], _Transfer] = {}
+    # Transfer đã hủy - chunk bên gửi còn đang gửi tới sau đó bị bỏ, không
+    # được tạo lại transfer từ giữa file
+    __cancelled: set[tuple[str, str]] = set()
+    __pumps: dict[str, _ReceiverPump] = {}
+    __directory: str | None = None
+    __used = 0  # Tổng byte spool trên đĩa
+    __limit = 0
+    __lock = threading.Lock()
+
+    @classmethod
+    def start(cls, directory: str | None, limit_mb: int):
+        """Tạo thư mục spool riêng trong directory (thư mục tạm của hệ thống nếu None)"""
+        with cls.__lock:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            cls.__directory = tempfile.mkdtemp(prefix="file-spool-", dir=directory)
+            cls.__limit = limit_mb * 1024 * 1024
+        logger.info(f"File spool enabled at {cls.__directory} (limit {limit_mb} MiB)")
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return cls.__directory is not None
+
+    @classmethod
+    def put(cls, receiver_id: str, packet: SpooledPackets) -> bool:
+        """
+        Ghi packet vào spool của transfer. Trả về False nếu vượt giới hạn spool
+        - khi đó transfer bị hủy và người gọi phải báo cho cả hai bên. Packet
+        của transfer đã hủy bị bỏ (trả về True).
+        """
+        record = pickle.dumps(packet, protocol=pickle.HIGHEST_PROTOCOL)
+        record = RECORD_HEADER.pack(len(record)) + record
+        key = (packet.session_id, packet.file_id)
+
+        while True:
+            with cls.__lock:
+                if cls.__directory is None:
+                    return False
+                if key in cls.__cancelled:
+                    return True
+                transfer = cls.__transfers.get(key)
+                if transfer is not None and transfer.closed:
+                    transfer = None  # Đang được xóa - dùng transfer mới
+                over_limit = cls.__used + len(record) > cls.__limit or (
+                    transfer is not None
+                    and transfer.size + len(record) > TRANSFER_LIMIT
+                )
+                if not over_limit:
+                    if transfer is None:
+                        transfer = _Transfer(
+                            packet.session_id, packet.file_id, receiver_id
+                        )
+                        cls.__transfers[key] = transfer
+                        cls.__pump(receiver_id).add(transfer)
+                    pump = cls.__pump(receiver_id)
+                    directory = cls.__directory
+                    cls.__used += len(record)  # Giữ chỗ trước khi ghi ngoài lock
+                else:
+                    # Đánh dấu ngay: packet relay song song chỉ một lần báo hủy
+                    cls.__cancelled.add(key)
+
+            if over_limit:
+                logger.warning(
+                    f"File spool full. Cancelling transfer {packet.file_id} to {receiver_id}"
+                )
+                cls.cancel(*key)
+                return False
+
+            if transfer.append(directory, record):
+                pump.notify()
+                return True
+
+            cls._release(len(record))
+            if not transfer.completed:
+                return True  # Transfer vừa bị hủy - bỏ packet
+            # Transfer vừa gửi xong - packet tới muộn đi vào transfer mới
+
+    @classmethod
+    def __pump(cls, receiver_id: str) -> _ReceiverPump:
+        pump = cls.__pumps.get(receiver_id)
+        if pump is None:
+            pump = _ReceiverPump(receiver_id)
+            cls.__pumps[receiver_id] = pump
+            pump.start()
+        return pump
+
+    @classmethod
+    def _release(cls, nbytes: int):
+        if nbytes:
+            with cls.__lock:
+                cls.__used -= nbytes
+
+    @classmethod
+    def cancel(cls, session_id: str, file_id: str):
+        """Xóa spool của một transfer (bị từ chối, hủy hoặc session kết thúc)"""
+        with cls.__lock:
+            cls.__cancelled.add((session_id, file_id))
+            transfer = cls.__transfers.get((session_id, file_id))
+        if transfer is not None:
+            cls._remove(transfer)
+
+    @classmethod
+    def _remove(cls, transfer: _Transfer):
+        with cls.__lock:
+            key = (transfer.session_id, transfer.file_id)
+            if cls.__transfers.get(key) is transfer:
+                del cls.__transfers[key]
+            pump = cls.__pumps.get(transfer.receiver_id)
+        if pump is not None:
+            pump.discard(transfer)
+        cls._release(transfer.close())
+
+    @classmethod
+    def end_session(cls, session_id: str):
+        with cls.__lock:
+            keys = [key for key in cls.__transfers if key[0] == session_id]
+        for key in keys:
+            cls.cancel(*key)
+        with cls.__lock:
+            cls.__cancelled.difference_update(
+                [key for key in cls.__cancelled if key[0] == session_id]
+            )
+
+    @classmethod
+    def drop_receiver(cls, receiver_id: str):
+        """Receiver đã ngắt kết nối - xóa mọi transfer tới nó và dừng pump"""
+        with cls.__lock:
+            keys = [
+                key
+                for key, transfer in cls.__transfers.items()
+                if transfer.receiver_id == receiver_id
+            ]
+            pump = cls.__pumps.pop(receiver_id, None)
+        if pump is not None:
+            pump.stop()
+        for key in keys:
+            cls.cancel(*key)
+
+    @classmethod
+    def shutdown(cls):
+        with cls.__lock:
+            pumps = list(cls.__pumps.values())
+            transfers = list(cls.__transfers.values())
+            cls.__pumps.clear()
+            cls.__transfers.clear()
+            cls.__cancelled.clear()
+            directory, cls.__directory = cls.__directory, None
+            cls.__used = 0
+        for pump in pumps:
+            pump.stop()
+        for transfer in transfers:
+            transfer.close()
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,100 @@
+import logging
+import threading
+from typing import Callable
+
+from server.timing_wheel import Timer, timing_wheel
+
+logger = logging.getLogger(__name__)
+
+
+class HeartbeatMonitor:
+    """
+    Phát hiện client không còn phản hồi (half-open TCP, máy sleep, NAT timeout)
+    và client treo máy quá lâu.
+
+    Mỗi client có hai timer trên timing wheel dùng chung:
+        - heartbeat: reset mỗi khi nhận được bất kỳ packet nào
+        - idle:      chỉ reset khi có packet thật (không tính ping/pong)
+    Reset chỉ dời node trong wheel (O(1), không cấp phát).
+    """
+
+    __heartbeat_timers: dict[str, Timer] = {}
+    __idle_timers: dict[str, Timer] = {}
+    __lock = threading.Lock()
+    __on_expired: Callable[[str, str], None] | None = None
+    __timeout = 15.0
+    __idle_timeout = 0.0
+
+    @classmethod
+    def start(
+        cls,
+        interval: float,
+        misses: int,
+        idle_timeout: float,
+        on_expired: Callable[[str, str], None],
+    ):
+        """
+        Bắt đầu theo dõi - on_expired(client_id, reason) được gọi trên thread của
+        timing wheel khi client hết hạn. idle_timeout = 0 để tắt idle timeout.
+        """
+        cls.__timeout = interval * misses
+        cls.__idle_timeout = idle_timeout
+        cls.__on_expired = on_expired
+        logger.info(
+            f"Heartbeat monitor started (interval={interval}s, misses={misses}, "
+            f"idle_timeout={idle_timeout or 'disabled'})"
+        )
+
+    @classmethod
+    def shutdown(cls):
+        with cls.__lock:
+            for timer in cls.__heartbeat_timers.values():
+                timing_wheel.cancel(timer)
+            for timer in cls.__idle_timers.values():
+                timing_wheel.cancel(timer)
+            cls.__heartbeat_timers.clear()
+            cls.__idle_timers.clear()
+
+    @classmethod
+    def touch(cls, client_id: str, activity: bool = True):
+        """
+        Ghi nhận client còn sống (gọi mỗi khi nhận được packet).
+
+        :param activity: False với packet chỉ để giữ kết nối (ping/pong)
+        """
+        with cls.__lock:
+            heartbeat_timer = cls.__heartbeat_timers.get(client_id)
+            if heartbeat_timer is None:
+                cls.__heartbeat_timers[client_id] = timing_wheel.schedule(
+                    cls.__timeout, cls.__expire, client_id, "heartbeat"
+                )
+            else:
+                timing_wheel.reset(heartbeat_timer, cls.__timeout)
+
+            if not cls.__idle_timeout:
+                return
+
+            idle_timer = cls.__idle_timers.get(client_id)
+            if idle_timer is None:
+                cls.__idle_timers[client_id] = timing_wheel.schedule(
+                    cls.__idle_timeout, cls.__expire, client_id, "idle"
+                )
+            elif activity:
+                timing_wheel.reset(idle_timer, cls.__idle_timeout)
+
+    @classmethod
+    def remove(cls, client_id: str):
+        """Ngừng theo dõi client (client đã ngắt kết nối)"""
+        with cls.__lock:
+            heartbeat_timer = cls.__heartbeat_timers.pop(client_id, None)
+            idle_timer = cls.__idle_timers.pop(client_id, None)
+        if heartbeat_timer:
+            timing_wheel.cancel(heartbeat_timer)
+        if idle_timer:
+            timing_wheel.cancel(idle_timer)
+
+    @classmethod
+    def __expire(cls, client_id: str, reason: str):
+        cls.remove(client_id)
+        if cls.__on_expired:
+            cls.__on_expired(client_id, reason)
@@ -0,0 +1,190 @@
+import logging
+import secrets
+import socket
+import threading
+import time
+from typing import Callable
+
+from common import media_transport
+from common.packets import CursorPacket, VideoStreamPacket
+from server.session_manager import SessionManager
+
+logger = logging.getLogger(__name__)
+
+
+class _MediaPeer:
+    """Đường UDP của một client: địa chỉ học từ HELLO, ghép frame client gửi lên"""
+
+    def __init__(self, client_id: str, token: bytes):
+        self.client_id = client_id
+        self.token = token
+        self.address: tuple[str, int] | None = None
+        self.last_hello = 0.0
+        self.frame_no = 0  # frame_no của frame server gửi xuống client
+        self.reassembler = media_transport.Reassembler()
+        self.lock = threading.Lock()
+
+
+class MediaRelay:
+    """
+    Nhận và gửi video / cursor bằng UDP (cùng port với TCP). Client mở đường
+    bằng HELLO kèm token được cấp trong AssignIdPacket; server trả HELLO_ACK và
+    chỉ gửi datagram tới client khi đã nhận HELLO trong PATH_TIMEOUT. Mỗi chặng
+    (host -> server, server -> controller) có FEC riêng, frame được ghép lại ở
+    relay rồi chuyển tiếp như packet TCP.
+    """
+
+    __socket: socket.socket | None = None
+    __thread: threading.Thread | None = None
+    __peers: dict[str, _MediaPeer] = {}  # client_id -> peer
+    __tokens: dict[bytes, _MediaPeer] = {}
+    __on_packet: Callable[[VideoStreamPacket | CursorPacket, str], None] | None = None
+    __lock = threading.Lock()
+
+    @classmethod
+    def start(
+        cls,
+        host: str,
+        port: int,
+        on_packet: Callable[[VideoStreamPacket | CursorPacket, str], None],
+    ):
+        """on_packet(packet, sender_id) được gọi trên thread nhận cho mỗi frame ghép xong"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, media_transport.SOCKET_BUFFER)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, media_transport.SOCKET_BUFFER)
+        sock.bind((host, port))
+        sock.settimeout(1.0)
+
+        cls.__socket = sock
+        cls.__on_packet = on_packet
+        cls.__thread = threading.Thread(
+            target=cls.__receive_worker, daemon=True, name="MediaRelay"
+        )
+        cls.__thread.start()
+        logger.info(f"UDP media transport listening on {host}:{port}")
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return cls.__socket is not None
+
+    @classmethod
+    def shutdown(cls):
+        sock, cls.__socket = cls.__socket, None
+        if sock:
+            sock.close()
+        if cls.__thread:
+            cls.__thread.join(timeout=2.0)
+            cls.__thread = None
+        with cls.__lock:
+            cls.__peers.clear()
+            cls.__tokens.clear()
+
+    @staticmethod
+    def new_token() -> bytes:
+        return secrets.token_bytes(media_transport.TOKEN_SIZE)
+
+    @classmethod
+    def register(cls, client_id: str, token: bytes):
+        with cls.__lock:
+            peer = _MediaPeer(client_id, token)
+            cls.__peers[client_id] = peer
+            cls.__tokens[token] = peer
+
+    @classmethod
+    def unregister(cls, client_id: str):
+        with cls.__lock:
+            peer = cls.__peers.pop(client_id, None)
+            if peer:
+                cls.__tokens.pop(peer.token, None)
+
+    @classmethod
+    def send(cls, client_id: str, packet: VideoStreamPacket | CursorPacket) -> bool:
+        """
+        Gửi packet media tới client qua UDP. Trả về False nếu client chưa có
+        đường UDP (hoặc đã mất) - khi đó người gọi gửi qua TCP.
+        """
+        sock = cls.__socket
+        if sock is None or not media_transport.is_datagram_packet(packet):
+            return False
+        with cls.__lock:
+            peer = cls.__peers.get(client_id)
+        if (
+            peer is None
+            or peer.address is None
+            or time.monotonic() - peer.last_hello > media_transport.PATH_TIMEOUT
+        ):
+            return False
+
+        if isinstance(packet, VideoStreamPacket) and packet.timestamps is not None:
+            packet.timestamps["relay_out"] = time.monotonic()
+        payload = media_transport.encode_packet(packet)
+        sent = 0
+        with peer.lock:
+            peer.frame_no = (peer.frame_no + 1) & 0xFFFFFFFF
+            datagrams = media_transport.packetize(peer.token, peer.frame_no, payload)
+            for datagram in datagrams:
+                try:
+                    sent += sock.sendto(datagram, peer.address)
+                except OSError as e:
+                    # Buffer đầy / mạng lỗi: datagram mất như trên đường truyền
+                    logger.debug(f"UDP send to {client_id} failed: {e}")
+                    break
+        if packet.session_id:
+            SessionManager.add_relayed_bytes(packet.session_id, sent)
+        return True
+
+    @classmethod
+    def __receive_worker(cls):
+        while True:
+            sock = cls.__socket
+            if sock is None:
+                return
+            try:
+                datagram, address = sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                if cls.__socket is None:
+                    return  # Socket đã đóng khi shutdown
+                continue
+
+            try:
+                cls.__handle_datagram(sock, datagram, address)
+            except Exception as e:
+                logger.error(f"Error handling media datagram from {address}: {e}")
+
+    @classmethod
+    def __handle_datagram(
+        cls, sock: socket.socket, datagram: bytes, address: tuple[str, int]
+    ):
+        parsed = media_transport.parse(datagram)
+        if parsed is None:
+            return
+        kind, token, frame_no, index, count, total_length, data = parsed
+
+        with cls.__lock:
+            peer = cls.__tokens.get(token)
+        if peer is None:
+            return
+
+        if kind == media_transport.HELLO:
+            # NAT có thể đổi port - địa chỉ luôn lấy theo HELLO mới nhất
+            peer.address = address
+            peer.last_hello = time.monotonic()
+            sock.sendto(media_transport.hello_ack(token), address)
+            return
+        if kind == media_transport.HELLO_ACK or address != peer.address:
+            return
+
+        payload = peer.reassembler.add(kind, frame_no, index, count, total_length, data)
+        if payload is None:
+            return
+        packet = media_transport.decode_packet(payload)
+        if packet is None:
+            logger.warning(f"Invalid media frame from {peer.client_id}. Dropping")
+            return
+
+        if isinstance(packet, VideoStreamPacket) and packet.timestamps is not None:
+            packet.timestamps["relay_in"] = time.monotonic()
+        if cls.__on_packet:
+            cls.__on_packet(packet, peer.client_id)
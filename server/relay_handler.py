@@ -6,6 +6,7 @@ import socket
 import ssl
 import os
 import threading
+import time
 
 
 from common.packets import (
@@ -13,26 +14,43 @@ from common.packets import (
     ConnectionRequestPacket,
     ConnectionResponsePacket,
     MousePacket,
+    PointerMotionPacket,
     KeyboardPacket,
     AuthenticationPasswordPacket,
     SessionPacket,
+    PingPacket,
+    PongPacket,
     VideoStreamPacket,
     VideoConfigPacket,
+    CursorPacket,
     ChatMessagePacket,
     FileMetadataPacket,
     FileAcceptPacket,
     FileRejectPacket,
     FileChunkPacket,
     FileCompletePacket,
+    FileAckPacket,
+    FileSignaturePacket,
+    FileDeltaPacket,
+    KeyframeRequestPacket,
+    MonitorListPacket,
+    MonitorSelectPacket,
+    PeerCandidatesPacket,
 )
+from common import compression, streams
 from common.enums import Status
 from server.client_manager import ClientManager
+from server.file_spool import FileSpool
+from server.media_relay import MediaRelay
 from server.session_manager import SessionManager
 
 from common.config import Config
 
 logger = logging.getLogger(__name__)
 
+MAX_PEER_CANDIDATES = 8
+MAX_MONITORS = 16
+
 
 class RelayHandler:
     __stream_pool = ThreadPoolExecutor(
@@ -53,13 +71,32 @@ class RelayHandler:
             if RelayHandler.__shutdown_event.is_set():
                 logger.warning("Server is shutting down. Dropping packet")
                 return
+            if isinstance(packet, PingPacket) and packet.session_id is None:
+                # Trả lời ngay trên thread nhận để không cộng thêm độ trễ của pool
+                RelayHandler.__reply_ping(packet, sender_socket, time.monotonic())
+                return
+            if isinstance(packet, (MousePacket, PointerMotionPacket, KeyboardPacket)):
+                # Input đi thẳng trên thread nhận của sender: thứ tự press / move /
+                # release được giữ nguyên tới queue của host (pool có thể đảo thứ
+                # tự), chỉ là tra session và put_nowait nên không chặn thread nhận
+                try:
+                    RelayHandler.__process_packet(packet, sender_socket)
+                except Exception:
+                    # Như trong pool: packet lỗi không làm đứt kết nối của sender
+                    logger.error("Error relaying input packet", exc_info=True)
+                return
+            if isinstance(packet, MonitorListPacket):
+                # Ghi nhận trên thread nhận: video của monitor mới chọn (đi stream
+                # pool) không bị lọc bỏ vì tới trước danh sách
+                RelayHandler.__record_monitors(packet, sender_socket)
             if isinstance(
                 packet,
                 (
                     VideoStreamPacket,
                     VideoConfigPacket,
-                    MousePacket,
-                    KeyboardPacket,
+                    CursorPacket,
+                    PingPacket,
+                    PongPacket,
                 ),
             ):
                 RelayHandler.__stream_pool.submit(
@@ -75,6 +112,18 @@ class RelayHandler:
             else:
                 raise e
 
+    @staticmethod
+    def relay_media_packet(packet: VideoStreamPacket | CursorPacket, sender_id: str):
+        """Chuyển tiếp packet media nhận qua UDP (MediaRelay đã xác định sender)"""
+        if RelayHandler.__shutdown_event.is_set():
+            return
+        try:
+            RelayHandler.__stream_pool.submit(
+                RelayHandler.__relay_stream_packet, packet, sender_id
+            )
+        except RuntimeError:
+            logger.warning("Packet submitted during shutdown. Dropping.")
+
     @classmethod
     def shutdown(cls):
         """Dọn dẹp tài nguyên khi shutdown server"""
@@ -97,9 +146,17 @@ class RelayHandler:
                 ConnectionRequestPacket: cls.__relay_request_connection,
                 AuthenticationPasswordPacket: cls.__handle_authentication_password,
                 SessionPacket: cls.__handle_session_packet,
+                PeerCandidatesPacket: cls.__relay_peer_candidates,
+                PingPacket: cls.__relay_stream_packet,
+                PongPacket: cls.__relay_stream_packet,
                 VideoStreamPacket: cls.__relay_stream_packet,
                 VideoConfigPacket: cls.__relay_stream_packet,
+                CursorPacket: cls.__relay_stream_packet,
+                KeyframeRequestPacket: cls.__relay_stream_packet,
+                MonitorListPacket: cls.__relay_stream_packet,
+                MonitorSelectPacket: cls.__relay_stream_packet,
                 MousePacket: cls.__relay_stream_packet,
+                PointerMotionPacket: cls.__relay_stream_packet,
                 KeyboardPacket: cls.__relay_stream_packet,
                 ChatMessagePacket: cls.__relay_stream_packet,
                 FileMetadataPacket: cls.__relay_stream_packet,
@@ -107,6 +164,9 @@ class RelayHandler:
                 FileRejectPacket: cls.__relay_stream_packet,
                 FileChunkPacket: cls.__relay_stream_packet,
                 FileCompletePacket: cls.__relay_stream_packet,
+                FileAckPacket: cls.__relay_stream_packet,
+                FileSignaturePacket: cls.__relay_stream_packet,
+                FileDeltaPacket: cls.__relay_stream_packet,
             }
 
     @staticmethod
@@ -128,6 +188,36 @@ class RelayHandler:
         except Exception:
             raise
 
+    @staticmethod
+    def __reply_ping(
+        packet: PingPacket,
+        sender_socket: socket.socket | ssl.SSLSocket,
+        receive_ts: float,
+    ):
+        """Trả lời PingPacket gửi tới server (reply_ts được đóng dấu lúc gửi)"""
+        sender_info = ClientManager.get_client_info(sender_socket)
+        if not sender_info:
+            return
+
+        sender_id = sender_info["id"]
+        if packet.rtt is not None:
+            ClientManager.update_link_stats(sender_id, packet.rtt, packet.rttvar)
+
+        sender_queue = ClientManager.get_client_queue(sender_id)
+        if not sender_queue:
+            return
+
+        try:
+            sender_queue.put_nowait(
+                PongPacket(
+                    ping_id=packet.ping_id,
+                    origin_ts=packet.origin_ts,
+                    receive_ts=receive_ts,
+                )
+            )
+        except queue.Full:
+            logger.debug(f"Queue full for {sender_id}, dropping pong")
+
     @staticmethod
     def __relay_request_connection(
         packet: ConnectionRequestPacket,
@@ -256,39 +346,146 @@ class RelayHandler:
             if receiver_queue:
                 receiver_queue.put(packet)
 
+    @staticmethod
+    def __record_monitors(
+        packet: MonitorListPacket, sender_socket: socket.socket | ssl.SSLSocket
+    ):
+        """Host báo các monitor đang stream cho session - dùng để lọc video broadcast"""
+        sender_info = ClientManager.get_client_info(sender_socket)
+        session_info = SessionManager.get_session(packet.session_id)
+        if (
+            not sender_info
+            or not session_info
+            or session_info["host_id"] != sender_info["id"]
+        ):
+            return
+        try:
+            monitors = [int(monitor) for monitor in packet.selected[:MAX_MONITORS]]
+        except (TypeError, ValueError):
+            logger.warning(f"Malformed monitor list from {sender_info['id']}")
+            return
+        SessionManager.set_monitors(packet.session_id, monitors)
+
+    @staticmethod
+    def __relay_peer_candidates(packet: PeerCandidatesPacket, sender_id: str):
+        """
+        Chuyển địa chỉ UDP của một bên cho bên kia của session, thêm địa chỉ
+        server thấy được (IP công khai nếu client sau NAT)
+        """
+        session_info = SessionManager.get_session(packet.session_id)
+        if not session_info or not SessionManager.is_client_in_session(
+            sender_id, packet.session_id
+        ):
+            logger.warning(
+                f"Sender {sender_id} not in session {packet.session_id}. Dropping candidates"
+            )
+            return
+
+        try:
+            candidates = [
+                (str(ip), int(port))
+                for ip, port in packet.candidates[:MAX_PEER_CANDIDATES]
+                if 0 < int(port) < 65536
+            ]
+        except (TypeError, ValueError):
+            logger.warning(f"Malformed candidates from {sender_id}. Dropping")
+            return
+        sender_info = ClientManager.get_client_info(sender_id)
+        if sender_info:
+            address = sender_info["ip"]
+            observed_ip = address[0] if isinstance(address, tuple) else address
+            for port in dict.fromkeys(port for _, port in candidates):
+                if (observed_ip, port) not in candidates:
+                    candidates.append((observed_ip, port))
+        packet.candidates = candidates
+
+        receiver_id = (
+            session_info["controller_id"]
+            if session_info["host_id"] == sender_id
+            else session_info["host_id"]
+        )
+        receiver_queue = ClientManager.get_client_queue(receiver_id)
+        if not receiver_queue:
+            logger.warning(f"Receiver {receiver_id} not found. Dropping candidates")
+            return
+        try:
+            receiver_queue.put_nowait(packet)
+        except queue.Full:
+            logger.warning(f"Queue full for {receiver_id}, dropping peer candidates")
+
     @staticmethod
     def __relay_stream_packet(
         packet: (
             MousePacket
+            | PointerMotionPacket
             | KeyboardPacket
+            | PingPacket
+            | PongPacket
             | VideoStreamPacket
             | VideoConfigPacket
+            | CursorPacket
+            | KeyframeRequestPacket
+            | MonitorListPacket
+            | MonitorSelectPacket
             | ChatMessagePacket
             | FileMetadataPacket
             | FileAcceptPacket
             | FileRejectPacket
             | FileChunkPacket
             | FileCompletePacket
+            | FileAckPacket
+            | FileSignaturePacket
+            | FileDeltaPacket
         ),
         sender_id: str,
     ):
         """Chuyển tiếp các gói tin stream"""
 
+        if getattr(packet, "compression", None) in (
+            compression.LZ4_HC,
+            compression.ZSTD,
+        ):
+            # Relay chỉ nén lại bằng LZ4 - nén mạnh là việc của bên gửi
+            packet.compression = compression.LZ4
+
+        def __return_credit():
+            # Credit của sender chỉ được trả khi dữ liệu rời server
+            ClientManager.return_credit(sender_id, packet)
+
         def __send_to_receiver(receiver_id: str, pkt):
             receiver_queue = ClientManager.get_client_queue(str(receiver_id))
             if not receiver_queue:
                 logger.warning(f"Receiver {receiver_id} not found. Dropping packet")
+                __return_credit()
                 return False
 
+            if FileSpool.is_enabled() and isinstance(
+                pkt, (FileChunkPacket, FileDeltaPacket, FileCompletePacket)
+            ):
+                # Dữ liệu file đi qua spool trên đĩa - không chiếm RAM, không bị drop
+                if not FileSpool.put(str(receiver_id), pkt):
+                    RelayHandler.__reject_file(sender_id, str(receiver_id), pkt)
+                __return_credit()
+                return
+
+            if isinstance(pkt, (VideoStreamPacket, CursorPacket)):
+                if MediaRelay.send(str(receiver_id), pkt):
+                    return  # Receiver có đường UDP
+                if ClientManager.is_client_parked(str(receiver_id)):
+                    return  # Receiver đang kết nối lại - sẽ nhận keyframe sau khi resume
+
             try:
                 if isinstance(pkt, VideoStreamPacket):
                     receiver_queue.put(pkt, block=False)
+                elif streams.uses_credit(pkt):
+                    receiver_queue.put_nowait(pkt, on_sent=__return_credit)
                 else:
                     receiver_queue.put_nowait(pkt)
             except queue.Full:
                 logger.warning(
                     f"Receiver {receiver_id}'s send queue is full. Dropping packet"
                 )
+                __return_credit()
 
         if packet.session_id is not None:
             session_info = SessionManager.get_session(packet.session_id)
@@ -296,8 +493,13 @@ class RelayHandler:
                 logger.warning(
                     f"Session {packet.session_id} not found. Dropping packet"
                 )
+                __return_credit()
                 return
 
+            if isinstance(packet, FileRejectPacket):
+                # Receiver từ chối / hủy - phần đang spool không cần gửi nữa
+                FileSpool.cancel(packet.session_id, packet.file_id)
+
             receiver_id = (
                 session_info["controller_id"]
                 if session_info["host_id"] == sender_id
@@ -311,6 +513,17 @@ class RelayHandler:
             logger.warning(f"Session not found for sender {sender_id}. Dropping packet")
             return
 
+        if isinstance(packet, VideoStreamPacket):
+            # Host gửi mỗi monitor một lần - chỉ session đang xem monitor đó nhận
+            monitor = getattr(packet, "monitor", 1)
+            sessions = {
+                session_id: session
+                for session_id, session in sessions.items()
+                if monitor in session["monitors"]
+            }
+            if not sessions:
+                return
+
         need_clone = len(sessions) > 1
 
         for session_id, session in sessions.items():
@@ -323,8 +536,47 @@ class RelayHandler:
             if need_clone:
                 pkt = type(packet)(**packet.__dict__)
                 pkt.session_id = session_id
+                # Mỗi bản sao cần timestamps riêng (relay_out khác nhau theo receiver)
+                if isinstance(pkt, VideoStreamPacket) and pkt.timestamps is not None:
+                    pkt.timestamps = dict(pkt.timestamps)
             else:
                 pkt = packet
                 pkt.session_id = session_id
 
             __send_to_receiver(receiver_id, pkt)
+
+    @staticmethod
+    def __reject_file(
+        sender_id: str,
+        receiver_id: str,
+        packet: FileChunkPacket | FileDeltaPacket | FileCompletePacket,
+    ):
+        """
+        Transfer bị hủy vì spool đầy: báo bên gửi dừng gửi, báo bên nhận
+        transfer thất bại (giữ file tạm để nhận tiếp lần sau)
+        """
+        notices = (
+            (
+                sender_id,
+                FileRejectPacket(session_id=packet.session_id, file_id=packet.file_id),
+            ),
+            (
+                receiver_id,
+                FileCompletePacket(
+                    session_id=packet.session_id,
+                    file_id=packet.file_id,
+                    success=False,
+                    message="Relay file spool is full",
+                ),
+            ),
+        )
+        for client_id, notice in notices:
+            client_queue = ClientManager.get_client_queue(client_id)
+            if not client_queue:
+                continue
+            try:
+                client_queue.put_nowait(notice)
+            except queue.Full:
+                logger.warning(
+                    f"Queue full for {client_id}, dropping {type(notice).__name__}"
+                )
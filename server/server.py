@@ -2,19 +2,32 @@ import queue
 import socket
 import ssl
 import threading
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from common.packets import (
     AssignIdPacket,
     ClientInformationPacket,
     ConnectionResponsePacket,
+    CursorPacket,
+    PingPacket,
+    PongPacket,
+    VideoStreamPacket,
+    WindowUpdatePacket,
 )
+from common.config import Config
 from common.enums import Status
+from common import tls
 from common.protocol import Protocol
-from common.utils import generate_numeric_id
 from server.client_manager import ClientManager
+from server.device_registry import DeviceRegistry
+from server.file_spool import FileSpool, SpooledPacket
+from server.heartbeat_monitor import HeartbeatMonitor
+from server.media_relay import MediaRelay
 from server.session_manager import SessionManager
 from server.relay_handler import RelayHandler
+from server.timing_wheel import timing_wheel
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +43,12 @@ class Server:
         self.cert_file = cert_file
         self.key_file = key_file
         self.client_semaphore = threading.Semaphore(max_clients)
+        self.ssl_context: ssl.SSLContext | None = None
+        self.handshake_pool = ThreadPoolExecutor(
+            max_workers=Config.handshake_workers, thread_name_prefix="Handshake"
+        )
+        # Giới hạn số kết nối đang chờ handshake (đang chạy + trong hàng đợi)
+        self.handshake_slots = threading.BoundedSemaphore(Config.handshake_workers * 4)
 
     def start(self):
         plain_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -37,96 +56,65 @@ class Server:
 
         try:
             plain_socket.bind((self.host, self.port))
-            plain_socket.listen(5)
+            plain_socket.listen(Config.backlog)
             self.is_listening = True
 
             if self.use_ssl:
                 if not self.cert_file or not self.key_file:
                     raise ValueError("SSL enabled but cert_file/key_file not provided")
 
-                context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-                context.load_cert_chain(certfile=self.cert_file, keyfile=self.key_file)
-
-                self.socket = context.wrap_socket(plain_socket, server_side=True)
+                self.ssl_context = tls.server_context(self.cert_file, self.key_file)
                 logger.info(f"Listening with SSL on {self.host}:{self.port}")
             else:
-                self.socket = plain_socket
                 logger.info(f"Listening on {self.host}:{self.port}")
 
-            SessionManager.start_cleanup()
+            # Accept loop chỉ nhận socket thô, TLS + ClientInformationPacket
+            # được xử lý song song ở handshake pool
+            self.socket = plain_socket
+
+            timing_wheel.start()
+            DeviceRegistry.start(Config.device_db)
+            if Config.udp_media:
+                if self.use_ssl:
+                    # Datagram không được mã hóa - không để media đi vòng qua TLS
+                    logger.warning("UDP media transport is not available with SSL")
+                else:
+                    MediaRelay.start(self.host, self.port, self.relay_media_packet)
+            if Config.file_spool:
+                FileSpool.start(Config.spool_dir, Config.spool_limit)
+            HeartbeatMonitor.start(
+                Config.heartbeat_interval,
+                Config.heartbeat_misses,
+                Config.idle_timeout,
+                self.evict_client,
+            )
 
             while not self.shutdown_event.is_set():
+                # Pool đầy -> ngừng accept, kết nối mới chờ trong backlog của kernel
+                if not self.handshake_slots.acquire(timeout=1.0):
+                    continue
+
                 self.socket.settimeout(1.0)
                 try:
                     client_socket, addr = self.socket.accept()
-
-                    if not self.client_semaphore.acquire(blocking=False):
-                        logger.warning(
-                            f"Max clients reached. Rejecting connection from {addr}"
-                        )
-                        try:
-                            rejection_packet = ConnectionResponsePacket(
-                                connection_status=Status.SERVER_FULL,
-                                message="Server is full, please try again later",
-                            )
-                            Protocol.send_packet(client_socket, rejection_packet)
-                        except Exception as e:
-                            logger.error(f"Failed to send rejection packet: {e}")
-                        finally:
-                            client_socket.close()
-                        continue
-
-                    try:
-                        client_socket.settimeout(1.0)
-                        client_info_packet = Protocol.receive_packet(client_socket)
-
-                        if not isinstance(client_info_packet, ClientInformationPacket):
-                            logger.warning(
-                                f"Expected ClientInformationPacket but got {type(client_info_packet)}"
-                            )
-                            client_socket.close()
-                            self.client_semaphore.release()
-                            continue
-
-                    except Exception as e:
-                        logger.error(f"Failed to receive client information: {e}")
-                        client_socket.close()
-                        self.client_semaphore.release()
-                        continue
-
-                    client_id = generate_numeric_id(9)
-
-                    packet = AssignIdPacket(client_id=client_id)
-                    Protocol.send_packet(client_socket, packet)
-                    logger.debug(f"Sent packet: {packet}")
-
-                    client_handler = threading.Thread(
-                        target=self.handle_client,
-                        args=(
-                            client_socket,
-                            client_id,
-                            addr,
-                            self.client_semaphore,
-                            client_info_packet.os,
-                            client_info_packet.host_name,
-                            client_info_packet.device_id,
-                        ),
-                        daemon=True,
-                    )
-                    client_handler.start()
-
                 except socket.timeout:
-                    continue
-                except ssl.SSLError as e:
-                    if self.is_listening:
-                        logger.error(f"SSL error accepting client connection: {e}")
+                    self.handshake_slots.release()
                     continue
                 except Exception as e:
+                    self.handshake_slots.release()
                     if isinstance(e, OSError) and (e.errno == 9 or e.errno == 10038):
                         break
                     logger.error(f"Error accepting client connection: {e}")
                     continue
 
+                try:
+                    self.handshake_pool.submit(self.handshake, client_socket, addr)
+                except RuntimeError:
+                    # Pool đã shutdown
+                    self.handshake_slots.release()
+                    client_socket.close()
+                    break
+
         except OSError as e:
             logger.error(f"Failed to bind to {self.host}:{self.port} - {e}")
             raise
@@ -134,6 +122,172 @@ class Server:
             logger.error(f"Unexpected error in server: {e}")
             raise
 
+    def handshake(self, client_socket: socket.socket | ssl.SSLSocket, addr):
+        """
+        TLS handshake + nhận ClientInformationPacket + cấp ID, chạy trong handshake pool.
+        Toàn bộ quá trình bị giới hạn bởi Config.handshake_timeout.
+        """
+        client_socket.settimeout(Config.handshake_timeout)
+        if self.ssl_context:
+            try:
+                client_socket = self.ssl_context.wrap_socket(
+                    client_socket, server_side=True, do_handshake_on_connect=False
+                )
+            except Exception as e:
+                logger.error(f"Failed to wrap connection from {addr}: {e}")
+                client_socket.close()
+                self.handshake_slots.release()
+                return
+
+        # Timer đóng socket khi quá hạn: chặn cả client gửi nhỏ giọt từng byte
+        deadline_timer = timing_wheel.schedule(
+            Config.handshake_timeout, self.__abort_handshake, client_socket
+        )
+        accepted = False
+        try:
+            if isinstance(client_socket, ssl.SSLSocket):
+                client_socket.do_handshake()
+                if client_socket.session_reused:
+                    logger.debug(f"Resumed TLS session for {addr}")
+
+            client_info_packet = Protocol.receive_packet(client_socket)
+            if not isinstance(client_info_packet, ClientInformationPacket):
+                logger.warning(
+                    f"Expected ClientInformationPacket but got {type(client_info_packet)}"
+                )
+                return
+
+            resume_id = getattr(client_info_packet, "resume_id", None)
+            resume_token = ClientManager.new_resume_token()
+            # Kết nối lại trong thời gian chờ: giữ ID, session và slot của kết nối trước
+            resumed = bool(
+                Config.resume_grace > 0
+                and resume_id
+                and ClientManager.resume_client(
+                    resume_id,
+                    getattr(client_info_packet, "resume_token", None),
+                    client_socket,
+                    addr,
+                    resume_token,
+                )
+            )
+            client_id = resume_id if resumed else None
+            device_key = None
+            if not resumed and not self.client_semaphore.acquire(blocking=False):
+                logger.warning(f"Max clients reached. Rejecting connection from {addr}")
+                try:
+                    rejection_packet = ConnectionResponsePacket(
+                        connection_status=Status.SERVER_FULL,
+                        message="Server is full, please try again later",
+                    )
+                    Protocol.send_packet(client_socket, rejection_packet)
+                except Exception as e:
+                    logger.error(f"Failed to send rejection packet: {e}")
+                return
+
+            try:
+                if not resumed:
+                    client_id, device_key = self.__assign_client_id(client_info_packet)
+                media_token = MediaRelay.new_token() if MediaRelay.is_enabled() else None
+
+                packet = AssignIdPacket(
+                    client_id=client_id,
+                    heartbeat_interval=Config.heartbeat_interval,
+                    media_port=self.port if media_token else None,
+                    media_token=media_token,
+                    resume_token=resume_token if Config.resume_grace > 0 else None,
+                    resumed=resumed,
+                    device_key=device_key,
+                )
+                Protocol.send_packet(client_socket, packet)
+                logger.debug(f"Sent packet: {packet}")
+
+                if not timing_wheel.cancel(deadline_timer):
+                    # Deadline đã kích hoạt và đóng socket
+                    raise socket.timeout()
+            except Exception:
+                if resumed:
+                    # Kết nối mới cũng hỏng - client tiếp tục chờ resume như trước
+                    self.__connection_closed(client_id, client_socket, addr)
+                else:
+                    if client_id:
+                        DeviceRegistry.release(client_id)
+                    self.client_semaphore.release()
+                raise
+
+            accepted = True
+            client_handler = threading.Thread(
+                target=self.handle_client,
+                args=(
+                    client_socket,
+                    client_id,
+                    addr,
+                    self.client_semaphore,
+                    client_info_packet.os,
+                    client_info_packet.host_name,
+                    client_info_packet.device_id,
+                    media_token,
+                    resume_token,
+                    resumed,
+                ),
+                daemon=True,
+            )
+            client_handler.start()
+
+        except ssl.SSLError as e:
+            logger.error(f"SSL handshake with {addr} failed: {e}")
+        except socket.timeout:
+            logger.warning(f"Handshake with {addr} timed out")
+        except Exception as e:
+            logger.error(f"Failed to receive client information from {addr}: {e}")
+        finally:
+            if not accepted:
+                timing_wheel.cancel(deadline_timer)
+                client_socket.close()
+            self.handshake_slots.release()
+
+    def __assign_client_id(
+        self, client_info_packet: ClientInformationPacket
+    ) -> tuple[str, bytes | None]:
+        """
+        ID cố định của thiết bị và device key. Thiết bị đang có kết nối khác
+        giữ ID (vd. chạy hai ứng dụng cùng lúc) thì nhận ID tạm, key cũ giữ nguyên.
+        """
+        device_id = client_info_packet.device_id
+        if not device_id:
+            return DeviceRegistry.allocate(), None
+
+        client_id, device_key = DeviceRegistry.bind(
+            device_id, getattr(client_info_packet, "device_key", None)
+        )
+        if DeviceRegistry.acquire(client_id):
+            return client_id, device_key
+
+        # Kết nối trước của chính thiết bị này đang chờ resume (vd. ứng dụng vừa
+        # khởi động lại nên mất resume token): bỏ client cũ để lấy lại ID
+        client_info = ClientManager.get_client_info(client_id)
+        if (
+            client_info
+            and client_info["socket"] is None
+            and client_info["device_id"] == device_id
+            and ClientManager.remove_parked_client(client_id, client_info["parked_at"])
+        ):
+            self.__release_client(client_id)
+            logger.info(
+                f"Client {client_id} replaced by a new connection from the same device"
+            )
+            if DeviceRegistry.acquire(client_id):
+                return client_id, device_key
+
+        return DeviceRegistry.allocate(), None
+
+    @staticmethod
+    def __abort_handshake(client_socket: socket.socket | ssl.SSLSocket):
+        try:
+            client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
     def stop(self):
         if self.shutdown_event.is_set():
             return
@@ -147,14 +301,52 @@ class Server:
             except Exception:
                 logger.error("Error closing server socket")
         try:
+            self.handshake_pool.shutdown(wait=False, cancel_futures=True)
+            HeartbeatMonitor.shutdown()
+            MediaRelay.shutdown()
             RelayHandler.shutdown()
+            FileSpool.shutdown()
             SessionManager.shutdown()
             ClientManager.shutdown()
+            DeviceRegistry.shutdown()
+            timing_wheel.shutdown()
         except Exception as e:
             logger.error(f"Error shutting down RelayHandler: {e}")
 
         logger.info("Server shutdown complete")
 
+    def evict_client(self, client_id: str, reason: str):
+        """Loại bỏ client không còn gửi heartbeat (kết nối half-open) hoặc idle quá lâu"""
+        client_socket = ClientManager.get_client_socket(client_id)
+        if not client_socket:
+            return
+
+        if reason == "idle":
+            logger.info(f"Client {client_id} idle for {Config.idle_timeout}s. Evicting")
+        else:
+            logger.warning(
+                f"Client {client_id} missed {Config.heartbeat_misses} heartbeats. Evicting"
+            )
+        if reason == "idle" or Config.resume_grace <= 0:
+            SessionManager.end_client_sessions(client_id)
+            ClientManager.remove_client(client_id)
+
+        # Đánh thức handle_client đang chờ recv để nó dọn dẹp và trả semaphore
+        # (mất heartbeat: kết nối có thể chỉ bị gián đoạn - client được chờ resume)
+        try:
+            client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def relay_media_packet(
+        self, packet: VideoStreamPacket | CursorPacket, client_id: str
+    ):
+        """Packet media client gửi qua UDP - tính là hoạt động như packet TCP"""
+        if not ClientManager.is_client_exist(client_id):
+            return
+        HeartbeatMonitor.touch(client_id)
+        RelayHandler.relay_media_packet(packet, client_id)
+
     def receive(self):
         if not self.socket:
             logger.error("Server is not running")
@@ -180,12 +372,33 @@ class Server:
             return
 
         while (
-            ClientManager.is_client_exist(client_id)
+            ClientManager.is_current_socket(client_id, client_socket)
             and not self.shutdown_event.is_set()
         ):
             try:
                 packet = send_queue.get(timeout=0.1)
-                Protocol.send_packet(client_socket, packet)
+                if not ClientManager.is_current_socket(client_id, client_socket):
+                    # Client đã resume trong lúc chờ: packet (vd. keyframe
+                    # request ngay sau resume) là của kết nối mới, không gửi vào
+                    # kết nối cũ đã chết
+                    send_queue.requeue(
+                        packet,
+                        packet.packet if isinstance(packet, SpooledPacket) else None,
+                    )
+                    break
+                if isinstance(packet, SpooledPacket):
+                    packet = packet.take()
+                if (
+                    isinstance(packet, VideoStreamPacket)
+                    and packet.timestamps is not None
+                ):
+                    packet.timestamps["relay_out"] = time.monotonic()
+                elif isinstance(packet, PongPacket) and not packet.reply_ts:
+                    packet.reply_ts = time.monotonic()
+                sent = Protocol.send_packet(client_socket, packet)
+                session_id = getattr(packet, "session_id", None)
+                if session_id:
+                    SessionManager.add_relayed_bytes(session_id, sent)
             except queue.Empty:
                 continue
             except Exception as e:
@@ -203,18 +416,34 @@ class Server:
         os: str = "",
         host_name: str = "",
         device_id: str = "",
+        media_token: bytes | None = None,
+        resume_token: bytes | None = None,
+        resumed: bool = False,
     ):
         """Main handler loop cho client"""
         sender_thread = None
         try:
-            ClientManager.add_client(
-                client_socket, client_id, client_addr, os, host_name, device_id
-            )
-            logger.info(
-                f"Client {client_id} ({host_name}) connected from {client_addr}"
-            )
+            if resumed:
+                # Đã gắn vào client cũ lúc handshake
+                logger.info(f"Client {client_id} ({host_name}) resumed from {client_addr}")
+            else:
+                ClientManager.add_client(
+                    client_socket,
+                    client_id,
+                    client_addr,
+                    os,
+                    host_name,
+                    device_id,
+                    resume_token,
+                )
+                logger.info(
+                    f"Client {client_id} ({host_name}) connected from {client_addr}"
+                )
 
             client_socket.settimeout(1.0)
+            HeartbeatMonitor.touch(client_id)
+            if media_token:
+                MediaRelay.register(client_id, media_token)
 
             sender_thread = threading.Thread(
                 target=self.sender_worker, args=(client_socket, client_id), daemon=True
@@ -222,7 +451,7 @@ class Server:
             sender_thread.start()
 
             while (
-                ClientManager.is_client_exist(client_id)
+                ClientManager.is_current_socket(client_id, client_socket)
                 and not self.shutdown_event.is_set()
             ):
                 try:
@@ -232,6 +461,23 @@ class Server:
                 if not packet:
                     break
 
+                HeartbeatMonitor.touch(
+                    client_id, not isinstance(packet, (PingPacket, PongPacket))
+                )
+
+                if isinstance(packet, WindowUpdatePacket):
+                    # Credit của chặng server -> client, không relay
+                    send_queue = ClientManager.get_client_queue(client_id)
+                    if send_queue:
+                        send_queue.window_update(packet.stream_id, packet.increment)
+                    continue
+
+                if (
+                    isinstance(packet, VideoStreamPacket)
+                    and packet.timestamps is not None
+                ):
+                    packet.timestamps["relay_in"] = time.monotonic()
+
                 RelayHandler.relay_packet(packet, client_socket)
 
         except ValueError as ve:
@@ -241,13 +487,47 @@ class Server:
         except Exception:
             logger.error(f"Exception in handle_client for {client_id}", exc_info=True)
         finally:
-            sessions = SessionManager.get_all_sessions(client_id)
-            if sessions:
-                for sess_id in list(sessions.keys()):
-                    SessionManager.end_session(sess_id)
-
-            ClientManager.remove_client(client_id)
             client_socket.close()
+            self.__connection_closed(client_id, client_socket, client_addr)
+
+    def __connection_closed(
+        self,
+        client_id: str,
+        client_socket: ssl.SSLSocket | socket.socket,
+        client_addr: str,
+    ):
+        """
+        Kết nối của client đã đóng: giữ client (ID, session, hàng đợi) trong
+        Config.resume_grace giây để nó kết nối lại, hoặc dọn dẹp ngay
+        """
+        parked_at = time.monotonic() if Config.resume_grace > 0 else None
+        state = ClientManager.detach_client(client_id, client_socket, parked_at)
+        if state == "superseded":
+            return  # Client đã kết nối lại bằng kết nối khác
+
+        HeartbeatMonitor.remove(client_id)
+        MediaRelay.unregister(client_id)
+        if state == "parked":
+            timing_wheel.schedule(
+                Config.resume_grace, self.__expire_parked_client, client_id, parked_at
+            )
+            logger.info(
+                f"Client {client_id} disconnected from {client_addr}. Waiting {Config.resume_grace}s for it to resume"
+            )
+            return
 
-            client_semaphore.release()
-            logger.info(f"Client {client_id} disconnected from {client_addr}")
+        self.__release_client(client_id)
+        logger.info(f"Client {client_id} disconnected from {client_addr}")
+
+    def __expire_parked_client(self, client_id: str, parked_at: float):
+        if ClientManager.remove_parked_client(client_id, parked_at):
+            self.__release_client(client_id)
+            logger.info(f"Client {client_id} did not resume in time")
+
+    def __release_client(self, client_id: str):
+        """Client rời hẳn: kết thúc session và trả slot"""
+        SessionManager.end_client_sessions(client_id)
+        FileSpool.drop_receiver(client_id)
+        ClientManager.remove_client(client_id)
+        DeviceRegistry.release(client_id)
+        self.client_semaphore.release()
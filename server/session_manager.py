@@ -4,9 +4,10 @@ import time
 import uuid
 from typing import TypedDict
 import queue
-import heapq
 
 from server.client_manager import ClientManager
+from server.file_spool import FileSpool
+from server.timing_wheel import Timer, timing_wheel
 from common.packets import SessionPacket
 from common.enums import Status
 
@@ -19,93 +20,53 @@ SessionInfo = TypedDict(
         "host_id": str,
         "status": str,
         "expires_at": float,
+        "relayed_bytes": int,  # Byte server đã gửi đi cho session (TCP + UDP)
+        "monitors": frozenset[int],  # Monitor của host controller đang xem
     },
 )
 
+PRIMARY_MONITOR = 1
+
 
 class SessionManager:
     __active_session: dict[str, SessionInfo] = {}
     __client_to_sessions: dict[str, set[str]] = {}
-    __expiry_heap: list[tuple[float, str]] = []
+    __expiry_timers: dict[str, Timer] = {}
     __lock = threading.Lock()
-    __cleanup_thread = None
-    __stop_cleanup = threading.Event()
 
     @classmethod
-    def start_cleanup(cls, interval: int = 30):
-        if cls.__cleanup_thread and cls.__cleanup_thread.is_alive():
+    def __on_session_expired(cls, session_id: str):
+        """Callback của timing wheel khi session hết hạn"""
+        session_info = cls.get_session(session_id)
+        if not session_info:
             return
 
-        def __cleanup_loop():
-            while not cls.__stop_cleanup.is_set():
-                with cls.__lock:
-                    if cls.__expiry_heap:
-                        next_expiry = cls.__expiry_heap[0][0]
-                        sleep_time = max(1, min(interval, next_expiry - time.time()))
-                    else:
-                        sleep_time = interval
-
-                cls.__stop_cleanup.wait(timeout=max(1, sleep_time))
-
-                if cls.__stop_cleanup.is_set():
-                    break
+        response = SessionPacket(
+            status=Status.SESSION_TIMEOUT,
+            session_id=session_id,
+        )
 
-                cls.__cleanup_expired_sessions()
-
-        cls.__cleanup_thread = threading.Thread(target=__cleanup_loop, daemon=True)
-        cls.__cleanup_thread.start()
-        logger.info("Session cleanup started")
-
-    @classmethod
-    def __cleanup_expired_sessions(cls):
-        now = time.time()
-        expired = []
+        for client_id in [session_info["controller_id"], session_info["host_id"]]:
+            client_queue = ClientManager.get_client_queue(client_id)
+            if client_queue:
+                try:
+                    client_queue.put_nowait(response)
+                except queue.Full:
+                    logger.warning(
+                        f"Queue full for {client_id}, dropping timeout notification"
+                    )
 
-        with cls.__lock:
-            while cls.__expiry_heap and cls.__expiry_heap[0][0] < now:
-                _, sid = heapq.heappop(cls.__expiry_heap)
-
-                if sid in cls.__active_session:
-                    session_info = cls.__active_session[sid]
-                    expired.append((sid, session_info))
-
-        if expired:
-            for sid, session_info in expired:
-                controller_id = session_info["controller_id"]
-                host_id = session_info["host_id"]
-
-                response = SessionPacket(
-                    status=Status.SESSION_TIMEOUT,
-                    session_id=sid,
-                )
-
-                for client_id in [controller_id, host_id]:
-                    client_queue = ClientManager.get_client_queue(client_id)
-                    if client_queue:
-                        try:
-                            client_queue.put_nowait(response)
-                        except queue.Full:
-                            logger.warning(
-                                f"Queue full for {client_id}, dropping timeout notification"
-                            )
-
-                cls.end_session(sid)
+        cls.end_session(session_id)
 
     @classmethod
     def shutdown(cls):
-        """Shutdown cleanup thread"""
-        if cls.__stop_cleanup.is_set():
-            return
-
-        cls.__stop_cleanup.set()
-
-        if cls.__cleanup_thread is not None:
-            cls.__cleanup_thread.join(timeout=5)
-
+        """Xóa toàn bộ session"""
         with cls.__lock:
+            for timer in cls.__expiry_timers.values():
+                timing_wheel.cancel(timer)
+            cls.__expiry_timers.clear()
             cls.__active_session.clear()
             cls.__client_to_sessions.clear()
-            cls.__expiry_heap.clear()
             logger.info("All active sessions cleared")
 
     @classmethod
@@ -122,9 +83,13 @@ class SessionManager:
                 "host_id": host_id,
                 "status": "ACTIVE",
                 "expires_at": expires_at,
+                "relayed_bytes": 0,
+                "monitors": frozenset({PRIMARY_MONITOR}),
             }
 
-            heapq.heappush(cls.__expiry_heap, (expires_at, session_id))
+            cls.__expiry_timers[session_id] = timing_wheel.schedule(
+                timeout, cls.__on_session_expired, session_id
+            )
 
             if controller_id not in cls.__client_to_sessions:
                 cls.__client_to_sessions[controller_id] = set()
@@ -150,6 +115,10 @@ class SessionManager:
                 logger.warning(f"Attempted to end non-existent session {session_id}")
                 return
 
+            timer = cls.__expiry_timers.pop(session_id, None)
+            if timer:
+                timing_wheel.cancel(timer)
+
             controller_id = session_info["controller_id"]
             host_id = session_info["host_id"]
 
@@ -160,7 +129,49 @@ class SessionManager:
                     if not client_sessions:
                         del cls.__client_to_sessions[client_id]
 
-            logger.info(f"Session {session_id} ended")
+            logger.info(
+                f"Session {session_id} ended ({session_info['relayed_bytes']} bytes relayed)"
+            )
+
+        FileSpool.end_session(session_id)
+
+    @classmethod
+    def add_relayed_bytes(cls, session_id: str, nbytes: int):
+        """Cộng dồn lưu lượng relay của session (để thấy hiệu quả của đường trực tiếp)"""
+        with cls.__lock:
+            session_info = cls.__active_session.get(session_id)
+            if session_info:
+                session_info["relayed_bytes"] += nbytes
+
+    @classmethod
+    def set_monitors(cls, session_id: str, monitors: list[int]):
+        """Ghi nhận các monitor host đang stream cho session (từ MonitorListPacket)"""
+        with cls.__lock:
+            session_info = cls.__active_session.get(session_id)
+            if session_info:
+                session_info["monitors"] = frozenset(monitors)
+
+    @classmethod
+    def end_client_sessions(cls, client_id: str):
+        """Kết thúc mọi session của client đã rời đi và báo cho phía còn lại"""
+        for session_id, session_info in cls.get_all_sessions(client_id).items():
+            cls.end_session(session_id)
+
+            partner_id = (
+                session_info["host_id"]
+                if session_info["controller_id"] == client_id
+                else session_info["controller_id"]
+            )
+            partner_queue = ClientManager.get_client_queue(partner_id)
+            if partner_queue:
+                try:
+                    partner_queue.put_nowait(
+                        SessionPacket(status=Status.SESSION_ENDED, session_id=session_id)
+                    )
+                except queue.Full:
+                    logger.warning(
+                        f"Queue full for {partner_id}, dropping session end notification"
+                    )
 
     @classmethod
     def get_session(cls, session_id: str) -> SessionInfo | None:
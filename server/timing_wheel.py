@@ -0,0 +1,212 @@
+import logging
+import math
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    """
+    Node của timing wheel - nằm trực tiếp trong danh sách liên kết đôi của slot
+    nên insert/cancel/reset không cần cấp phát hay tìm kiếm.
+    """
+
+    __slots__ = ("callback", "args", "deadline", "prev", "next")
+
+    def __init__(self, callback: Callable | None = None, args: tuple = ()):
+        self.callback = callback
+        self.args = args
+        self.deadline = 0  # tính bằng tick
+        self.prev: "Timer | None" = None
+        self.next: "Timer | None" = None
+
+    @property
+    def active(self) -> bool:
+        return self.next is not None
+
+    def __repr__(self):
+        return f"Timer(deadline={self.deadline}, active={self.active})"
+
+
+class TimingWheel:
+    """
+    Timing wheel phân cấp (kiểu timer wheel của Linux kernel).
+
+    Mỗi level có SLOTS slot, mỗi slot ở level L dài SLOTS^L tick:
+        tick 0.1s, 64 slot, 4 level -> tầm với ~19 ngày
+    Timer xa được đặt ở level cao và "cascade" xuống level thấp hơn khi
+    level 0 quay hết một vòng. Mọi timer chạy trên một thread duy nhất.
+        - schedule / cancel / reset: O(1)
+        - mỗi tick: O(số timer hết hạn) + cascade (mỗi timer tối đa LEVELS lần)
+    """
+
+    BITS = 6
+    SLOTS = 1 << BITS
+    MASK = SLOTS - 1
+    LEVELS = 4
+
+    def __init__(self, tick: float = 0.1):
+        self.__tick = tick
+        self.__wheels = [
+            [self.__new_head() for _ in range(self.SLOTS)] for _ in range(self.LEVELS)
+        ]
+        self.__max_ticks = (1 << (self.BITS * self.LEVELS)) - 1
+        self.__next_tick = 0  # tick kế tiếp cần xử lý
+        self.__origin = time.monotonic()
+        self.__count = 0
+        self.__lock = threading.Lock()
+        self.__thread = None
+        self.__stop_event = threading.Event()
+
+    @staticmethod
+    def __new_head() -> Timer:
+        head = Timer()
+        head.prev = head
+        head.next = head
+        return head
+
+    def start(self):
+        if self.__thread and self.__thread.is_alive():
+            return
+        self.__stop_event.clear()
+        self.__thread = threading.Thread(
+            target=self.__run, daemon=True, name="TimingWheel"
+        )
+        self.__thread.start()
+        logger.info(f"Timing wheel started (tick={self.__tick}s)")
+
+    def shutdown(self):
+        self.__stop_event.set()
+        if self.__thread:
+            self.__thread.join(timeout=2)
+            self.__thread = None
+        with self.__lock:
+            for wheel in self.__wheels:
+                for head in wheel:
+                    node = head.next
+                    while node is not head:
+                        following = node.next
+                        node.prev = node.next = None
+                        node = following
+                    head.prev = head.next = head
+            self.__count = 0
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def schedule(self, delay: float, callback: Callable, *args) -> Timer:
+        """Đặt timer chạy callback(*args) sau delay giây"""
+        timer = Timer(callback, args)
+        with self.__lock:
+            self.__add(timer, self.__deadline_for(delay))
+        return timer
+
+    def cancel(self, timer: Timer) -> bool:
+        """Hủy timer, trả về False nếu timer đã chạy hoặc đã bị hủy"""
+        with self.__lock:
+            if timer.next is None:
+                return False
+            self.__unlink(timer)
+            return True
+
+    def reset(self, timer: Timer, delay: float):
+        """Dời timer sang delay giây kể từ bây giờ (kích hoạt lại nếu đã chạy)"""
+        deadline = self.__deadline_for(delay)
+        with self.__lock:
+            if timer.next is not None:
+                if timer.deadline == deadline:
+                    return
+                self.__unlink(timer)
+            self.__add(timer, deadline)
+
+    def __deadline_for(self, delay: float) -> int:
+        return math.ceil((time.monotonic() - self.__origin + delay) / self.__tick)
+
+    def __add(self, timer: Timer, deadline: int):
+        if deadline < self.__next_tick:
+            deadline = self.__next_tick
+        timer.deadline = deadline
+
+        distance = min(deadline - self.__next_tick, self.__max_ticks)
+        level = 0
+        while distance >= self.SLOTS and level < self.LEVELS - 1:
+            distance >>= self.BITS
+            level += 1
+
+        placement = min(deadline, self.__next_tick + self.__max_ticks)
+        head = self.__wheels[level][(placement >> (self.BITS * level)) & self.MASK]
+
+        timer.prev = head.prev
+        timer.next = head
+        head.prev.next = timer
+        head.prev = timer
+        self.__count += 1
+
+    def __unlink(self, timer: Timer):
+        timer.prev.next = timer.next
+        timer.next.prev = timer.prev
+        timer.prev = timer.next = None
+        self.__count -= 1
+
+    def __detach_slot(self, head: Timer) -> Timer | None:
+        """Tách toàn bộ timer của một slot, trả về node đầu của chuỗi"""
+        if head.next is head:
+            return None
+        first = head.next
+        head.prev.next = None
+        head.prev = head.next = head
+        return first
+
+    def __cascade(self, level: int) -> int:
+        """Phân phối lại slot hiện tại của level xuống các level thấp hơn"""
+        index = (self.__next_tick >> (self.BITS * level)) & self.MASK
+        node = self.__detach_slot(self.__wheels[level][index])
+        while node is not None:
+            following = node.next
+            self.__count -= 1
+            self.__add(node, node.deadline)
+            node = following
+        return index
+
+    def __advance(self) -> list[Timer]:
+        """Xử lý một tick, trả về các timer hết hạn"""
+        index = self.__next_tick & self.MASK
+        if index == 0:
+            level = 1
+            while level < self.LEVELS and self.__cascade(level) == 0:
+                level += 1
+
+        expired: list[Timer] = []
+        node = self.__detach_slot(self.__wheels[0][index])
+        while node is not None:
+            following = node.next
+            node.prev = node.next = None
+            self.__count -= 1
+            expired.append(node)
+            node = following
+
+        self.__next_tick += 1
+        return expired
+
+    def __run(self):
+        while not self.__stop_event.is_set():
+            now_tick = int((time.monotonic() - self.__origin) / self.__tick)
+
+            expired: list[Timer] = []
+            with self.__lock:
+                while self.__next_tick <= now_tick:
+                    expired.extend(self.__advance())
+
+            for timer in expired:
+                try:
+                    timer.callback(*timer.args)
+                except Exception as e:
+                    logger.error(f"Error in timer callback: {e}", exc_info=True)
+
+            next_time = self.__origin + (now_tick + 1) * self.__tick
+            self.__stop_event.wait(timeout=max(0.0, next_time - time.monotonic()))
+
+
+timing_wheel = TimingWheel()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Không cần màn hình / thiết bị input thật khi chạy test
+os.environ.setdefault("PYNPUT_BACKEND", "dummy")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
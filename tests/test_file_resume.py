@@ -0,0 +1,196 @@
+import os
+import queue
+import random
+import threading
+import time
+
+import pytest
+
+from client.handlers.receive_handler import ReceiveHandler
+from client.managers.session_manager import SessionManager, SessionResources
+from client.services.file_transfer_service import CHUNK_SIZE, FileTransferService
+from client.services.sender_service import SenderService
+from common.config import Config
+from common.packets import FileChunkPacket, FileCompletePacket, FileMetadataPacket
+
+SENDER, RECEIVER = "resume-tx", "resume-rx"
+FILE_SIZE = 64 * 1024 * 1024 + 12345
+TOTAL_CHUNKS = (FILE_SIZE + CHUNK_SIZE - 1) // CHUNK_SIZE
+
+
+class Link:
+    """
+    Kết nối giữa hai client trong cùng process (thay cho relay): packet gửi
+    qua SenderService được giao cho ReceiveHandler với session_id của phía
+    bên kia. cut() mô phỏng mất kết nối - packet đang bay bị mất, cả hai phía
+    kết thúc session.
+    """
+
+    def __init__(self, save_path: str, kill_after: int | None = None, corrupt_chunk=None):
+        self.save_path = save_path
+        self.kill_after = kill_after  # Cắt sau khi bên nhận đã nhận ngần này chunk
+        self.corrupt_chunk = corrupt_chunk
+        self.received_chunks = 0
+        self.sent_chunks: list[int] = []
+        self.accepted_ranges = None
+        self.results: dict[str, bool] = {}  # file_id -> FileComplete của bên nhận
+        self.cut_event = threading.Event()
+        self.__queue: queue.Queue = queue.Queue()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+
+    def start(self):
+        for session_id, role in ((SENDER, "controller"), (RECEIVER, "host")):
+            SessionManager._sessions[session_id] = SessionResources(role=role)
+        self.__thread.start()
+
+    def send(self, packet):
+        if self.cut_event.is_set():
+            return
+        if isinstance(packet, FileChunkPacket) and packet.session_id == SENDER:
+            self.sent_chunks.append(packet.chunk_index)
+        if isinstance(packet, FileCompletePacket) and packet.session_id == RECEIVER:
+            self.results[packet.file_id] = packet.success
+        self.__queue.put(packet)
+
+    def __run(self):
+        while not self.cut_event.is_set():
+            try:
+                packet = self.__queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if self.kill_after is not None and self.received_chunks >= self.kill_after:
+                self.cut()
+                return
+
+            packet.session_id = RECEIVER if packet.session_id == SENDER else SENDER
+            if isinstance(packet, FileChunkPacket) and packet.chunk_index == self.corrupt_chunk:
+                data = bytearray(packet.chunk_data)
+                data[0] ^= 1
+                packet.chunk_data = bytes(data)
+            ReceiveHandler.handle_packet(packet)
+            if isinstance(packet, FileChunkPacket) and packet.session_id == RECEIVER:
+                self.received_chunks += 1
+
+            if isinstance(packet, FileMetadataPacket):
+                # Người dùng chọn nơi lưu trong hộp thoại
+                SessionManager.accept_file_transfer(RECEIVER, packet.file_id, self.save_path)
+                transfer = SessionManager._sessions[RECEIVER].pending_file_transfers[packet.file_id]
+                writer = transfer["writer"]
+                self.accepted_ranges = writer.received_ranges() if writer.resumed_chunks else []
+
+    def cut(self):
+        self.cut_event.set()
+        for session_id in (SENDER, RECEIVER):
+            SessionManager.stop_file_transfers(session_id)
+            SessionManager._sessions.pop(session_id, None)
+
+    def stop(self):
+        self.cut_event.set()
+        self.__thread.join(timeout=5)
+        for session_id in (SENDER, RECEIVER):
+            SessionManager._sessions.pop(session_id, None)
+
+
+@pytest.fixture
+def transfer_env(tmp_path, monkeypatch):
+    source = tmp_path / "source.bin"
+    source.write_bytes(os.urandom(FILE_SIZE))
+    links = []
+
+    def open_link(**kwargs) -> Link:
+        link = Link(str(tmp_path / "received.bin"), **kwargs)
+        monkeypatch.setattr(SenderService, "send_packet", link.send)
+        links.append(link)
+        link.start()
+        return link
+
+    monkeypatch.setattr(Config, "file_delta", False)
+    monkeypatch.setattr(Config, "sendfile", False)
+    yield str(source), str(tmp_path / "received.bin"), open_link
+    for link in links:
+        link.stop()
+
+
+def wait_for(predicate, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def sending(file_id: str) -> bool:
+    return file_id in FileTransferService._active_transfers
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_resume_after_connection_killed_at_random_points(transfer_env, seed):
+    source, save_path, open_link = transfer_env
+    rng = random.Random(seed)
+    have = 0  # Chunk bên nhận đã ghi
+
+    # Mất kết nối 3 lần ở các điểm ngẫu nhiên
+    for _ in range(3):
+        remaining = TOTAL_CHUNKS - have
+        if remaining < 2:
+            break
+        link = open_link(kill_after=rng.randrange(1, remaining))
+        file_id = FileTransferService.send_file(SENDER, source, "controller")
+        assert link.cut_event.wait(30)
+        # Thread gửi dừng ngay khi session kết thúc
+        assert wait_for(lambda: not sending(file_id), 5)
+        link.stop()
+
+        # Bên nhận giữ mọi chunk đã ghi và chỉ yêu cầu phần còn thiếu
+        resumed = sum(end - start for start, end in link.accepted_ranges)
+        assert resumed == have
+        accepted = {i for start, end in link.accepted_ranges for i in range(start, end)}
+        assert not accepted & set(link.sent_chunks)
+        have += link.received_chunks
+
+    link = open_link()
+    file_id = FileTransferService.send_file(SENDER, source, "controller")
+    assert wait_for(lambda: link.results.get(file_id), 60)
+    assert sum(end - start for start, end in link.accepted_ranges) == have
+    assert sorted(link.sent_chunks) == [
+        i for i in range(TOTAL_CHUNKS) if not any(s <= i < e for s, e in link.accepted_ranges)
+    ]
+
+    assert open(save_path, "rb").read() == open(source, "rb").read()
+    assert not os.path.exists(save_path + ".part")
+    assert not os.path.exists(save_path + ".part.map")
+
+
+def test_partial_file_survives_kill_before_any_chunk(transfer_env):
+    source, save_path, open_link = transfer_env
+    link = open_link(kill_after=0)  # Ngay packet đầu tiên (metadata)
+    file_id = FileTransferService.send_file(SENDER, source, "controller")
+    assert link.cut_event.wait(30)
+    assert wait_for(lambda: not sending(file_id), 5)
+    link.stop()
+
+    link = open_link()
+    file_id = FileTransferService.send_file(SENDER, source, "controller")
+    assert wait_for(lambda: link.results.get(file_id), 60)
+    assert open(save_path, "rb").read() == open(source, "rb").read()
+
+
+def test_receiver_failure_stops_sender(transfer_env):
+    """FileComplete(success=False) từ bên nhận dừng thread gửi ngay, không chờ ack timeout"""
+    source, save_path, open_link = transfer_env
+    link = open_link(corrupt_chunk=3)
+    file_id = FileTransferService.send_file(SENDER, source, "controller")
+
+    assert wait_for(lambda: link.results.get(file_id) is False, 10)
+    assert wait_for(lambda: not sending(file_id), 2)
+    assert len(link.sent_chunks) < TOTAL_CHUNKS
+    # Chunk đã ghi đúng được giữ để gửi lại phần còn thiếu
+    assert os.path.exists(save_path + ".part")
+    link.stop()
+
+    link = open_link()
+    file_id = FileTransferService.send_file(SENDER, source, "controller")
+    assert wait_for(lambda: link.results.get(file_id), 60)
+    assert link.accepted_ranges
+    assert open(save_path, "rb").read() == open(source, "rb").read()
@@ -0,0 +1,110 @@
+import os
+import queue
+import socket
+import time
+
+import pytest
+
+from common.packets import FileChunkPacket, FileCompletePacket, FileRejectPacket
+from server.client_manager import ClientManager
+from server.file_spool import FileSpool, SpooledPacket
+from server.relay_handler import RelayHandler
+from server.session_manager import SessionManager
+
+CHUNK = 256 * 1024
+SENDER, RECEIVER = "spool-tx", "spool-rx"
+
+
+@pytest.fixture
+def relay(tmp_path):
+    """Hai client kết nối tới relay, spool giới hạn 1 MiB, receiver chưa đọc queue"""
+    sockets = []
+    for client_id in (SENDER, RECEIVER):
+        sock, peer = socket.socketpair()
+        sockets += [sock, peer]
+        ClientManager.add_client(sock, client_id, "127.0.0.1")
+    FileSpool.start(str(tmp_path), 1)
+    session_id = SessionManager.create_session(SENDER, RECEIVER)
+    yield session_id, sockets[0], tmp_path
+    SessionManager.end_session(session_id)
+    FileSpool.shutdown()
+    for client_id in (SENDER, RECEIVER):
+        ClientManager.remove_client(client_id)
+    for sock in sockets:
+        sock.close()
+
+
+def chunk(session_id: str, index: int) -> FileChunkPacket:
+    data = index.to_bytes(8, "little") + bytes(CHUNK - 8)
+    return FileChunkPacket(session_id, "big", index, data, 64)
+
+
+def drain(client_id: str, timeout: float = 0.5) -> list:
+    """Lấy hết packet trong queue gửi của client"""
+    client_queue = ClientManager.get_client_queue(client_id)
+    packets = []
+    while True:
+        try:
+            item = client_queue.get(timeout=timeout)
+        except queue.Empty:
+            return packets
+        packets.append(item.take() if isinstance(item, SpooledPacket) else item)
+
+
+def spool_bytes(directory) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(directory)
+        for name in names
+    )
+
+
+def test_spool_full_cancels_transfer_and_drops_later_packets(relay):
+    session_id, _, directory = relay
+
+    rejected = None
+    for index in range(64):
+        if not FileSpool.put(RECEIVER, chunk(session_id, index)):
+            rejected = index
+            break
+    assert rejected is not None
+
+    # Bên gửi chưa kịp dừng - chunk sau đó không được tạo lại transfer giữa file
+    for index in range(rejected + 1, rejected + 8):
+        assert FileSpool.put(RECEIVER, chunk(session_id, index))
+    assert FileSpool.put(RECEIVER, FileCompletePacket(session_id, "big", True))
+
+    # Chỉ còn các chunk pump đã chuyển sang queue trước khi hủy
+    packets = drain(RECEIVER)
+    assert all(isinstance(packet, FileChunkPacket) for packet in packets)
+    assert all(packet.chunk_index < rejected for packet in packets)
+    assert spool_bytes(directory) == 0
+
+    # Session kết thúc thì quên transfer đã hủy
+    FileSpool.end_session(session_id)
+    assert FileSpool.put(RECEIVER, chunk(session_id, 0))
+    assert [packet.chunk_index for packet in drain(RECEIVER)] == [0]
+
+
+def test_relay_notifies_both_sides_when_spool_full(relay):
+    session_id, sender_socket, _ = relay
+
+    for index in range(16):
+        RelayHandler.relay_packet(chunk(session_id, index), sender_socket)
+
+    rejects = []
+    deadline = time.monotonic() + 5
+    while not rejects and time.monotonic() < deadline:
+        rejects = [
+            packet for packet in drain(SENDER, 0.1) if isinstance(packet, FileRejectPacket)
+        ]
+    assert [(packet.session_id, packet.file_id) for packet in rejects] == [
+        (session_id, "big")
+    ]
+
+    completes = [
+        packet for packet in drain(RECEIVER) if isinstance(packet, FileCompletePacket)
+    ]
+    assert len(completes) == 1
+    assert not completes[0].success
+    assert completes[0].file_id == "big"
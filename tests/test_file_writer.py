@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+import pytest
+
+from client.handlers.send_handler import SendHandler
+from client.managers.session_manager import SessionManager, SessionResources
+from client.services.file_transfer_service import CHUNK_SIZE
+from client.services.file_writer import ChunkFileWriter, chunk_digest
+
+# Kích thước file của test nhận file lớn, đặt PBL4_BIG_FILE_GB=0 để bỏ qua
+BIG_FILE_GB = float(os.environ.get("PBL4_BIG_FILE_GB", "2"))
+RSS_LIMIT = 256 * 1024 * 1024
+
+
+def make_chunk(base: bytes, chunk_index: int, size: int) -> bytes:
+    return chunk_index.to_bytes(8, "little") + base[8:size]
+
+
+def test_chunks_out_of_order_are_written_at_offsets(tmp_path):
+    save_path = str(tmp_path / "out.bin")
+    data = os.urandom(5 * 1000 + 123)
+    writer = ChunkFileWriter(save_path, len(data), 1000)
+
+    chunks = [data[i : i + 1000] for i in range(0, len(data), 1000)]
+    finished = [
+        writer.write_chunk(i, chunk, chunk_digest(chunk))
+        for i, chunk in reversed(list(enumerate(chunks)))
+    ]
+    assert not any(finished)  # Bên gửi chưa báo xong
+    assert writer.mark_sender_done()
+
+    writer.finalize(writer.file_hash())
+    assert open(save_path, "rb").read() == data
+    assert not os.path.exists(writer.part_path)
+    assert not os.path.exists(writer.map_path)
+
+
+def test_hash_mismatch_is_rejected(tmp_path):
+    writer = ChunkFileWriter(str(tmp_path / "out.bin"), 10, 10)
+    with pytest.raises(ValueError):
+        writer.write_chunk(0, b"0123456789", chunk_digest(b"x" * 10))
+    writer.abort()
+
+
+def test_write_after_close_raises_value_error(tmp_path):
+    writer = ChunkFileWriter(str(tmp_path / "out.bin"), 20, 10)
+    writer.close()
+    with pytest.raises(ValueError):
+        writer.write_chunk(0, b"0123456789")
+
+
+def test_close_during_concurrent_writes(tmp_path):
+    """close() giữa lúc các thread khác đang ghi: chỉ OSError / ValueError, không TypeError"""
+    chunk_size = 64 * 1024
+    total = 2000
+    writer = ChunkFileWriter(str(tmp_path / "out.bin"), chunk_size * total, chunk_size)
+    chunk = os.urandom(chunk_size)
+    errors = []
+
+    def write(chunk_index: int):
+        try:
+            writer.write_chunk(chunk_index, chunk)
+        except (OSError, ValueError):
+            pass
+        except Exception as e:
+            errors.append(e)
+
+    with ThreadPoolExecutor(8) as pool:
+        for chunk_index in range(total):
+            pool.submit(write, chunk_index)
+            if chunk_index == total // 4:
+                threading.Thread(target=writer.close).start()
+
+    assert errors == []
+
+
+@pytest.mark.skipif(BIG_FILE_GB <= 0, reason="PBL4_BIG_FILE_GB=0")
+def test_receive_multi_gb_file_with_bounded_rss(tmp_path, monkeypatch):
+    """Nhận file nhiều GB qua SessionManager: RSS không tăng theo kích thước file"""
+    sent = []
+    monkeypatch.setattr(SendHandler, "send_file_accept_packet", lambda *args: None)
+    monkeypatch.setattr(SendHandler, "send_file_ack_packet", lambda *args: None)
+    monkeypatch.setattr(
+        SendHandler, "send_file_complete_packet", lambda **kwargs: sent.append(kwargs)
+    )
+
+    size = int(BIG_FILE_GB * 1024**3) + 12345
+    total = (size + CHUNK_SIZE - 1) // CHUNK_SIZE
+    save_path = str(tmp_path / "big.bin")
+    session_id, file_id = "rss-session", "rss-file"
+    monkeypatch.setitem(SessionManager._sessions, session_id, SessionResources(role="host"))
+    SessionManager.handle_file_metadata(session_id, file_id, "big.bin", size, "controller")
+    assert SessionManager.accept_file_transfer(session_id, file_id, save_path)
+
+    process = psutil.Process()
+    baseline = process.memory_info().rss
+    peak = baseline
+    base = os.urandom(CHUNK_SIZE)
+
+    # Giống ListenerService: nhiều thread xử lý chunk, không theo thứ tự chặt
+    with ThreadPoolExecutor(8) as pool:
+        for chunk_index in range(total):
+            data = make_chunk(base, chunk_index, min(CHUNK_SIZE, size - chunk_index * CHUNK_SIZE))
+            pool.submit(
+                SessionManager.handle_file_chunk,
+                session_id,
+                file_id,
+                chunk_index,
+                data,
+                total,
+                chunk_digest(data),
+            )
+            while pool._work_queue.qsize() > 64:
+                time.sleep(0.001)
+            if chunk_index % 256 == 0:
+                peak = max(peak, process.memory_info().rss)
+        SessionManager.handle_file_complete(session_id, file_id, True, "")
+    peak = max(peak, process.memory_info().rss)
+
+    assert sent and sent[-1]["success"], sent
+    assert os.path.getsize(save_path) == size
+    assert peak - baseline < RSS_LIMIT, f"RSS grew by {(peak - baseline) >> 20} MiB"
+
+    with open(save_path, "rb") as f:
+        for chunk_index in (0, total // 2, total - 1):
+            f.seek(chunk_index * CHUNK_SIZE)
+            expected = make_chunk(base, chunk_index, min(CHUNK_SIZE, size - chunk_index * CHUNK_SIZE))
+            assert f.read(CHUNK_SIZE) == expected
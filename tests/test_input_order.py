@@ -0,0 +1,94 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from client.handlers.receive_handler import ReceiveHandler
+from client.managers.session_manager import SessionManager, SessionResources
+from client.services.input_executor_service import InputExecutorService
+from common.enums import MouseButton, MouseEventType
+from common.packets import MousePacket
+from server.client_manager import ClientManager
+from server.relay_handler import RelayHandler
+from server.session_manager import SessionManager as ServerSessionManager
+
+CONTROLLER, HOST = "input-ctl", "input-host"
+SESSION = "input-session"
+QUEUES = "_InputExecutorService__queues"
+
+
+def drag(session_id: str, count: int) -> list[MousePacket]:
+    """Chuỗi PRESS, MOVE, RELEASE, MOVE... - vị trí đánh số thứ tự"""
+    kinds = (MouseEventType.PRESS, MouseEventType.MOVE, MouseEventType.RELEASE, MouseEventType.MOVE)
+    return [
+        MousePacket(kinds[index % 4], (index, 0), MouseButton.LEFT, session_id=session_id)
+        for index in range(count)
+    ]
+
+
+@pytest.fixture
+def relay():
+    sockets = []
+    for client_id in (CONTROLLER, HOST):
+        sock, peer = socket.socketpair()
+        sockets += [sock, peer]
+        ClientManager.add_client(sock, client_id, "127.0.0.1")
+    session_id = ServerSessionManager.create_session(CONTROLLER, HOST)
+    yield session_id, sockets[0]
+    ServerSessionManager.end_session(session_id)
+    for client_id in (CONTROLLER, HOST):
+        ClientManager.remove_client(client_id)
+    for sock in sockets:
+        sock.close()
+
+
+@pytest.fixture
+def stalled_host(monkeypatch):
+    """Session host mà worker thực thi input bị chặn tới khi release được set"""
+    release = threading.Event()
+    monkeypatch.setattr(ReceiveHandler, "handle_packet", staticmethod(lambda packet: release.wait()))
+    SessionManager._sessions[SESSION] = SessionResources(role="host")
+    yield release
+    release.set()
+    InputExecutorService.remove_session(SESSION)
+    InputExecutorService.shutdown()
+    SessionManager._sessions.pop(SESSION, None)
+
+
+def test_relay_forwards_input_in_order(relay):
+    session_id, controller_socket = relay
+    packets = drag(session_id, 2000)
+    for packet in packets:
+        RelayHandler.relay_packet(packet, controller_socket)
+
+    host_queue = ClientManager.get_client_queue(HOST)
+    relayed = []
+    deadline = time.monotonic() + 5
+    while len(relayed) < len(packets) and time.monotonic() < deadline:
+        relayed.append(host_queue.get(timeout=1))
+    assert [packet.position for packet in relayed] == [packet.position for packet in packets]
+
+
+def test_full_queue_does_not_block_and_keeps_press_release(stalled_host):
+    packets = drag(SESSION, 4 * InputExecutorService.MAX_PENDING)
+    start = time.monotonic()
+    for packet in packets:
+        InputExecutorService.submit(packet)
+    assert time.monotonic() - start < 0.2
+
+    session_queue = getattr(InputExecutorService, QUEUES)[SESSION]
+    queued = [packet for packet in session_queue.pending if packet.event_type != MouseEventType.MOVE]
+    expected = [packet for packet in packets if packet.event_type != MouseEventType.MOVE]
+    # Worker đang giữ packet đầu tiên - mọi PRESS / RELEASE còn lại vẫn trong queue
+    assert queued == expected[1:]
+    assert session_queue.buttons_down == set()
+
+
+def test_no_worker_for_removed_session(stalled_host):
+    # remove_session chạy khi session còn trong SessionManager._sessions
+    InputExecutorService.remove_session(SESSION)
+    InputExecutorService.submit(drag(SESSION, 1)[0])
+
+    assert SESSION not in getattr(InputExecutorService, QUEUES)
+    assert not any(thread.name == f"InputExecutor-{SESSION}" for thread in threading.enumerate())
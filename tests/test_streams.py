@@ -0,0 +1,145 @@
+import heapq
+from collections import defaultdict
+from queue import Empty
+
+import pytest
+
+from common.enums import MouseEventType
+from common.packets import FileChunkPacket, MousePacket, VideoStreamPacket
+from common.streams import CONTROL_STREAM, StreamQueue, WindowTracker, stream_id
+
+RATE = 20 * 1024 * 1024  # Băng thông link (byte/s)
+RTT = 0.02  # WindowUpdate tới bên gửi sau ngần này giây
+CHUNK = 256 * 1024
+FILES = ("a", "b", "c")
+FPS = 30
+INPUT_INTERVAL = 0.01
+DURATION = 5.0
+SESSION = "s1"
+
+
+def simulate(frame_size: int):
+    """
+    Mô phỏng một kết nối theo đồng hồ ảo: ba file luôn có chunk chờ gửi, một
+    stream video FPS khung hình frame_size byte, input chuột mỗi 10 ms. Link
+    gửi lần lượt từng packet lấy ra từ StreamQueue, bên nhận trả credit qua
+    WindowTracker sau RTT. Trả về (byte đã gửi theo stream, byte video đã tạo,
+    độ trễ của từng packet control).
+    """
+    stream_queue = StreamQueue()
+    tracker = WindowTracker()
+    sent: dict[str, int] = defaultdict(int)
+    queued = dict.fromkeys(FILES, 0)
+    next_index = dict.fromkeys(FILES, 0)
+    input_times: dict[MousePacket, float] = {}
+    latencies = []
+    updates = []  # (thời điểm tới bên gửi, stream, increment)
+    video_bytes = 0
+    next_frame = next_input = now = 0.0
+
+    while now < DURATION:
+        while next_frame <= now:
+            stream_queue.put(VideoStreamPacket(SESSION, bytes(frame_size)))
+            video_bytes += frame_size
+            next_frame += 1 / FPS
+        while next_input <= now:
+            packet = MousePacket(MouseEventType.MOVE, (0, 0), session_id=SESSION)
+            input_times[packet] = next_input
+            stream_queue.put(packet)
+            next_input += INPUT_INTERVAL
+        while updates and updates[0][0] <= now:
+            _, stream, increment = heapq.heappop(updates)
+            stream_queue.window_update(stream, increment)
+        for file_id in FILES:
+            # Bên gửi luôn có sẵn vài chunk của mỗi file
+            while queued[file_id] < 4:
+                chunk = FileChunkPacket(SESSION, file_id, next_index[file_id], bytes(CHUNK), 0)
+                stream_queue.put(chunk)
+                queued[file_id] += 1
+                next_index[file_id] += 1
+
+        try:
+            packet = stream_queue.get_nowait()
+        except Empty:
+            # Mọi stream đang chờ credit / dữ liệu - tới sự kiện tiếp theo
+            now = min([next_frame, next_input] + [update[0] for update in updates[:1]])
+            continue
+
+        if isinstance(packet, FileChunkPacket):
+            size = len(packet.chunk_data)
+        elif isinstance(packet, VideoStreamPacket):
+            size = len(packet.video_data)
+        else:
+            size = 64
+        now += size / RATE
+        sent[stream_id(packet)] += size
+
+        if isinstance(packet, MousePacket):
+            latencies.append(now - input_times.pop(packet))
+        elif isinstance(packet, FileChunkPacket):
+            queued[packet.file_id] -= 1
+            update = tracker.consumed(packet)
+            if update:
+                heapq.heappush(updates, (now + RTT, *update))
+
+    return sent, video_bytes, latencies
+
+
+def shares(sent: dict[str, int]) -> dict[str, float]:
+    total = sum(sent.values())
+    return {stream: nbytes / total for stream, nbytes in sent.items()}
+
+
+def assert_control_latency(latencies: list[float], largest_packet: int):
+    """Input chỉ phải chờ packet đang gửi dở, không chờ hàng đợi của các stream"""
+    assert len(latencies) >= DURATION / INPUT_INTERVAL * 0.95
+    assert max(latencies) <= (largest_packet + 2 * 64) / RATE + 1e-9
+
+
+def test_video_below_fair_share_is_not_throttled_and_files_split_the_rest():
+    # 60 KB x 30 fps ~ 1.8 MB/s, dưới 1/4 băng thông
+    sent, video_bytes, latencies = simulate(60_000)
+    share = shares(sent)
+
+    video = f"video/{SESSION}/1"
+    assert sent[video] >= video_bytes - 2 * 60_000
+    file_shares = [share[f"file/{file_id}"] for file_id in FILES]
+    expected = (1 - share[video] - share[CONTROL_STREAM]) / len(FILES)
+    for file_share in file_shares:
+        assert file_share == pytest.approx(expected, abs=0.02)
+    assert_control_latency(latencies, CHUNK)
+
+
+def test_backlogged_streams_share_bandwidth_equally():
+    # 400 KB x 30 fps ~ 12 MB/s, video cũng luôn có khung hình chờ gửi
+    sent, _, latencies = simulate(400_000)
+    share = shares(sent)
+
+    data_streams = [f"file/{file_id}" for file_id in FILES] + [f"video/{SESSION}/1"]
+    fair = (1 - share[CONTROL_STREAM]) / len(data_streams)
+    for stream in data_streams:
+        assert share[stream] == pytest.approx(fair, abs=0.02)
+    assert_control_latency(latencies, 400_000)
+
+
+def test_requeued_packets_go_out_first_with_their_credit():
+    # Kết nối cũ lấy packet ra sau khi client resume - trả lại cho kết nối mới
+    stream_queue = StreamQueue(window=2 * CHUNK)
+    chunks = [FileChunkPacket(SESSION, "a", index, bytes(CHUNK), 0) for index in range(3)]
+    for chunk in chunks:
+        stream_queue.put(chunk)
+    assert stream_queue.get_nowait() is chunks[0]
+    request = MousePacket(MouseEventType.MOVE, (0, 0), session_id=SESSION)
+    stream_queue.put(request)
+    assert stream_queue.get_nowait() is request
+
+    stream_queue.requeue(chunks[0])
+    stream_queue.requeue(request)
+    assert stream_queue.qsize() == 4
+
+    # Credit của chunk trả lại được hoàn: chunk 0, 1 đi tiếp, chunk 2 chờ credit
+    assert stream_queue.get_nowait() is request
+    assert stream_queue.get_nowait() is chunks[0]
+    assert stream_queue.get_nowait() is chunks[1]
+    with pytest.raises(Empty):
+        stream_queue.get_nowait()